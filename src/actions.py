@@ -0,0 +1,146 @@
+# c:\0124newSIm\src\actions.py
+# NPC企業の意思決定結果 (アクション)
+# 意思決定ロジックはDBへ直接書き込まず、アクションを出力する。適用は Simulation.apply_actions が行う。
+import json
+from database import db
+
+class Action:
+    """
+    アクションの基底クラス。fields に列挙した値をキーワード引数で受け取る。
+    log: 適用時にイベントログへ書き出す (event_type, details)
+    status / note: 適用結果 ('applied' / 'rejected') と補足 (振替・却下理由)
+    """
+    fields = ()
+
+    def __init__(self, company_id, week, log=None, **values):
+        self.company_id = company_id
+        self.week = week
+        self.log = log
+        for name in self.fields:
+            setattr(self, name, values.get(name))
+        self.status = None
+        self.note = None
+
+    @property
+    def type(self):
+        return self.__class__.__name__
+
+    def to_dict(self):
+        return {
+            'type': self.type,
+            'company_id': self.company_id,
+            'week': self.week,
+            'values': {name: getattr(self, name) for name in self.fields},
+            'log': list(self.log) if self.log else None,
+        }
+
+    def __repr__(self):
+        values = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.fields)
+        return f"{self.type}(company_id={self.company_id}, {values})"
+
+# --- 経営 ---
+class SetPhase(Action):
+    fields = ('phase',)
+
+class TakeLoan(Action):
+    fields = ('amount', 'interest_rate', 'remaining_weeks')
+
+# --- 人事 ---
+class RaiseSalary(Action):
+    fields = ('npc_id', 'salary')
+
+class MakeJobOffer(Action):
+    fields = ('npc_id', 'offer_salary', 'target_dept')
+
+class PostRequisition(Action):
+    # 求人 (採用する人はマッチングで決まる)。stat_error: 能力の認知誤差の幅 / eval_noise: 評価のブレ (±割合)
+    fields = ('target_dept', 'count', 'industry_key', 'stat_error', 'eval_noise')
+
+class FireEmployee(Action):
+    fields = ('npc_id',)
+
+class PromoteEmployee(Action):
+    fields = ('npc_id', 'role')
+
+# --- 生産・開発・取引 ---
+class ProduceGoods(Action):
+    # inventory_id=None なら在庫行を新規作成する (sales_price はその初期価格)
+    fields = ('design_id', 'quantity', 'cost', 'inventory_id', 'sales_price')
+
+class StartDevelopment(Action):
+    fields = ('division_id', 'industry_key', 'name', 'material_score', 'strategy', 'parts_config')
+
+class PlaceB2BOrder(Action):
+    fields = ('seller_id', 'design_id', 'quantity', 'amount')
+
+class AcceptB2BOrder(Action):
+    # quantity / amount は部分受注の場合のみ指定する
+    fields = ('order_id', 'quantity', 'amount')
+
+class RejectB2BOrder(Action):
+    fields = ('order_id',)
+
+# --- 施設 ---
+class ContractFacility(Action):
+    # purchase_price=None なら賃貸契約
+    fields = ('facility_id', 'division_id', 'facility_type', 'size', 'rent', 'purchase_price')
+
+class ReleaseFacility(Action):
+    fields = ('facility_id', 'facility_type', 'size')
+
+# --- 広告・価格 ---
+class RunAdvertising(Action):
+    # design_id=None ならブランド広告
+    fields = ('amount', 'brand_effect', 'design_id', 'awareness_effect')
+
+class SetPrice(Action):
+    fields = ('design_id', 'price')
+
+class SetRetailPrice(Action):
+    fields = ('inventory_id', 'price')
+
+# --- 資本政策 ---
+class ApplyIPO(Action):
+    fields = ()
+
+class IssueShares(Action):
+    fields = ('shares', 'amount')
+
+class BuybackShares(Action):
+    fields = ('shares', 'amount')
+
+class PayDividend(Action):
+    fields = ('dps', 'amount')
+
+ACTION_TYPES = {cls.__name__: cls for cls in [
+    SetPhase, TakeLoan, RaiseSalary, MakeJobOffer, PostRequisition, FireEmployee, PromoteEmployee,
+    ProduceGoods, StartDevelopment, PlaceB2BOrder, AcceptB2BOrder, RejectB2BOrder,
+    ContractFacility, ReleaseFacility, RunAdvertising, SetPrice, SetRetailPrice,
+    ApplyIPO, IssueShares, BuybackShares, PayDividend,
+]}
+
+def from_dict(data):
+    cls = ACTION_TYPES[data['type']]
+    return cls(data['company_id'], data['week'], log=tuple(data['log']) if data.get('log') else None, **data['values'])
+
+def record_actions(actions):
+    """適用結果を含めてアクションを監査ログ (action_log) へ保存する"""
+    db.bulk_insert('action_log', [{
+        'week': a.week,
+        'company_id': a.company_id,
+        'seq': seq,
+        'action_type': a.type,
+        'payload': json.dumps(a.to_dict(), ensure_ascii=False),
+        'status': a.status,
+        'note': a.note,
+    } for seq, a in enumerate(actions)])
+
+def load_actions(week, applied_only=True):
+    """
+    指定週のアクションを監査ログから読み込む。
+    同じ週初の状態 (チェックポイント) に Simulation.apply_actions で適用すれば意思決定フェーズを再現できる。
+    """
+    query = "SELECT payload, status FROM action_log WHERE week = ?"
+    if applied_only:
+        query += " AND status = 'applied'"
+    return [from_dict(json.loads(r['payload'])) for r in db.fetch_all(query + " ORDER BY seq", (week,))]
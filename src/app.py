@@ -7,7 +7,9 @@ import random
 import sqlite3
 from database import db
 from simulation import Simulation
+from capability_cache import capability_cache
 import gamebalance as gb
+import aptitudes
 
 app = Flask(__name__)
 app.secret_key = 'newsim_secret_key'
@@ -18,6 +20,10 @@ app.jinja_env.globals.update(max=max, min=min)
 # シミュレーションインスタンス
 sim = Simulation()
 
+# 旧バージョンで作成したDBを現行スキーマへ移行
+if os.path.exists(db.db_path):
+    db.migrate()
+
 def get_player_company():
     """プレイヤー企業を取得する"""
     res = db.fetch_one("SELECT * FROM companies WHERE type = 'player' LIMIT 1")
@@ -43,7 +49,7 @@ def inject_common_data():
     # ヘッダー用企業能力データ
     header_caps = None
     if player:
-        header_caps = sim.calculate_capabilities(player['id'])
+        header_caps = sim.get_capabilities(player['id'])
 
     return dict(
         player=player,
@@ -131,6 +137,11 @@ def format_week_filter(week):
     week_of_year = (week - 1) % 52 + 1
     return f"{year}年 Week {week_of_year}"
 
+@app.template_filter('aptitudes')
+def aptitudes_filter(npc):
+    """NPC行から {業界キー: 適性} を返す"""
+    return aptitudes.as_dict(npc)
+
 @app.template_filter('json_load')
 def json_load_filter(value):
     if not value: return {}
@@ -252,7 +263,7 @@ def hr():
     player = get_player_company()
     
     # 人事能力の取得（表示誤差計算用）
-    caps = sim.calculate_capabilities(player['id'])
+    caps = sim.get_capabilities(player['id'])
     
     # 従業員一覧
     employees = db.fetch_all("SELECT * FROM npcs WHERE company_id = ?", (player['id'],))
@@ -274,7 +285,7 @@ def hire_page():
     player = get_player_company()
     
     # 人事能力の取得（表示誤差計算用）
-    caps = sim.calculate_capabilities(player['id'])
+    caps = sim.get_capabilities(player['id'])
     hr_power = caps['hr']
     current_week = sim.get_current_week()
     
@@ -293,7 +304,7 @@ def hire_page():
     # ソートパラメータ
     sort_col = request.args.get('sort', 'id')
     sort_order = request.args.get('order', 'asc')
-    valid_sorts = ['id', 'name', 'age', 'desired_salary', 'diligence', 'adaptability', 'production', 'store_ops', 'sales', 'hr', 'development', 'pr', 'accounting', 'management']
+    valid_sorts = ['id', 'name', 'age', 'desired_salary', 'diligence', 'adaptability', 'production', 'store_ops', 'sales', 'hr', 'development', 'pr', 'accounting', 'management'] + list(aptitudes.COLUMNS.values())
     ability_cols = ['diligence', 'adaptability', 'production', 'store_ops', 'sales', 'hr', 'development', 'pr', 'accounting', 'management']
 
     if sort_col not in valid_sorts: sort_col = 'id'
@@ -403,6 +414,7 @@ def hr_change_dept():
             new_div_id = None
 
         db.execute_query("UPDATE npcs SET department = ?, division_id = ?, role = ? WHERE id = ?", (new_dept, new_div_id, new_role, npc_id))
+        capability_cache.invalidate(player['id'])
         flash(f"人事異動を発令しました。", "success")
     
     return redirect(url_for('hr'))
@@ -434,6 +446,7 @@ def hr_fire():
             last_resigned_week = ?, last_company_id = ?, loyalty = 50 
             WHERE id = ?
         """, (current_week, player['id'], npc_id))
+        capability_cache.invalidate(player['id'])
         flash("解雇しました。", "warning")
         
     return redirect(url_for('hr'))
@@ -503,7 +516,7 @@ def production():
     selected_division = next((d for d in divisions if d['id'] == division_id), divisions[0])
     
     # 能力とキャパシティの計算
-    caps = sim.calculate_capabilities(player['id'])
+    caps = sim.get_capabilities(player['id'])
     # 事業部ごとの能力を取得
     div_caps = caps.get('divisions', {}).get(division_id, {})
     
@@ -606,6 +619,7 @@ def production_order():
             else:
                 db.execute_query("INSERT INTO inventory (company_id, division_id, design_id, quantity, sales_price) VALUES (?, ?, ?, ?, ?)", 
                                  (player['id'], division_id, design_id, quantity, design['sales_price']))
+            capability_cache.invalidate(player['id'])
             
             # 統計更新
             db.increment_weekly_stat(current_week, player['id'], 'production_ordered', quantity)
@@ -625,7 +639,7 @@ def production_order():
 @app.route('/store')
 def store():
     player = get_player_company()
-    caps = sim.calculate_capabilities(player['id'])
+    caps = sim.get_capabilities(player['id'])
     
     # 店舗一覧
     stores = db.fetch_all("SELECT * FROM facilities WHERE company_id = ? AND type = 'store'", (player['id'],))
@@ -811,6 +825,7 @@ def dev_start():
         (company_id, division_id, industry_key, name, material_score, concept_score, production_efficiency, base_price, sales_price, status, strategy, developed_week, parts_config)
         VALUES (?, ?, ?, ?, ?, 0, 0, 0, 0, 'developing', ?, ?, ?)
     """, (player['id'], division_id, industry_key, name, avg_material_score, strategy, current_week, json.dumps(parts_config)))
+    capability_cache.invalidate(player['id'])
     
     flash(f"新製品 {name} の開発を開始しました。", "success")
     return redirect(url_for('dev'))
@@ -861,6 +876,7 @@ def facility_contract():
             if action == 'rent':
                 # 契約処理 (賃貸)
                 db.execute_query("UPDATE facilities SET company_id = ?, division_id = ?, is_owned = 0 WHERE id = ?", (player['id'], division_id, facility_id))
+                capability_cache.invalidate(player['id'])
                 flash(f"{fac['name']} (賃料: ¥{fac['rent']:,}/週) を賃貸契約しました。", "success")
             elif action == 'buy':
                 # 購入処理
@@ -870,6 +886,7 @@ def facility_contract():
                     db.execute_query("UPDATE companies SET funds = funds - ? WHERE id = ?", (purchase_price, player['id']))
                     db.execute_query("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, 'facility_purchase', ?)",
                                      (sim.get_current_week(), player['id'], purchase_price))
+                    capability_cache.invalidate(player['id'])
                     flash(f"{fac['name']} を ¥{purchase_price:,} で購入しました。", "success")
                 else:
                     flash("資金が不足しています。", "error")
@@ -889,6 +906,7 @@ def facility_release():
         if fac:
             if action == 'cancel' and not fac['is_owned']:
                 db.execute_query("UPDATE facilities SET company_id = NULL WHERE id = ?", (facility_id,))
+                capability_cache.invalidate(player['id'])
                 flash(f"{fac['name']} の賃貸契約を解約しました。", "info")
             elif action == 'sell' and fac['is_owned']:
                 # 売却価格は購入価格の80%
@@ -898,6 +916,7 @@ def facility_release():
                 # 売却益として記録 (簡易的に facility_sell カテゴリ)
                 db.execute_query("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, 'facility_sell', ?)",
                                  (sim.get_current_week(), player['id'], sell_price))
+                capability_cache.invalidate(player['id'])
                 flash(f"{fac['name']} を ¥{sell_price:,} で売却しました。", "info")
     
     return redirect(url_for('facility'))
@@ -1073,7 +1092,7 @@ def npc_detail(npc_id):
     
     # プレイヤーの人事力を取得（能力値マスク用）
     player = get_player_company()
-    caps = sim.calculate_capabilities(player['id'])
+    caps = sim.get_capabilities(player['id'])
     hr_power = caps['hr']
     
     return render_template('detail_npc.html', npc=npc, hr_power=hr_power, industries=gb.INDUSTRIES)
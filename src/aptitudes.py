@@ -0,0 +1,36 @@
+# c:\0124newSIm\src\aptitudes.py
+# NPCの業界適性へのアクセサ (npcs テーブルの業界別カラム apt_<業界キー>)
+# カラムは gamebalance.INDUSTRIES から生成する。業界を追加した場合、既存DBには db.migrate() のたびに
+# 不足しているカラムが既定値で追加される (バージョン付きのマイグレーション手順は要らない)。
+import gamebalance as gb
+
+DEFAULT_APTITUDE = 0.1
+
+# 業界キー -> カラム名
+COLUMNS = {key: f"apt_{key}" for key in gb.INDUSTRIES}
+
+def column(industry_key):
+    """業界キーに対応するカラム名 (SQLでの絞り込み・並べ替え用)"""
+    if industry_key not in COLUMNS:
+        raise ValueError(f"Unknown industry: {industry_key}")
+    return COLUMNS[industry_key]
+
+def get(npc, industry_key, default=DEFAULT_APTITUDE):
+    """NPC行 (dict / sqlite3.Row) の業界適性。未知の業界・カラムなしは default"""
+    col = COLUMNS.get(industry_key)
+    if col is None or col not in npc.keys():
+        return default
+    value = npc[col]
+    return value if value is not None else default
+
+def as_dict(npc):
+    """{業界キー: 適性} (画面表示用)"""
+    return {key: get(npc, key) for key in COLUMNS}
+
+def to_columns(aptitudes):
+    """{業界キー: 適性} -> {カラム名: 適性} (INSERT用、未指定の業界は既定値)"""
+    return {col: aptitudes.get(key, DEFAULT_APTITUDE) for key, col in COLUMNS.items()}
+
+def schema():
+    """CREATE TABLE npcs に埋め込むカラム定義"""
+    return ",\n            ".join(f"{col} REAL DEFAULT {DEFAULT_APTITUDE}" for col in COLUMNS.values())
@@ -0,0 +1,274 @@
+# c:\0124newSIm\src\b2c_market.py
+# B2C需要マッチング (NumPyによる一括スコアリングと需要配分)
+
+import heapq
+import time
+import numpy as np
+
+# 顧客セグメントごとの感度
+# price_elasticity: 価格比率 (小売価格 / 基準価格) の指数。大きいほど高価格でスコアが落ちる
+# brand_divisor: メーカーブランドの効き (1 + brand / divisor)。小さいほどブランド重視
+SEGMENTS = {
+    'wealthy': {'price_elasticity': 0.5, 'brand_divisor': 50.0},   # 価格感度低め、品質・ブランド重視
+    'mass': {'price_elasticity': 3.0, 'brand_divisor': 200.0},     # 価格感度高め、コスパ重視
+}
+
+# 売れ残った需要を他の在庫へ回す回数
+DISTRIBUTION_PASSES = 3
+
+class RetailBook:
+    """
+    小売在庫の列指向ビュー (在庫ID昇順)。
+    company は company_ids へのインデックスで、店舗キャパシティは企業単位で共有する。
+    quantity は販売のたびに減算される (残り在庫)。
+    """
+
+    NUMERIC_COLUMNS = ['quantity', 'retail_price', 'base_price', 'concept_score', 'material_score',
+                       'awareness', 'maker_brand', 'store_score', 'prev_sold']
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda r: r['id'])
+        self.rows = rows
+        self.company_ids = sorted({r['company_id'] for r in rows})
+        company_index = {cid: i for i, cid in enumerate(self.company_ids)}
+        self.company = np.array([company_index[r['company_id']] for r in rows], dtype=np.int64)
+        self.industry = np.array([r['industry_key'] for r in rows], dtype=object)
+        for col in self.NUMERIC_COLUMNS:
+            setattr(self, col, np.array([r[col] or 0 for r in rows], dtype=np.float64))
+        self.quantity = self.quantity.astype(np.int64)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def members(self, industry_key):
+        return np.nonzero(self.industry == industry_key)[0]
+
+def score_stocks(book, members, rand):
+    """
+    指定在庫の魅力度をセグメントごとに一括計算する。
+    戻り値: {segment: members と同じ並びのスコア配列}
+    """
+    n = len(members)
+    base_price = book.base_price[members]
+    retail_price = book.retail_price[members]
+    price_ratio = np.where(base_price > 0, retail_price / np.where(base_price > 0, base_price, 1.0), 1.0)
+    # 小売価格0の在庫でスコアが発散しないようにする
+    price_ratio = np.maximum(price_ratio, 1e-6)
+
+    quality = book.concept_score[members] * book.material_score[members]
+    awareness = 1 + book.awareness[members] / 100.0
+    trend_factor = rand.uniform(0.8, 1.2, n)
+    bandwagon_bonus = 1.0 + np.log1p(book.prev_sold[members]) * 0.15
+    common = book.store_score[members] * quality * awareness * trend_factor * bandwagon_bonus
+
+    scores = {}
+    for name, seg in SEGMENTS.items():
+        brand = 1 + book.maker_brand[members] / seg['brand_divisor']
+        score = common * brand / price_ratio ** seg['price_elasticity']
+        scores[name] = np.maximum(score * rand.normal(1.0, 0.1, n), 0.0)
+    return scores
+
+def round_preserving_total(values, rand):
+    """
+    非負の実数配列を整数に丸める (系統抽出による最大剰余法)。
+    各要素が切り上げられる確率は小数部に等しく、合計は元の合計の丸めに一致する。
+    """
+    base = np.floor(values)
+    cum = np.cumsum(values - base)
+    edges = np.floor(np.concatenate(([0.0], cum)) + rand.random())
+    return (base + np.diff(edges)).astype(np.int64)
+
+def stochastic_round(values, rand):
+    """小数部の確率で切り上げる (例: 9.8 は80%で10、20%で9)"""
+    values = np.maximum(values, 0.0)
+    base = np.floor(values)
+    return (base + (rand.random(len(values)) < values - base)).astype(np.int64)
+
+def cap_by_company(book, rows, wanted, capacity):
+    """
+    企業の店舗キャパシティで販売数を打ち切る。
+    同じ企業の在庫は在庫ID順にキャパシティを使う (企業→在庫ID順に並べ、企業内の累積で判定する)。
+    """
+    company = book.company[rows]
+    order = np.argsort(company, kind='stable')
+    w, c = wanted[order], company[order]
+    used_before = np.cumsum(w) - w
+    is_start = np.concatenate(([True], c[1:] != c[:-1]))
+    group_start = np.maximum.accumulate(np.where(is_start, np.arange(len(c)), 0))
+    used_before -= used_before[group_start]
+    sold = np.empty_like(w)
+    sold[order] = np.clip(capacity[c] - used_before, 0, w)
+    return sold
+
+class MarketClearing:
+    """
+    B2C需要配分方式の共通インターフェース。
+    allocate() は需要を members の在庫へ配分し、book.quantity (在庫) と throughput (企業ごとの店舗キャパシティ) を販売数だけ減らす。
+    業界ごとの方式は gamebalance.INDUSTRIES[key]['market_clearing'] で選ぶ。
+    """
+    name = None
+
+    def allocate(self, demand, book, members, scores, throughput, rand):
+        """戻り値: members と同じ並びの販売数"""
+        raise NotImplementedError
+
+    def clear(self, industry_key, segment, demand, book, members, scores, throughput, rand):
+        """allocate() を実行し、販売数と処理時間・未充足需要のレポートを返す"""
+        start = time.perf_counter()
+        sold = self.allocate(int(demand), book, members, scores, throughput, rand)
+        allocated = int(sold.sum())
+        return sold, {
+            'industry': industry_key, 'segment': segment, 'strategy': self.name, 'skus': len(members),
+            'demand': int(demand), 'allocated': allocated, 'unallocated': int(demand) - allocated,
+            'seconds': time.perf_counter() - start,
+        }
+
+    def _commit(self, book, rows, sold, throughput):
+        book.quantity[rows] -= sold
+        np.subtract.at(throughput, book.company[rows], sold)
+
+class ProportionalClearing(MarketClearing):
+    """
+    スコア比で需要を配分し、在庫数と店舗キャパシティで売れなかった分を次のパスで他の在庫へ回す (従来方式)。
+    パス数が有限のため、供給が残っていても需要が配り切れないことがある。
+    """
+    name = 'proportional'
+
+    def __init__(self, passes=DISTRIBUTION_PASSES):
+        self.passes = passes
+
+    def allocate(self, demand, book, members, scores, throughput, rand):
+        sold_total = np.zeros(len(members), dtype=np.int64)
+        remaining = demand
+        for _ in range(self.passes):
+            if remaining <= 0: break
+
+            # 販売可能在庫 (在庫あり & 店舗キャパあり)
+            active = np.nonzero((book.quantity[members] > 0) & (throughput[book.company[members]] > 0))[0]
+            if len(active) == 0: break
+            total_score = scores[active].sum()
+            if total_score <= 0: break
+
+            rows = members[active]
+            demand_int = round_preserving_total(remaining * scores[active] / total_score, rand)
+            wanted = np.minimum(demand_int, book.quantity[rows])
+            sold = cap_by_company(book, rows, wanted, stochastic_round(throughput, rand))
+
+            self._commit(book, rows, sold, throughput)
+            sold_total[active] += sold
+            remaining = int(demand_int.sum() - sold.sum())
+        return sold_total
+
+class WaterFillingClearing(MarketClearing):
+    """
+    厳密な水位充填。各在庫に 水位 × スコア を配り、在庫数または企業の店舗キャパシティで頭打ちになったものを外しながら、
+    需要を配り切るか供給が尽きるまで水位を上げる。頭打ちになる水位をヒープで管理するため O(n log n)。
+    """
+    name = 'water_filling'
+
+    def allocate(self, demand, book, members, scores, throughput, rand):
+        n = len(members)
+        qty = book.quantity[members].astype(np.float64)
+        company = book.company[members]
+        capacity = stochastic_round(throughput, rand)
+        eligible = np.nonzero((qty > 0) & (scores > 0) & (capacity[company] > 0))[0]
+        if demand <= 0 or len(eligible) == 0:
+            return np.zeros(n, dtype=np.int64)
+
+        # 企業ごとの状態: 未飽和在庫のスコア合計 / 飽和済み在庫の販売量 / 頭打ちになった水位
+        score_sum, filled, frozen, version = {}, {}, {}, {}
+        heap = []
+        for i in eligible:
+            c = int(company[i])
+            score_sum[c] = score_sum.get(c, 0.0) + scores[i]
+            filled.setdefault(c, 0.0)
+            version.setdefault(c, 0)
+            heap.append((qty[i] / scores[i], 0, int(i), 0))
+
+        def push_company(c):
+            if score_sum[c] > 1e-12:
+                heapq.heappush(heap, ((capacity[c] - filled[c]) / score_sum[c], 1, c, version[c]))
+
+        for c in score_sum:
+            push_company(c)
+        heapq.heapify(heap)
+
+        saturated = np.zeros(n, dtype=bool)
+        active_score = sum(score_sum.values())
+        active_filled = 0.0
+        level = 0.0
+        while heap and active_score > 1e-12:
+            target = (demand - active_filled) / active_score
+            if target <= heap[0][0]:
+                level = target
+                break
+            level, kind, key, ver = heapq.heappop(heap)
+            if kind == 0:
+                # 在庫切れ
+                c = int(company[key])
+                if c in frozen: continue
+                saturated[key] = True
+                score_sum[c] -= scores[key]
+                filled[c] += qty[key]
+                active_score -= scores[key]
+                active_filled += qty[key]
+                version[c] += 1
+                push_company(c)
+            elif ver == version[key] and key not in frozen:
+                # 店舗キャパシティの上限
+                frozen[key] = level
+                active_score -= score_sum[key]
+                active_filled += level * score_sum[key]
+
+        alloc = np.zeros(n, dtype=np.float64)
+        for i in eligible:
+            c = int(company[i])
+            if saturated[i]:
+                alloc[i] = qty[i]
+            else:
+                alloc[i] = min(frozen.get(c, level) * scores[i], qty[i])
+
+        wanted = np.minimum(round_preserving_total(alloc, rand), book.quantity[members])
+        sold = cap_by_company(book, members, wanted, capacity)
+        self._commit(book, members, sold, throughput)
+        return sold
+
+class LogitClearing(MarketClearing):
+    """
+    離散選択 (ロジット) モデルによる標本シミュレーション。
+    各消費者は効用 log(スコア) / temperature + ガンベル誤差が最大の商品を選ぶ (スコア^(1/temperature) に比例する確率)。
+    売り切れ・店舗キャパシティ超過で買えなかった消費者は、残った商品から選び直す。
+    """
+    name = 'logit'
+
+    def __init__(self, temperature=1.0, rounds=10):
+        self.temperature = temperature
+        self.rounds = rounds
+
+    def allocate(self, demand, book, members, scores, throughput, rand):
+        sold_total = np.zeros(len(members), dtype=np.int64)
+        remaining = demand
+        for _ in range(self.rounds):
+            if remaining <= 0: break
+            active = np.nonzero((book.quantity[members] > 0) & (throughput[book.company[members]] > 0) & (scores > 0))[0]
+            if len(active) == 0: break
+
+            rows = members[active]
+            weights = scores[active] ** (1.0 / self.temperature)
+            choices = rand.multinomial(remaining, weights / weights.sum())
+            wanted = np.minimum(choices, book.quantity[rows])
+            sold = cap_by_company(book, rows, wanted, stochastic_round(throughput, rand))
+
+            self._commit(book, rows, sold, throughput)
+            sold_total[active] += sold
+            remaining -= int(sold.sum())
+            if sold.sum() == 0: break
+        return sold_total
+
+CLEARING_STRATEGIES = {cls.name: cls for cls in [ProportionalClearing, WaterFillingClearing, LogitClearing]}
+
+def get_clearing(name):
+    """方式名から配分方式のインスタンスを返す"""
+    if name not in CLEARING_STRATEGIES:
+        raise ValueError(f"Unknown market clearing strategy: {name} (available: {', '.join(CLEARING_STRATEGIES)})")
+    return CLEARING_STRATEGIES[name]()
@@ -0,0 +1,64 @@
+# c:\0124newSIm\src\capability_cache.py
+# 企業能力値 (calculate_capabilities の結果) のキャッシュ
+
+# 能力値に影響するカラム (これらが変化した企業のキャッシュを破棄する)
+# 能力成長やブランド減衰のような週次の変化は、週が変わればキーが変わるため対象外とする
+RELEVANT_COLUMNS = {
+    'npcs': {'company_id', 'division_id', 'department', 'role'},                # 採用・解雇・異動・昇進
+    'facilities': {'company_id', 'division_id', 'size', 'type'},                # 施設契約・解約
+    'product_designs': {'company_id', 'division_id', 'status', 'awareness'},    # 新規設計・開発完了・広告 (広報の負荷)
+    'inventory': {'company_id', 'division_id', 'quantity'},                     # 在庫移動
+    'divisions': {'company_id', 'industry_key'},                                # 事業部の新設
+    'companies': {'brand_power'},                                               # 広告・上場ボーナス (広報の負荷)
+}
+
+class CapabilityCache:
+    """
+    (company_id, week) をキーに能力値を保持する。
+    採用・解雇・異動・施設契約・新規設計・在庫移動・ブランド/認知度の変化があった企業のみ破棄する。
+    """
+
+    def __init__(self):
+        self._entries = {}  # {company_id: (week, caps)}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, company_id, week):
+        entry = self._entries.get(company_id)
+        if entry and entry[0] == week:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, company_id, week, caps):
+        self._entries[company_id] = (week, caps)
+
+    def invalidate(self, company_id):
+        if self._entries.pop(company_id, None) is not None:
+            self.invalidations += 1
+
+    def notify(self, table, company_ids, columns=None):
+        """行の変更通知 (columns=None は行の追加・削除)"""
+        relevant = RELEVANT_COLUMNS.get(table)
+        if relevant is None: return
+        if columns is not None and not relevant.intersection(columns): return
+        for cid in company_ids:
+            if cid is not None:
+                self.invalidate(cid)
+
+    def clear(self):
+        self._entries = {}
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations,
+            'hit_rate': self.hits / total if total else 0.0, 'entries': len(self._entries)
+        }
+
+    def reset_stats(self):
+        self.hits = self.misses = self.invalidations = 0
+
+capability_cache = CapabilityCache()
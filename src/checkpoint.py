@@ -0,0 +1,154 @@
+# c:\0124newSIm\src\checkpoint.py
+# 長期シミュレーションのチェックポイント保存・再開・分岐
+import os
+import json
+import gzip
+import shutil
+import random
+import sqlite3
+import tempfile
+import time
+from database import db, BASE_DIR, DB_PATH
+from capability_cache import capability_cache
+from rng import rng
+
+CHECKPOINT_DIR = os.path.join(BASE_DIR, "checkpoints")
+CHECKPOINT_EXT = ".ckpt"
+
+def _rng_state():
+    # random.getstate() はタプルのためJSON化できる形に変換する
+    version, internal, gauss_next = random.getstate()
+    return {'random': [version, list(internal), gauss_next], 'registry': rng.getstate()}
+
+def _set_rng_state(state):
+    version, internal, gauss_next = state['random']
+    random.setstate((version, tuple(internal), gauss_next))
+    if 'registry' in state:
+        rng.setstate(state['registry'])
+
+def checkpoint_path(week, label=None, directory=CHECKPOINT_DIR):
+    name = f"week_{week:04d}" + (f"_{label}" if label else "")
+    return os.path.join(directory, name + CHECKPOINT_EXT)
+
+def save_checkpoint(path=None, label=None, directory=CHECKPOINT_DIR):
+    """
+    全テーブル・game_state・乱数状態を1ファイルに保存する。
+    DBをバックアップ → メタ情報を書き込み → VACUUM → gzip圧縮 の順で作成する。
+    """
+    res = db.fetch_one("SELECT week FROM game_state")
+    week = res['week'] if res else 0
+    if path is None:
+        path = checkpoint_path(week, label, directory)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    start = time.time()
+    fd, tmp_db = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        db.snapshot(tmp_db)
+        conn = sqlite3.connect(tmp_db)
+        try:
+            conn.execute("CREATE TABLE checkpoint_meta (key TEXT PRIMARY KEY, value TEXT)")
+            meta = {
+                'week': week,
+                'label': label,
+                'created_at': time.time(),
+                'rng': _rng_state(),
+            }
+            conn.executemany("INSERT INTO checkpoint_meta (key, value) VALUES (?, ?)",
+                             [(k, json.dumps(v)) for k, v in meta.items()])
+            conn.commit()
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+
+        with open(tmp_db, 'rb') as src, gzip.open(path + ".tmp", 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(path + ".tmp", path)
+    finally:
+        os.remove(tmp_db)
+
+    print(f"[Checkpoint] Week {week} saved to {path} ({os.path.getsize(path) / 1024:.0f}KB, {time.time() - start:.2f}s)")
+    return path
+
+def read_meta(path):
+    """チェックポイントのメタ情報 (week, label, rng...) を読む"""
+    tmp_db = _extract(path)
+    try:
+        return _read_meta_db(tmp_db)
+    finally:
+        os.remove(tmp_db)
+
+def _read_meta_db(db_file):
+    conn = sqlite3.connect(db_file)
+    try:
+        return {k: json.loads(v) for k, v in conn.execute("SELECT key, value FROM checkpoint_meta")}
+    finally:
+        conn.close()
+
+def _extract(path):
+    fd, tmp_db = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    with gzip.open(path, 'rb') as src, open(tmp_db, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    return tmp_db
+
+def load_checkpoint(path, in_memory=True, db_path=DB_PATH):
+    """
+    チェックポイントから世界を復元する。
+    in_memory=True ならインメモリDBへ、False なら db_path のファイルへ展開する。
+    """
+    tmp_db = _extract(path)
+    try:
+        meta = _read_meta_db(tmp_db)
+        conn = sqlite3.connect(tmp_db)
+        conn.execute("DROP TABLE checkpoint_meta")
+        conn.commit()
+        conn.close()
+
+        if in_memory:
+            db.load_snapshot(tmp_db)
+        else:
+            # 開いたままのコネクションは置き換え前のファイル (削除後の inode) を指し続けるため、先に全て閉じる
+            db.reset_pool()
+            for p in (db_path, db_path + "-wal", db_path + "-shm"):
+                if os.path.exists(p):
+                    os.remove(p)
+            shutil.copyfile(tmp_db, db_path)
+            # 復元したファイルを開き直し、旧バージョンで作ったチェックポイントならスキーマを更新する
+            db.use_file(db_path)
+    finally:
+        os.remove(tmp_db)
+
+    _set_rng_state(meta['rng'])
+    capability_cache.clear()
+    print(f"[Checkpoint] Resumed from week {meta['week']} ({path})")
+    return meta
+
+def list_checkpoints(directory=CHECKPOINT_DIR):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(CHECKPOINT_EXT))
+
+def fork(path, variants, weeks, in_memory=True):
+    """
+    1つのチェックポイントから複数の派生実行を行う。
+    variants: {名前: 設定関数} 。設定関数は復元後・実行前に呼ばれ、gamebalance の上書きなどを行う。
+    各派生の結果は名前付きのレポートと最終状態のDBとして出力される。
+    """
+    import copy
+    import gamebalance as gb
+    from run_simulation_report import run_report
+
+    # 派生ごとのパラメータ変更が次の派生へ漏れないよう、gamebalance の定数を退避・復元する
+    original = {k: copy.deepcopy(v) for k, v in vars(gb).items() if k.isupper()}
+    results = {}
+    for name, setup in variants.items():
+        print(f"=== Fork '{name}' from {path} ===")
+        try:
+            results[name] = run_report(weeks=weeks, in_memory=in_memory, resume_path=path, setup=setup, output_tag=name,
+                                       snapshot_path=os.path.join(CHECKPOINT_DIR, f"fork_{name}.db"))
+        finally:
+            for k, v in original.items():
+                setattr(gb, k, copy.deepcopy(v))
+    return results
@@ -3,33 +3,370 @@
 import sqlite3
 import json
 import os
+import re
 from contextlib import contextmanager
 import threading
+import time
+import weakref
+import aptitudes
 
 # database.pyの場所を基準に絶対パスを設定
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "newsim.db")
 
+# 会計エントリのロールアップ {テーブル: 期間カラム} と、週から期間番号への変換式
+LEDGER_ROLLUPS = {'ledger_weekly': 'week', 'ledger_quarterly': 'quarter', 'ledger_yearly': 'year'}
+LEDGER_PERIOD_SQL = {'week': 'NEW.week', 'quarter': '(NEW.week - 1) / 13 + 1', 'year': '(NEW.week - 1) / 52 + 1'}
+
+# スキーマのマイグレーション [(バージョン, 名前, メソッド名)] (バージョンの昇順)
+# init_db は常に最新のスキーマを作り、schema_version に最新バージョンを記録する。
+# 既存DB (長期間回したセーブやスナップショット) は migrate() で未適用のものを順に適用して、その場で更新する。
+# テーブルやカラムを変更するときは init_db の定義を直したうえで、既存DB向けの手順をここに追加する。
+# ただし gamebalance.INDUSTRIES から生成する業界適性のカラム (apt_<業界キー>) は、インデックスと同様に
+# バージョン管理の対象外とし、migrate() のたびに不足分を追加する (業界の追加にマイグレーション手順は要らない)。
+MIGRATIONS = [
+    (1, 'npc_aptitude_columns', '_migrate_npc_aptitudes'),   # 業界適性を JSON から業界別カラムへ
+    (2, 'ledger_rollups', '_migrate_ledger_rollups'),         # 会計エントリの週次・四半期・年次ロールアップ
+    (3, 'perf_stats', '_migrate_perf_stats'),                 # 週次処理のフェーズ別計測
+    (4, 'action_log', '_migrate_action_log'),                 # NPC意思決定のアクションログ
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# インデックス定義 {テーブル: [(インデックス名, カラム, 部分インデックスの条件)]}
+# バージョン管理の対象外: init_db で作成し、既存DBには migrate() で不足分を1本ずつ作る (オンライン作成)。
+# ホットなクエリが全件走査にならないことは query_audit.py で確認する。
+INDEXES = {
+    'npcs': [('idx_npcs_company_id', 'company_id', None)],               # company_id IS NULL (求職者) にも使われる
+    'divisions': [('idx_divisions_company', 'company_id', None)],
+    'inventory': [('idx_inventory_company_design', 'company_id, design_id', None),
+                  ('idx_inventory_company_division', 'company_id, division_id', None)],
+    'product_designs': [('idx_product_designs_company', 'company_id', None),
+                        ('idx_product_designs_status', 'status', None),
+                        ('idx_product_designs_industry_status', 'industry_key, status', None)],
+    'facilities': [('idx_facilities_company', 'company_id', None)],
+    'loans': [('idx_loans_company', 'company_id', None)],
+    'transactions': [('idx_transactions_week_type', 'week, type', None),
+                     ('idx_transactions_type_week', 'type, week', None),    # 種別ごとの直近N週
+                     ('idx_transactions_seller_week', 'seller_id, week', None),
+                     ('idx_transactions_buyer_week', 'buyer_id, week', None)],
+    'account_entries': [('idx_account_entries_company_week', 'company_id, week', None)],
+    'ledger_weekly': [('idx_ledger_weekly_week', 'week', None)],             # 全社分の期間集計
+    'ledger_quarterly': [('idx_ledger_quarterly_quarter', 'quarter', None)],
+    'ledger_yearly': [('idx_ledger_yearly_year', 'year', None)],
+    'news_logs': [('idx_news_logs_week', 'week', None)],
+    'job_offers': [('idx_job_offers_week', 'week', None)],
+    'b2b_orders': [('idx_b2b_orders_status', 'status', None)],
+    'financial_reports': [('idx_financial_reports_company_status', 'company_id, status', None),
+                          ('idx_financial_reports_status', 'status', None)],
+    'action_log': [('idx_action_log_week', 'week', None)],
+}
+
+# 接続時に設定するPRAGMA (Database(pragmas=...) や db.configure() で上書き可能)
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',        # UIの読み取りとシミュレーションの書き込みを並行させる
+    'synchronous': 'NORMAL',      # WALではコミット毎のfsyncを省略しても整合性は保たれる
+    'cache_size': -65536,         # ページキャッシュ 64MB (負値はKB指定)
+    'mmap_size': 268435456,       # 256MB をメモリマップ
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,         # 書き込み中のロック待ち (ms)
+}
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    計測・トレース中のみ使うカーソル。
+    connection.counters があれば実行したSQL文の数と読み書きした行数を加算し
+    (executemany は1文として数え、書き込み行数はトリガーによる変更を含まない)、
+    connection.tracer があれば文ごとの実行・取得時間と返した行数を記録する (sql_trace.py)。
+    """
+    _trace = None   # 直近に実行した文のトレース (取得時間・行数を加算する)
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters, False)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters, True)
+
+    def _run(self, method, sql, parameters, many):
+        conn = self.connection
+        if conn.tracer is None:
+            method(sql, parameters)
+        else:
+            start = time.perf_counter()
+            method(sql, parameters)
+            self._trace = conn.tracer.record(conn, sql, (time.perf_counter() - start) * 1000, many)
+        counters = conn.counters
+        if counters is not None:
+            counters['statements'] += 1
+            if self.rowcount > 0:
+                counters['rows_written'] += self.rowcount
+        return self
+
+    def _fetch(self, method, *args):
+        if self._trace is None:
+            result = method(*args)
+        else:
+            start = time.perf_counter()
+            result = method(*args)
+            self._trace.fetched((time.perf_counter() - start) * 1000, _row_count(result))
+        counters = self.connection.counters
+        if counters is not None:
+            counters['rows_read'] += _row_count(result)
+        return result
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    def __next__(self):
+        return self._fetch(super().__next__)
+
+def _row_count(result):
+    if result is None: return 0
+    return len(result) if isinstance(result, list) else 1
+
+class PooledConnection(sqlite3.Connection):
+    """
+    スレッドごとに使い回すコネクション。
+    既存コードの conn.close() は未コミット分を破棄するだけで、実際には閉じない。
+    計測中 (counters) やトレース中 (tracer) はカーソルを InstrumentedCursor にする。
+    """
+    counters = None
+    tracer = None
+    fresh = False   # 開いてからまだ文を実行していない (トレースで「接続を開いた呼び出し」を記録する)
+
+    def cursor(self, factory=sqlite3.Cursor):
+        if (self.counters is not None or self.tracer is not None) and factory is sqlite3.Cursor:
+            factory = InstrumentedCursor
+        return super().cursor(factory)
+
+    # Connection.execute は cursor() を経由しないため、計測・トレース中はここで振り替える
+    def execute(self, sql, parameters=()):
+        if self.counters is None and self.tracer is None:
+            return super().execute(sql, parameters)
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if self.counters is None and self.tracer is None:
+            return super().executemany(sql, seq_of_parameters)
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def _close(self):
+        super().close()
+        self.closed = True
+
 class Database:
-    def __init__(self, db_path=DB_PATH):
+    def __init__(self, db_path=DB_PATH, pragmas=None):
         self.db_path = db_path
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
         self._local = threading.local()
+        self._pool = weakref.WeakSet()   # 全スレッドのコネクション (reset_pool 用)
+        self._pool_lock = threading.Lock()
+        self.connections_opened = 0
+        self._memory_anchor = None       # インメモリモード時にDBを保持し続けるコネクション
+        self.counters = None             # SQL文数・読み書き行数の計測値 (start_counting() の間だけ)
+        self.tracer = None               # SQLのトレース先 (start_tracing() の間だけ)
+
+    def configure(self, **pragmas):
+        """PRAGMA設定を変更し、次回接続から反映する"""
+        self.pragmas.update(pragmas)
+        self.reset_pool()
+
+    @property
+    def is_memory(self):
+        return self._memory_anchor is not None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, factory=PooledConnection, check_same_thread=False,
+                               uri=self.db_path.startswith("file:"))
+        conn.row_factory = sqlite3.Row
+        conn.closed = False
+        conn.opened_at = time.time()
+        conn.thread_name = threading.current_thread().name
+        for key, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {key} = {value}")
+        conn.counters = self.counters
+        conn.tracer = self.tracer
+        conn.fresh = True
+        with self._pool_lock:
+            self._pool.add(conn)
+            self.connections_opened += 1
+        return conn
+
+    def _pooled_connection(self):
+        conn = getattr(self._local, 'pooled', None)
+        if conn is None or conn.closed:
+            conn = self._connect()
+            self._local.pooled = conn
+        return conn
 
     def get_connection(self):
         # トランザクション内なら既存のコネクションを返す
         if hasattr(self._local, 'connection') and self._local.connection:
             return self._local.connection, False  # (conn, should_close)
         
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn, True
+        # スレッド専用のコネクションを使い回す (close() は実際には閉じない)
+        return self._pooled_connection(), True
+
+    def check_health(self):
+        """現在のスレッドのコネクションを確認し、壊れていれば張り直す"""
+        conn = self._pooled_connection()
+        try:
+            conn.execute("SELECT 1").fetchone()
+        except sqlite3.Error:
+            self._local.pooled = None
+            conn._close()
+            conn = self._pooled_connection()
+        return {
+            'db_path': self.db_path,
+            'journal_mode': conn.execute("PRAGMA journal_mode").fetchone()[0],
+            'synchronous': conn.execute("PRAGMA synchronous").fetchone()[0],
+            'cache_size': conn.execute("PRAGMA cache_size").fetchone()[0],
+            'in_transaction': self._in_transaction(),
+            'pool': self.pool_status(),
+        }
+
+    def pool_status(self):
+        with self._pool_lock:
+            conns = [c for c in self._pool if not c.closed]
+        now = time.time()
+        return {
+            'open_connections': len(conns),
+            'connections_opened': self.connections_opened,
+            'threads': sorted(c.thread_name for c in conns),
+            'oldest_age_sec': max((now - c.opened_at for c in conns), default=0),
+        }
+
+    def reset_pool(self):
+        """全スレッドのコネクションを閉じる (各スレッドは次回アクセス時に接続し直す)"""
+        if self._in_transaction():
+            raise RuntimeError("トランザクション中はコネクションプールをリセットできません")
+        with self._pool_lock:
+            conns = list(self._pool)
+            self._pool = weakref.WeakSet()
+        for conn in conns:
+            if not conn.closed:
+                conn._close()
+        self._local.pooled = None
+
+    def start_counting(self):
+        """全コネクションで実行したSQL文の数と読み書きした行数の計測を始める (perf.py 用)"""
+        self.counters = {'statements': 0, 'rows_read': 0, 'rows_written': 0}
+        self._instrument()
+
+    def stop_counting(self):
+        self.counters = None
+        self._instrument()
+
+    def start_tracing(self, tracer):
+        """
+        全コネクションで実行するSQLを tracer へ渡す (sql_trace.py 用)。
+        tracer.record(conn, sql, 経過ms, executemany か) は文ごとのトレースを返し、
+        その fetched(経過ms, 行数) で結果の取得分が加算される。
+        """
+        self.tracer = tracer
+        self._instrument()
+
+    def stop_tracing(self):
+        self.tracer = None
+        self._instrument()
+
+    def _instrument(self):
+        # 既存のコネクションにも計測・トレースの設定を反映する
+        with self._pool_lock:
+            conns = list(self._pool)
+        for conn in conns + [getattr(self._local, 'connection', None)]:
+            if conn is not None:
+                conn.counters = self.counters
+                conn.tracer = self.tracer
+
+    # ---------------------------------------------------------
+    # インメモリモードとスナップショット
+    # ---------------------------------------------------------
+    def use_memory(self, name="newsim"):
+        """
+        共有キャッシュのインメモリDBに切り替える (ヘッドレス実行用)。
+        全スレッドが同じDBを参照するが、同時書き込み中の読み取りはテーブルロックで失敗しうる。
+        """
+        self.reset_pool()
+        self._close_memory()
+        self.db_path = f"file:{name}?mode=memory&cache=shared"
+        self._open_memory()
+
+    def use_file(self, path=DB_PATH):
+        """ファイルDBに戻す (インメモリの内容は破棄される。必要なら先に snapshot())"""
+        self.reset_pool()
+        self._close_memory()
+        self.db_path = path
+        if os.path.exists(path):
+            self.migrate()
+
+    def _open_memory(self):
+        # 最後のコネクションが閉じるとインメモリDBは消えるため、プール外で1本保持する
+        self._memory_anchor = self._connect()
+        with self._pool_lock:
+            self._pool.discard(self._memory_anchor)
+
+    def _close_memory(self):
+        if self._memory_anchor is not None:
+            self._memory_anchor._close()
+            self._memory_anchor = None
+
+    def snapshot(self, path=DB_PATH):
+        """現在のDBをバックアップAPIでファイルへ書き出す (書き出し後に置き換えるので途中で壊れない)"""
+        if self._in_transaction():
+            raise RuntimeError("トランザクション中はスナップショットを取れません")
+        self.flush()
+        start = time.time()
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        dst = sqlite3.connect(tmp_path)
+        try:
+            self._pooled_connection().backup(dst)
+        finally:
+            dst.close()
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        os.replace(tmp_path, path)
+        return time.time() - start
+
+    def load_snapshot(self, path=DB_PATH, name="newsim"):
+        """スナップショットをインメモリDBへ読み込み、続きから実行できるようにする"""
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        self.use_memory(name)
+        src = sqlite3.connect(path)
+        try:
+            src.backup(self._memory_anchor)
+        finally:
+            src.close()
+        self.migrate()
 
     def init_db(self):
-        if os.path.exists(self.db_path):
-            os.remove(self.db_path)
+        self.reset_pool()
+        if self.is_memory:
+            # インメモリDBは保持用コネクションを張り直せば空になる
+            self._close_memory()
+            self._open_memory()
         
         conn, should_close = self.get_connection()
         cursor = conn.cursor()
+        if not self.is_memory:
+            # ファイルは消さずに中身だけ作り直す (UIなど他のプロセスが開いていても初期化できる)
+            self._drop_all(conn)
+
+        # スキーマのバージョン
+        self._create_schema_version(cursor)
 
         # ゲーム状態
         cursor.execute("""
@@ -78,7 +415,7 @@ class Database:
         """)
 
         # NPC
-        cursor.execute("""
+        cursor.execute(f"""
         CREATE TABLE IF NOT EXISTS npcs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT,
@@ -107,7 +444,8 @@ class Database:
             pr REAL,
             accounting REAL,
             executive REAL,
-            aptitudes TEXT, -- JSON: {"automotive": 0.5, ...}
+            -- 業界適性 (業界ごとに apt_<業界キー> カラム。aptitudes.py 参照)
+            {aptitudes.schema()},
             
             FOREIGN KEY(company_id) REFERENCES companies(id),
             FOREIGN KEY(division_id) REFERENCES divisions(id)
@@ -205,6 +543,8 @@ class Database:
             amount INTEGER
         )
         """)
+        # 会計エントリの週次・四半期・年次ロールアップ (INSERT 時にトリガーで加算。ledger.py 参照)
+        self._create_ledger_rollups(cursor)
 
         # ニュースログ
         cursor.execute("""
@@ -248,15 +588,6 @@ class Database:
         )
         """)
 
-        # インデックスの作成 (パフォーマンス向上)
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_npcs_company_id ON npcs(company_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_company_design ON inventory(company_id, design_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_product_designs_company ON product_designs(company_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_facilities_company ON facilities(company_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_week_type ON transactions(week, type)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_b2b_orders_status ON b2b_orders(status)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_job_offers_week ON job_offers(week)")
-
         # 週次企業統計 (レポート用)
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS weekly_stats (
@@ -362,10 +693,226 @@ class Database:
         )
         """)
 
+        # NPC意思決定のアクションログ (監査・再現用)
+        self._create_action_log(cursor)
+
+        # 週次処理のフェーズ別計測 (perf.py)
+        self._create_perf_stats(cursor)
+
+        # インデックスの作成 (定義は INDEXES)
+        self._create_indexes(cursor)
+
+        # 作成したスキーマは最新なので、全マイグレーションを適用済みとして記録する
+        cursor.executemany("INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, datetime('now'))",
+                           [(version, name) for version, name, _ in MIGRATIONS])
+
         conn.commit()
         conn.close()
 
+    def _drop_all(self, conn):
+        """全テーブル・トリガー・インデックスを削除する"""
+        objects = conn.execute("SELECT type, name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name NOT LIKE 'sqlite_%'").fetchall()
+        for obj_type, name in sorted(objects, key=lambda o: o[0] != 'trigger'):
+            conn.execute(f"DROP {obj_type.upper()} IF EXISTS {name}")
+        conn.commit()
+
+    def _create_schema_version(self, cursor):
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at TEXT
+        )
+        """)
+
+    def schema_version(self):
+        """適用済みのスキーマバージョン (schema_version のないDBは 0、空のDBは None)"""
+        conn, should_close = self.get_connection()
+        try:
+            tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if not tables: return None
+            if 'schema_version' not in tables: return 0
+            return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+        finally:
+            if should_close:
+                conn.close()
+
+    def migrate(self):
+        """
+        既存DB (旧バージョンで作成した newsim.db やスナップショット) を最新のスキーマへ更新する。
+        MIGRATIONS のうち未適用のものをバージョン順に1つずつ適用・記録し、最後に不足している
+        業界適性のカラムとインデックスを作る。
+        何度呼んでもよい (適用済みの手順は飛ばす)。
+        """
+        current = self.schema_version()
+        if current is None: return   # 空のDB (init_db 前)
+        if current > SCHEMA_VERSION:
+            raise RuntimeError(f"DBのスキーマ (v{current}) がこのバージョンのコード (v{SCHEMA_VERSION}) より新しいため開けません")
+
+        conn, should_close = self.get_connection()
+        try:
+            self._create_schema_version(conn.cursor())
+            for version, name, method in MIGRATIONS:
+                if version <= current: continue
+                start = time.time()
+                # 手順ごとにコミットし、途中で止まっても次回は続きから適用する
+                getattr(self, method)(conn)
+                conn.execute("INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, datetime('now'))", (version, name))
+                if should_close:
+                    conn.commit()
+                print(f"Applied schema migration v{version} ({name}) in {time.time() - start:.2f}s")
+            self._add_missing_aptitude_columns(conn, should_close)
+            self._build_missing_indexes(conn, should_close)
+        finally:
+            if should_close:
+                conn.close()
+
+    def _add_missing_aptitude_columns(self, conn, commit=True):
+        """gamebalance.INDUSTRIES に後から追加された業界の適性カラムを npcs に追加する (既定値で埋まる)"""
+        columns = {r[1] for r in conn.execute("PRAGMA table_info(npcs)")}
+        if not columns: return
+        for col in aptitudes.COLUMNS.values():
+            if col not in columns:
+                conn.execute(f"ALTER TABLE npcs ADD COLUMN {col} REAL DEFAULT {aptitudes.DEFAULT_APTITUDE}")
+                print(f"Added aptitude column {col} to npcs")
+        if commit:
+            conn.commit()
+
+    def _missing_indexes(self, cursor):
+        """INDEXES のうち、テーブルが存在して未作成のもの [(テーブル, インデックス名, カラム, 条件)]"""
+        objects = cursor.execute("SELECT type, name FROM sqlite_master WHERE type IN ('table', 'index')").fetchall()
+        tables = {name for obj_type, name in objects if obj_type == 'table'}
+        existing = {name for obj_type, name in objects if obj_type == 'index'}
+        return [(table, name, columns, where) for table, indexes in INDEXES.items() if table in tables
+                for name, columns, where in indexes if name not in existing]
+
+    def _create_index(self, cursor, table, name, columns, where):
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({columns})" + (f" WHERE {where}" if where else ""))
+
+    def _create_indexes(self, cursor):
+        """INDEXES のうち、テーブルが存在するものを作成する (作成済みのものはそのまま)"""
+        for index in self._missing_indexes(cursor):
+            self._create_index(cursor, *index)
+
+    def _build_missing_indexes(self, conn, commit=True):
+        """
+        既存DBに不足しているインデックスを1本ずつ作成・コミットする (オンライン作成)。
+        WAL モードではインデックスの作成中も他のコネクションから読み取れ、
+        書き込みロックは1本分の作成時間しか保持しない。
+        """
+        cursor = conn.cursor()
+        for table, name, columns, where in self._missing_indexes(cursor):
+            start = time.time()
+            self._create_index(cursor, table, name, columns, where)
+            if commit:
+                conn.commit()
+            print(f"Built index {name} on {table}({columns}) in {time.time() - start:.2f}s")
+
+    def _create_action_log(self, cursor):
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS action_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            week INTEGER,
+            company_id INTEGER,
+            seq INTEGER, -- 週内の適用順
+            action_type TEXT,
+            payload TEXT, -- JSON
+            status TEXT, -- 'applied', 'rejected'
+            note TEXT
+        )
+        """)
+
+    def _migrate_action_log(self, conn):
+        # インデックス (idx_action_log_week) は migrate() の最後に INDEXES から作られる
+        self._create_action_log(conn.cursor())
+
+    def _create_perf_stats(self, cursor):
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS perf_stats (
+            week INTEGER,
+            phase TEXT,
+            parent TEXT, -- 内訳の場合は親フェーズ (例: NPCLogic.decide_* は npc_decisions)
+            calls INTEGER,
+            wall_ms REAL,
+            cpu_ms REAL,
+            statements INTEGER,
+            rows_read INTEGER,
+            rows_written INTEGER,
+            peak_memory_kb REAL, -- tracemalloc で計測した場合のみ
+            PRIMARY KEY (week, phase)
+        )
+        """)
+
+    def _migrate_perf_stats(self, conn):
+        self._create_perf_stats(conn.cursor())
+
+    def _create_ledger_rollups(self, cursor):
+        """ledger_weekly / ledger_quarterly / ledger_yearly とそれらを維持するトリガーを作成する"""
+        for table, period in LEDGER_ROLLUPS.items():
+            cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                company_id INTEGER,
+                {period} INTEGER,
+                category TEXT,
+                amount INTEGER DEFAULT 0,
+                PRIMARY KEY (company_id, {period}, category)
+            )
+            """)
+        # 週 -> 四半期・年 は 1始まり (第1四半期 = 1-13週、第1期 = 1-52週)
+        upserts = "\n".join(f"""
+                INSERT INTO {table} (company_id, {period}, category, amount)
+                VALUES (NEW.company_id, {LEDGER_PERIOD_SQL[period]}, NEW.category, NEW.amount)
+                ON CONFLICT(company_id, {period}, category) DO UPDATE SET amount = amount + excluded.amount;""" for table, period in LEDGER_ROLLUPS.items())
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_account_entries_ledger AFTER INSERT ON account_entries
+            WHEN NEW.company_id IS NOT NULL AND NEW.week IS NOT NULL AND NEW.category IS NOT NULL
+            BEGIN{upserts}
+            END
+        """)
+
+    def _migrate_ledger_rollups(self, conn):
+        # 会計エントリのロールアップ: テーブルがなければ作成し、既存のエントリから集計し直す
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if 'account_entries' not in tables or all(t in tables for t in LEDGER_ROLLUPS): return
+        cursor = conn.cursor()
+        for table in LEDGER_ROLLUPS:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute("DROP TRIGGER IF EXISTS trg_account_entries_ledger")
+        self._create_ledger_rollups(cursor)
+        for table, period in LEDGER_ROLLUPS.items():
+            expr = LEDGER_PERIOD_SQL[period].replace('NEW.', '')
+            cursor.execute(f"""
+                INSERT INTO {table} (company_id, {period}, category, amount)
+                SELECT company_id, {expr}, category, SUM(amount) FROM account_entries
+                WHERE company_id IS NOT NULL AND week IS NOT NULL AND category IS NOT NULL
+                GROUP BY company_id, {expr}, category
+            """)
+        print("Built ledger rollups from account_entries")
+
+    def _migrate_npc_aptitudes(self, conn):
+        # 業界適性: JSON の aptitudes カラム -> 業界別の apt_<業界キー> カラム
+        columns = {r[1] for r in conn.execute("PRAGMA table_info(npcs)")}
+        if not columns: return
+        self._add_missing_aptitude_columns(conn, commit=False)
+        if 'aptitudes' not in columns: return
+
+        params = []
+        for npc_id, blob in conn.execute("SELECT id, aptitudes FROM npcs WHERE aptitudes IS NOT NULL").fetchall():
+            values = aptitudes.to_columns(json.loads(blob) if blob else {})
+            params.append(tuple(values.values()) + (npc_id,))
+        set_clause = ", ".join(f"{col} = ?" for col in aptitudes.COLUMNS.values())
+        conn.executemany(f"UPDATE npcs SET {set_clause} WHERE id = ?", params)
+        try:
+            conn.execute("ALTER TABLE npcs DROP COLUMN aptitudes")
+        except sqlite3.OperationalError:
+            # DROP COLUMN 非対応の SQLite では旧カラムを空にして残す
+            conn.execute("UPDATE npcs SET aptitudes = NULL")
+        print(f"Migrated aptitudes of {len(params)} NPCs to per-industry columns")
+
     def _execute(self, query, params, fetch_mode=None):
+        # 未反映の遅延書き込みが対象テーブルにあれば先に書き出す (読み書きの順序を保つ)
+        if self._has_pending() and self._touches_pending(query):
+            self.flush()
         conn, should_close = self.get_connection()
         try:
             cursor = conn.cursor()
@@ -401,23 +948,179 @@ class Database:
         # ネスト対応: 既にトランザクション中なら何もしない（親に任せる）
         is_root = False
         if not (hasattr(self._local, 'connection') and self._local.connection):
-            self._local.connection = sqlite3.connect(self.db_path)
-            self._local.connection.row_factory = sqlite3.Row
+            self._local.connection = self._pooled_connection()
             is_root = True
+        else:
+            # 内側のブロックはコネクションを直接使うため、ここがフェーズの区切りになる
+            self.flush()
             
         conn = self._local.connection
         try:
             yield conn
             if is_root:
+                self.flush()
                 conn.commit()
         except Exception:
             if is_root:
+                self._discard_pending()
                 conn.rollback()
             raise
         finally:
             if is_root:
-                conn.close()
                 self._local.connection = None
+
+    # ---------------------------------------------------------
+    # 遅延書き込み (write-behind)
+    # ---------------------------------------------------------
+    def _in_transaction(self):
+        return bool(getattr(self._local, 'connection', None))
+
+    def _pending(self):
+        # スレッドごとのバッファ: SQL文 -> パラメータのリスト / 週次統計 -> カラムごとの (操作, 値)
+        if not hasattr(self._local, 'pending'):
+            self._local.pending = {}
+            self._local.pending_tables = set()
+            self._local.pending_stats = {}
+        return self._local.pending
+
+    def _has_pending(self):
+        return bool(getattr(self._local, 'pending', None) or getattr(self._local, 'pending_stats', None))
+
+    def _touches_pending(self, query):
+        if self._local.pending_stats and 'weekly_stats' in query:
+            return True
+        # ロールアップはトリガーで account_entries への INSERT と同時に更新される
+        if 'account_entries' in self._local.pending_tables and 'ledger_' in query:
+            return True
+        return any(t in query for t in self._local.pending_tables)
+
+    def _discard_pending(self):
+        self._local.pending = {}
+        self._local.pending_tables = set()
+        self._local.pending_stats = {}
+
+    # ---------------------------------------------------------
+    # 並列意思決定用: スナップショットの受け渡し
+    # ---------------------------------------------------------
+    def serialize(self):
+        """現在のDB (未コミットの変更を含む) をバイト列にする"""
+        self.flush()
+        conn, _ = self.get_connection()
+        return conn.serialize()
+
+    def open_serialized(self, data):
+        """
+        バイト列を専用のインメモリDBへ展開し、このスレッドの作業用コネクションにする。
+        ワーカープロセスで親のDBファイルに触れずに参照するために使う。
+        """
+        # WALモードのヘッダのままではインメモリDBとして開けないため、ロールバックジャーナルに書き換える
+        data = bytearray(data)
+        data[18] = data[19] = 1
+        conn = sqlite3.connect(":memory:", factory=PooledConnection)
+        conn.deserialize(bytes(data))
+        conn.row_factory = sqlite3.Row
+        conn.closed = False
+        conn.counters = self.counters
+        conn.tracer = self.tracer
+        self._local.connection = conn
+        return conn
+
+    def execute_deferred(self, query, params=()):
+        """
+        戻り値を使わない INSERT/UPSERT をバッファに積む。
+        トランザクション外では通常どおり即時実行する。
+        """
+        if not self._in_transaction():
+            return self.execute_query(query, params)
+        pending = self._pending()
+        pending.setdefault(query, []).append(params)
+        match = re.search(r"INTO\s+(\w+)", query, re.IGNORECASE)
+        if match:
+            self._local.pending_tables.add(match.group(1))
+
+    def flush(self):
+        """バッファ済みの書き込みを SQL 文ごとに executemany で書き出す"""
+        if not self._has_pending(): return
+        pending, stats = self._local.pending, self._local.pending_stats
+        self._discard_pending()
+
+        rows = [dict(week=week, company_id=cid, **{c: v for c, (op, v) in cols.items()}) for (week, cid), cols in stats.items()]
+        modes = [{c: op for c, (op, v) in cols.items()} for cols in stats.values()]
+
+        conn, should_close = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            for query, params_list in pending.items():
+                cursor.executemany(query, params_list)
+            self._upsert_weekly_stats(cursor, rows, modes)
+            if should_close:
+                conn.commit()
+        finally:
+            if should_close:
+                conn.close()
+
+    def bulk_insert(self, table, rows):
+        """dictのリストを executemany で一括挿入する (キーは全行で共通)"""
+        if not rows: return
+        self.flush()
+        columns = list(rows[0].keys())
+        placeholders = ', '.join(['?'] * len(columns))
+        query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+        conn, should_close = self.get_connection()
+        try:
+            conn.executemany(query, [tuple(r[c] for c in columns) for r in rows])
+            if should_close:
+                conn.commit()
+        finally:
+            if should_close:
+                conn.close()
+
+    def bulk_upsert_weekly_stats(self, rows, increment=False):
+        """
+        週次統計の一括更新
+        rows: [{'week': w, 'company_id': cid, column: value, ...}, ...]
+        increment=True なら既存値に加算、False なら上書き
+        """
+        if not rows: return
+        self.flush()
+        op = 'inc' if increment else 'set'
+        modes = [{c: op for c in r if c not in ('week', 'company_id')} for r in rows]
+        conn, should_close = self.get_connection()
+        try:
+            self._upsert_weekly_stats(conn.cursor(), rows, modes)
+            if should_close:
+                conn.commit()
+        finally:
+            if should_close:
+                conn.close()
+
+    def _upsert_weekly_stats(self, cursor, rows, modes):
+        # 更新するカラムと操作の組み合わせごとに1つのSQL文にまとめる
+        groups = {}
+        for row, mode in zip(rows, modes):
+            key = tuple(sorted(mode.items()))
+            groups.setdefault(key, []).append(tuple([row['week'], row['company_id']] + [row[c] for c, _ in key]))
+
+        for key, params in groups.items():
+            columns = ', '.join(c for c, _ in key)
+            placeholders = ', '.join(['?'] * (len(key) + 2))
+            updates = ', '.join(f"{c} = {c} + excluded.{c}" if op == 'inc' else f"{c} = excluded.{c}" for c, op in key)
+            cursor.executemany(f"""
+                INSERT INTO weekly_stats (week, company_id, {columns})
+                VALUES ({placeholders})
+                ON CONFLICT(week, company_id)
+                DO UPDATE SET {updates}
+            """, params)
+
+    def _buffer_weekly_stat(self, week, company_id, column, value, op):
+        self._pending()
+        cols = self._local.pending_stats.setdefault((week, company_id), {})
+        prev = cols.get(column)
+        if op == 'inc' and prev:
+            # 上書き後の加算は上書き値へ、加算同士は合算する
+            cols[column] = (prev[0], prev[1] + value)
+        else:
+            cols[column] = (op, value)
             
     def log_file_event(self, week, company_id, event_type, details):
         try:
@@ -430,6 +1133,23 @@ class Database:
         
         with open("simulation_events.log", "a", encoding="utf-8") as f:
             f.write(log_entry)
+
+    def log_file_events(self, week, events):
+        """
+        イベントログの一括出力 (企業名は1回のクエリでまとめて引く)
+        events: [(company_id, event_type, details), ...]
+        """
+        if not events: return
+        ids = sorted({cid for cid, _, _ in events if cid is not None})
+        names = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows = self.fetch_all(f"SELECT id, name FROM companies WHERE id IN ({','.join(['?'] * len(chunk))})", tuple(chunk))
+            names.update({r['id']: r['name'] for r in rows})
+
+        with open("simulation_events.log", "a", encoding="utf-8") as f:
+            f.writelines(f"Week {week} | {names.get(cid, 'Unknown')} (ID: {cid}) | {event_type} | {details}\n"
+                         for cid, event_type, details in events)
             
     def increment_weekly_stat(self, week, company_id, column, value):
         query = f"""
@@ -438,6 +1158,9 @@ class Database:
             ON CONFLICT(week, company_id) 
             DO UPDATE SET {column} = {column} + ?
         """
+        if self._in_transaction():
+            self._buffer_weekly_stat(week, company_id, column, value, 'inc')
+            return
         self.execute_query(query, (week, company_id, value, value))
 
     def set_weekly_stat(self, week, company_id, column, value):
@@ -447,6 +1170,9 @@ class Database:
             ON CONFLICT(week, company_id) 
             DO UPDATE SET {column} = ?
         """
+        if self._in_transaction():
+            self._buffer_weekly_stat(week, company_id, column, value, 'set')
+            return
         self.execute_query(query, (week, company_id, value, value))
 
 db = Database()
@@ -0,0 +1,140 @@
+# c:\0124newSIm\src\decision_worker.py
+# NPC意思決定フェーズの並列実行 (ワーカープロセス側)
+import os
+import pickle
+import sqlite3
+import tempfile
+from database import db
+from rng import rng
+import gamebalance as gb
+from perf import perf
+
+# ワーカーごとに読み込み済みの週次スナップショット
+_loaded = {'path': None, 'ctx': None, 'conn': None}
+
+# ワーカーへ渡すテーブル (NPCLogic が意思決定中に参照するもの)
+DECISION_TABLES = ['companies', 'divisions', 'npcs', 'facilities', 'loans', 'product_designs', 'inventory',
+                   'market_trends', 'weekly_stats', 'transactions', 'ledger_weekly', 'ledger_quarterly', 'ledger_yearly']
+
+def lookback_weeks():
+    """意思決定が参照する履歴の週数 (直近4週の実績、四半期利益、IPO審査の黒字継続週数)"""
+    return max(13, gb.IPO_MIN_PROFIT_WEEKS) + 1
+
+def _row_filters(week):
+    """
+    テーブルごとの抽出条件 {テーブル: (WHERE句, パラメータ)}。
+    履歴系のテーブルは直近 lookback_weeks() 週分だけを渡し、セーブの履歴が伸びても転送量が増えないようにする。
+    """
+    start = week - lookback_weeks()
+    return {
+        # 従業員は ctx (npcs_by_company) で渡すため、NPCはテーブル定義のみ (行数が最も多く、意思決定では参照しない)
+        'npcs': ("WHERE 0", ()),
+        # 前週の需要と、業界ごとの最新週の需要
+        'market_trends': ("WHERE week >= ? OR (industry_key, week) IN (SELECT industry_key, MAX(week) FROM market_trends GROUP BY industry_key)", (start,)),
+        'weekly_stats': ("WHERE week >= ?", (start,)),
+        'transactions': ("WHERE week >= ?", (start,)),
+        'ledger_weekly': ("WHERE week >= ?", (start,)),
+        'ledger_quarterly': ("WHERE quarter >= ?", ((start - 1) // 13 + 1,)),
+        'ledger_yearly': ("WHERE year >= ?", ((start - 1) // 52 + 1,)),
+    }
+
+def decision_snapshot(week):
+    """
+    意思決定に必要なテーブル・行だけを新しいインメモリDBへ写し、バイト列にする。
+    DB全体の serialize() と違い、会計エントリ・ニュース・アクションログなどの履歴は含めない。
+    """
+    db.flush()
+    conn, should_close = db.get_connection()
+    filters = _row_filters(week)
+    dst = sqlite3.connect(":memory:")
+    try:
+        schema = conn.execute("SELECT type, name, tbl_name, sql FROM sqlite_master WHERE sql IS NOT NULL AND type IN ('table', 'index')").fetchall()
+        tables = {r['tbl_name'] for r in schema if r['type'] == 'table'}
+        for r in schema:
+            if r['type'] == 'table' and r['name'] in DECISION_TABLES:
+                dst.execute(r['sql'])
+        src = conn.cursor()
+        src.row_factory = None
+        for table in DECISION_TABLES:
+            if table not in tables: continue
+            where, params = filters.get(table, ("", ()))
+            src.execute(f"SELECT * FROM {table} {where}", params)
+            columns = len(src.description)
+            dst.executemany(f"INSERT INTO {table} VALUES ({', '.join(['?'] * columns)})", src)
+        # インデックスは行を入れてから作る
+        for r in schema:
+            if r['type'] == 'index' and r['tbl_name'] in DECISION_TABLES:
+                dst.execute(r['sql'])
+        dst.commit()
+        return dst.serialize()
+    finally:
+        dst.close()
+        if should_close:
+            conn.close()
+
+def run_parallel(ctx, executor, workers):
+    """
+    週初のDB (意思決定が参照する範囲)・意思決定入力・乱数状態を一時ファイルにまとめ、企業を分割してワーカーへ渡す。
+    戻り値: {company_id: (actions, phase, plan)}
+    """
+    payload = {
+        'db': decision_snapshot(ctx['week']),
+        'ctx': ctx,
+        'rng': rng.getstate(),
+        # 派生実行などで実行時に上書きされた定数をワーカーへ引き継ぐ
+        'gamebalance': {k: v for k, v in vars(gb).items() if k.isupper()},
+        # フェーズ別計測の有無 (decide_* の内訳はワーカー側で集計して返す)
+        'perf': {'enabled': perf.enabled, 'memory': perf.memory},
+    }
+    fd, path = tempfile.mkstemp(suffix=".decide")
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    try:
+        company_ids = sorted(ctx['companies'])
+        chunks = [company_ids[i::workers] for i in range(workers)]
+        futures = [executor.submit(run_chunk, path, chunk) for chunk in chunks if chunk]
+        results = {}
+        for future in futures:
+            chunk_results, records = future.result()
+            results.update(chunk_results)
+            perf.merge(records)
+        return results
+    finally:
+        os.remove(path)
+
+def run_chunk(path, company_ids):
+    """担当企業の意思決定を1社ずつ実行し、出力されたアクションと計測結果を返す"""
+    from simulation import Simulation
+
+    if _loaded['path'] != path:
+        _load(path)
+    ctx = _loaded['ctx']
+
+    sim = Simulation()
+    results = {}
+    perf.begin_week()
+    for cid in company_ids:
+        # 意思決定はDBへ書き込まないため、全社が同じ週初の状態を参照する
+        logic = sim._decide_company(ctx['companies'][cid], ctx)
+        results[cid] = (logic.actions, logic.phase, logic.plan)
+    return results, perf.take_records()
+
+def _load(path):
+    with open(path, 'rb') as f:
+        payload = pickle.load(f)
+
+    if _loaded['conn'] is not None:
+        _loaded['conn']._close()
+    for key, value in payload['gamebalance'].items():
+        setattr(gb, key, value)
+    rng.setstate(payload['rng'])
+
+    _loaded['path'] = path
+    _loaded['ctx'] = payload['ctx']
+    _loaded['conn'] = db.open_serialized(payload['db'])
+
+    if payload['perf']['enabled'] and not perf.enabled:
+        perf.enable(memory=payload['perf']['memory'])
+    elif not payload['perf']['enabled'] and perf.enabled:
+        perf.disable()
@@ -36,6 +36,7 @@ INDUSTRIES = {
         "base_demand": 1000, # 週次需要
         "production_efficiency_base": 0.27, # 1人週あたりの生産台数
         "development_duration": 48, # 開発期間(週): 長め
+        "market_clearing": "proportional", # B2C需要の配分方式 (b2c_market.CLEARING_STRATEGIES)
         "parts": [
             {"key": "engine", "label": "エンジン", "base_cost": 240000},
             {"key": "drive_parts", "label": "走行パーツ", "base_cost": 240000},
@@ -56,6 +57,7 @@ INDUSTRIES = {
         "stock_handling_coefficient": 0.02,
         "transaction_handling_coefficient": 5.0,
         "development_difficulty": 0.6,
+        "market_clearing": "proportional",
         "parts": [
             {"key": "cpu", "label": "CPU", "base_cost": 30000},
             {"key": "gpu", "label": "GPU", "base_cost": 40000},
@@ -70,6 +72,13 @@ INDUSTRIES = {
 
 # デフォルト設定（後方互換用）
 DEFAULT_INDUSTRY = "automotive"
+# B2C需要の配分方式 (業界に market_clearing がない場合)
+# 'proportional': スコア比で3パス配分 / 'water_filling': 厳密な水位充填 / 'logit': 離散選択モデルの標本シミュレーション
+DEFAULT_MARKET_CLEARING = "proportional"
+
+# B2B注文の処理優先順位 (受注判断と納品時の在庫引当)
+# 'fifo': 発注の古い順 / 'price': 単価の高い順
+B2B_ORDER_PRIORITY = "fifo"
 
 # 施設・賃料 (週次)
 RENT_OFFICE = 5000  # 1人あたり
@@ -97,6 +106,9 @@ INDUSTRY_APTITUDE_GROWTH_FAST = 1.0 / 13 # 13週で1.0へ
 BASE_SALARY_YEARLY = 4000000 # 能力50の時
 WEEKS_PER_YEAR_REAL = 52 # 給与計算用（ゲーム内進行とは別）
 REHIRE_PROHIBITION_WEEKS = 52 # 離職後、元の会社に戻れない期間
+# 求人の提案回数の上限 (枠数の何倍まで提案するか)。1 なら各社は評価上位の枠数分だけに提案し、
+# 他社に取られても次の候補へは進まない (一斉オファー方式)。None なら枠が埋まるまで次の候補へ提案を続ける
+HIRING_PROPOSAL_ROUNDS = 1
 
 # 部署定義
 DEPT_PRODUCTION = "production"
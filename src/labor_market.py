@@ -0,0 +1,148 @@
+# c:\0124newSIm\src\labor_market.py
+# 労働市場のマッチング (全求人 x 全求職者の一括評価と、受入保留方式による採用の確定)
+
+import heapq
+import numpy as np
+import gamebalance as gb
+import aptitudes
+from rng import rng
+
+# 部署 -> 評価に使う能力 (ここにない部署は評価用能力の最大値で評価する)
+DEPT_STAT = {
+    gb.DEPT_PRODUCTION: 'production', gb.DEPT_DEV: 'development', gb.DEPT_SALES: 'sales',
+    gb.DEPT_HR: 'hr', gb.DEPT_STORE: 'store_ops'
+}
+EVAL_STATS = ['production', 'development', 'sales', 'hr', 'store_ops']
+INDUSTRY_KEYS = list(aptitudes.COLUMNS.keys())
+
+# 希望給与のこの割合以上の提示なら受諾する
+ACCEPT_RATIO = 0.9
+
+class CandidatePool:
+    """求職者の列指向ビュー (NPC ID昇順)"""
+
+    def __init__(self, npcs):
+        self.rows = sorted(npcs, key=lambda n: n['id'])
+        self.ids = np.array([n['id'] for n in self.rows], dtype=np.int64)
+        self.index = {int(nid): i for i, nid in enumerate(self.ids)}
+        self.stats = np.array([[n[s] or 0 for s in EVAL_STATS] for n in self.rows], dtype=np.float64).reshape(len(self.rows), len(EVAL_STATS))
+        self.aptitudes = np.array([[aptitudes.get(n, k) for k in INDUSTRY_KEYS] for n in self.rows], dtype=np.float64).reshape(len(self.rows), len(INDUSTRY_KEYS))
+        desired = np.array([n['desired_salary'] or 0 for n in self.rows], dtype=np.float64)
+        salary = np.array([n['salary'] or 0 for n in self.rows], dtype=np.float64)
+        # 評価に使う給与 (希望給与 -> 現給与 -> 基準給与)
+        self.cost = np.where(desired > 0, desired, np.where(salary > 0, salary, gb.BASE_SALARY_YEARLY))
+        # 求人への提示額と受諾の下限
+        self.ask = np.where(desired > 0, desired, gb.BASE_SALARY_YEARLY)
+        self.last_company = np.array([n['last_company_id'] if n['last_company_id'] is not None else -1 for n in self.rows], dtype=np.int64)
+        self.last_resigned = np.array([n['last_resigned_week'] or 0 for n in self.rows], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.rows)
+
+def _uniforms(seed, ids, m):
+    """
+    (seed, NPC ID, 列) ごとに決まる [0, 1) の一様乱数 [len(ids) x m] (splitmix64)。
+    求職者の並びや人数によらないため、候補を絞り込んでも各求職者の評価は全員で評価した場合と変わらない。
+    """
+    with np.errstate(over='ignore'):
+        z = np.uint64(seed) + ids.astype(np.uint64)[:, None] * np.uint64(m) + np.arange(m, dtype=np.uint64)
+        z = z * np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+def score_requisitions(pool, requisitions, week):
+    """
+    全求人について全求職者を一括で評価する。
+    評価 = (能力 + 認知誤差) x 業界適性 / 給与 x (1 + 評価のブレ)。誤差 (±stat_error/2) とブレ (±eval_noise) は
+    求人ごとに企業の乱数ストリームから引いたシードと NPC ID で決まる (labor_pool の候補の絞り込みはこの範囲を前提にする)。
+    requisitions: [{'company_id', 'target_dept', 'industry_key', 'stat_error', 'eval_noise', ...}]
+    戻り値: [求人 x 求職者] のスコア行列 (再雇用禁止期間中の元社員は -inf)
+    """
+    n = len(pool)
+    scores = np.full((len(requisitions), n), -np.inf)
+    for r, req in enumerate(requisitions):
+        seed = rng.numpy('hiring', req['company_id']).integers(2 ** 63)
+        u = _uniforms(seed, pool.ids, len(EVAL_STATS) + 1)
+        half = req['stat_error'] / 2.0
+        error = half * (2.0 * u[:, :len(EVAL_STATS)] - 1.0)
+        stat = DEPT_STAT.get(req['target_dept'])
+        if stat:
+            j = EVAL_STATS.index(stat)
+            perceived = pool.stats[:, j] + error[:, j]
+        else:
+            perceived = (pool.stats + error).max(axis=1)
+        ind = INDUSTRY_KEYS.index(req['industry_key']) if req['industry_key'] in INDUSTRY_KEYS else None
+        apt = pool.aptitudes[:, ind] if ind is not None else aptitudes.DEFAULT_APTITUDE
+        noise = 1.0 + req['eval_noise'] * (2.0 * u[:, len(EVAL_STATS)] - 1.0)
+        row = (perceived * apt / pool.cost) * noise
+        banned = (pool.last_company == req['company_id']) & (week - pool.last_resigned < gb.REHIRE_PROHIBITION_WEEKS)
+        scores[r] = np.where(banned, -np.inf, row)
+    return scores
+
+def deferred_acceptance(pool, requisitions, scores, offers, brand_power):
+    """
+    企業側提案の受入保留方式 (多対一の安定マッチング)。
+    求人は評価の高い順に求職者へ提案し、求職者は受諾条件 (希望給与の9割以上) を満たす中で
+    提示給与 x (1 + ブランド/200) が最も高い提案を保留する。より良い提案が来たら保留中の求人を押し出す。
+    求人の提案は 枠数 x gb.HIRING_PROPOSAL_ROUNDS 人までで、使い切った求人は押し出されても次の候補へ進まない
+    (既定の 1 では各社が上位の枠数分へ一斉にオファーし、求職者が最良の1社を選ぶ)。
+    offers: 個別オファー [{'company_id', 'npc_id', 'offer_salary', 'target_dept'}] (プレイヤーなど。その1人だけに提案する)
+    戻り値: [{'npc_id', 'company_id', 'target_dept', 'salary'}] (NPC ID順)
+    """
+    # 提案元: 求人 (枠数 count、評価順の候補リスト) と個別オファー (枠1、候補1人)
+    proposers = []
+    if len(requisitions):
+        order = np.argsort(-scores, axis=1, kind='stable')
+    for r, req in enumerate(requisitions):
+        prefs = order[r][np.isfinite(scores[r][order[r]])]
+        proposers.append({'company_id': req['company_id'], 'target_dept': req['target_dept'], 'slots': req['count'],
+                          'prefs': prefs, 'salary': None})
+    for offer in offers:
+        c = pool.index.get(offer['npc_id'])
+        if c is None: continue
+        proposers.append({'company_id': offer['company_id'], 'target_dept': offer['target_dept'], 'slots': 1,
+                          'prefs': np.array([c], dtype=np.int64), 'salary': offer['offer_salary']})
+
+    rounds = gb.HIRING_PROPOSAL_ROUNDS
+    limit = [min(len(p['prefs']), p['slots'] * rounds) if rounds else len(p['prefs']) for p in proposers]
+    held = {}             # {求職者: (評価値, -提案元, 提案元, 給与)}
+    cursor = [0] * len(proposers)
+    free = [p['slots'] for p in proposers]
+    queue = list(range(len(proposers)))
+    heapq.heapify(queue)
+    while queue:
+        k = heapq.heappop(queue)
+        p = proposers[k]
+        while free[k] > 0 and cursor[k] < limit[k]:
+            c = int(p['prefs'][cursor[k]])
+            cursor[k] += 1
+            salary = p['salary'] if p['salary'] is not None else pool.ask[c]
+            if salary < pool.ask[c] * ACCEPT_RATIO:
+                continue
+            value = (salary * (1 + brand_power.get(p['company_id'], 0) / 200.0), -k)
+            current = held.get(c)
+            if current is not None and current[:2] >= value:
+                continue
+            held[c] = value + (k, salary)
+            free[k] -= 1
+            if current is not None:
+                # 押し出された提案元は (提案回数が残っていれば) 次の候補へ提案を続ける
+                free[current[2]] += 1
+                heapq.heappush(queue, current[2])
+
+    hires = []
+    for c in sorted(held):
+        _, _, k, salary = held[c]
+        hires.append({'npc_id': int(pool.ids[c]), 'company_id': proposers[k]['company_id'],
+                      'target_dept': proposers[k]['target_dept'], 'salary': int(salary)})
+    return hires
+
+def match(candidates, requisitions, offers, brand_power, week):
+    """求職者・求人・個別オファーから採用の組み合わせを決める"""
+    pool = CandidatePool(candidates)
+    if len(pool) == 0:
+        return []
+    scores = score_requisitions(pool, requisitions, week)
+    return deferred_acceptance(pool, requisitions, scores, offers, brand_power)
@@ -0,0 +1,179 @@
+# c:\0124newSIm\src\labor_pool.py
+# 求職者 (無所属NPC) のインデックス (経営能力の降順リストと、採用マッチングの評価の基準値)
+
+from bisect import bisect_left, insort
+import numpy as np
+import gamebalance as gb
+import aptitudes
+from labor_market import DEPT_STAT, EVAL_STATS
+
+# 索引名 (能力値の降順リストを持つカラム。参照があるのは新興企業のCEO選び用の経営能力のみ)
+INDEX_NAMES = ['executive']
+
+# 索引のキーに影響するカラム (これ以外の変更、例えば忠誠度では索引を更新しない)
+RELEVANT_COLUMNS = {'company_id', 'salary', 'desired_salary'} | set(EVAL_STATS) | set(INDEX_NAMES) | set(aptitudes.COLUMNS.values())
+
+# 採用マッチングの評価に使う能力 (部署の能力、'max' は評価用能力の最大値)
+SCORE_STATS = EVAL_STATS + ['max']
+
+# NPCごとに持つ評価の基準値 (誤差・ブレのない評価 "score:<能力>:<業界キー>" = 能力 x 適性 / 給与、
+# 認知誤差1あたりの評価の幅 "fit:<業界キー>" = 適性 / 給与)
+SCORE_KEYS = [f"score:{s}:{k}" for s in SCORE_STATS for k in aptitudes.COLUMNS] + [f"fit:{k}" for k in aptitudes.COLUMNS]
+
+# 評価の上限・下限に持たせる余裕 (浮動小数点の丸めで実際の評価が範囲の端をわずかに超えても取りこぼさない)
+_BOUND_EPS = 1e-9
+
+def _cost(npc):
+    """評価に使う給与 (希望給与 -> 現給与 -> 基準給与。labor_market.CandidatePool と同じ)"""
+    return npc['desired_salary'] or npc['salary'] or gb.BASE_SALARY_YEARLY
+
+def _sort_values(npc):
+    """INDEX_NAMES の並びで、符号を反転した値 (昇順に並べると値の大きい順になる)"""
+    return tuple(-(npc[s] or 0) for s in INDEX_NAMES)
+
+def _score_values(npc):
+    """SCORE_KEYS の並びの評価の基準値"""
+    stats = {s: npc[s] or 0 for s in EVAL_STATS}
+    stats['max'] = max(stats.values())
+    cost = _cost(npc)
+    fit = [aptitudes.get(npc, k) / cost for k in aptitudes.COLUMNS]
+    return tuple([stats[s] * f for s in SCORE_STATS for f in fit] + fit)
+
+def _upper(x, noise):
+    """誤差込みの (能力 x 適性 / 給与) が x 以下のときの、評価のブレ (1 ± noise) を掛けた値の上限"""
+    return np.where(x >= 0, x * (1 + noise), x * (1 - noise)) + np.abs(x) * _BOUND_EPS
+
+def _lower(x, noise):
+    """誤差込みの (能力 x 適性 / 給与) が x 以上のときの、評価のブレを掛けた値の下限"""
+    return np.where(x >= 0, x * (1 - noise), x * (1 + noise)) - np.abs(x) * _BOUND_EPS
+
+class LaborPoolIndex:
+    """
+    無所属NPCの ID を索引ごとに (-値, NPC ID) の昇順で並べたリストで保持し、上位K人を先頭から取り出す。
+    あわせて NPC ごとの採用マッチングの評価の基準値を持ち、求人ごとの候補の絞り込みに使う。
+    WorldState の更新から on_change() で通知を受け、就職・離職・能力変化のあった NPC だけを入れ替える。
+    リストは最初の参照時に作る (参照のない週の途中の読み直しでは作り直さない)。
+    """
+
+    def __init__(self, world):
+        self.world = world
+        self._lists = {name: [] for name in INDEX_NAMES}   # {索引名: [npc_id]} (-値, npc_id) の昇順
+        self._values = {}  # {npc_id: _sort_values()} 索引に入っている NPC の登録時の値
+        self._scores = {}  # {npc_id: _score_values()}
+        self._stale = True
+
+    def rebuild(self):
+        """世界状態の全NPCから作り直す (WorldState.refresh の後。実際の構築は次の参照時)"""
+        self._stale = True
+
+    def _build(self):
+        rows = [n for n in self.world.npcs.values() if n['company_id'] is None]
+        ids = np.array([n['id'] for n in rows], dtype=np.int64)
+        eval_stats = np.array([[n[s] or 0 for s in EVAL_STATS] for n in rows], dtype=np.float64).reshape(len(rows), len(EVAL_STATS))
+        values = -np.array([[n[s] or 0 for s in INDEX_NAMES] for n in rows], dtype=np.float64).reshape(len(rows), len(INDEX_NAMES))
+        cost = np.array([_cost(n) for n in rows], dtype=np.float64)
+        apt = np.array([[aptitudes.get(n, k) for k in aptitudes.COLUMNS] for n in rows], dtype=np.float64).reshape(len(rows), len(aptitudes.COLUMNS))
+        fit = apt / cost[:, None]
+        score_stats = np.hstack([eval_stats, eval_stats.max(axis=1)[:, None]])
+        # SCORE_STATS x 業界 の順 (SCORE_KEYS と同じ並び)
+        score = (score_stats[:, :, None] * fit[:, None, :]).reshape(len(rows), -1)
+
+        id_list = ids.tolist()
+        self._values = dict(zip(id_list, map(tuple, values.tolist())))
+        self._scores = dict(zip(id_list, map(tuple, np.hstack([score, fit]).tolist())))
+        self._lists = {}
+        for k, name in enumerate(INDEX_NAMES):
+            order = np.lexsort((ids, values[:, k]))
+            self._lists[name] = ids[order].tolist()
+        self._stale = False
+
+    # ---------------------------------------------------------
+    # 参照
+    # ---------------------------------------------------------
+    def __len__(self):
+        if self._stale: self._build()
+        return len(self._values)
+
+    def top(self, name, k):
+        """索引 name の上位 k 人 (NPC行のリスト、値の大きい順・同値はID順)"""
+        if self._stale: self._build()
+        return [self.world.npcs[npc_id] for npc_id in self._lists[name][:k]]
+
+    def best(self, stat):
+        """能力 stat が最も高い求職者 (いなければ None)"""
+        top = self.top(stat, 1)
+        return top[0] if top else None
+
+    def candidates(self, requisitions, week):
+        """
+        採用マッチングで求人の提案先になりうる求職者 (NPC ID昇順)。
+        求人は評価の上位 (枠数 x gb.HIRING_PROPOSAL_ROUNDS) 人にしか提案しないため、求人ごとにその範囲に
+        入りうる求職者だけを集める。全求職者でマッチングした場合と同じ採用結果になる。
+        提案回数に上限がない場合と、適性のない業界の求人がある場合は全求職者を返す。
+        """
+        if self._stale: self._build()
+        rounds = gb.HIRING_PROPOSAL_ROUNDS
+        if not rounds or any(req['industry_key'] not in aptitudes.COLUMNS for req in requisitions):
+            return [self.world.npcs[i] for i in sorted(self._values)]
+
+        ids = np.array(list(self._scores), dtype=np.int64)
+        scores = np.array(list(self._scores.values()), dtype=np.float64).reshape(len(ids), len(SCORE_KEYS))
+        npcs = [self.world.npcs[i] for i in ids.tolist()]
+        last_company = np.array([n['last_company_id'] if n['last_company_id'] is not None else -1 for n in npcs], dtype=np.int64)
+        last_resigned = np.array([n['last_resigned_week'] or 0 for n in npcs], dtype=np.int64)
+        selected = np.zeros(len(ids), dtype=bool)
+        for req in requisitions:
+            # 再雇用禁止期間中の元社員はこの求人の評価から外れる (labor_market.score_requisitions と同じ条件)
+            eligible = ~((last_company == req['company_id']) & (week - last_resigned < gb.REHIRE_PROHIBITION_WEEKS))
+            selected |= self._shortlist(req, req['count'] * rounds, scores, eligible)
+        return [self.world.npcs[i] for i in np.sort(ids[selected]).tolist()]
+
+    def _shortlist(self, req, k, scores, eligible):
+        """
+        求人 req の評価で上位 k 人に入りうる求職者 (scores の行に対するマスク)。
+        評価 = (能力 + 誤差) x 適性 / 給与 x (1 ± ブレ) は、score = 能力 x 適性 / 給与 と fit = 適性 / 給与 から
+        [(score - h x fit)(1 - ブレ), (score + h x fit)(1 + ブレ)] (h = 誤差の幅の半分) に収まる。
+        上限が下限の k 番目に届かない求職者は、誤差・ブレによらず上位 k 人に入らない。
+        """
+        stat = DEPT_STAT.get(req['target_dept'], 'max')
+        score = scores[:, SCORE_KEYS.index(f"score:{stat}:{req['industry_key']}")]
+        fit = scores[:, SCORE_KEYS.index(f"fit:{req['industry_key']}")]
+        half = req['stat_error'] / 2.0
+        lower = _lower(score - half * fit, req['eval_noise'])[eligible]
+        if len(lower) <= k:
+            return eligible
+        cutoff = np.partition(lower, len(lower) - k)[len(lower) - k]
+        return eligible & (_upper(score + half * fit, req['eval_noise']) >= cutoff)
+
+    # ---------------------------------------------------------
+    # 更新通知
+    # ---------------------------------------------------------
+    def on_change(self, table, row, columns=None):
+        """行の変更通知 (columns=None は行の追加・削除)"""
+        if table != 'npcs' or self._stale: return
+        if columns is not None and not RELEVANT_COLUMNS.intersection(columns): return
+
+        self._remove(row['id'])
+        if row['company_id'] is None and row['id'] in self.world.npcs:
+            self._add(row)
+
+    def _add(self, npc):
+        values = _sort_values(npc)
+        self._values[npc['id']] = values
+        self._scores[npc['id']] = _score_values(npc)
+        for k, name in enumerate(INDEX_NAMES):
+            insort(self._lists[name], npc['id'], key=self._sort_key(k))
+
+    def _remove(self, npc_id):
+        values = self._values.get(npc_id)
+        if values is None: return
+        for k, (name, value) in enumerate(zip(INDEX_NAMES, values)):
+            lst = self._lists[name]
+            del lst[bisect_left(lst, (value, npc_id), key=self._sort_key(k))]
+        del self._values[npc_id]
+        del self._scores[npc_id]
+
+    def _sort_key(self, k):
+        """k 番目の索引での並び順のキー (-値, NPC ID)"""
+        values = self._values
+        return lambda npc_id: (values[npc_id][k], npc_id)
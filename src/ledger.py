@@ -0,0 +1,68 @@
+# c:\0124newSIm\src\ledger.py
+# 会計エントリの期間集計 (週次・四半期・年次のロールアップを組み合わせて、任意の週範囲をまとめて引く)
+# ロールアップは account_entries への INSERT 時にトリガーで加算される (database.py)
+
+from database import db
+
+QUARTER_WEEKS = 13
+YEAR_QUARTERS = 4
+
+def _segments(start_week, end_week):
+    """
+    週範囲 [start_week, end_week] をロールアップの行に分解する。
+    端の半端な週は ledger_weekly、丸ごと含まれる四半期は ledger_quarterly、年は ledger_yearly から引く。
+    戻り値: [(テーブル, 期間カラム, 開始, 終了)]
+    """
+    start_week = max(1, start_week)
+    if start_week > end_week: return []
+    first_q = (start_week - 1 + QUARTER_WEEKS - 1) // QUARTER_WEEKS + 1   # 最初に丸ごと含まれる四半期
+    last_q = end_week // QUARTER_WEEKS                                       # 最後に丸ごと含まれる四半期
+    if first_q > last_q:
+        return [('ledger_weekly', 'week', start_week, end_week)]
+
+    segments = [('ledger_weekly', 'week', start_week, (first_q - 1) * QUARTER_WEEKS),
+                ('ledger_weekly', 'week', last_q * QUARTER_WEEKS + 1, end_week)]
+    first_y = (first_q - 1 + YEAR_QUARTERS - 1) // YEAR_QUARTERS + 1
+    last_y = last_q // YEAR_QUARTERS
+    if first_y > last_y:
+        segments.append(('ledger_quarterly', 'quarter', first_q, last_q))
+    else:
+        segments += [('ledger_quarterly', 'quarter', first_q, (first_y - 1) * YEAR_QUARTERS),
+                     ('ledger_quarterly', 'quarter', last_y * YEAR_QUARTERS + 1, last_q),
+                     ('ledger_yearly', 'year', first_y, last_y)]
+    return [seg for seg in segments if seg[2] <= seg[3]]
+
+def _query(start_week, end_week, company_id=None, categories=None):
+    parts, params = [], []
+    for table, period, lo, hi in _segments(start_week, end_week):
+        where = f"{period} BETWEEN ? AND ?"
+        params += [lo, hi]
+        if company_id is not None:
+            where += " AND company_id = ?"
+            params.append(company_id)
+        if categories is not None:
+            where += f" AND category IN ({', '.join(['?'] * len(categories))})"
+            params += list(categories)
+        parts.append(f"SELECT company_id, category, amount FROM {table} WHERE {where}")
+    if not parts: return []
+    return db.fetch_all(f"""
+        SELECT company_id, category, SUM(amount) as total FROM ({' UNION ALL '.join(parts)})
+        GROUP BY company_id, category
+    """, tuple(params))
+
+def totals(company_id, start_week, end_week, categories=None):
+    """1社の期間中の勘定別合計 {category: amount} (categories を指定するとその勘定のみ)"""
+    return {r['category']: r['total'] for r in _query(start_week, end_week, company_id, categories)}
+
+def totals_by_company(start_week, end_week, categories=None):
+    """全社の期間中の勘定別合計 {company_id: {category: amount}}"""
+    result = {}
+    for r in _query(start_week, end_week, None, categories):
+        result.setdefault(r['company_id'], {})[r['category']] = r['total']
+    return result
+
+def profit(pl, excluded=()):
+    """売上 - 費用 (revenue と excluded 以外の勘定を費用とみなす)"""
+    revenue = pl.get('revenue', 0) or 0
+    expenses = sum(v or 0 for cat, v in pl.items() if cat != 'revenue' and cat not in excluded)
+    return revenue - expenses
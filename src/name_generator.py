@@ -1,5 +1,5 @@
 # c:\0124newSIm\src\name_generator.py
-import random
+from rng import rng
 
 # 日本人の姓 (Top 100)
 LAST_NAMES = [
@@ -92,40 +92,46 @@ SUPPLIER_SUFFIXES = [
     "マニュファクチャリング", "クリエイション", "ラボ", "研究所", "本店", "商会", "ファクトリー", "産業"
 ]
 
+def _rand():
+    # 名前生成専用のストリーム (他の乱数の系列に影響しない)
+    return rng.stream('names')
+
 def generate_person_name(gender):
-    last = random.choice(LAST_NAMES)
-    first = random.choice(FIRST_NAMES_M if gender == "M" else FIRST_NAMES_F)
+    last = _rand().choice(LAST_NAMES)
+    first = _rand().choice(FIRST_NAMES_M if gender == "M" else FIRST_NAMES_F)
     return f"{last} {first}"
 
 def generate_company_name(type_):
     if type_ == 'npc_maker':
         # 英語風のかっこいい名前
-        prefix = random.choice(MAKER_PREFIXES)
-        suffix = random.choice(MAKER_SUFFIXES)
+        prefix = _rand().choice(MAKER_PREFIXES)
+        suffix = _rand().choice(MAKER_SUFFIXES)
         return f"{prefix} {suffix}"
     elif type_ == 'npc_retail':
         # 日本語風の親しみやすい名前
-        prefix = random.choice(RETAIL_PREFIXES)
-        suffix = random.choice(RETAIL_SUFFIXES)
+        prefix = _rand().choice(RETAIL_PREFIXES)
+        suffix = _rand().choice(RETAIL_SUFFIXES)
         return f"{prefix}{suffix}"
     else:
-        return f"Company {random.randint(100, 999)}"
+        return f"Company {_rand().randint(100, 999)}"
 
-def generate_product_name(strategy=None):
+def generate_product_name(strategy=None, rand=None):
     # 戦略に応じて傾向を変えることも可能だが、まずはランダム
-    part_a = random.choice(PRODUCT_NAMES_A)
+    # rand: 企業ごとのストリームを渡すと、他社の処理順序に依存しない名前になる
+    rand = rand or _rand()
+    part_a = rand.choice(PRODUCT_NAMES_A)
     
     # 40%の確率で単語のみ、60%で2単語
-    if random.random() < 0.4:
+    if rand.random() < 0.4:
         return part_a
     else:
-        part_b = random.choice(PRODUCT_NAMES_B)
+        part_b = rand.choice(PRODUCT_NAMES_B)
         return f"{part_a} {part_b}"
 
 def generate_facility_name(type_):
     if type_ == 'office':
-        name = random.choice(BUILDING_NAMES)
-        floor = random.randint(1, 40)
+        name = _rand().choice(BUILDING_NAMES)
+        floor = _rand().randint(1, 40)
         return f"{name} {floor}F"
     elif type_ == 'factory':
         names = [
@@ -133,17 +139,17 @@ def generate_facility_name(type_):
             "千葉製造所", "群馬製作所", "栃木工場", "静岡事業所", "愛知工場", "大阪製造部", "九州工場", "北海道工場",
             "アドバンスド・マニュファクチャリング・センター", "グローバル生産センター", "試作開発センター", "部品センター"
         ]
-        return random.choice(names)
+        return _rand().choice(names)
     elif type_ == 'store':
         names = [
             "本店", "駅前店", "中央通り店", "バイパス店", "港店", "南店", "北店", "ショッピングモール店", "銀座店", "表参道店",
             "新宿店", "渋谷店", "池袋店", "横浜店", "梅田店", "難波店", "博多店", "札幌店", "仙台店", "名古屋店",
             "アウトレットパーク店", "メガストア", "フラッグシップストア", "サテライトショップ", "ショールーム"
         ]
-        return random.choice(names)
+        return _rand().choice(names)
     return "未設定"
 
 def generate_supplier_name(part_label=""):
-    prefix = random.choice(SUPPLIER_PREFIXES)
-    suffix = random.choice(SUPPLIER_SUFFIXES)
+    prefix = _rand().choice(SUPPLIER_PREFIXES)
+    suffix = _rand().choice(SUPPLIER_SUFFIXES)
     return f"{prefix}{suffix}"
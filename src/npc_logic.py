@@ -5,12 +5,26 @@ import json
 import math
 import random
 from database import db
+from actions import (SetPhase, TakeLoan, RaiseSalary, PostRequisition, FireEmployee, PromoteEmployee,
+                     ProduceGoods, StartDevelopment, PlaceB2BOrder, AcceptB2BOrder, RejectB2BOrder,
+                     ContractFacility, ReleaseFacility, RunAdvertising, SetPrice, SetRetailPrice,
+                     ApplyIPO, IssueShares, BuybackShares, PayDividend)
 import gamebalance as gb
 import name_generator
+from rng import rng
+import aptitudes
+import ledger
+import stock_logic
+from perf import perf
 
 class NPCLogic:
+    """
+    1社分の意思決定を行う。DBへは書き込まず、決定内容をアクションとして self.actions に積む。
+    アクションの検証・適用は Simulation.apply_actions が全社分まとめて行う。
+    """
     def __init__(self, company_id, company_data=None, employees=None):
         self.company_id = company_id
+        self.actions = []
         if company_data:
             self.company = dict(company_data)
         else:
@@ -67,16 +81,44 @@ class NPCLogic:
         # 0-100 -> 0.0-1.0
         return min(1.0, max(0.0, weighted_score / 100.0))
 
+    def _emit(self, action_cls, current_week, log=None, **values):
+        """アクションを出力する (log: 適用時に書き出すイベントログ (event_type, details))"""
+        action = action_cls(self.company_id, current_week, log=log, **values)
+        self.actions.append(action)
+        return action
+
+    def _pending(self, action_cls):
+        return [a for a in self.actions if isinstance(a, action_cls)]
+
+    # ---------------------------------------------------------
+    # 今週出力済みのアクションを反映した自社の状態
+    # (アクションは週の意思決定がすべて終わってから適用されるため、後続の判断ではここで補う)
+    # ---------------------------------------------------------
+    def _total_debt(self):
+        res = db.fetch_one("SELECT SUM(amount) as total FROM loans WHERE company_id = ?", (self.company_id,))
+        return (res['total'] or 0) + sum(a.amount for a in self._pending(TakeLoan))
+
+    def _facilities(self):
+        released = {a.facility_id for a in self._pending(ReleaseFacility)}
+        facilities = [dict(f) for f in db.fetch_all("SELECT id, type, size, rent, is_owned, division_id FROM facilities WHERE company_id = ?", (self.company_id,))
+                      if f['id'] not in released]
+        for a in self._pending(ContractFacility):
+            facilities.append({'id': a.facility_id, 'type': a.facility_type, 'size': a.size, 'rent': a.rent,
+                               'is_owned': 1 if a.purchase_price is not None else 0, 'division_id': a.division_id})
+        return facilities
+
     def _calculate_weekly_fixed_costs(self):
         """固定費（人件費、家賃、金利）の週次合計を算出"""
         # Labor
         labor = sum(e['salary'] * gb.NPC_SCALE_FACTOR for e in self.employees) / gb.WEEKS_PER_YEAR_REAL
         # Rent
-        rent = db.fetch_one("SELECT SUM(rent) as total FROM facilities WHERE company_id = ? AND is_owned = 0", (self.company_id,))['total'] or 0
+        rent = sum(f['rent'] for f in self._facilities() if not f['is_owned'])
         # Interest
-        interest = (db.fetch_one("SELECT SUM(amount * interest_rate) as total FROM loans WHERE company_id = ?", (self.company_id,))['total'] or 0) / 52.0
-        return int(labor + rent + interest)
+        interest = db.fetch_one("SELECT SUM(amount * interest_rate) as total FROM loans WHERE company_id = ?", (self.company_id,))['total'] or 0
+        interest += sum(a.amount * a.interest_rate for a in self._pending(TakeLoan))
+        return int(labor + rent + interest / 52.0)
 
+    @perf.timed()
     def update_phase(self, current_week):
         """企業の現状分析を行い、フェーズを決定する"""
         old_phase = self.phase
@@ -84,22 +126,16 @@ class NPCLogic:
         fixed_costs = self._calculate_weekly_fixed_costs()
         
         # 借入余力
-        loans = db.fetch_one("SELECT SUM(amount) as total FROM loans WHERE company_id = ?", (self.company_id,))
-        current_debt = loans['total'] or 0
+        current_debt = self._total_debt()
         borrowing_limit = self.company['borrowing_limit']
         credit_room = borrowing_limit - current_debt
         
         # 直近の収益性 (4週間)
-        recent_pl = db.fetch_one("""
-            SELECT 
-                SUM(CASE WHEN category = 'revenue' THEN amount ELSE 0 END) as revenue,
-                SUM(CASE WHEN category IN ('cogs', 'labor', 'rent', 'ad', 'interest') THEN amount ELSE 0 END) as expenses
-            FROM account_entries 
-            WHERE company_id = ? AND week >= ?
-        """, (self.company_id, current_week - 4))
+        recent_pl = ledger.totals(self.company_id, current_week - 4, current_week,
+                                  ('revenue', 'cogs', 'labor', 'rent', 'ad', 'interest'))
         
-        revenue = recent_pl['revenue'] or 0
-        expenses = recent_pl['expenses'] or 0
+        revenue = recent_pl.pop('revenue', 0) or 0
+        expenses = sum(recent_pl.values())
         profit = revenue - expenses
         profit_margin = profit / revenue if revenue > 0 else -1.0
 
@@ -120,12 +156,14 @@ class NPCLogic:
         else:
             self.phase = 'STABLE'
             
+        log = None
         if self.phase != old_phase:
-             db.log_file_event(current_week, self.company_id, "Phase Change", f"Changed phase from {old_phase} to {self.phase}")
+             log = ("Phase Change", f"Changed phase from {old_phase} to {self.phase}")
 
         # フェーズを統計情報として保存
-        db.set_weekly_stat(current_week, self.company_id, 'phase', self.phase)
+        self._emit(SetPhase, current_week, log=log, phase=self.phase)
 
+    @perf.timed()
     def decide_financing(self, current_week):
         """
         資金調達: 運転資金が心許ない場合、借入を行う
@@ -146,8 +184,7 @@ class NPCLogic:
 
         if self.company['funds'] < target_funds:
             # 借入可能額を確認
-            current_loans = db.fetch_one("SELECT SUM(amount) as total FROM loans WHERE company_id = ?", (self.company_id,))
-            total_loans = current_loans['total'] if current_loans['total'] else 0
+            total_loans = self._total_debt()
             
             limit = self.company['borrowing_limit']
             borrowable = limit - total_loans
@@ -170,11 +207,10 @@ class NPCLogic:
                 rate = gb.INTEREST_RATE_MAX - ((rating / 100.0) * (gb.INTEREST_RATE_MAX - gb.INTEREST_RATE_MIN))
                 rate = max(gb.INTEREST_RATE_MIN, rate)
 
-                db.execute_query("INSERT INTO loans (company_id, amount, interest_rate, remaining_weeks) VALUES (?, ?, ?, ?)",
-                                 (self.company_id, int(amount), rate, gb.LOAN_TERM_WEEKS))
-                db.execute_query("UPDATE companies SET funds = funds + ? WHERE id = ?", (int(amount), self.company_id))
-                db.log_file_event(current_week, self.company_id, "Financing", f"Borrowed {amount} yen")
+                self._emit(TakeLoan, current_week, log=("Financing", f"Borrowed {amount} yen"),
+                           amount=int(amount), interest_rate=rate, remaining_weeks=gb.LOAN_TERM_WEEKS)
 
+    @perf.timed()
     def decide_salary(self, current_week):
         """
         給与査定: 希望給与と現在給与に乖離がある従業員に対し、予算の範囲内で昇給を行う
@@ -192,14 +228,15 @@ class NPCLogic:
                 is_important = emp['role'] in [gb.ROLE_MANAGER, gb.ROLE_CXO, gb.ROLE_CEO]
                 is_risk = emp['loyalty'] < 40
                 
-                if is_important or is_risk or random.random() < 0.3:
+                if is_important or is_risk or rng.for_company(self.company_id, 'salary').random() < 0.3:
                     new_salary = emp['desired_salary']
-                    db.execute_query("UPDATE npcs SET salary = ? WHERE id = ?", (new_salary, emp['id']))
-                    db.log_file_event(current_week, self.company_id, "HR Salary", f"Increased salary for {emp['name']} to {new_salary}")
+                    self._emit(RaiseSalary, current_week, log=("HR Salary", f"Increased salary for {emp['name']} to {new_salary}"),
+                               npc_id=emp['id'], salary=new_salary)
 
-    def decide_hiring(self, current_week, candidates_pool=None, all_caps=None):
+    @perf.timed()
+    def decide_hiring(self, current_week, all_caps=None):
         """
-        採用計画: 目標達成に必要なキャパシティと現状を比較し、不足分を採用する
+        採用計画: 目標達成に必要なキャパシティと現状を比較し、不足分の求人を出す
         """
         if not self.company: return
         
@@ -211,25 +248,9 @@ class NPCLogic:
         if self.phase == 'GROWTH':
             max_offers = 15
 
-        # 既にオファーを出している件数を確認
-        current_offers_cnt = db.fetch_one("SELECT COUNT(*) as cnt FROM job_offers WHERE company_id = ?", (self.company_id,))['cnt']
-        
         # 今回使える枠 (人事は別枠で追加可能とするため、ここではベース枠)
-        available_offers = max_offers - current_offers_cnt
-        if available_offers < 0: available_offers = 0
-
-        # 今回のループでオファーを出したNPCのIDを記録（重複防止）
-        offered_npc_ids = set()
-        
-        # 候補者リストが渡されていない場合はDBから取得 (フォールバック)
-        if candidates_pool is None:
-            candidates_pool = db.fetch_all("SELECT * FROM npcs WHERE company_id IS NULL LIMIT 100")
-
-        # 自社に再雇用禁止期間中の候補者を除外
-        filtered_candidates = [
-            c for c in candidates_pool 
-            if c['last_company_id'] != self.company_id or (current_week - c['last_resigned_week']) >= gb.REHIRE_PROHIBITION_WEEKS
-        ]
+        # 求人は週内にマッチングで解消されるため、週初に出ているNPC企業の求人はない
+        available_offers = max_offers
 
         # ---------------------------------------------------------
         # 1. 人事部 (HR) の優先採用 (別枠判定)
@@ -254,10 +275,8 @@ class NPCLogic:
             needed_hr = math.ceil(shortage_cap / (50 * gb.NPC_SCALE_FACTOR))
             if needed_hr < 1: needed_hr = 1
             
-            # 人事採用実行 (別枠として実行)
-            self._process_hiring_round(
-                current_week, gb.DEPT_HR, needed_hr, filtered_candidates, offered_npc_ids
-            )
+            # 人事の求人 (別枠として実行)
+            self._post_requisition(current_week, gb.DEPT_HR, needed_hr)
 
         # ---------------------------------------------------------
         # 2. 通常採用 (事業計画に基づく)
@@ -372,99 +391,43 @@ class NPCLogic:
                 target_dept = best_dept
         
         if not target_dept:
-            target_dept = random.choice(gb.DEPARTMENTS)
+            target_dept = rng.for_company(self.company_id, 'hiring').choice(gb.DEPARTMENTS)
 
         if available_offers <= 0: return
 
-        # 通常採用実行
-        self._process_hiring_round(
-            current_week, target_dept, available_offers, filtered_candidates, offered_npc_ids
-        )
+        # 通常の求人
+        self._post_requisition(current_week, target_dept, available_offers)
 
-    def _process_hiring_round(self, current_week, target_dept, count, candidates, offered_npc_ids):
+    def _post_requisition(self, current_week, target_dept, count):
         """
-        指定された部署・人数分の採用オファー処理を行う
+        指定された部署・人数分の求人を出す。
+        誰を採用するかは process_hr の労働市場マッチングで全社分まとめて決まる (labor_market.py)。
         """
         if count <= 0: return 0
-        
+
+        # 予算チェック (年収の2倍程度の余裕があるか)
+        if self.company['funds'] < gb.BASE_SALARY_YEARLY * gb.NPC_SCALE_FACTOR * 2:
+            return 0
+
         # ターゲット業界の特定 (最初の事業部の業界とする)
         target_industry = self.divisions[0]['industry_key'] if self.divisions else 'automotive'
-        
-        # 人事担当者の能力取得
+
+        # 人事担当者の能力による認知誤差の幅
         hr_employees = [e for e in self.employees if e['department'] == gb.DEPT_HR]
         avg_hr = sum([e['hr'] for e in hr_employees]) / len(hr_employees) if hr_employees else 0
-        
-        # 人事能力による誤差範囲の計算
         error_range = 40 - (36 * (min(100, avg_hr) / 100.0))
-        half_range = error_range / 2.0
-        
-        # CEOの判断精度
+
+        # CEOの判断精度による評価のブレ
         ceo_precision = self._get_ceo_precision('hr')
-        
-        offers_made = 0
-        
-        for _ in range(count):
-            # 予算チェック (年収の2倍程度の余裕があるか)
-            if self.company['funds'] < gb.BASE_SALARY_YEARLY * gb.NPC_SCALE_FACTOR * 2:
-                break
-
-            best_candidate = None
-            best_score = -1
-
-            for cand in candidates:
-                # 今回のループで既にオファー済みならスキップ
-                if cand['id'] in offered_npc_ids:
-                    continue
-
-                # 能力値をファジー化して認知
-                perceived_stats = {}
-                for stat in ['production', 'development', 'sales', 'hr', 'store_ops']:
-                    perceived_stats[stat] = cand[stat] + random.uniform(-half_range, half_range)
-
-                # 業界適性の取得
-                apts = json.loads(cand['aptitudes']) if cand['aptitudes'] else {}
-                apt_val = apts.get(target_industry, 0.1)
-                
-                # ターゲット部署の能力値 * 適性 で評価
-                stat_val = 0
-                if target_dept == gb.DEPT_PRODUCTION: stat_val = perceived_stats['production']
-                elif target_dept == gb.DEPT_DEV: stat_val = perceived_stats['development']
-                elif target_dept == gb.DEPT_SALES: stat_val = perceived_stats['sales']
-                elif target_dept == gb.DEPT_HR: stat_val = perceived_stats['hr']
-                elif target_dept == gb.DEPT_STORE: stat_val = perceived_stats['store_ops']
-                else: stat_val = max(perceived_stats.values())
-                
-                # 適性を反映
-                stat_val *= apt_val
-                
-                # ROI (能力/給与) でスコアリング
-                desired = cand['desired_salary']
-                if desired == 0: desired = cand['salary']
-                if desired == 0: desired = gb.BASE_SALARY_YEARLY
-                
-                noise_range = 0.4 * (1.0 - ceo_precision)
-                evaluation_noise = random.uniform(1.0 - noise_range, 1.0 + noise_range)
-                score = (stat_val / desired) * evaluation_noise
-                
-                if score > best_score:
-                    best_score = score
-                    best_candidate = cand
-            
-            if best_candidate:
-                # オファー発行
-                offer_salary = best_candidate['desired_salary'] if best_candidate['desired_salary'] > 0 else gb.BASE_SALARY_YEARLY
-                
-                db.execute_query("INSERT INTO job_offers (week, company_id, npc_id, offer_salary, target_dept) VALUES (?, ?, ?, ?, ?)",
-                                 (current_week, self.company_id, best_candidate['id'], offer_salary, target_dept))
-                
-                db.log_file_event(current_week, self.company_id, "HR Hiring Offer", f"Offered {offer_salary} yen to {best_candidate['name']} (ID: {best_candidate['id']}) for {target_dept}")
-                offered_npc_ids.add(best_candidate['id'])
-                offers_made += 1
-            else:
-                break # 候補者がいなければ終了
-        
-        return offers_made
+        noise_range = 0.4 * (1.0 - ceo_precision)
 
+        self._emit(PostRequisition, current_week,
+                   log=("HR Requisition", f"Posted {count} openings for {target_dept}"),
+                   target_dept=target_dept, count=count, industry_key=target_industry,
+                   stat_error=error_range, eval_noise=noise_range)
+        return count
+
+    @perf.timed()
     def decide_restructuring(self, current_week):
         """
         リストラ策: CRISISフェーズで赤字の場合、人員削減や施設解約を行う
@@ -500,13 +463,9 @@ class NPCLogic:
         targets = scored_candidates[:fire_count]
         
         for _, target in targets:
-            db.execute_query("""
-                UPDATE npcs SET company_id = NULL, department = NULL, role = NULL, 
-                last_resigned_week = ?, last_company_id = ?, loyalty = 50 
-                WHERE id = ?
-            """, (current_week, self.company_id, target['id']))
-            db.log_file_event(current_week, self.company_id, "Restructuring", f"Fired {target['name']} to cut costs")
+            self._emit(FireEmployee, current_week, log=("Restructuring", f"Fired {target['name']} to cut costs"), npc_id=target['id'])
 
+    @perf.timed()
     def decide_promotion(self, current_week):
         """
         人事異動: 
@@ -537,8 +496,8 @@ class NPCLogic:
                 candidates.sort(key=lambda x: x['management'] + x['adaptability'], reverse=True)
                 
                 best = candidates[0]
-                db.execute_query("UPDATE npcs SET role = ? WHERE id = ?", (gb.ROLE_MANAGER, best['id']))
-                db.log_file_event(current_week, self.company_id, "HR Promotion", f"Promoted {best['name']} to Manager")
+                self._emit(PromoteEmployee, current_week, log=("HR Promotion", f"Promoted {best['name']} to Manager"),
+                           npc_id=best['id'], role=gb.ROLE_MANAGER)
             
             # CxOが不在かつ、部長がいる場合
             if not dept_cxos[dept] and dept_managers[dept]:
@@ -549,9 +508,10 @@ class NPCLogic:
                 best = candidates[0]
                 # 役員適正が一定以上ならCxOへ昇進
                 if best['executive'] >= 40:
-                    db.execute_query("UPDATE npcs SET role = ? WHERE id = ?", (gb.ROLE_CXO, best['id']))
-                    db.log_file_event(current_week, self.company_id, "HR Promotion", f"Promoted {best['name']} to CxO")
+                    self._emit(PromoteEmployee, current_week, log=("HR Promotion", f"Promoted {best['name']} to CxO"),
+                               npc_id=best['id'], role=gb.ROLE_CXO)
 
+    @perf.timed()
     def decide_weekly_targets(self, current_week, designs, inventory, b2b_sales_history, market_total_sales_4w, economic_index, maker_stocks=None):
         """
         週次目標設定: シェア目標 -> 在庫目標 -> 生産/仕入目標 -> 必要キャパシティ算出
@@ -747,6 +707,7 @@ class NPCLogic:
         req_admin_ppl = total_emp_est * 0.1
         self.plan['required_facility']['office'] = int(req_sales_ppl + req_dev_ppl + req_admin_ppl)
 
+    @perf.timed()
     def decide_production(self, current_week, designs, inventory, b2b_sales_history, market_total_sales_4w, economic_index):
         """
         メーカー用: 生産計画
@@ -765,8 +726,7 @@ class NPCLogic:
     def _decide_production_for_division(self, current_week, designs, inventory, b2b_sales_history, market_total_sales_4w, economic_index, division):
         # 生産能力の算出 (週あたりの生産可能台数)
         # 1. 施設容量チェック
-        facilities = db.fetch_all("SELECT size FROM facilities WHERE company_id = ? AND division_id = ? AND type = 'factory'", (self.company_id, division['id']))
-        total_factory_size = sum(f['size'] for f in facilities)
+        total_factory_size = sum(f['size'] for f in self._facilities() if f['division_id'] == division['id'] and f['type'] == 'factory')
         
         # フォールバック: 施設データがない場合でも、生産部員がいれば最低限(10)のキャパシティがあるとみなす
         if total_factory_size == 0:
@@ -806,7 +766,7 @@ class NPCLogic:
             # 端数は確率的に切り上げ (例: 9.8台作れる能力なら80%の確率で10台、20%で9台)
             float_produce = total_man_power * design_eff
             max_produce = int(float_produce)
-            if random.random() < (float_produce - max_produce):
+            if rng.for_company(self.company_id, 'production').random() < (float_produce - max_produce):
                 max_produce += 1
             
             to_produce = min(to_produce, max_produce)
@@ -825,7 +785,7 @@ class NPCLogic:
             # 資金計算の改善: CRISIS時や在庫切れ時は、借入枠も含めて全力で生産する
             available_funds = max(0, self.company['funds'] - (fixed_costs * 4)) 
             if self.phase == 'CRISIS' or current_stock == 0:
-                credit_room = self.company['borrowing_limit'] - (db.fetch_one("SELECT SUM(amount) as total FROM loans WHERE company_id = ?", (self.company_id,))['total'] or 0)
+                credit_room = self.company['borrowing_limit'] - self._total_debt()
                 available_funds = self.company['funds'] + credit_room
 
             if available_funds < total_cost and total_cost > 0:
@@ -834,30 +794,20 @@ class NPCLogic:
             
             if to_produce > 0:
                 # 生産実行 (資金消費と在庫増加)
-                db.execute_query("UPDATE companies SET funds = funds - ? WHERE id = ?", (total_cost, self.company_id))
-                db.execute_query("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, 'material', ?)",
-                                 (current_week, self.company_id, total_cost))
+                self._emit(ProduceGoods, current_week, log=("Production", f"Produced {to_produce} units of {design['name']}"),
+                           design_id=design['id'], quantity=to_produce, cost=total_cost,
+                           inventory_id=stock_item['id'] if stock_item else None, sales_price=design['sales_price'])
                 
                 # 資金がマイナスになった場合、即座に借入を実行して埋める (キャッシュ不足による倒産判定回避のため)
                 if self.company['funds'] - total_cost < 0:
                     deficit = abs(self.company['funds'] - total_cost) + 10000000
-                    db.execute_query("INSERT INTO loans (company_id, amount, interest_rate, remaining_weeks) VALUES (?, ?, ?, ?)",
-                                     (self.company_id, deficit, 0.15, gb.LOAN_TERM_WEEKS)) # 緊急借入は金利高め
-                    db.execute_query("UPDATE companies SET funds = funds + ? WHERE id = ?", (deficit, self.company_id))
-                
-                if stock_item:
-                    db.execute_query("UPDATE inventory SET quantity = quantity + ? WHERE id = ?", (to_produce, stock_item['id']))
-                else:
-                    db.execute_query("INSERT INTO inventory (company_id, design_id, quantity, sales_price) VALUES (?, ?, ?, ?)", 
-                                     (self.company_id, design['id'], to_produce, design['sales_price']))
+                    self._emit(TakeLoan, current_week, amount=deficit, interest_rate=0.15, remaining_weeks=gb.LOAN_TERM_WEEKS) # 緊急借入は金利高め
                 
                 # キャパシティ消費 (簡易的に、この製品に全力を注いだ分を減算)
                 used_capacity = to_produce / design_eff if design_eff > 0 else 0
                 total_man_power -= used_capacity
-                db.log_file_event(current_week, self.company_id, "Production", f"Produced {to_produce} units of {design['name']}")
-                db.increment_weekly_stat(current_week, self.company_id, 'production_ordered', to_produce)
-                db.increment_weekly_stat(current_week, self.company_id, 'production_completed', to_produce)
 
+    @perf.timed()
     def decide_procurement(self, current_week, maker_stocks, my_capabilities, all_capabilities, my_inventory, on_order=None):
         """
         小売用: 仕入れ計画
@@ -873,8 +823,7 @@ class NPCLogic:
 
         # CRISIS時は予算制限を緩和 (売るものがないと死ぬ)
         if self.phase == 'CRISIS' and sum(i['quantity'] for i in my_inventory) < 10:
-             loans = db.fetch_one("SELECT SUM(amount) as total FROM loans WHERE company_id = ?", (self.company_id,))
-             credit_room = self.company['borrowing_limit'] - (loans['total'] or 0)
+             credit_room = self.company['borrowing_limit'] - self._total_debt()
              budget = self.company['funds'] + credit_room
 
         # all_capabilities は事前計算済み
@@ -919,10 +868,10 @@ class NPCLogic:
             
             # 評価のブレ: CEOの能力が低いと商品の価値を見誤る
             noise_range = 0.3 * (1.0 - ceo_precision) # 最大±30%
-            perception_noise = random.uniform(1.0 - noise_range, 1.0 + noise_range)
+            perception_noise = rng.for_company(self.company_id, 'procurement').uniform(1.0 - noise_range, 1.0 + noise_range)
             
             # 直感・相性 (Gut Feeling): 数値化できない相性や営業担当の印象など
-            gut_feeling = random.uniform(0.9, 1.1)
+            gut_feeling = rng.for_company(self.company_id, 'procurement').uniform(0.9, 1.1)
             
             # 利益率 (Retailer Margin)
             # 小売価格(MSRP) - 仕入れ値(actual_price)
@@ -942,7 +891,7 @@ class NPCLogic:
         
         # スコア順にソート
         # 同スコア時の順序をランダムにするため、先にシャッフルしておく
-        random.shuffle(scored_items)
+        rng.for_company(self.company_id, 'procurement').shuffle(scored_items)
         scored_items.sort(key=lambda x: x['score'], reverse=True)
 
         # --- 仕入れロジック改善 ---
@@ -1010,7 +959,7 @@ class NPCLogic:
             # 必要数のシェア分を仕入れる (残数ではなく初期必要数をベースにする)
             float_buy_qty = initial_needed_total * share
             ideal_buy_qty = int(float_buy_qty)
-            if random.random() < (float_buy_qty - ideal_buy_qty):
+            if rng.for_company(self.company_id, 'procurement').random() < (float_buy_qty - ideal_buy_qty):
                 ideal_buy_qty += 1
             
             # 予算から買える数を計算
@@ -1023,21 +972,14 @@ class NPCLogic:
             
             cost = buy_qty * item['actual_price']
                 
-            # 発注 (B2B Orders)
-            db.execute_query("""
-                INSERT INTO b2b_orders (week, buyer_id, seller_id, design_id, quantity, amount, status)
-                VALUES (?, ?, ?, ?, ?, ?, 'pending')
-            """, (current_week, self.company_id, item['maker_id'], item['design_id'], buy_qty, cost))
-            
-            db.log_file_event(current_week, self.company_id, "B2B Order", f"Ordered {buy_qty} units from Maker ID {item['maker_id']} for {cost} yen")
-            
-            # 売り手（プレイヤー等）にも通知を出す
-            db.execute_query("INSERT INTO news_logs (week, company_id, message, type) VALUES (?, ?, ?, ?)",
-                             (current_week, item['maker_id'], f"{self.company['name']} から {buy_qty}台 の注文が入りました (営業画面で確認してください)", 'info'))
+            # 発注 (B2B Orders)。売り手（プレイヤー等）への通知は適用時に出す
+            self._emit(PlaceB2BOrder, current_week, log=("B2B Order", f"Ordered {buy_qty} units from Maker ID {item['maker_id']} for {cost} yen"),
+                       seller_id=item['maker_id'], design_id=item['design_id'], quantity=buy_qty, amount=cost)
             
             budget -= cost
             needed_total -= buy_qty
 
+    @perf.timed()
     def decide_development(self, current_week, designs):
         """
         メーカー用: 商品開発計画
@@ -1064,7 +1006,7 @@ class NPCLogic:
         is_underperforming = current_share < fair_share * 0.8
 
         # 製品が2つ未満、またはランダム（新陳代謝）で新規開発
-        if completed_count < 2 or random.random() < 0.05 or (is_underperforming and random.random() < 0.2):
+        if completed_count < 2 or rng.for_company(self.company_id, 'development').random() < 0.05 or (is_underperforming and rng.for_company(self.company_id, 'development').random() < 0.2):
             # コンセプト決定 (1.0 - 5.0)
             # 企業の得意分野などがまだないのでランダム
             # コンセプトスコア等は開発完了時にStrategyに基づいて決定するため、ここでは仮置き
@@ -1112,11 +1054,11 @@ class NPCLogic:
                 elif orientation == 'value':
                     supplier = sorted(suppliers, key=lambda x: x['trait_cost_multiplier'])[0]
                 else:
-                    supplier = random.choice(suppliers)
+                    supplier = rng.for_company(self.company_id, 'development').choice(suppliers)
                 
                 # 部品調達のブレ (Quality/Cost Fluctuation): ロット差や交渉による変動 (±10%)
-                quality_fluctuation = random.uniform(0.90, 1.10)
-                cost_fluctuation = random.uniform(0.90, 1.10)
+                quality_fluctuation = rng.for_company(self.company_id, 'development').uniform(0.90, 1.10)
+                cost_fluctuation = rng.for_company(self.company_id, 'development').uniform(0.90, 1.10)
                 p_score = supplier['trait_material_score'] * quality_fluctuation
                 p_cost = int(part['base_cost'] * supplier['trait_cost_multiplier'] * cost_fluctuation)
 
@@ -1141,18 +1083,14 @@ class NPCLogic:
                 # バランス
                 strategy = gb.DEV_STRATEGY_BALANCED
 
-            name = name_generator.generate_product_name(strategy)
+            name = name_generator.generate_product_name(strategy, rand=rng.for_company(self.company_id, 'development'))
             
-            # DBに登録 (status='developing')
-            # base_price, sales_price は完成時に確定するため仮置き
-            db.execute_query("""
-                INSERT INTO product_designs
-                (company_id, division_id, industry_key, name, material_score, concept_score, production_efficiency, base_price, sales_price, status, strategy, developed_week, parts_config)
-                VALUES (?, ?, ?, ?, ?, 0, 0, 0, 0, 'developing', ?, ?, ?)
-            """, (self.company_id, division['id'], ind_key, name, avg_material_score, strategy, current_week, json.dumps(parts_config)))
-            db.log_file_event(current_week, self.company_id, "Development Start", f"Started development of {name}")
-            db.increment_weekly_stat(current_week, self.company_id, 'development_ordered', 1)
+            # 設計書の登録 (status='developing')。base_price, sales_price は完成時に確定する
+            self._emit(StartDevelopment, current_week, log=("Development Start", f"Started development of {name}"),
+                       division_id=division['id'], industry_key=ind_key, name=name, material_score=avg_material_score,
+                       strategy=strategy, parts_config=json.dumps(parts_config))
 
+    @perf.timed()
     def decide_order_fulfillment(self, current_week, orders, inventory):
         """
         メーカー用: 受注処理
@@ -1182,21 +1120,19 @@ class NPCLogic:
 
                 # 注文情報を更新して受注
                 if fulfill_qty < qty:
-                    db.execute_query("UPDATE b2b_orders SET quantity = ?, amount = ?, status = 'accepted' WHERE id = ?", 
-                                     (fulfill_qty, new_amount, order['id']))
-                    db.log_file_event(current_week, self.company_id, "B2B Partial Accept", f"Partially Accepted Order ID {order['id']} ({fulfill_qty}/{qty} units)")
+                    self._emit(AcceptB2BOrder, current_week, log=("B2B Partial Accept", f"Partially Accepted Order ID {order['id']} ({fulfill_qty}/{qty} units)"),
+                               order_id=order['id'], quantity=fulfill_qty, amount=new_amount)
                 else:
-                    db.execute_query("UPDATE b2b_orders SET status = 'accepted' WHERE id = ?", (order['id'],))
-                    db.log_file_event(current_week, self.company_id, "B2B Accept", f"Accepted Order ID {order['id']} ({qty} units)")
+                    self._emit(AcceptB2BOrder, current_week, log=("B2B Accept", f"Accepted Order ID {order['id']} ({qty} units)"), order_id=order['id'])
                 
                 # メモリ上の在庫を即座に減らす
                 item['quantity'] -= fulfill_qty
                 
             else:
                 # 在庫ゼロのため拒否
-                db.execute_query("UPDATE b2b_orders SET status = 'rejected' WHERE id = ?", (order['id'],))
-                db.log_file_event(current_week, self.company_id, "B2B Reject", f"Rejected Order ID {order['id']} (No Stock)")
+                self._emit(RejectB2BOrder, current_week, log=("B2B Reject", f"Rejected Order ID {order['id']} (No Stock)"), order_id=order['id'])
 
+    @perf.timed()
     def decide_facilities(self, current_week):
         """
         施設管理: 従業員数に合わせて施設を確保する。過剰な場合は解約する。
@@ -1236,7 +1172,7 @@ class NPCLogic:
         if self.phase == 'CRISIS': return
 
         # 現在の施設容量を確認
-        facilities = db.fetch_all("SELECT id, type, size, rent, is_owned FROM facilities WHERE company_id = ?", (self.company_id,))
+        facilities = self._facilities()
         current_cap = {'factory': 0, 'store': 0, 'office': 0}
         owned_facilities = {'factory': [], 'store': [], 'office': []}
         rented_facilities = {'factory': [], 'store': [], 'office': []}
@@ -1283,21 +1219,17 @@ class NPCLogic:
                     
                     if self.company['funds'] > purchase_price + 100000000:
                         # 購入
-                        db.execute_query("UPDATE facilities SET company_id = ?, division_id = ?, is_owned = 1 WHERE id = ?", 
-                                         (self.company_id, assign_div_id, available['id']))
-                        db.execute_query("UPDATE companies SET funds = funds - ? WHERE id = ?", (purchase_price, self.company_id))
-                        db.execute_query("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, 'facility_purchase', ?)",
-                                         (current_week, self.company_id, purchase_price))
+                        self._emit(ContractFacility, current_week, log=("Facility", f"Purchased {ftype} (Size: {available['size']})"),
+                                   facility_id=available['id'], division_id=assign_div_id, facility_type=ftype,
+                                   size=available['size'], rent=available['rent'], purchase_price=purchase_price)
                         
                         # メモリ上の資金も更新して、ループ内の次回の判定に反映させる (過剰購入防止)
                         self.company['funds'] -= purchase_price
-                        
-                        db.log_file_event(current_week, self.company_id, "Facility", f"Purchased {ftype} (Size: {available['size']})")
                     else:
                         # 賃貸
-                        db.execute_query("UPDATE facilities SET company_id = ?, division_id = ?, is_owned = 0 WHERE id = ?", 
-                                         (self.company_id, assign_div_id, available['id']))
-                        db.log_file_event(current_week, self.company_id, "Facility", f"Rented {ftype} (Size: {available['size']})")
+                        self._emit(ContractFacility, current_week, log=("Facility", f"Rented {ftype} (Size: {available['size']})"),
+                                   facility_id=available['id'], division_id=assign_div_id, facility_type=ftype,
+                                   size=available['size'], rent=available['rent'])
                     
                     shortage -= available['size']
 
@@ -1320,8 +1252,8 @@ class NPCLogic:
                 
                 for fac in rented_list:
                     if excess >= fac['size'] * 0.8: # 8割以上過剰なら解約
-                        db.execute_query("UPDATE facilities SET company_id = NULL, division_id = NULL, is_owned = 0 WHERE id = ?", (fac['id'],))
-                        db.log_file_event(current_week, self.company_id, "Facility Release", f"Released {ftype} (Size: {fac['size']})")
+                        self._emit(ReleaseFacility, current_week, log=("Facility Release", f"Released {ftype} (Size: {fac['size']})"),
+                                   facility_id=fac['id'], facility_type=ftype, size=fac['size'])
                         excess -= fac['size']
                         if excess <= 0: break
 
@@ -1329,6 +1261,7 @@ class NPCLogic:
         release_facility('store', store_needs_keep, current_cap['store'], rented_facilities['store'])
         release_facility('office', office_needs_keep, current_cap['office'], rented_facilities['office'])
 
+    @perf.timed()
     def decide_advertising(self, current_week):
         """
         広告戦略: 資金に余裕があればブランド広告や商品広告を打つ
@@ -1337,8 +1270,7 @@ class NPCLogic:
 
         # 予算設定の適正化: 売上高連動型へ変更
         # 直近の売上を取得 (簡易的にaccount_entriesから)
-        recent_revenue_row = db.fetch_one("SELECT SUM(amount) as val FROM account_entries WHERE company_id = ? AND category = 'revenue' AND week = ?", (self.company_id, current_week - 1))
-        recent_revenue = recent_revenue_row['val'] if recent_revenue_row and recent_revenue_row['val'] else 0
+        recent_revenue = ledger.totals(self.company_id, current_week - 1, current_week - 1, ('revenue',)).get('revenue') or 0
         
         # 基本予算: 売上の10%。売上がない場合は手持ち資金の0.5%または200万円の小さい方（最低限の露出維持）
         # シェア低下時は予算を増額する (対抗策)
@@ -1373,11 +1305,8 @@ class NPCLogic:
         # 戦略決定
         # ブランド力が50未満ならブランド広告優先
         if self.company['brand_power'] < 50:
-            db.execute_query("UPDATE companies SET funds = funds - ?, brand_power = brand_power + ? WHERE id = ?",
-                             (spend_amount, effect, self.company_id))
-            db.execute_query("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, 'ad', ?)",
-                             (current_week, self.company_id, spend_amount))
-            db.log_file_event(current_week, self.company_id, "Advertising", f"Brand Ad (Budget: {spend_amount})")
+            self._emit(RunAdvertising, current_week, log=("Advertising", f"Brand Ad (Budget: {spend_amount})"),
+                       amount=spend_amount, brand_effect=effect)
         else:
             # 認知度が低い最新商品をプッシュ
             target_product = db.fetch_one("""
@@ -1387,12 +1316,10 @@ class NPCLogic:
             """, (self.company_id,))
             
             if target_product:
-                db.execute_query("UPDATE companies SET funds = funds - ? WHERE id = ?", (spend_amount, self.company_id))
-                db.execute_query("UPDATE product_designs SET awareness = awareness + ? WHERE id = ?", (effect * 2, target_product['id'])) # 商品広告は効果が出やすいとする
-                db.execute_query("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, 'ad', ?)",
-                                 (current_week, self.company_id, spend_amount))
-                db.log_file_event(current_week, self.company_id, "Advertising", f"Product Ad for {target_product['name']} (Budget: {spend_amount})")
+                self._emit(RunAdvertising, current_week, log=("Advertising", f"Product Ad for {target_product['name']} (Budget: {spend_amount})"),
+                           amount=spend_amount, design_id=target_product['id'], awareness_effect=effect * 2) # 商品広告は効果が出やすいとする
 
+    @perf.timed()
     def decide_pricing(self, current_week, designs, inventory, b2b_sales_history):
         """
         価格改定: 
@@ -1405,11 +1332,11 @@ class NPCLogic:
             
             # CEOの性格 (IDベースで固定の乱数シードを使用)
             # 1.0が標準。小さいほどせっかち（すぐ値下げ/値上げする）、大きいほどどっしり構える
-            random.seed(self.company_id)
-            patience = random.uniform(0.5, 1.5)
+            # (グローバルの乱数状態を汚さないよう専用のインスタンスを使う)
+            persona = random.Random(self.company_id)
+            patience = persona.uniform(0.5, 1.5)
             # 価格改定の積極性 (1.0=標準, >1.0=大幅に変える)
-            aggressiveness = random.uniform(0.8, 1.2)
-            random.seed() # シードリセット
+            aggressiveness = persona.uniform(0.8, 1.2)
 
             current_share = self.plan['stats'].get('current_share', 0)
             fair_share = self.plan['stats'].get('fair_share', 0.1)
@@ -1469,7 +1396,7 @@ class NPCLogic:
                     else:
                         drop_rate = gb.PRICE_ADJUST_RATE * aggressiveness * resistance
                     
-                    proposed_price = int(p['sales_price'] * (1.0 - drop_rate * random.uniform(0.8, 1.2)))
+                    proposed_price = int(p['sales_price'] * (1.0 - drop_rate * rng.for_company(self.company_id, 'pricing').uniform(0.8, 1.2)))
                     new_price = max(min_price, proposed_price)
                     
                 elif current_qty < shortage_threshold and max_weekly_sales > (10 / patience):
@@ -1488,11 +1415,10 @@ class NPCLogic:
                     else:
                         raise_rate = gb.PRICE_ADJUST_RATE * 0.5 * aggressiveness * boost
                     
-                    new_price = int(p['sales_price'] * (1.0 + raise_rate * random.uniform(0.8, 1.2)))
+                    new_price = int(p['sales_price'] * (1.0 + raise_rate * rng.for_company(self.company_id, 'pricing').uniform(0.8, 1.2)))
                 
                 if new_price != p['sales_price']:
-                    db.execute_query("UPDATE product_designs SET sales_price = ? WHERE id = ?", (new_price, p['id']))
-                    db.log_file_event(current_week, self.company_id, "Pricing", f"Changed MSRP of {p['name']} to {new_price}")
+                    self._emit(SetPrice, current_week, log=("Pricing", f"Changed MSRP of {p['name']} to {new_price}"), design_id=p['id'], price=new_price)
 
         elif self.company['type'] == 'npc_retail':
             # 小売: inventory の sales_price を更新
@@ -1508,8 +1434,9 @@ class NPCLogic:
                 # 売れ残りが多い場合は値下げするなどのロジックをここに追加可能
                 # 現状はMSRPに合わせる (メーカーが価格改定した場合に追従)
                 if s['sales_price'] != msrp:
-                    db.execute_query("UPDATE inventory SET sales_price = ? WHERE id = ?", (msrp, s['id']))
+                    self._emit(SetRetailPrice, current_week, inventory_id=s['id'], price=msrp)
 
+    @perf.timed()
     def decide_stock_action(self, current_week):
         """
         株式関連の意思決定 (IPO, 増資, 自社株買い)
@@ -1519,18 +1446,14 @@ class NPCLogic:
             # IPO要件チェック (簡易)
             funds = self.company['funds']
             inv_val = db.fetch_one("SELECT SUM(quantity * sales_price * 0.5) as val FROM inventory WHERE company_id = ?", (self.company_id,))['val'] or 0
-            fac_val = db.fetch_one("SELECT SUM(rent * 100) as val FROM facilities WHERE company_id = ? AND is_owned = 1", (self.company_id,))['val'] or 0
-            debt = db.fetch_one("SELECT SUM(amount) as val FROM loans WHERE company_id = ?", (self.company_id,))['val'] or 0
+            fac_val = sum(f['rent'] * 100 for f in self._facilities() if f['is_owned'])
+            debt = self._total_debt()
             
             net_assets = funds + inv_val + fac_val - debt
             
             # 黒字要件
-            profit_res = db.fetch_one("""
-                SELECT SUM(CASE WHEN category = 'revenue' THEN amount ELSE 0 END) - 
-                       SUM(CASE WHEN category NOT IN ('revenue', 'material', 'stock_purchase', 'facility_purchase', 'facility_sell', 'equity_finance') THEN amount ELSE 0 END) as profit
-                FROM account_entries WHERE company_id = ? AND week >= ?
-            """, (self.company_id, current_week - gb.IPO_MIN_PROFIT_WEEKS))
-            recent_profit = profit_res['profit'] or 0
+            recent_profit = ledger.profit(ledger.totals(self.company_id, current_week - gb.IPO_MIN_PROFIT_WEEKS, current_week),
+                                          stock_logic.IPO_EXCLUDED_CATEGORIES)
             
             is_eligible = (
                 net_assets >= gb.IPO_MIN_NET_ASSETS and
@@ -1540,8 +1463,7 @@ class NPCLogic:
             
             # 申請判断: GROWTHフェーズ または 資金調達が必要
             if is_eligible and (self.phase == 'GROWTH' or self.company['funds'] < net_assets * 0.2):
-                db.execute_query("UPDATE companies SET listing_status = 'applying' WHERE id = ?", (self.company_id,))
-                db.log_file_event(current_week, self.company_id, "IPO Application", "Applied for IPO")
+                self._emit(ApplyIPO, current_week, log=("IPO Application", "Applied for IPO"))
 
         # 2. 上場企業のアクション
         elif self.company['listing_status'] == 'public':
@@ -1560,10 +1482,8 @@ class NPCLogic:
                 issue_price = int(stock_price * 0.95) # 5%ディスカウント
                 raised_amount = new_shares * issue_price
                 
-                db.execute_query("UPDATE companies SET funds = funds + ?, outstanding_shares = outstanding_shares + ? WHERE id = ?", (raised_amount, new_shares, self.company_id))
-                db.execute_query("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, 'equity_finance', ?)", (current_week, self.company_id, raised_amount))
-                db.log_file_event(current_week, self.company_id, "Public Offering", f"Issued {new_shares} shares, raised {raised_amount}")
-                db.execute_query("INSERT INTO news_logs (week, company_id, message, type) VALUES (?, ?, ?, ?)", (current_week, self.company_id, f"公募増資を実施し、{raised_amount:,}円を調達しました。", 'market'))
+                self._emit(IssueShares, current_week, log=("Public Offering", f"Issued {new_shares} shares, raised {raised_amount}"),
+                           shares=new_shares, amount=raised_amount)
 
             # B. 自社株買い (Buyback)
             # 資金余剰 (STABLE/GROWTH) かつ 資金が潤沢 (20億円以上)
@@ -1572,20 +1492,15 @@ class NPCLogic:
                 buy_price = int(stock_price * 1.05)
                 buy_shares = int(budget / buy_price)
                 if buy_shares > 0:
-                    db.execute_query("UPDATE companies SET funds = funds - ?, outstanding_shares = outstanding_shares - ? WHERE id = ?", (budget, buy_shares, self.company_id))
-                    db.execute_query("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, 'equity_finance', ?)", (current_week, self.company_id, -budget))
-                    db.log_file_event(current_week, self.company_id, "Stock Buyback", f"Bought back {buy_shares} shares, cost {budget}")
+                    self._emit(BuybackShares, current_week, log=("Stock Buyback", f"Bought back {buy_shares} shares, cost {budget}"),
+                               shares=buy_shares, amount=budget)
 
             # C. 配当 (Dividends)
             # 四半期初め(1, 14, 27, 40週)に、前期の利益に基づいて配当を出す
             if (current_week - 1) % 13 == 0:
                 # 直近四半期の利益を確認
-                quarter_profit = db.fetch_one("""
-                    SELECT SUM(CASE WHEN category = 'revenue' THEN amount ELSE 0 END) - 
-                           SUM(CASE WHEN category NOT IN ('revenue', 'material', 'stock_purchase', 'facility_purchase', 'facility_sell', 'equity_finance') THEN amount ELSE 0 END) as profit
-                    FROM account_entries 
-                    WHERE company_id = ? AND week >= ?
-                """, (self.company_id, current_week - 13))['profit'] or 0
+                quarter_profit = ledger.profit(ledger.totals(self.company_id, current_week - 13, current_week),
+                                               stock_logic.IPO_EXCLUDED_CATEGORIES)
 
                 # 黒字 かつ 資金に余裕がある(固定費12週分以上)
                 fixed_costs = self._calculate_weekly_fixed_costs()
@@ -1596,7 +1511,5 @@ class NPCLogic:
                     
                     if dps > 0:
                         actual_payout = dps * shares
-                        db.execute_query("UPDATE companies SET funds = funds - ? WHERE id = ?", (actual_payout, self.company_id))
-                        db.execute_query("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, 'equity_finance', ?)", (current_week, self.company_id, -actual_payout))
-                        db.log_file_event(current_week, self.company_id, "Dividend", f"Paid dividend: {dps} yen/share (Total: {actual_payout})")
-                        db.execute_query("INSERT INTO news_logs (week, company_id, message, type) VALUES (?, ?, ?, ?)", (current_week, self.company_id, f"1株当たり{dps}円の配当を実施しました。", 'market'))
+                        self._emit(PayDividend, current_week, log=("Dividend", f"Paid dividend: {dps} yen/share (Total: {actual_payout})"),
+                                   dps=dps, amount=actual_payout)
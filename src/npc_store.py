@@ -0,0 +1,276 @@
+# c:\0124newSIm\src\npc_store.py
+# NPCデータの列指向ストア (NumPy配列による一括集計・一括更新)
+
+import numpy as np
+import gamebalance as gb
+from aptitudes import COLUMNS as APTITUDE_COLUMNS, DEFAULT_APTITUDE
+
+# 能力値カラム (1カラム = 1配列)
+STAT_COLUMNS = [
+    'diligence', 'production', 'development', 'sales', 'hr', 'pr', 'accounting', 'store_ops',
+    'management', 'executive', 'adaptability', 'loyalty', 'salary', 'desired_salary'
+]
+
+# 整数コード表 (-1 は NULL)
+INDUSTRY_KEYS = list(gb.INDUSTRIES.keys())
+DEPT_CODES = {d: i for i, d in enumerate(gb.DEPARTMENTS)}
+ROLES = [gb.ROLE_MEMBER, gb.ROLE_ASSISTANT_MANAGER, gb.ROLE_MANAGER, gb.ROLE_CXO, gb.ROLE_CEO]
+ROLE_CODES = {r: i for i, r in enumerate(ROLES)}
+
+# 部署コード -> 担当能力カラム
+DEPT_STAT = {
+    gb.DEPT_PRODUCTION: 'production', gb.DEPT_SALES: 'sales', gb.DEPT_DEV: 'development',
+    gb.DEPT_HR: 'hr', gb.DEPT_PR: 'pr', gb.DEPT_ACCOUNTING: 'accounting', gb.DEPT_STORE: 'store_ops'
+}
+CORP_DEPTS = [gb.DEPT_HR, gb.DEPT_PR, gb.DEPT_ACCOUNTING]
+DIV_DEPTS = [gb.DEPT_PRODUCTION, gb.DEPT_DEV, gb.DEPT_SALES, gb.DEPT_STORE]
+
+# 業界適性カラム -> 適性行列の列
+APTITUDE_INDEX = {APTITUDE_COLUMNS[key]: j for j, key in enumerate(INDUSTRY_KEYS)}
+
+def _code(value, table):
+    return table.get(value, -1) if value is not None else -1
+
+def _lookup(mapping, keys):
+    """整数配列 keys を {整数キー: 整数値} で引いた配列 (見つからないキーは -1)"""
+    if not mapping:
+        return np.full(len(keys), -1, dtype=np.int64)
+    table_keys = np.array(sorted(mapping), dtype=np.int64)
+    table_values = np.array([mapping[k] for k in table_keys.tolist()], dtype=np.int64)
+    pos = np.minimum(np.searchsorted(table_keys, keys), len(table_keys) - 1)
+    return np.where(table_keys[pos] == keys, table_values[pos], -1)
+
+class NPCStore:
+    """
+    npcs テーブルの列指向コピー。
+    能力値ごとの配列、[NPC, 業界] の適性行列、部署・役職・企業・事業部の整数コードを持つ。
+    行は NPC ID 昇順に並ぶ。
+    WorldState.npc_store として週に1度作り、以降は行の変更を sync() で受けて配列を同期する。
+    """
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda r: r['id'])
+        n = len(rows)
+        self.ids = np.array([r['id'] for r in rows], dtype=np.int64)
+        self.row_of = {int(nid): i for i, nid in enumerate(self.ids)}
+
+        self.stats = {}
+        for col in STAT_COLUMNS:
+            self.stats[col] = np.array([r[col] or 0 for r in rows], dtype=np.float64)
+
+        self.aptitudes = np.empty((n, len(INDUSTRY_KEYS)), dtype=np.float64)
+        for j, key in enumerate(INDUSTRY_KEYS):
+            col = APTITUDE_COLUMNS[key]
+            self.aptitudes[:, j] = [r[col] if r[col] is not None else DEFAULT_APTITUDE for r in rows]
+
+        self.dept = np.array([_code(r['department'], DEPT_CODES) for r in rows], dtype=np.int64)
+        self.role = np.array([_code(r['role'], ROLE_CODES) for r in rows], dtype=np.int64)
+        self.company = np.array([r['company_id'] if r['company_id'] is not None else -1 for r in rows], dtype=np.int64)
+        self.division = np.array([r['division_id'] if r['division_id'] is not None else -1 for r in rows], dtype=np.int64)
+        self._writing = False  # write_back 中 (自身の書き戻しの通知は同期不要)
+
+    @classmethod
+    def from_world(cls, world):
+        return cls(world.npcs.values())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def sync(self, row, columns):
+        """WorldState の npcs 行の変更 (columns のカラム) を配列へ反映する"""
+        i = self.row_of.get(row['id'])
+        if i is None or self._writing: return
+        for col in columns:
+            value = row[col]
+            if col in self.stats:
+                self.stats[col][i] = value or 0
+            elif col in APTITUDE_INDEX:
+                self.aptitudes[i, APTITUDE_INDEX[col]] = value if value is not None else DEFAULT_APTITUDE
+            elif col == 'department':
+                self.dept[i] = _code(value, DEPT_CODES)
+            elif col == 'role':
+                self.role[i] = _code(value, ROLE_CODES)
+            elif col == 'company_id':
+                self.company[i] = value if value is not None else -1
+            elif col == 'division_id':
+                self.division[i] = value if value is not None else -1
+
+    def dept_stat(self):
+        """各NPCの所属部署に対応する能力値 (部署なしは0)"""
+        matrix = np.stack([self.stats[DEPT_STAT[d]] for d in gb.DEPARTMENTS], axis=1)
+        own = matrix[np.arange(len(self)), np.maximum(self.dept, 0)]
+        return np.where(self.dept >= 0, own, 0.0)
+
+    # ---------------------------------------------------------
+    # 能力集計
+    # ---------------------------------------------------------
+    def staff_aggregates(self, divisions, head_limits):
+        """
+        全企業の部署別人員・能力合計をまとめて集計する
+        divisions: 事業部行 (id, company_id, industry_key) のリスト
+        head_limits: {(division_id, dept): 収容可能人数} (工場・店舗の施設上限)
+        戻り値: {company_id: staff} (staff の構造は Simulation._aggregate_staff と同じ)
+        """
+        div_industry = {d['id']: d['industry_key'] or 'automotive' for d in divisions}
+        div_owner = {d['id']: d['company_id'] for d in divisions if d['company_id'] is not None}
+        result = {}
+        employed = np.nonzero(self.company >= 0)[0]
+        if len(employed) == 0:
+            return result
+
+        comp = self.company[employed]
+        dept = self.dept[employed]
+        role = self.role[employed]
+        div = self.division[employed]
+        own = self.dept_stat()[employed]
+        mgmt = self.stats['management'][employed]
+
+        # 全社: 人数・勤勉さ合計
+        comp_ids, comp_inv = np.unique(comp, return_inverse=True)
+        counts = np.bincount(comp_inv)
+        dil_sums = np.bincount(comp_inv, weights=self.stats['diligence'][employed])
+        for k, cid in enumerate(comp_ids):
+            result[int(cid)] = {'count': int(counts[k]), 'diligence_sum': float(dil_sums[k]),
+                                'corp': {}, 'div': {}, 'mgr_corp': {}, 'mgr_div': {}, 'cxo': {}}
+
+        n_depts = len(gb.DEPARTMENTS)
+
+        # 共通部門 (企業 x 部署)
+        corp_codes = np.array([DEPT_CODES[d] for d in CORP_DEPTS])
+        mask = np.isin(dept, corp_codes)
+        if mask.any():
+            keys, inv = np.unique(comp[mask] * n_depts + dept[mask], return_inverse=True)
+            n = np.bincount(inv)
+            s = np.bincount(inv, weights=own[mask])
+            for k, key in enumerate(keys):
+                cid, d = divmod(int(key), n_depts)
+                result[cid]['corp'][gb.DEPARTMENTS[d]] = {'n': int(n[k]), 'sum': float(s[k])}
+
+        # 事業部部門 (事業部 x 部署): 業界適性で重み付けし、工場・店舗の収容上限を超えた人員は能力上位から残す
+        div_codes = np.array([DEPT_CODES[d] for d in DIV_DEPTS])
+        ind_idx = self._industry_index(div, div_industry)
+        # 自社の事業部に所属している者のみ対象
+        own_div = _lookup(div_owner, div) == comp
+        mask = np.isin(dept, div_codes) & own_div
+        if mask.any():
+            rows = employed[mask]
+            m_div = div[mask]
+            m_dept = dept[mask]
+            m_own = own[mask]
+            m_ind = ind_idx[mask]
+            apt = np.where(m_ind >= 0, self.aptitudes[rows, np.maximum(m_ind, 0)], DEFAULT_APTITUDE)
+            weighted = m_own * apt
+
+            group = m_div * n_depts + m_dept
+            # グループ内で能力降順 (同値はID順) に順位付け
+            order = np.lexsort((rows, -m_own, group))
+            sorted_group = group[order]
+            starts = np.r_[0, np.nonzero(np.diff(sorted_group))[0] + 1]
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+
+            keys, inv = np.unique(group, return_inverse=True)
+            limit = np.array([head_limits.get((int(g) // n_depts, gb.DEPARTMENTS[int(g) % n_depts]), len(order)) for g in keys])[inv]
+            kept = rank < limit
+
+            n_raw = np.bincount(inv)
+            n_kept = np.bincount(inv, weights=kept)
+            s = np.bincount(inv, weights=np.where(kept, weighted, 0.0))
+            for k, key in enumerate(keys):
+                d_id, d = divmod(int(key), n_depts)
+                entry = result[div_owner[d_id]]['div'].setdefault(d_id, {})
+                entry[gb.DEPARTMENTS[d]] = {'n_raw': int(n_raw[k]), 'n': int(n_kept[k]), 'sum': float(s[k])}
+
+        # マネージャー・CxO (各グループでID最小の者のマネジメント力)
+        def first_by(mask, key):
+            if not mask.any(): return []
+            keys, first = np.unique(key[mask], return_index=True)
+            return zip(keys, mgmt[mask][first])
+
+        has_dept = dept >= 0
+        mgr = (role == ROLE_CODES[gb.ROLE_MANAGER]) & has_dept
+        cxo = np.isin(role, [ROLE_CODES[gb.ROLE_CXO], ROLE_CODES[gb.ROLE_CEO]]) & has_dept
+        for key, value in first_by(mgr, comp * n_depts + dept):
+            cid, d = divmod(int(key), n_depts)
+            result[cid]['mgr_corp'][gb.DEPARTMENTS[d]] = float(value)
+        for key, value in first_by(cxo, comp * n_depts + dept):
+            cid, d = divmod(int(key), n_depts)
+            result[cid]['cxo'][gb.DEPARTMENTS[d]] = float(value)
+        for key, value in first_by(mgr & own_div, div * n_depts + dept):
+            d_id, d = divmod(int(key), n_depts)
+            result[div_owner[d_id]]['mgr_div'][(d_id, gb.DEPARTMENTS[d])] = float(value)
+
+        return result
+
+    # ---------------------------------------------------------
+    # 成長・忠誠度
+    # ---------------------------------------------------------
+    def _industry_index(self, div, div_industry):
+        """事業部ID配列 -> 業界インデックス配列 (事業部なし・不明は -1)"""
+        return _lookup({d: INDUSTRY_KEYS.index(k) for d, k in div_industry.items() if k in INDUSTRY_KEYS}, div)
+
+    def apply_weekly_growth(self, rows, div_industry):
+        """
+        指定行のNPCに週次成長を適用する (担当能力、マネジメント、役員適性、業界適性)
+        div_industry: {division_id: industry_key}
+        戻り値: 業界適性が変化した (行, 業界インデックス)
+        """
+        adapt = self.stats['adaptability'][rows]
+        base_growth = 0.025 * (2 ** (adapt / 50.0))
+        dept = self.dept[rows]
+        role = self.role[rows]
+
+        for d, stat in DEPT_STAT.items():
+            sel = rows[dept == DEPT_CODES[d]]
+            if len(sel):
+                self.stats[stat][sel] = np.minimum(gb.ABILITY_MAX, self.stats[stat][sel] + base_growth[dept == DEPT_CODES[d]])
+
+        mgmt_roles = [ROLE_CODES[r] for r in (gb.ROLE_ASSISTANT_MANAGER, gb.ROLE_MANAGER, gb.ROLE_CXO, gb.ROLE_CEO)]
+        m = np.isin(role, mgmt_roles)
+        self.stats['management'][rows[m]] = np.minimum(gb.ABILITY_MAX, self.stats['management'][rows[m]] + base_growth[m])
+
+        exec_roles = [ROLE_CODES[r] for r in (gb.ROLE_MANAGER, gb.ROLE_CXO, gb.ROLE_CEO)]
+        m = np.isin(role, exec_roles)
+        self.stats['executive'][rows[m]] = np.minimum(gb.ABILITY_MAX, self.stats['executive'][rows[m]] + base_growth[m] * 2)
+
+        # 業界適性 (所属事業部の業界のみ, 上限2.0)
+        ind_idx = self._industry_index(self.division[rows], div_industry)
+        m = ind_idx >= 0
+        apt_rows, apt_cols = rows[m], ind_idx[m]
+        current = self.aptitudes[apt_rows, apt_cols]
+        speed = adapt[m] / 50.0
+        growth = np.where(current < 1.0, (0.9 / 13.0) * speed, (1.0 / 260.0) * speed)
+        grow = current < 2.0
+        self.aptitudes[apt_rows[grow], apt_cols[grow]] = np.minimum(2.0, current[grow] + growth[grow])
+        return apt_rows[grow], apt_cols[grow]
+
+    def loyalty_deltas(self, rows, company_delta):
+        """企業単位の忠誠度変動に、個人の給与不満分を加えた変動量を返す"""
+        salary = self.stats['salary'][rows]
+        desired = self.stats['desired_salary'][rows]
+        gap = np.where(desired > salary, (desired - salary) / np.where(desired > 0, desired, 1), 0.0)
+        penalty = np.where(gap > 0.05, np.floor(gap * 10), 0.0)
+        return company_delta - penalty
+
+    # ---------------------------------------------------------
+    # 同期
+    # ---------------------------------------------------------
+    def write_back(self, world, rows, before, apt_changes=None):
+        """
+        指定行の能力値のうち before ({カラム: 変更前の値の配列}) から変わったものだけを WorldState の npcs 行へ反映する
+        apt_changes: apply_weekly_growth の戻り値 (業界適性が変化した行と業界)
+        """
+        self._writing = True
+        try:
+            for col, old in before.items():
+                changed = rows[self.stats[col][rows] != old]
+                if len(changed):
+                    world.update_many('npcs', self.ids[changed].tolist(), **{col: self.stats[col][changed].tolist()})
+            if apt_changes is not None:
+                apt_rows, apt_cols = apt_changes
+                for j, key in enumerate(INDUSTRY_KEYS):
+                    changed = apt_rows[apt_cols == j]
+                    if len(changed):
+                        world.update_many('npcs', self.ids[changed].tolist(), **{APTITUDE_COLUMNS[key]: self.aptitudes[changed, j].tolist()})
+        finally:
+            self._writing = False
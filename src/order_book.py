@@ -0,0 +1,147 @@
+# c:\0124newSIm\src\order_book.py
+# B2B注文板 (未約定の注文をメモリ上で保持し、週内の変更をまとめてDBへ書き戻す)
+
+from database import db
+import gamebalance as gb
+
+OPEN_STATUSES = ('pending', 'accepted')
+
+# 同じ売り手への注文を処理する優先順位
+# fifo: 発注の古い順 / price: 単価の高い順 (同単価なら古い順)
+PRIORITY_RULES = {
+    'fifo': lambda o: (o['week'], o['id']),
+    'price': lambda o: (-(o['amount'] / o['quantity'] if o['quantity'] else 0), o['week'], o['id']),
+}
+
+class OrderBook:
+    """
+    未約定 (pending / accepted) の注文だけを保持し、売り手・買い手・ステータスで索引を持つ。
+    約定・拒否・期限切れになった注文は索引から外し、flush() で変更分だけを executemany で書き戻す。
+    新規注文の ID はロード時点の最大IDから採番する。
+    """
+
+    def __init__(self, priority=None):
+        self.priority = PRIORITY_RULES[priority or gb.B2B_ORDER_PRIORITY]
+        self.orders = {}      # {order_id: order} 未約定の注文
+        self._by_seller = {}  # {seller_id: {order_id: order}}
+        self._by_buyer = {}   # {buyer_id: {order_id: order}}
+        self._by_status = {s: {} for s in OPEN_STATUSES}
+        self._changed = {}    # {order_id: order} 既存行の変更 (約定済みも含む)
+        self._new = {}        # {order_id: order} 未保存の新規注文
+        self._next_id = 1
+
+    @classmethod
+    def load(cls, priority=None):
+        book = cls(priority)
+        for r in db.fetch_all(f"SELECT * FROM b2b_orders WHERE status IN ({', '.join(['?'] * len(OPEN_STATUSES))})", OPEN_STATUSES):
+            book._index(dict(r))
+        res = db.fetch_one("SELECT MAX(id) as max_id FROM b2b_orders")
+        book._next_id = (res['max_id'] or 0) + 1
+        return book
+
+    # ---------------------------------------------------------
+    # 参照 (優先順位順)
+    # ---------------------------------------------------------
+    def get(self, order_id):
+        """未約定の注文 (約定済み・存在しない場合は None)"""
+        return self.orders.get(order_id)
+
+    def for_seller(self, seller_id, status=None):
+        return self._select(self._by_seller.get(seller_id, {}), status)
+
+    def for_buyer(self, buyer_id, status=None):
+        return self._select(self._by_buyer.get(buyer_id, {}), status)
+
+    def with_status(self, status):
+        return self._select(self._by_status[status], None)
+
+    def _select(self, orders, status):
+        return sorted((o for o in orders.values() if status is None or o['status'] == status), key=self.priority)
+
+    # ---------------------------------------------------------
+    # 更新
+    # ---------------------------------------------------------
+    def place(self, week, buyer_id, seller_id, design_id, quantity, amount):
+        order = {'id': self._next_id, 'week': week, 'buyer_id': buyer_id, 'seller_id': seller_id,
+                 'design_id': design_id, 'quantity': quantity, 'amount': amount, 'status': 'pending'}
+        self._next_id += 1
+        self._new[order['id']] = order
+        self._index(order)
+        return order
+
+    def accept(self, order_id, quantity=None, amount=None):
+        """受注する。quantity / amount を指定すると注文をその数量に縮める (部分受注)"""
+        order = self.orders[order_id]
+        if quantity is not None:
+            order['quantity'] = quantity
+            order['amount'] = amount
+        self._set_status(order, 'accepted')
+        return order
+
+    def reject(self, order_id):
+        return self._set_status(self.orders[order_id], 'rejected')
+
+    def fill(self, order_id, quantity):
+        """
+        受注済みの注文を quantity だけ約定させる。
+        一部約定の場合は注文を約定分 (completed) と残り (accepted、新しいID) に分割し、残りの注文を返す。
+        """
+        order = self.orders[order_id]
+        remainder = None
+        if quantity < order['quantity']:
+            unit_price = order['amount'] / order['quantity']
+            filled_amount = int(unit_price * quantity)
+            remainder = self.place(order['week'], order['buyer_id'], order['seller_id'], order['design_id'],
+                                   order['quantity'] - quantity, order['amount'] - filled_amount)
+            self._set_status(remainder, 'accepted')
+            order['quantity'] = quantity
+            order['amount'] = filled_amount
+        self._set_status(order, 'completed')
+        return remainder
+
+    def expire(self, before_week):
+        """指定週より前に発注された未承認の注文を期限切れにする"""
+        expired = [o for o in self._by_status['pending'].values() if o['week'] < before_week]
+        for order in expired:
+            self._set_status(order, 'expired')
+        return expired
+
+    def _set_status(self, order, status):
+        self._unindex(order)
+        order['status'] = status
+        if status in OPEN_STATUSES:
+            self._index(order)
+        if order['id'] not in self._new:
+            self._changed[order['id']] = order
+        return order
+
+    def _index(self, order):
+        self.orders[order['id']] = order
+        self._by_seller.setdefault(order['seller_id'], {})[order['id']] = order
+        self._by_buyer.setdefault(order['buyer_id'], {})[order['id']] = order
+        self._by_status[order['status']][order['id']] = order
+
+    def _unindex(self, order):
+        self.orders.pop(order['id'], None)
+        self._by_seller.get(order['seller_id'], {}).pop(order['id'], None)
+        self._by_buyer.get(order['buyer_id'], {}).pop(order['id'], None)
+        if order['status'] in self._by_status:
+            self._by_status[order['status']].pop(order['id'], None)
+
+    # ---------------------------------------------------------
+    # 書き戻し
+    # ---------------------------------------------------------
+    def flush(self):
+        """新規注文の挿入と既存注文の更新を executemany でまとめて書き戻す"""
+        if not self._new and not self._changed: return
+        with db.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT INTO b2b_orders (id, week, buyer_id, seller_id, design_id, quantity, amount, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(o['id'], o['week'], o['buyer_id'], o['seller_id'], o['design_id'], o['quantity'], o['amount'], o['status'])
+                  for o in self._new.values()])
+            cursor.executemany("UPDATE b2b_orders SET quantity = ?, amount = ?, status = ? WHERE id = ?",
+                               [(o['quantity'], o['amount'], o['status'], o['id']) for o in self._changed.values()])
+        self._new = {}
+        self._changed = {}
@@ -0,0 +1,176 @@
+# c:\0124newSIm\src\perf.py
+# 週次処理のフェーズ別計測 (経過時間・CPU時間・SQL文数・読み書き行数・ピークメモリ)
+# perf.enable() したときだけ計測し、週ごとに perf_stats テーブルへ書き込む。無効時は何もしない。
+
+import csv
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+from database import db
+
+COLUMNS = ['week', 'phase', 'parent', 'calls', 'wall_ms', 'cpu_ms', 'statements', 'rows_read', 'rows_written', 'peak_memory_kb']
+# フェーズの開始・終了時の差分で集計する値 (_sample() の並び)
+METRICS = ['wall_ms', 'cpu_ms', 'statements', 'rows_read', 'rows_written']
+
+class PerfRecorder:
+    """
+    フェーズの開始・終了時の計測値の差分を、週内でフェーズ名ごとに合算する。
+    フェーズは入れ子にでき (NPC意思決定の中の decide_* など)、内側の値は外側にも含まれる。
+    企業ごとに呼ばれる decide_* のように同じ名前を何度も通る場合は合算し、回数を calls に持つ。
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self._records = {}   # {フェーズ名: 集計}
+        self._stack = []     # 計測中のフェーズ (外側から順)
+
+    def enable(self, memory=False):
+        """計測を始める。memory=True で tracemalloc によるピークメモリも計測する (処理はかなり遅くなる)"""
+        self.enabled = True
+        self.memory = memory
+        db.start_counting()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.begin_week()
+
+    def disable(self):
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        db.stop_counting()
+        self.enabled = False
+        self.memory = False
+        self.begin_week()
+
+    def begin_week(self):
+        """週の集計を空にする (前週の途中で例外になった場合の計測中フェーズも捨てる)"""
+        self._records = {}
+        self._stack = []
+
+    # ---------------------------------------------------------
+    # 計測
+    # ---------------------------------------------------------
+    def _sample(self):
+        counters = db.counters or {}
+        return (time.perf_counter() * 1000, time.process_time() * 1000,
+                counters.get('statements', 0), counters.get('rows_read', 0), counters.get('rows_written', 0))
+
+    def start(self, name):
+        """フェーズ name の計測を始める (stop() と対にする。短い区間は phase() を使う)"""
+        if not self.enabled: return
+        if self.memory:
+            # 外側のフェーズのここまでのピークを引き継いでから、内側用にピークをリセットする
+            self._raise_peak(tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        parent = self._stack[-1]['name'] if self._stack else None
+        self._stack.append({'name': name, 'parent': parent, 'start': self._sample(), 'peak': 0})
+
+    def stop(self):
+        """直近に start() したフェーズの計測を終える"""
+        if not self.enabled or not self._stack: return
+        end = self._sample()
+        frame = self._stack.pop()
+        peak = None
+        if self.memory:
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            self._raise_peak(peak)
+        self._add(frame['name'], frame['parent'], 1, [e - s for s, e in zip(frame['start'], end)], peak)
+
+    def _raise_peak(self, peak):
+        if self._stack:
+            self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+
+    def _add(self, name, parent, calls, deltas, peak):
+        rec = self._records.get(name)
+        if rec is None:
+            rec = self._records[name] = {'parent': parent, 'calls': 0, 'peak': None, **{m: 0 for m in METRICS}}
+        rec['calls'] += calls
+        for metric, delta in zip(METRICS, deltas):
+            rec[metric] += delta
+        if peak is not None:
+            rec['peak'] = peak if rec['peak'] is None else max(rec['peak'], peak)
+
+    @contextmanager
+    def phase(self, name):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def timed(self, name=None):
+        """メソッドの呼び出しをフェーズとして計測するデコレータ (名前の既定は関数名)"""
+        def decorator(func):
+            label = name or func.__name__
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                self.start(label)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.stop()
+            return wrapper
+        return decorator
+
+    # ---------------------------------------------------------
+    # ワーカープロセスとの受け渡し
+    # ---------------------------------------------------------
+    def take_records(self):
+        """週内の集計を取り出して空にする (並列意思決定のワーカーから親へ返す)"""
+        records, self._records = self._records, {}
+        return records
+
+    def merge(self, records):
+        """
+        ワーカーの集計を合算する。親フェーズのないものは現在計測中のフェーズの内訳にする。
+        経過時間は各ワーカーの合計になるため、親フェーズの経過時間を超えることがある。
+        """
+        if not self.enabled: return
+        parent = self._stack[-1]['name'] if self._stack else None
+        for name, rec in records.items():
+            self._add(name, rec['parent'] or parent, rec['calls'], [rec[m] for m in METRICS], rec['peak'])
+
+    # ---------------------------------------------------------
+    # 保存・出力
+    # ---------------------------------------------------------
+    def end_week(self, week):
+        """週の集計を perf_stats へ書き込み、書き込んだ行を返す"""
+        if not self.enabled: return []
+        while self._stack:
+            self.stop()
+        rows = []
+        for name, rec in self._records.items():
+            rows.append((week, name, rec['parent'], rec['calls'], round(rec['wall_ms'], 3), round(rec['cpu_ms'], 3),
+                         rec['statements'], rec['rows_read'], rec['rows_written'],
+                         round(rec['peak'] / 1024, 1) if rec['peak'] is not None else None))
+        self._records = {}
+        conn, should_close = db.get_connection()
+        try:
+            # チェックポイントから同じ週をやり直した場合は上書きする
+            conn.executemany(f"INSERT OR REPLACE INTO perf_stats ({', '.join(COLUMNS)}) VALUES ({', '.join(['?'] * len(COLUMNS))})", rows)
+            if should_close:
+                conn.commit()
+        finally:
+            if should_close:
+                conn.close()
+        return rows
+
+    def export(self, path, since_week=None):
+        """perf_stats を CSV に書き出す (週・フェーズ順)"""
+        query = f"SELECT {', '.join(COLUMNS)} FROM perf_stats"
+        params = ()
+        if since_week is not None:
+            query += " WHERE week >= ?"
+            params = (since_week,)
+        rows = db.fetch_all(query + " ORDER BY week, parent IS NOT NULL, parent, phase", params)
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            for r in rows:
+                writer.writerow(tuple(r))
+        return len(rows)
+
+perf = PerfRecorder()
@@ -0,0 +1,105 @@
+# c:\0124newSIm\src\query_audit.py
+# ホットなクエリの実行計画 (EXPLAIN QUERY PLAN) を確認し、テーブルの全件走査になっているものを報告する
+# 使い方: python query_audit.py [DBファイル]
+#   DBファイルを省略すると、空のインメモリDBに現行スキーマを作って確認する。
+#   全件走査が1件でもあれば終了コード 1 を返す。
+
+import sys
+from database import db
+
+# (ラベル, クエリ, パラメータ) 各モジュールで週ごと・企業ごとに実行されるクエリと同じ形にする
+HOT_QUERIES = [
+    ("npcs: 求職者数", "SELECT COUNT(*) as cnt FROM npcs WHERE company_id IS NULL", ()),
+    ("npcs: 従業員", "SELECT * FROM npcs WHERE company_id = ?", (1,)),
+    ("divisions: 事業部", "SELECT * FROM divisions WHERE company_id = ?", (1,)),
+    ("facilities: 施設", "SELECT id, type, size, rent, is_owned, division_id FROM facilities WHERE company_id = ?", (1,)),
+    ("inventory: 事業部在庫", "SELECT SUM(quantity) as cnt FROM inventory WHERE company_id = ? AND division_id = ?", (1, 1)),
+    ("inventory: 在庫の特定", "SELECT id FROM inventory WHERE company_id = ? AND division_id = ? AND design_id = ?", (1, 1, 1)),
+    ("product_designs: 開発中", "SELECT COUNT(*) as cnt FROM product_designs WHERE company_id = ? AND division_id = ? AND status = 'developing'", (1, 1)),
+    ("product_designs: 状態別", "SELECT * FROM product_designs WHERE status = 'developing'", ()),
+    ("product_designs: 業界の完成品", "SELECT COUNT(*) as cnt FROM product_designs WHERE status = 'completed' AND industry_key = ?", ('automotive',)),
+    ("product_designs: 競合価格", "SELECT sales_price FROM product_designs WHERE industry_key = ? AND status='completed' AND company_id != ?", ('automotive', 1)),
+    ("loans: 借入残高", "SELECT SUM(amount) as total FROM loans WHERE company_id = ?", (1,)),
+    ("transactions: 取引件数 (売り手/買い手)", """
+        SELECT COUNT(*) as cnt FROM (
+            SELECT id FROM transactions WHERE seller_id = ? AND week = ?
+            UNION
+            SELECT id FROM transactions WHERE buyer_id = ? AND week = ?
+        )
+    """, (1, 1, 1, 1)),
+    ("transactions: 事業部の取引数量", """
+        SELECT SUM(t.quantity) as cnt FROM transactions t JOIN product_designs d ON t.design_id = d.id
+        WHERE t.id IN (
+            SELECT id FROM transactions WHERE seller_id = ? AND week = ?
+            UNION
+            SELECT id FROM transactions WHERE buyer_id = ? AND week = ?
+        ) AND d.division_id = ?
+    """, (1, 1, 1, 1, 1)),
+    ("transactions: 全社の取引件数", """
+        SELECT company_id, COUNT(*) as cnt FROM (
+            SELECT seller_id as company_id FROM transactions WHERE week = ?
+            UNION ALL
+            SELECT buyer_id FROM transactions WHERE week = ? AND buyer_id IS NOT seller_id
+        )
+        WHERE company_id IS NOT NULL
+        GROUP BY company_id
+    """, (1, 1)),
+    ("transactions: 直近のB2C販売", "SELECT COUNT(*) as cnt FROM transactions WHERE seller_id = ? AND type = 'b2c' AND week >= ?", (1, 1)),
+    ("transactions: B2B販売実績", """
+        SELECT seller_id, design_id, MAX(weekly_total) as max_weekly
+        FROM (
+            SELECT seller_id, design_id, week, SUM(quantity) as weekly_total
+            FROM transactions
+            WHERE week >= ? AND type = 'b2b'
+            GROUP BY seller_id, design_id, week
+        )
+        GROUP BY seller_id, design_id
+    """, (1,)),
+    ("transactions: 前週のB2C販売", "SELECT design_id, SUM(quantity) as total FROM transactions WHERE week = ? AND type = 'b2c' GROUP BY design_id", (1,)),
+    ("account_entries: 期間PL", "SELECT category, SUM(amount) as total FROM account_entries WHERE company_id = ? AND week BETWEEN ? AND ? GROUP BY category", (1, 1, 13)),
+    ("ledger_weekly: 1社", "SELECT company_id, category, amount FROM ledger_weekly WHERE week BETWEEN ? AND ? AND company_id = ?", (1, 4, 1)),
+    ("ledger_weekly: 全社", "SELECT company_id, category, amount FROM ledger_weekly WHERE week BETWEEN ? AND ?", (1, 4)),
+    ("ledger_quarterly: 全社", "SELECT company_id, category, amount FROM ledger_quarterly WHERE quarter BETWEEN ? AND ?", (1, 2)),
+    ("ledger_yearly: 全社", "SELECT company_id, category, amount FROM ledger_yearly WHERE year BETWEEN ? AND ?", (1, 1)),
+    ("news_logs: 週のニュース", "SELECT * FROM news_logs WHERE week = ? ORDER BY id DESC LIMIT 5", (1,)),
+    ("job_offers: 週のオファー", "SELECT * FROM job_offers WHERE week = ?", (1,)),
+    ("b2b_orders: 未約定", "SELECT * FROM b2b_orders WHERE status IN (?, ?)", ('pending', 'accepted')),
+    ("financial_reports: 未発表", "SELECT * FROM financial_reports WHERE status = 'draft' ORDER BY id", ()),
+    ("financial_reports: 企業の決算", "SELECT * FROM financial_reports WHERE company_id = ? ORDER BY week DESC", (1,)),
+    ("weekly_stats: 週の統計", "SELECT * FROM weekly_stats WHERE week = ?", (1,)),
+    ("action_log: 週のアクション", "SELECT * FROM action_log WHERE week = ?", (1,)),
+]
+
+def full_scans(plan):
+    """実行計画の行のうち、テーブルまたはインデックス全体の走査 (サブクエリ結果の走査は除く)"""
+    return [detail for detail in plan
+            if detail.startswith('SCAN ') and not detail.startswith('SCAN (') and 'CONSTANT ROW' not in detail]
+
+def audit(queries=HOT_QUERIES):
+    """[(ラベル, 実行計画, 全件走査)] を返す"""
+    results = []
+    for label, query, params in queries:
+        plan = [r['detail'] for r in db.fetch_all("EXPLAIN QUERY PLAN " + query, params)]
+        results.append((label, plan, full_scans(plan)))
+    return results
+
+def main(path=None):
+    if path:
+        db.use_file(path)
+    else:
+        db.use_memory("query_audit")
+        db.init_db()
+
+    failures = 0
+    for label, plan, scans in audit():
+        status = "FULL SCAN" if scans else "ok"
+        print(f"[{status}] {label}")
+        for detail in plan:
+            print(f"    {detail}")
+        failures += bool(scans)
+
+    print(f"{len(HOT_QUERIES) - failures}/{len(HOT_QUERIES)} queries use indexes")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else None))
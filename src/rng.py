@@ -0,0 +1,64 @@
+# c:\0124newSIm\src\rng.py
+# サブシステム・企業ごとに独立した乱数ストリームを払い出すレジストリ
+import random
+import hashlib
+import numpy as np
+
+class RNGRegistry:
+    """
+    マスターシードと (週, サブシステム, 企業ID) からストリームのシードを導出する。
+    ストリームは週の開始時に作り直すため、同じシードなら任意の週を単独で再現でき、
+    企業ごとの処理順序を入れ替えても結果は変わらない。
+    """
+
+    def __init__(self, seed=None):
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        """マスターシードを設定する (None なら実行ごとにランダム)"""
+        if seed is None:
+            seed = random.SystemRandom().randrange(2 ** 63)
+        self.master_seed = seed
+        self.week = 0
+        self._streams = {}
+
+    def begin_week(self, week):
+        self.week = week
+        self._streams = {}
+
+    def stream(self, subsystem, *keys):
+        """サブシステム単位のストリーム (例: rng.stream('b2c'))"""
+        key = (subsystem,) + keys
+        stream = self._streams.get(key)
+        if stream is None:
+            stream = random.Random(self._derive(key))
+            self._streams[key] = stream
+        return stream
+
+    def numpy(self, subsystem, *keys):
+        """配列演算用の NumPy Generator (例: rng.numpy('b2c'))。同じキーの random.Random とは別系列"""
+        key = ('numpy', subsystem) + keys
+        stream = self._streams.get(key)
+        if stream is None:
+            stream = np.random.default_rng(self._derive(key))
+            self._streams[key] = stream
+        return stream
+
+    def for_company(self, company_id, subsystem):
+        """企業単位のストリーム (例: rng.for_company(cid, 'hiring'))"""
+        return self.stream(subsystem, company_id)
+
+    def _derive(self, key):
+        # hash() はプロセスごとに変わるため、sha256 で安定したシードを作る
+        material = repr((self.master_seed, self.week) + key).encode()
+        return int.from_bytes(hashlib.sha256(material).digest()[:8], 'big')
+
+    def getstate(self):
+        # ストリームは週の開始時に作り直すため、週の区切りではシードと週だけで状態が決まる
+        return {'seed': self.master_seed, 'week': self.week}
+
+    def setstate(self, state):
+        self.master_seed = state['seed']
+        self.begin_week(state['week'])
+
+rng = RNGRegistry()
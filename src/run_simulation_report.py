@@ -1,34 +1,113 @@
 # c:\0124newSIm\src\run_simulation_report.py
 import csv
 import os
-from database import db
+import argparse
+from database import db, DB_PATH
+from capability_cache import capability_cache
+import checkpoint
+from rng import rng
 from simulation import Simulation
 from seed import run_seed
+from perf import perf
+from sql_trace import tracer
 
 # シミュレーション実行週数
 SIMULATION_WEEKS = 260
 # 出力ファイル名
 OUTPUT_FILE = "simulation_report.csv"
 
-def run_report():
+def run_report(weeks=SIMULATION_WEEKS, in_memory=False, snapshot_weeks=(), snapshot_path=DB_PATH, load_path=None,
+               resume_path=None, checkpoint_every=0, checkpoint_dir=checkpoint.CHECKPOINT_DIR, setup=None, output_tag=None,
+               seed=None, workers=0, clearing=None, profile=False, profile_memory=False,
+               trace_sql=False):
+    """
+    in_memory: インメモリDBで実行し、snapshot_weeks の週と終了時に snapshot_path へ保存する
+    load_path: 保存済みスナップショットから続きを実行する (インメモリで読み込む)
+    resume_path: チェックポイント (乱数状態を含む) から続きを実行する
+    checkpoint_every: N週ごとにチェックポイントを checkpoint_dir へ保存する
+    setup: 実行前に呼ぶ関数 (派生実行でのパラメータ変更用)
+    output_tag: レポートのファイル名に付ける識別子
+    seed: 乱数のマスターシード (同じシードなら同じ結果になる。再開時はチェックポイントのシードを使う)
+    workers: 2以上でNPC意思決定をプロセス並列で実行する
+    clearing: 全業界のB2C需要配分方式をこの方式に置き換える (方式ごとの比較用)
+    profile: 週次処理のフェーズ別計測を perf_stats に記録し、CSV に書き出す (profile_memory でピークメモリも計測)
+    trace_sql: SQLをトレースし、週ごとに遅い文・多い文と N+1 の候補を表示して JSON に書き出す
+    """
     print("=== NewSim Balance Check Report Generator ===")
     
     # 1. データベースの初期化とシードデータの投入
-    print("Initializing database and seed data...")
-    run_seed()
+    if resume_path:
+        checkpoint.load_checkpoint(resume_path, in_memory=in_memory)
+    elif load_path:
+        print(f"Loading snapshot from {load_path}...")
+        db.load_snapshot(load_path)
+        capability_cache.clear()
+        rng.seed(seed)
+        in_memory = True
+    else:
+        if in_memory:
+            db.use_memory()
+        rng.seed(seed)
+        print(f"Initializing database and seed data... (seed={rng.master_seed})")
+        run_seed()
     
-    sim = Simulation()
+    if setup:
+        setup()
+    if clearing:
+        import gamebalance as gb
+        for ind in gb.INDUSTRIES.values():
+            ind['market_clearing'] = clearing
+        print(f"Market clearing: {clearing}")
+
+    sim = Simulation(decision_workers=workers)
     stats = []
+    start_week = sim.get_current_week()
+    if profile or profile_memory:
+        perf.enable(memory=profile_memory)
+    if trace_sql:
+        tracer.enable()
     
-    print(f"Starting simulation for {SIMULATION_WEEKS} weeks...")
+    print(f"Starting simulation for {weeks} weeks...")
     
+    try:
+        _simulate(sim, weeks, stats, set(snapshot_weeks) if in_memory else set(), snapshot_path,
+                  checkpoint_every, checkpoint_dir, output_tag)
+    finally:
+        sim.shutdown()
+        # インメモリ実行は終了時 (中断時も含む) に必ずディスクへ書き出す
+        if in_memory:
+            elapsed = db.snapshot(snapshot_path)
+            print(f"Snapshot saved to {snapshot_path} ({elapsed:.2f}s)")
+
+    _export_reports(stats, output_tag)
+    if perf.enabled:
+        perf_output_path = _output_path("simulation_perf_report.csv", output_tag)
+        count = perf.export(perf_output_path, since_week=start_week)
+        perf.disable()
+        print(f"Exported {count} phase timings to {perf_output_path}")
+    if tracer.enabled:
+        trace_output_path = _output_path("simulation_sql_trace.json", output_tag)
+        count = tracer.export(trace_output_path)
+        tracer.disable()
+        print(f"Exported SQL trace of {count} weeks to {trace_output_path}")
+    return stats
+
+def _simulate(sim, weeks, stats, snapshot_weeks, snapshot_path, checkpoint_every=0, checkpoint_dir=None, output_tag=None):
     # シミュレーションループ
-    for _ in range(SIMULATION_WEEKS):
+    for _ in range(weeks):
         # 現在の週を取得（処理開始前の週）
         current_week = sim.get_current_week()
         
         # 1週間進める
         sim.proceed_week()
+
+        if current_week in snapshot_weeks:
+            elapsed = db.snapshot(snapshot_path)
+            print(f"[Week {current_week}] Snapshot saved to {snapshot_path} ({elapsed:.2f}s)")
+
+        # チェックポイントのファイル名は再開する週 (current_week + 1)
+        if checkpoint_every and current_week % checkpoint_every == 0:
+            checkpoint.save_checkpoint(label=output_tag, directory=checkpoint_dir)
         
         # --- データ集計 (処理が行われた週 = current_week に関するデータを集計) ---
         
@@ -92,6 +171,10 @@ def run_report():
         # 8. 稼働企業数
         active_companies = db.fetch_one("SELECT COUNT(*) as cnt FROM companies WHERE is_active = 1 AND type != 'system_supplier'")['cnt']
 
+        # 9. B2C需要配分 (未充足需要と処理時間)
+        b2c_unallocated = sum(r['unallocated'] for r in sim.clearing_reports)
+        b2c_clearing_ms = sum(r['seconds'] for r in sim.clearing_reports) * 1000
+
         # 統計データをリストに追加
         stats.append({
             "week": current_week,
@@ -106,12 +189,22 @@ def run_report():
             "avg_salary": int(avg_salary),
             "avg_loyalty": f"{avg_loyalty:.1f}",
             "active_companies": active_companies,
+            "b2c_unallocated": b2c_unallocated,
+            "b2c_clearing_ms": f"{b2c_clearing_ms:.2f}",
             "bankruptcies": bankruptcy_info
         })
 
+def _output_path(filename, tag=None):
+    # srcディレクトリの親（プロジェクトルート）に出力
+    if tag:
+        base, ext = os.path.splitext(filename)
+        filename = f"{base}_{tag}{ext}"
+    return os.path.join(os.path.dirname(__file__), "..", filename)
+
+def _export_reports(stats, tag=None):
     # レポート出力
     # srcディレクトリの親（プロジェクトルート）に出力
-    output_path = os.path.join(os.path.dirname(__file__), "..", OUTPUT_FILE)
+    output_path = _output_path(OUTPUT_FILE, tag)
     print(f"Exporting report to {output_path}...")
     
     try:
@@ -121,6 +214,7 @@ def run_report():
                 "avg_funds_maker", "avg_funds_retail", 
                 "maker_inventory", "retail_inventory", 
                 "avg_salary", "avg_loyalty", "active_companies",
+                "b2c_unallocated", "b2c_clearing_ms",
                 "bankruptcies"
             ]
             writer = csv.DictWriter(f, fieldnames=fieldnames)
@@ -133,7 +227,7 @@ def run_report():
         print(f"Error exporting report: {e}")
         
     # 詳細レポート出力 (Company Weekly Stats)
-    detail_output_path = os.path.join(os.path.dirname(__file__), "..", "company_details.csv")
+    detail_output_path = _output_path("company_details.csv", tag)
     print(f"Exporting detailed report to {detail_output_path}...")
     
     try:
@@ -197,7 +291,7 @@ def run_report():
         print(f"Error exporting detailed report: {e}")
 
     # P/L詳細レポート出力 (Company P/L Details)
-    pl_output_path = os.path.join(os.path.dirname(__file__), "..", "company_pl_details.csv")
+    pl_output_path = _output_path("company_pl_details.csv", tag)
     print(f"Exporting P/L detailed report to {pl_output_path}...")
 
     try:
@@ -213,9 +307,9 @@ def run_report():
         count = db.fetch_one("SELECT COUNT(*) as cnt FROM account_entries")['cnt']
         print(f"Total account entries in DB: {count}")
 
-        # 全会計エントリ取得
-        entries = db.fetch_all("SELECT week, company_id, category, amount FROM account_entries WHERE week IS NOT NULL AND company_id IS NOT NULL")
-        print(f"Fetched {len(entries)} entries for P/L report.")
+        # 週次の会計ロールアップ取得 (週・企業・勘定ごとに集計済み)
+        entries = db.fetch_all("SELECT week, company_id, category, amount FROM ledger_weekly")
+        print(f"Fetched {len(entries)} weekly ledger rows for P/L report.")
         
         # 集計
         pl_data = {} # {week: {company_id: {category: amount}}}
@@ -338,7 +432,7 @@ def run_report():
         print(f"Error exporting P/L detailed report: {e}")
 
     # ボトルネック分析レポート出力
-    bottleneck_output_path = os.path.join(os.path.dirname(__file__), "..", "simulation_bottleneck_report.csv")
+    bottleneck_output_path = _output_path("simulation_bottleneck_report.csv", tag)
     print(f"Exporting Bottleneck Analysis report to {bottleneck_output_path}...")
 
     try:
@@ -387,4 +481,36 @@ def run_report():
         print(f"Error exporting Bottleneck Analysis report: {e}")
 
 if __name__ == "__main__":
-    run_report()
+    parser = argparse.ArgumentParser(description="NewSim バランスチェックレポート")
+    parser.add_argument("--weeks", type=int, default=SIMULATION_WEEKS, help="実行週数")
+    parser.add_argument("--memory", action="store_true", help="インメモリDBで実行する")
+    parser.add_argument("--snapshot-weeks", type=int, nargs="*", default=[], help="スナップショットを保存する週")
+    parser.add_argument("--snapshot-path", default=DB_PATH, help="スナップショットの保存先")
+    parser.add_argument("--load", default=None, help="スナップショットを読み込んで続きから実行する")
+    parser.add_argument("--resume", default=None, help="チェックポイントから再開する")
+    parser.add_argument("--checkpoint-every", type=int, default=0, help="N週ごとにチェックポイントを保存する")
+    parser.add_argument("--checkpoint-dir", default=checkpoint.CHECKPOINT_DIR, help="チェックポイントの保存先")
+    parser.add_argument("--set", nargs="*", default=[], metavar="KEY=VALUE", help="gamebalance の定数を上書きする (派生実行用)")
+    parser.add_argument("--tag", default=None, help="出力ファイル名に付ける識別子")
+    parser.add_argument("--seed", type=int, default=None, help="乱数のマスターシード")
+    parser.add_argument("--workers", type=int, default=0, help="NPC意思決定の並列プロセス数")
+    parser.add_argument("--clearing", default=None, help="全業界のB2C需要配分方式 (proportional / water_filling / logit)")
+    parser.add_argument("--profile", action="store_true", help="週次処理のフェーズ別計測を記録する")
+    parser.add_argument("--profile-memory", action="store_true", help="フェーズ別計測にピークメモリを含める (遅くなる)")
+    parser.add_argument("--trace-sql", action="store_true", help="SQLをトレースし、週ごとの遅い文・多い文と N+1 の候補を出力する")
+    args = parser.parse_args()
+
+    def apply_overrides():
+        import ast
+        import gamebalance as gb
+        for item in args.set:
+            key, value = item.split("=", 1)
+            setattr(gb, key, ast.literal_eval(value))
+            print(f"Override: {key} = {value}")
+
+    run_report(weeks=args.weeks, in_memory=args.memory, snapshot_weeks=args.snapshot_weeks,
+               snapshot_path=args.snapshot_path, load_path=args.load,
+               resume_path=args.resume, checkpoint_every=args.checkpoint_every, checkpoint_dir=args.checkpoint_dir,
+               setup=apply_overrides if args.set else None, output_tag=args.tag, seed=args.seed,
+               workers=args.workers, clearing=args.clearing, profile=args.profile, profile_memory=args.profile_memory,
+               trace_sql=args.trace_sql)
@@ -2,11 +2,12 @@
 # 初期データを生成・投入するスクリプト
 
 import json
-import random
 import math
 from database import db
 import gamebalance as gb
 import name_generator
+from rng import rng
+from aptitudes import COLUMNS as APTITUDE_COLUMNS, to_columns as aptitude_columns
 
 # NPCテーブルのカラム順序を固定定義
 NPC_COLUMNS = [
@@ -15,8 +16,8 @@ NPC_COLUMNS = [
     "last_resigned_week", "last_company_id", 
     "diligence", "management", "adaptability", "store_ops", 
     "production", "development", "sales", "hr", "pr", "accounting", 
-    "executive", "aptitudes"
-]
+    "executive"
+] + list(APTITUDE_COLUMNS.values())
 
 def create_npc_tuple(name, age, gender, company_id, division_id, department, role, salary, stats, aptitudes):
     return (
@@ -25,21 +26,22 @@ def create_npc_tuple(name, age, gender, company_id, division_id, department, rol
         0, None, # last_resigned, last_company
         stats['diligence'], stats['management'], stats['adaptability'], stats['store_ops'],
         stats['production'], stats['development'], stats['sales'], stats['hr'], stats['pr'], stats['accounting'],
-        stats['executive'], json.dumps(aptitudes)
-    )
+        stats['executive']
+    ) + tuple(aptitude_columns(aptitudes).values())
 
 def generate_random_npc(age=None):
+    rand = rng.stream('npc_gen')
     if age is None:
-        age = random.randint(gb.START_AGE, 60)
-    gender = random.choice(["M", "F"])
+        age = rand.randint(gb.START_AGE, 60)
+    gender = rand.choice(["M", "F"])
     name = name_generator.generate_person_name(gender)
     
     # 年齢と能力の比例 (年齢依存を下げ、ランダム性を高める)
     # 22歳: 15~65程度, 60歳: 25~75程度
-    base_stat = random.randint(15, 65) + (age - 22) * 0.3
+    base_stat = rand.randint(15, 65) + (age - 22) * 0.3
     base_stat = max(5, min(95, base_stat))
     
-    stats = {k: base_stat + random.randint(-5, 5) for k in ["diligence", "management", "adaptability", "store_ops", "production", "development", "sales", "hr", "pr", "accounting", "executive"]}
+    stats = {k: base_stat + rand.randint(-5, 5) for k in ["diligence", "management", "adaptability", "store_ops", "production", "development", "sales", "hr", "pr", "accounting", "executive"]}
     # Clamp
     for k in stats: stats[k] = max(0, min(100, stats[k]))
     
@@ -47,10 +49,10 @@ def generate_random_npc(age=None):
     for ind_key in gb.INDUSTRIES.keys():
         val = 0.1
         # 年齢に応じた適性付与 (22歳以上の場合、確率で経験値を持たせる)
-        if age > 22 and random.random() < 0.3:
+        if age > 22 and rand.random() < 0.3:
             years = age - 22
             # 1年あたり0.02~0.08程度の成長と仮定 (最大2.0)
-            growth = years * random.uniform(0.02, 0.08)
+            growth = years * rand.uniform(0.02, 0.08)
             val = min(2.0, val + growth)
         aptitudes[ind_key] = round(val, 2)
     
@@ -65,7 +67,7 @@ def generate_random_npc(age=None):
         "last_resigned_week": 0, "last_company_id": None,
         "diligence": stats['diligence'], "management": stats['management'], "adaptability": stats['adaptability'], "store_ops": stats['store_ops'],
         "production": stats['production'], "development": stats['development'], "sales": stats['sales'], "hr": stats['hr'], "pr": stats['pr'], "accounting": stats['accounting'],
-        "executive": stats['executive'], "aptitudes": json.dumps(aptitudes)
+        "executive": stats['executive'], **aptitude_columns(aptitudes)
     }
 
 def generate_unemployed_npc():
@@ -74,6 +76,7 @@ def generate_unemployed_npc():
 
 def run_seed():
     db.init_db()
+    rng.begin_week(0)
     
     # 1. ゲーム状態初期化
     db.execute_query("INSERT INTO game_state (week, economic_index) VALUES (1, 1.0)")
@@ -141,7 +144,7 @@ def run_seed():
     parts_config = {}
     total_material_cost = 0
     for part in ind_def['parts']:
-        sid = random.choice(supplier_ids[part['key']])
+        sid = rng.stream('seed').choice(supplier_ids[part['key']])
         cost = int(part['base_cost'])
         parts_config[part['key']] = {"supplier_id": sid, "score": 3.0, "cost": cost}
         total_material_cost += cost
@@ -189,7 +192,7 @@ def run_seed():
                     role = gb.ROLE_MANAGER if j == 0 else gb.ROLE_MEMBER
                     stats = {k: EMPLOYEE_STAT for k in ["diligence", "management", "adaptability", "store_ops", "production", "development", "sales", "hr", "pr", "accounting", "executive"]}
                     apts = {k: 1.0 for k in gb.INDUSTRIES.keys()}
-                    gender = random.choice(["M", "F"])
+                    gender = rng.stream('seed').choice(["M", "F"])
                     p_name = name_generator.generate_person_name(gender)
                     
                     target_div = div_id if dept in [gb.DEPT_PRODUCTION, gb.DEPT_DEV, gb.DEPT_SALES] else None
@@ -254,7 +257,7 @@ def run_seed():
                     role = gb.ROLE_MANAGER if j == 0 else gb.ROLE_MEMBER
                     stats = {k: EMPLOYEE_STAT for k in ["diligence", "management", "adaptability", "store_ops", "production", "development", "sales", "hr", "pr", "accounting", "executive"]}
                     apts = {k: 1.0 for k in gb.INDUSTRIES.keys()}
-                    gender = random.choice(["M", "F"])
+                    gender = rng.stream('seed').choice(["M", "F"])
                     p_name = name_generator.generate_person_name(gender)
                     
                     target_div = div_id if dept in [gb.DEPT_STORE, gb.DEPT_SALES] else None
@@ -279,7 +282,7 @@ def run_seed():
         for rid, div_id in retailers:
             # ランダムに設計書を選んで合計100台にする
             # 5種類選んで20台ずつとする
-            selected_designs = random.choices(designs, k=5)
+            selected_designs = rng.stream('seed').choices(designs, k=5)
             for d in selected_designs:
                 db.execute_query("INSERT INTO inventory (company_id, division_id, design_id, quantity, sales_price) VALUES (?, ?, ?, ?, ?)", 
                                  (rid, div_id, d['id'], 20, d['price']))
@@ -315,8 +318,8 @@ def run_seed():
     market_facilities = []
     current_cap = 0
     while current_cap < VACANT_FACILITY_CAPACITY:
-        size = random.choice([20, 50, 100])
-        ftype = random.choice(['office', 'factory', 'store'])
+        size = rng.stream('seed').choice([20, 50, 100])
+        ftype = rng.stream('seed').choice(['office', 'factory', 'store'])
         rent = 0
         if ftype == 'office': rent = size * gb.RENT_OFFICE
         elif ftype == 'factory': rent = size * gb.RENT_FACTORY
@@ -2,35 +2,64 @@
 # 週次シミュレーションのメインループ処理
 
 import json
-import random
 import math
+import numpy as np
 from database import db
 import gamebalance as gb
 from npc_logic import NPCLogic
 import name_generator
 from seed import generate_random_npc
+from world_state import WorldState
+from order_book import OrderBook
+import aptitudes
+from rng import rng
+from capability_cache import capability_cache
+from actions import record_actions
+from b2c_market import RetailBook, score_stocks, get_clearing
+import labor_market
+import stock_logic
+import ledger
+from perf import perf
+from sql_trace import tracer
 
 class Simulation:
-    def __init__(self):
-        pass
+    def __init__(self, decision_workers=0):
+        # decision_workers >= 2 で NPC意思決定をプロセス並列で実行する
+        self.decision_workers = decision_workers
+        self._executor = None
+        # 直近の process_b2c における需要配分のレポート (業界・セグメントごと)
+        self.clearing_reports = []
+        # 週の処理中に使うB2B注文板 (proceed_week の間だけ保持する)
+        self.order_book = None
+        # 今週の求人 (アクションの適用で積まれ、process_hr のマッチングで解消される)
+        self.requisitions = []
 
     def get_current_week(self):
         res = db.fetch_one("SELECT week FROM game_state")
         return res['week'] if res else 0
     
     def log_news(self, week, company_id, message, type='info'):
-        db.execute_query("INSERT INTO news_logs (week, company_id, message, type) VALUES (?, ?, ?, ?)",
+        db.execute_deferred("INSERT INTO news_logs (week, company_id, message, type) VALUES (?, ?, ?, ?)",
                          (week, company_id, message, type))
     
-    def calculate_capabilities(self, company_id, employees=None):
+    def calculate_capabilities(self, company_id, employees=None, world=None, staff=None):
         """
         企業の能力値を計算する
         事業部制に対応: 共通部門は全社、直接部門は事業部ごとに計算
+        world (WorldState) が渡された場合はDBではなくメモリ上のデータを参照する
+        staff (NPCStore.staff_aggregates の結果) が渡された場合は従業員の集計を省略する
         """
+        current_week = world.week if world else self.get_current_week()
+
         # 必要なカラムのみ取得して高速化
+        if staff is not None:
+            employees = []
+        elif employees is None and world:
+            employees = world.employees(company_id)
         if employees is None:
-            employees = db.fetch_all("""
-                SELECT department, role, diligence, production, development, sales, hr, pr, accounting, store_ops, management, division_id, aptitudes
+            employees = db.fetch_all(f"""
+                SELECT id, department, role, diligence, production, development, sales, hr, pr, accounting, store_ops, management, division_id,
+                       {', '.join(aptitudes.COLUMNS.values())}
                 FROM npcs WHERE company_id = ?""", (company_id,))
         
         # 初期化
@@ -45,7 +74,10 @@ class Simulation:
         }
 
         # 事業部情報の取得
-        divisions = db.fetch_all("SELECT id, name, industry_key FROM divisions WHERE company_id = ?", (company_id,))
+        if world:
+            divisions = world.divisions(company_id)
+        else:
+            divisions = db.fetch_all("SELECT id, name, industry_key FROM divisions WHERE company_id = ?", (company_id,))
         div_map = {d['id']: {'name': d['name'], 'industry': d['industry_key'] or 'automotive'} for d in divisions}
         
         # 戻り値の構造拡張
@@ -62,65 +94,32 @@ class Simulation:
             }
 
         # 施設キャパシティの取得
-        facilities = db.fetch_all("SELECT type, size, division_id FROM facilities WHERE company_id = ?", (company_id,))
-        
-        # 基礎キャパシティ (施設がなくても最低限活動できる場所: ガレージ/自宅など)
-        # NPC_SCALE_FACTOR(8) * 1.5人分 = 12 程度確保しておく
-        base_cap = int(gb.NPC_SCALE_FACTOR * 1.5)
-        # 全社共通および事業部ごとの施設リミット
-        caps_limit = {'office': base_cap} # 本社
-        div_caps_limit = {div_id: {'factory': base_cap, 'store': base_cap, 'office': base_cap} for div_id in div_map}
-
-        for f in facilities:
-            if f['division_id'] and f['division_id'] in div_caps_limit:
-                if f['type'] in div_caps_limit[f['division_id']]:
-                    div_caps_limit[f['division_id']][f['type']] += f['size']
-            elif f['type'] == 'office':
-                caps_limit['office'] += f['size']
+        if world:
+            facilities = world.facilities(company_id)
+        else:
+            facilities = db.fetch_all("SELECT type, size, division_id FROM facilities WHERE company_id = ?", (company_id,))
+        caps_limit, div_caps_limit = self._facility_limits(div_map, facilities)
 
         # 施設稼働状況の初期化
         caps['facilities'] = {'office': {'name': '本社オフィス', 'usage': 0, 'limit': caps_limit['office'], 'efficiency': 1.0, 'npc_count': 0}}
         
-        if not employees:
+        # 部署ごとの人員・能力の集計 (NPCStore で一括集計済みならそれを使う)
+        if staff is None:
+            staff = self._aggregate_staff(employees, div_map, div_caps_limit)
+
+        if not staff['count']:
             return caps
 
         # 勤勉さ平均 (安定性)
-        if employees:
-            caps['stability'] = sum(e['diligence'] for e in employees) / len(employees)
-        else:
-            caps['stability'] = 0
+        caps['stability'] = staff['diligence_sum'] / staff['count']
 
-        # 部署ごとの集計
-        # 共通部門
         corp_depts = [gb.DEPT_HR, gb.DEPT_PR, gb.DEPT_ACCOUNTING]
-        corp_staff = {d: [] for d in corp_depts}
-        
-        # 事業部部門
-        div_depts = [gb.DEPT_PRODUCTION, gb.DEPT_DEV, gb.DEPT_SALES, gb.DEPT_STORE]
-        div_staff = {div_id: {d: [] for d in div_depts} for div_id in div_map}
-        
-        # マネージャー・CxO
-        managers = []
-        cxos = []
+        empty = {'n': 0, 'n_raw': 0, 'sum': 0.0}
 
-        for e in employees:
-            d = e['department']
-            div_id = e['division_id']
-            
-            if e['role'] == gb.ROLE_MANAGER: managers.append(e)
-            if e['role'] in [gb.ROLE_CXO, gb.ROLE_CEO]: cxos.append(e)
-            
-            # 修正: 役員も現場人員に含める (プレイングマネージャーとして機能させる)
-            # if e['role'] in [gb.ROLE_CXO, gb.ROLE_CEO]: continue 
-            
-            if d in corp_depts:
-                corp_staff[d].append(e)
-            elif d in div_depts and div_id in div_staff:
-                div_staff[div_id][d].append(e)
-        
         # キャパシティ制限の適用 (あふれた人員は計算から除外、または効率低下)
         # 1. 共通部門 (本社オフィス)
-        total_corp_staff = sum(len(corp_staff[d]) for d in corp_depts) * gb.NPC_SCALE_FACTOR
+        corp_count = sum(staff['corp'].get(d, empty)['n'] for d in corp_depts)
+        total_corp_staff = corp_count * gb.NPC_SCALE_FACTOR
         corp_efficiency = 1.0
         if total_corp_staff > caps_limit['office'] and total_corp_staff > 0:
             corp_efficiency = caps_limit['office'] / total_corp_staff
@@ -130,7 +129,7 @@ class Simulation:
         
         caps['facilities']['office']['usage'] = total_corp_staff
         caps['facilities']['office']['efficiency'] = corp_efficiency
-        caps['facilities']['office']['npc_count'] = sum(len(corp_staff[d]) for d in corp_depts)
+        caps['facilities']['office']['npc_count'] = corp_count
 
         # 能力マッピング
         corp_stat_map = {
@@ -141,17 +140,14 @@ class Simulation:
 
         # 共通部門の能力計算
         for dept, stat in corp_stat_map.items():
-            staff = corp_staff[dept]
-            if staff:
-                avg_stat = sum(e[stat] for e in staff) / len(staff)
-                sum_stat = sum(e[stat] for e in staff)
-                
-                # マネジメントボーナス (全社の該当部署マネージャーを探す)
-                dept_mgrs = [m for m in managers if m['department'] == dept]
-                dept_cxos_list = [c for c in cxos if c['department'] == dept]
-                
-                manager_mgmt = dept_mgrs[0]['management'] if dept_mgrs else 0
-                cxo_mgmt = dept_cxos_list[0]['management'] if dept_cxos_list else 0
+            agg = staff['corp'].get(dept, empty)
+            if agg['n']:
+                avg_stat = agg['sum'] / agg['n']
+                sum_stat = agg['sum']
+                
+                # マネジメントボーナス (全社の該当部署マネージャー・CxO)
+                manager_mgmt = staff['mgr_corp'].get(dept, 0)
+                cxo_mgmt = staff['cxo'].get(dept, 0)
                 mgmt_bonus = (manager_mgmt * gb.MGMT_BONUS_MANAGER) + (cxo_mgmt * gb.MGMT_BONUS_CXO)
                 
                 caps[stat] = min(100.0, (avg_stat + mgmt_bonus) * corp_efficiency)
@@ -165,31 +161,23 @@ class Simulation:
             gb.DEPT_STORE: 'store_ops'
         }
 
-        for div_id, d_staff in div_staff.items():
+        for div_id in div_map:
             d_caps = caps['divisions'][div_id]
             d_limit = div_caps_limit[div_id]
+            d_staff = staff['div'].get(div_id, {})
             industry_key = div_map[div_id]['industry']
             ind_def = gb.INDUSTRIES.get(industry_key, {})
             
-            # 施設制限チェック
-            # 工場
-            prod_staff = d_staff[gb.DEPT_PRODUCTION]
-            prod_usage = len(prod_staff) * gb.NPC_SCALE_FACTOR
+            # 施設制限 (工場・店舗の収容超過分は集計時に能力上位から除外済み)
+            prod_agg = d_staff.get(gb.DEPT_PRODUCTION, empty)
+            prod_usage = prod_agg['n_raw'] * gb.NPC_SCALE_FACTOR
             prod_eff = 1.0
-            if prod_usage > d_limit['factory']:
-                prod_staff.sort(key=lambda x: x['production'], reverse=True)
-                # あふれた分は計算対象外にする
-                d_staff[gb.DEPT_PRODUCTION] = prod_staff[:int(d_limit['factory'] // gb.NPC_SCALE_FACTOR)]
-            
-            # 店舗
-            store_staff = d_staff[gb.DEPT_STORE]
-            store_usage = len(store_staff) * gb.NPC_SCALE_FACTOR
-            if store_usage > d_limit['store']:
-                store_staff.sort(key=lambda x: x['store_ops'], reverse=True)
-                d_staff[gb.DEPT_STORE] = store_staff[:int(d_limit['store'] // gb.NPC_SCALE_FACTOR)]
+            store_agg = d_staff.get(gb.DEPT_STORE, empty)
+            store_usage = store_agg['n_raw'] * gb.NPC_SCALE_FACTOR
             
             # 事業部オフィス (営業・開発)
-            div_office_staff = (len(d_staff[gb.DEPT_SALES]) + len(d_staff[gb.DEPT_DEV])) * gb.NPC_SCALE_FACTOR
+            office_count = d_staff.get(gb.DEPT_SALES, empty)['n'] + d_staff.get(gb.DEPT_DEV, empty)['n']
+            div_office_staff = office_count * gb.NPC_SCALE_FACTOR
             div_office_eff = 1.0
             # 事業部オフィス + 本社オフィスの余剰分 を利用可能とする
             effective_office_limit = d_limit['office'] + available_corp_office
@@ -202,47 +190,38 @@ class Simulation:
                 'usage': int(prod_usage),
                 'limit': int(d_limit['factory']),
                 'efficiency': prod_eff,
-                'npc_count': len(prod_staff)
+                'npc_count': prod_agg['n_raw']
             }
             caps['facilities'][f'store_{div_id}'] = {
                 'name': f"{d_caps['name']} 店舗",
                 'usage': int(store_usage),
                 'limit': int(d_limit['store']),
                 'efficiency': 1.0,
-                'npc_count': len(store_staff)
+                'npc_count': store_agg['n_raw']
             }
             caps['facilities'][f'office_{div_id}'] = {
                 'name': f"{d_caps['name']} オフィス",
                 'usage': int(div_office_staff),
                 'limit': int(d_limit['office']),
                 'efficiency': div_office_eff,
-                'npc_count': len(d_staff[gb.DEPT_SALES]) + len(d_staff[gb.DEPT_DEV])
+                'npc_count': office_count
             }
 
             # 計算
             for dept, stat in div_stat_map.items():
-                staff = d_staff[dept]
-                if staff:
+                agg = d_staff.get(dept, empty)
+                if agg['n']:
                     eff = div_office_eff if dept in [gb.DEPT_SALES, gb.DEPT_DEV] else 1.0
                     
-                    # 業界適性を適用 (能力値 * 適性値)
-                    weighted_stats = []
-                    for e in staff:
-                        apts = json.loads(e['aptitudes']) if e['aptitudes'] else {}
-                        apt = apts.get(industry_key, 0.1)
-                        weighted_stats.append(e[stat] * apt)
-
-                    avg_stat = sum(weighted_stats) / len(staff)
-                    sum_stat = sum(weighted_stats)
+                    # 業界適性を適用済みの能力合計 (能力値 * 適性値)
+                    avg_stat = agg['sum'] / agg['n']
+                    sum_stat = agg['sum']
                     
                     # 事業部マネージャー
-                    dept_mgrs = [m for m in managers if m['department'] == dept and m['division_id'] == div_id]
                     # CxOは全社共通だが、事業部にも影響すると仮定（あるいは事業部担当役員）
                     # ここでは簡易的に全社CxOが全事業部を見る
-                    dept_cxos_list = [c for c in cxos if c['department'] == dept]
-                    
-                    manager_mgmt = dept_mgrs[0]['management'] if dept_mgrs else 0
-                    cxo_mgmt = dept_cxos_list[0]['management'] if dept_cxos_list else 0
+                    manager_mgmt = staff['mgr_div'].get((div_id, dept), 0)
+                    cxo_mgmt = staff['cxo'].get(dept, 0)
                     mgmt_bonus = (manager_mgmt * gb.MGMT_BONUS_MANAGER) + (cxo_mgmt * gb.MGMT_BONUS_CXO)
                     
                     d_caps[stat] = min(100.0, (avg_stat + mgmt_bonus) * eff)
@@ -253,7 +232,7 @@ class Simulation:
                         d_caps[f"{stat}_capacity"] = sum_stat * eff * gb.NPC_SCALE_FACTOR
             
             # 店舗スループット
-            store_staff_count = len(d_staff[gb.DEPT_STORE])
+            store_staff_count = store_agg['n']
             sales_eff = ind_def.get('sales_efficiency_base', gb.BASE_SALES_EFFICIENCY)
             d_caps['store_throughput'] = store_staff_count * gb.NPC_SCALE_FACTOR * sales_eff * (d_caps['store_ops'] / 50.0)
             
@@ -270,7 +249,7 @@ class Simulation:
         if caps['stability'] < 50:
             # 安定性0で最大50%ダウン、安定性50でデバフなし
             max_penalty = 0.5 * (1.0 - (caps['stability'] / 50.0))
-            penalty_factor = 1.0 - random.uniform(0, max_penalty)
+            penalty_factor = 1.0 - rng.for_company(company_id, 'capability').uniform(0, max_penalty)
             
             for key in caps:
                 if key != 'stability' and isinstance(caps[key], (int, float)): # 安定性自体は下げない。辞書型(facilities)も除外
@@ -283,8 +262,11 @@ class Simulation:
             industry_key = div_map[div_id]['industry']
             ind_def = gb.INDUSTRIES.get(industry_key, {})
             dev_diff = ind_def.get('development_difficulty', 1.0)
-            dev_projects = db.fetch_one("SELECT COUNT(*) as cnt FROM product_designs WHERE company_id = ? AND division_id = ? AND status = 'developing'", (company_id, div_id))
-            dev_count = dev_projects['cnt'] if dev_projects else 0
+            if world:
+                dev_count = sum(1 for d in world.company_designs(company_id) if d['division_id'] == div_id and d['status'] == 'developing')
+            else:
+                dev_projects = db.fetch_one("SELECT COUNT(*) as cnt FROM product_designs WHERE company_id = ? AND division_id = ? AND status = 'developing'", (company_id, div_id))
+                dev_count = dev_projects['cnt'] if dev_projects else 0
             req_dev = dev_count * gb.REQ_CAPACITY_DEV_PROJECT * dev_diff
             d_caps['requirements']['development'] = req_dev
             
@@ -297,7 +279,7 @@ class Simulation:
         # 2. 営業部 (Sales)
         # 事業部ごとに計算
         # 統計データ(weekly_stats)ではなく、実データから事業部ごとの負荷を計算する
-        prev_week = self.get_current_week() - 1
+        prev_week = current_week - 1
         req_sales_total = 0
         
         for div_id, d_caps in caps['divisions'].items():
@@ -307,11 +289,21 @@ class Simulation:
             tx_coeff = ind_def.get('transaction_handling_coefficient', gb.REQ_CAPACITY_SALES_TRANSACTION)
 
             # 在庫数
-            inv_res = db.fetch_one("SELECT SUM(quantity) as cnt FROM inventory WHERE company_id = ? AND division_id = ?", (company_id, div_id))
-            stock_count = inv_res['cnt'] or 0
+            if world:
+                stock_count = sum(i['quantity'] for i in world.inventory(company_id) if i['division_id'] == div_id)
+            else:
+                inv_res = db.fetch_one("SELECT SUM(quantity) as cnt FROM inventory WHERE company_id = ? AND division_id = ?", (company_id, div_id))
+                stock_count = inv_res['cnt'] or 0
             
             # 取引数 (前週)
-            tx_res = db.fetch_one("SELECT SUM(t.quantity) as cnt FROM transactions t JOIN product_designs d ON t.design_id = d.id WHERE (t.seller_id = ? OR t.buyer_id = ?) AND t.week = ? AND d.division_id = ?", (company_id, company_id, prev_week, div_id))
+            tx_res = db.fetch_one("""
+                SELECT SUM(t.quantity) as cnt FROM transactions t JOIN product_designs d ON t.design_id = d.id
+                WHERE t.id IN (
+                    SELECT id FROM transactions WHERE seller_id = ? AND week = ?
+                    UNION
+                    SELECT id FROM transactions WHERE buyer_id = ? AND week = ?
+                ) AND d.division_id = ?
+            """, (company_id, prev_week, company_id, prev_week, div_id))
             tx_count = tx_res['cnt'] or 0
             
             div_req = (tx_count * tx_coeff) + (stock_count * stock_coeff)
@@ -331,12 +323,15 @@ class Simulation:
 
         # 3. 広報部 (PR)
         # 仕事量: ブランド力 + 全商品認知度
-        comp_info = db.fetch_one("SELECT brand_power FROM companies WHERE id = ?", (company_id,))
+        if world:
+            comp_info = world.company(company_id)
+            awareness = sum(d['awareness'] or 0 for d in world.company_designs(company_id))
+        else:
+            comp_info = db.fetch_one("SELECT brand_power FROM companies WHERE id = ?", (company_id,))
+            awareness_res = db.fetch_one("SELECT SUM(awareness) as total FROM product_designs WHERE company_id = ?", (company_id,))
+            awareness = awareness_res['total'] if awareness_res and awareness_res['total'] else 0
         brand = comp_info['brand_power'] if comp_info else 0
         
-        awareness_res = db.fetch_one("SELECT SUM(awareness) as total FROM product_designs WHERE company_id = ?", (company_id,))
-        awareness = awareness_res['total'] if awareness_res and awareness_res['total'] else 0
-        
         req_pr = (brand + awareness) * gb.REQ_CAPACITY_PR_POINT
         caps['requirements']['pr'] = req_pr
         
@@ -351,7 +346,7 @@ class Simulation:
         # 4. 人事部 (HR)
         # 仕事量: 全従業員数 (NPC数 * SCALE)
         # process_hr のロジック: required = 50 * (scaled_count / 7.0)
-        total_employees = len(employees)
+        total_employees = staff['count']
         total_employees_scaled = total_employees * gb.NPC_SCALE_FACTOR
         req_hr = 50 * (total_employees_scaled / gb.HR_CAPACITY_PER_PERSON)
         caps['requirements']['hr'] = int(req_hr)
@@ -361,8 +356,15 @@ class Simulation:
         # 仕事量: 取引数 + 従業員数
         # process_stock_market のロジック参照
         # 取引数は前週の実績を使用 (Transactionsテーブルから件数を取得)
-        prev_week_acc = self.get_current_week() - 1
-        tx_res = db.fetch_one("SELECT COUNT(*) as cnt FROM transactions WHERE (seller_id = ? OR buyer_id = ?) AND week = ?", (company_id, company_id, prev_week_acc))
+        prev_week_acc = current_week - 1
+        # OR 条件だとインデックスが使えないため、売り手側・買い手側をそれぞれ索引で引いて UNION する
+        tx_res = db.fetch_one("""
+            SELECT COUNT(*) as cnt FROM (
+                SELECT id FROM transactions WHERE seller_id = ? AND week = ?
+                UNION
+                SELECT id FROM transactions WHERE buyer_id = ? AND week = ?
+            )
+        """, (company_id, prev_week_acc, company_id, prev_week_acc))
         total_tx = tx_res['cnt'] if tx_res else 0
         
         req_acc = (total_tx * gb.ACCOUNTING_LOAD_PER_TRANSACTION) + (total_employees * gb.ACCOUNTING_LOAD_PER_EMPLOYEE)
@@ -371,39 +373,626 @@ class Simulation:
         
         return caps
 
+    def _facility_limits(self, div_map, facilities):
+        """本社オフィスと事業部ごとの施設収容上限 (スケール済み人数) を返す"""
+        # 基礎キャパシティ (施設がなくても最低限活動できる場所: ガレージ/自宅など)
+        # NPC_SCALE_FACTOR(8) * 1.5人分 = 12 程度確保しておく
+        base_cap = int(gb.NPC_SCALE_FACTOR * 1.5)
+        # 全社共通および事業部ごとの施設リミット
+        caps_limit = {'office': base_cap} # 本社
+        div_caps_limit = {div_id: {'factory': base_cap, 'store': base_cap, 'office': base_cap} for div_id in div_map}
+
+        for f in facilities:
+            if f['division_id'] and f['division_id'] in div_caps_limit:
+                if f['type'] in div_caps_limit[f['division_id']]:
+                    div_caps_limit[f['division_id']][f['type']] += f['size']
+            elif f['type'] == 'office':
+                caps_limit['office'] += f['size']
+        return caps_limit, div_caps_limit
+
+    def _aggregate_staff(self, employees, div_map, div_caps_limit):
+        """
+        従業員リストを部署別に集計する (1社分)
+        工場・店舗の収容上限を超えた人員は能力上位から残し、事業部部門は業界適性で重み付けする
+        """
+        staff = {'count': len(employees), 'diligence_sum': sum(e['diligence'] for e in employees),
+                 'corp': {}, 'div': {}, 'mgr_corp': {}, 'mgr_div': {}, 'cxo': {}}
+        corp_depts = [gb.DEPT_HR, gb.DEPT_PR, gb.DEPT_ACCOUNTING]
+        div_depts = [gb.DEPT_PRODUCTION, gb.DEPT_DEV, gb.DEPT_SALES, gb.DEPT_STORE]
+        stat_map = {
+            gb.DEPT_PRODUCTION: 'production', gb.DEPT_SALES: 'sales', gb.DEPT_DEV: 'development',
+            gb.DEPT_HR: 'hr', gb.DEPT_PR: 'pr', gb.DEPT_ACCOUNTING: 'accounting', gb.DEPT_STORE: 'store_ops'
+        }
+        limits = {gb.DEPT_PRODUCTION: 'factory', gb.DEPT_STORE: 'store'}
+
+        corp_staff = {d: [] for d in corp_depts}
+        div_staff = {div_id: {d: [] for d in div_depts} for div_id in div_map}
+
+        for e in sorted(employees, key=lambda x: x['id']):
+            d = e['department']
+            div_id = e['division_id']
+
+            # マネージャー・CxO (各部署で最初に見つかった者)
+            if e['role'] == gb.ROLE_MANAGER and d:
+                staff['mgr_corp'].setdefault(d, e['management'])
+                if div_id in div_map:
+                    staff['mgr_div'].setdefault((div_id, d), e['management'])
+            if e['role'] in [gb.ROLE_CXO, gb.ROLE_CEO] and d:
+                staff['cxo'].setdefault(d, e['management'])
+
+            # 修正: 役員も現場人員に含める (プレイングマネージャーとして機能させる)
+            if d in corp_depts:
+                corp_staff[d].append(e)
+            elif d in div_depts and div_id in div_staff:
+                div_staff[div_id][d].append(e)
+
+        for d, members in corp_staff.items():
+            if members:
+                staff['corp'][d] = {'n': len(members), 'sum': sum(e[stat_map[d]] for e in members)}
+
+        for div_id, d_staff in div_staff.items():
+            industry_key = div_map[div_id]['industry']
+            for d, members in d_staff.items():
+                if not members: continue
+                stat = stat_map[d]
+                n_raw = len(members)
+                # 施設上限を超えた分は計算対象外にする
+                if d in limits:
+                    max_heads = int(div_caps_limit[div_id][limits[d]] // gb.NPC_SCALE_FACTOR)
+                    if n_raw * gb.NPC_SCALE_FACTOR > div_caps_limit[div_id][limits[d]]:
+                        members = sorted(members, key=lambda x: x[stat], reverse=True)[:max_heads]
+
+                # 業界適性を適用 (能力値 * 適性値)
+                weighted_sum = 0
+                for e in members:
+                    weighted_sum += e[stat] * aptitudes.get(e, industry_key)
+                staff['div'].setdefault(div_id, {})[d] = {'n_raw': n_raw, 'n': len(members), 'sum': weighted_sum}
+        return staff
+
+    def get_capabilities(self, company_id, world=None):
+        """キャッシュ経由で企業の能力値を取得する (同じ週・変更なしなら再計算しない)"""
+        week = world.week if world else self.get_current_week()
+        caps = capability_cache.get(company_id, week)
+        if caps is None:
+            caps = self.calculate_capabilities(company_id, world=world)
+            capability_cache.put(company_id, week, caps)
+        return caps
+
+    def calculate_all_capabilities(self, world):
+        """
+        全アクティブ企業の能力値を一括計算する
+        キャッシュにない企業のみ、従業員の部署別集計を NPCStore の配列演算でまとめて行う
+        """
+        all_caps = {}
+        companies = []
+        for comp in world.active_companies():
+            caps = capability_cache.get(comp['id'], world.week)
+            if caps is None:
+                companies.append(comp)
+            else:
+                all_caps[comp['id']] = caps
+        if not companies:
+            return all_caps
+
+        head_limits = {}
+        for comp in companies:
+            divs = world.divisions(comp['id'])
+            div_map = {d['id']: {'name': d['name'], 'industry': d['industry_key'] or 'automotive'} for d in divs}
+            _, div_caps_limit = self._facility_limits(div_map, world.facilities(comp['id']))
+            for div_id, limit in div_caps_limit.items():
+                head_limits[(div_id, gb.DEPT_PRODUCTION)] = int(limit['factory'] // gb.NPC_SCALE_FACTOR)
+                head_limits[(div_id, gb.DEPT_STORE)] = int(limit['store'] // gb.NPC_SCALE_FACTOR)
+
+        all_staff = world.npc_store.staff_aggregates(list(world.rows['divisions'].values()), head_limits)
+        empty_staff = {'count': 0, 'diligence_sum': 0, 'corp': {}, 'div': {}, 'mgr_corp': {}, 'mgr_div': {}, 'cxo': {}}
+
+        for comp in companies:
+            caps = self.calculate_capabilities(comp['id'], world=world, staff=all_staff.get(comp['id'], empty_staff))
+            capability_cache.put(comp['id'], world.week, caps)
+            all_caps[comp['id']] = caps
+        return all_caps
+
+    def _decide_company(self, comp, ctx):
+        """
+        1社分の意思決定パイプラインを実行する (決定内容は logic.actions に積まれる)
+        ctx: proceed_week で作成する週初のスナップショット
+        """
+        current_week = ctx['week']
+        company_employees = ctx['npcs_by_company'].get(comp['id'], [])
+        company_designs = ctx['designs_by_company'].get(comp['id'], [])
+        company_inventory = ctx['inventory_by_company'].get(comp['id'], [])
+        all_caps = ctx['all_caps']
+
+        logic = NPCLogic(comp['id'], company_data=comp, employees=company_employees)
+
+        # フェーズ更新とリストラ判断 (最初に行う) - 経営状態の確認
+        logic.update_phase(current_week)
+        logic.decide_restructuring(current_week)
+        logic.decide_financing(current_week)
+        logic.decide_stock_action(current_week) # 資本政策
+
+        # --- 計画フェーズ ---
+        logic.decide_weekly_targets(
+            current_week,
+            designs=company_designs,
+            inventory=company_inventory,
+            b2b_sales_history=ctx['market_b2b_sales_history'],
+            market_total_sales_4w=ctx['market_total_sales_4w'],
+            economic_index=ctx['economic_index'],
+            maker_stocks=ctx['maker_stocks']
+        )
+
+        # --- 準備フェーズ (リソース確保) ---
+        logic.decide_facilities(current_week)
+        logic.decide_development(current_week, designs=company_designs)
+        logic.decide_advertising(current_week)
+
+        # 人事 (目標キャパシティに基づいて採用)
+        logic.decide_hiring(current_week, all_caps=all_caps)
+        logic.decide_salary(current_week)
+        logic.decide_promotion(current_week)
+
+        # --- 実行フェーズ ---
+        # 受注処理を先に実行 (在庫を引き当てるため)
+        logic.decide_order_fulfillment(
+            current_week,
+            orders=ctx['orders_for_seller'].get(comp['id'], []),
+            inventory=company_inventory
+        )
+
+        logic.decide_production(
+            current_week,
+            designs=company_designs,
+            inventory=company_inventory,
+            b2b_sales_history=ctx['market_b2b_sales_history'],
+            market_total_sales_4w=ctx['market_total_sales_4w'],
+            economic_index=ctx['economic_index']
+        )
+        logic.decide_procurement(
+            current_week,
+            maker_stocks=ctx['maker_stocks'],
+            my_capabilities=all_caps.get(comp['id']),
+            all_capabilities=all_caps,
+            my_inventory=company_inventory,
+            on_order=ctx['orders_for_buyer'].get(comp['id'], [])
+        )
+        logic.decide_pricing(
+            current_week,
+            designs=ctx['all_designs'],
+            inventory=company_inventory,
+            b2b_sales_history=ctx['market_b2b_sales_history']
+        )
+        return logic
+
+    def _decide_parallel(self, ctx, bottleneck_cache):
+        """
+        意思決定をワーカープロセスで実行し、各社のアクションを企業ID順に並べて返す。
+        各社は同じ週初スナップショットを見て判断するため、結果は分割数や完了順に依存しない。
+        """
+        import decision_worker
+
+        results = decision_worker.run_parallel(ctx, self._decision_executor(), self.decision_workers)
+        week_actions = []
+        for cid in sorted(results):
+            actions, phase, plan = results[cid]
+            week_actions.extend(actions)
+            bottleneck_cache[cid] = {'phase': phase, 'plan': plan}
+        return week_actions
+
+    def _decision_executor(self):
+        if self._executor is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # fork だと親のSQLite接続を引き継いでしまうため spawn で起動する
+            self._executor = ProcessPoolExecutor(max_workers=self.decision_workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def shutdown(self):
+        """並列意思決定用のワーカープロセスを終了する"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    # ---------------------------------------------------------
+    # アクションの適用
+    # ---------------------------------------------------------
+    # 種類ごとの適用順 (解雇は昇進・昇給より先、施設の契約は解約より先に処理する)
+    ACTION_ORDER = [
+        'SetPhase', 'FireEmployee', 'PromoteEmployee', 'RaiseSalary', 'MakeJobOffer', 'PostRequisition',
+        'TakeLoan', 'ApplyIPO', 'IssueShares', 'BuybackShares', 'PayDividend',
+        'ContractFacility', 'ReleaseFacility', 'StartDevelopment', 'RunAdvertising',
+        'AcceptB2BOrder', 'RejectB2BOrder', 'ProduceGoods', 'PlaceB2BOrder', 'SetPrice', 'SetRetailPrice',
+    ]
+
+    def apply_actions(self, actions, current_week, world=None):
+        """
+        全社分のアクションを検証し、種類ごとにまとめて世界状態 (world) へ適用する。
+        actions は企業ID順・出力順に並べて渡す (同じ入力なら同じ結果になる)。
+        週初の状態と矛盾するもの (退職済みの社員への昇進、他社が先に契約した施設など) は却下し、
+        却下分も含めて action_log に記録する。
+        """
+        handlers = {
+            'SetPhase': self._apply_set_phase,
+            'FireEmployee': self._apply_fire_employee,
+            'PromoteEmployee': self._apply_promote_employee,
+            'RaiseSalary': self._apply_raise_salary,
+            'MakeJobOffer': self._apply_job_offer,
+            'PostRequisition': self._apply_requisition,
+            'TakeLoan': self._apply_take_loan,
+            'ApplyIPO': self._apply_ipo,
+            'IssueShares': self._apply_issue_shares,
+            'BuybackShares': self._apply_buyback_shares,
+            'PayDividend': self._apply_dividend,
+            'ContractFacility': self._apply_contract_facility,
+            'ReleaseFacility': self._apply_release_facility,
+            'StartDevelopment': self._apply_start_development,
+            'RunAdvertising': self._apply_advertising,
+            'AcceptB2BOrder': self._apply_accept_order,
+            'RejectB2BOrder': self._apply_reject_order,
+            'ProduceGoods': self._apply_produce,
+            'PlaceB2BOrder': self._apply_place_order,
+            'SetPrice': self._apply_set_price,
+            'SetRetailPrice': self._apply_retail_price,
+        }
+        groups = {}
+        for action in actions:
+            action.status = 'applied'
+            groups.setdefault(action.type, []).append(action)
+
+        # 週の処理外 (アクションの再適用など) では世界状態と注文板をここで読み込み、適用後に書き戻す
+        own_world = world is None
+        if own_world:
+            world = WorldState.load()
+        own_book = self.order_book is None
+        if own_book:
+            self.order_book = OrderBook.load()
+        # 資金・仕訳・ニュースは全種類分を集めて最後に1回で反映する
+        batch = {'world': world, 'funds': {}, 'entries': [], 'news': []}
+        with db.transaction() as conn:
+            cursor = conn.cursor()
+            for action_type in self.ACTION_ORDER:
+                if action_type in groups:
+                    handlers[action_type](cursor, groups[action_type], current_week, batch)
+
+            for cid, delta in sorted(batch['funds'].items()):
+                if delta:
+                    world.adjust('companies', cid, 'funds', delta)
+            db.bulk_insert('account_entries', batch['entries'])
+            db.bulk_insert('news_logs', batch['news'])
+            record_actions(actions)
+            if own_book:
+                self.order_book.flush()
+                self.order_book = None
+            if own_world:
+                world.flush()
+
+        rejected = 0
+        for action in actions:
+            if action.status == 'applied':
+                if action.log:
+                    db.log_file_event(action.week, action.company_id, *action.log)
+            else:
+                rejected += 1
+                db.log_file_event(action.week, action.company_id, "Action Rejected", f"{action.type}: {action.note}")
+        return rejected
+
+    def _reject(self, action, note):
+        action.status = 'rejected'
+        action.note = note
+
+    def _add_funds(self, batch, company_id, amount):
+        batch['funds'][company_id] = batch['funds'].get(company_id, 0) + amount
+
+    def _add_entry(self, batch, week, company_id, category, amount):
+        batch['entries'].append({'week': week, 'company_id': company_id, 'category': category, 'amount': amount})
+
+    def _add_news(self, batch, week, company_id, message, type='info'):
+        batch['news'].append({'week': week, 'company_id': company_id, 'message': message, 'type': type})
+
+    def _owned(self, batch, table, row_id, company_id):
+        """row_id の行が存在し、company_id の企業の所有であるか"""
+        row = batch['world'].rows[table].get(row_id)
+        return row is not None and row['company_id'] == company_id
+
+    def _employed(self, group, batch):
+        """社員への操作のうち、対象がまだその企業に在籍しているものだけを返す"""
+        valid = []
+        for a in group:
+            if self._owned(batch, 'npcs', a.npc_id, a.company_id):
+                valid.append(a)
+            else:
+                self._reject(a, f"NPC {a.npc_id} is no longer employed")
+        return valid
+
+    # --- 経営・人事 ---
+    def _apply_set_phase(self, cursor, group, current_week, batch):
+        for a in group:
+            db.set_weekly_stat(a.week, a.company_id, 'phase', a.phase)
+
+    def _apply_fire_employee(self, cursor, group, current_week, batch):
+        for a in self._employed(group, batch):
+            batch['world'].update('npcs', a.npc_id, company_id=None, department=None, role=None,
+                                  last_resigned_week=a.week, last_company_id=a.company_id, loyalty=50)
+
+    def _apply_promote_employee(self, cursor, group, current_week, batch):
+        valid = self._employed(group, batch)
+        batch['world'].update_many('npcs', [a.npc_id for a in valid], role=[a.role for a in valid])
+
+    def _apply_raise_salary(self, cursor, group, current_week, batch):
+        valid = self._employed(group, batch)
+        batch['world'].update_many('npcs', [a.npc_id for a in valid], salary=[a.salary for a in valid])
+
+    def _apply_job_offer(self, cursor, group, current_week, batch):
+        rows = []
+        for a in group:
+            if not self._owned(batch, 'npcs', a.npc_id, None):
+                self._reject(a, f"NPC {a.npc_id} is not on the labor market")
+                continue
+            rows.append({'week': a.week, 'company_id': a.company_id, 'npc_id': a.npc_id,
+                         'offer_salary': a.offer_salary, 'target_dept': a.target_dept})
+        db.bulk_insert('job_offers', rows)
+
+    def _apply_requisition(self, cursor, group, current_week, batch):
+        for a in group:
+            if not a.count or a.count <= 0:
+                self._reject(a, "requisition has no openings")
+                continue
+            self.requisitions.append({'company_id': a.company_id, 'target_dept': a.target_dept, 'count': a.count,
+                                      'industry_key': a.industry_key, 'stat_error': a.stat_error, 'eval_noise': a.eval_noise})
+
+    # --- 資金調達・資本政策 ---
+    def _apply_take_loan(self, cursor, group, current_week, batch):
+        rows = []
+        for a in group:
+            if a.amount <= 0:
+                self._reject(a, "non-positive loan amount")
+                continue
+            rows.append((a.company_id, a.amount, a.interest_rate, a.remaining_weeks))
+            self._add_funds(batch, a.company_id, a.amount)
+        batch['world'].insert_many('loans', ['company_id', 'amount', 'interest_rate', 'remaining_weeks'], rows)
+
+    def _apply_ipo(self, cursor, group, current_week, batch):
+        companies = batch['world'].companies
+        valid = []
+        for a in group:
+            if companies[a.company_id]['listing_status'] != 'private':
+                self._reject(a, "company is not private")
+                continue
+            valid.append(a)
+        batch['world'].update_many('companies', [a.company_id for a in valid], listing_status=['applying'] * len(valid))
+
+    def _listed(self, group, quantity, batch):
+        """
+        資本政策のうち、上場中の企業による数量 (quantity: 株数 'shares' か1株配当 'dps')・金額が正のものだけを返す。
+        戻り値: (有効なアクション, {company_id: 企業の行})
+        """
+        companies = batch['world'].companies
+        valid = []
+        for a in group:
+            if companies[a.company_id]['listing_status'] != 'public':
+                self._reject(a, "company is not listed")
+            elif getattr(a, quantity) <= 0 or a.amount <= 0:
+                self._reject(a, f"non-positive {quantity} or amount")
+            else:
+                valid.append(a)
+        return valid, companies
+
+    def _available_funds(self, batch, company):
+        """週初の資金に、このバッチで先に適用したアクションの増減を加えた額"""
+        return company['funds'] + batch['funds'].get(company['id'], 0)
+
+    def _apply_issue_shares(self, cursor, group, current_week, batch):
+        valid, _ = self._listed(group, 'shares', batch)
+        for a in valid:
+            batch['world'].adjust('companies', a.company_id, 'outstanding_shares', a.shares)
+            self._add_funds(batch, a.company_id, a.amount)
+            self._add_entry(batch, a.week, a.company_id, 'equity_finance', a.amount)
+            self._add_news(batch, a.week, a.company_id, f"公募増資を実施し、{a.amount:,}円を調達しました。", 'market')
+
+    def _apply_buyback_shares(self, cursor, group, current_week, batch):
+        # 発行済株式数は増資の適用後の値を読む (同じ週の増資分も買い戻せる)
+        valid, companies = self._listed(group, 'shares', batch)
+        for a in valid:
+            company = companies[a.company_id]
+            outstanding = company['outstanding_shares']
+            if a.shares > outstanding:
+                self._reject(a, f"buyback of {a.shares} shares exceeds outstanding {outstanding}")
+                continue
+            if a.amount > self._available_funds(batch, company):
+                self._reject(a, f"insufficient funds for buyback ({a.amount:,})")
+                continue
+            batch['world'].adjust('companies', a.company_id, 'outstanding_shares', -a.shares)
+            self._add_funds(batch, a.company_id, -a.amount)
+            self._add_entry(batch, a.week, a.company_id, 'equity_finance', -a.amount)
+
+    def _apply_dividend(self, cursor, group, current_week, batch):
+        valid, companies = self._listed(group, 'dps', batch)
+        for a in valid:
+            if a.amount > self._available_funds(batch, companies[a.company_id]):
+                self._reject(a, f"insufficient funds for dividend ({a.amount:,})")
+                continue
+            self._add_funds(batch, a.company_id, -a.amount)
+            self._add_entry(batch, a.week, a.company_id, 'equity_finance', -a.amount)
+            self._add_news(batch, a.week, a.company_id, f"1株当たり{a.dps}円の配当を実施しました。", 'market')
+
+    # --- 施設 ---
+    def _apply_contract_facility(self, cursor, group, current_week, batch):
+        # 各社は週初の空き物件から選ぶため、先に適用された他社と同じ物件を選んでいることがある。
+        # 家賃・購入価格は種類と広さで決まるため、同条件の空き物件に振り替えても判断結果は変わらない。
+        # 振替先がなければ却下し、翌週に改めて判断される。
+        world = batch['world']
+        vacant = {}
+        for f in sorted(world.owned_by('facilities', None), key=lambda f: f['id']):
+            vacant.setdefault((f['type'], f['size']), []).append(f['id'])
+
+        for a in group:
+            fid = a.facility_id
+            if not self._owned(batch, 'facilities', fid, None):
+                fid = next((i for i in vacant.get((a.facility_type, a.size), []) if world.rows['facilities'][i]['company_id'] is None), None)
+                if fid is None:
+                    self._reject(a, f"{a.facility_type} (Size: {a.size}) was contracted by another company")
+                    continue
+                a.note = f"substituted facility {a.facility_id} with {fid}"
+                a.facility_id = fid
+            world.update('facilities', fid, company_id=a.company_id, division_id=a.division_id,
+                         is_owned=1 if a.purchase_price is not None else 0)
+            if a.purchase_price is not None:
+                self._add_funds(batch, a.company_id, -a.purchase_price)
+                self._add_entry(batch, a.week, a.company_id, 'facility_purchase', a.purchase_price)
+
+    def _apply_release_facility(self, cursor, group, current_week, batch):
+        world = batch['world']
+        for a in group:
+            if not self._owned(batch, 'facilities', a.facility_id, a.company_id) or world.rows['facilities'][a.facility_id]['is_owned']:
+                self._reject(a, f"facility {a.facility_id} is not rented by the company")
+                continue
+            world.update('facilities', a.facility_id, company_id=None, division_id=None, is_owned=0)
+
+    # --- 開発・広告・生産 ---
+    def _apply_start_development(self, cursor, group, current_week, batch):
+        # 開発開始時の費用はない (開発部員の人件費で賄う) ため、資金が尽きている企業の新規開発のみ却下する
+        world = batch['world']
+        valid = []
+        for a in group:
+            company = world.company(a.company_id)
+            if company is None or not company['is_active']:
+                self._reject(a, "company is not active")
+            elif not self._owned(batch, 'divisions', a.division_id, a.company_id):
+                self._reject(a, f"division {a.division_id} is not owned by the company")
+            elif self._available_funds(batch, company) <= 0:
+                self._reject(a, "insufficient funds for development")
+            else:
+                valid.append(a)
+        world.insert_many('product_designs', [
+            'company_id', 'division_id', 'industry_key', 'name', 'material_score', 'concept_score', 'production_efficiency',
+            'base_price', 'sales_price', 'status', 'strategy', 'developed_week', 'parts_config'
+        ], [(a.company_id, a.division_id, a.industry_key, a.name, a.material_score, 0, 0, 0, 0, 'developing', a.strategy, a.week, a.parts_config)
+            for a in valid])
+        for a in valid:
+            db.increment_weekly_stat(a.week, a.company_id, 'development_ordered', 1)
+
+    def _apply_advertising(self, cursor, group, current_week, batch):
+        world = batch['world']
+        for a in group:
+            if a.design_id is None:
+                world.adjust('companies', a.company_id, 'brand_power', a.brand_effect)
+            elif self._owned(batch, 'product_designs', a.design_id, a.company_id):
+                world.adjust('product_designs', a.design_id, 'awareness', a.awareness_effect)
+            else:
+                self._reject(a, f"design {a.design_id} is not owned by the company")
+                continue
+            self._add_funds(batch, a.company_id, -a.amount)
+            self._add_entry(batch, a.week, a.company_id, 'ad', a.amount)
+
+    def _apply_produce(self, cursor, group, current_week, batch):
+        world = batch['world']
+        inserts = []
+        for a in group:
+            if a.inventory_id is not None and not self._owned(batch, 'inventory', a.inventory_id, a.company_id):
+                self._reject(a, f"inventory {a.inventory_id} is not owned by the company")
+                continue
+            if a.inventory_id is not None:
+                world.adjust('inventory', a.inventory_id, 'quantity', a.quantity)
+            else:
+                inserts.append((a.company_id, a.design_id, a.quantity, a.sales_price))
+            self._add_funds(batch, a.company_id, -a.cost)
+            self._add_entry(batch, a.week, a.company_id, 'material', a.cost)
+            db.increment_weekly_stat(a.week, a.company_id, 'production_ordered', a.quantity)
+            db.increment_weekly_stat(a.week, a.company_id, 'production_completed', a.quantity)
+        world.insert_many('inventory', ['company_id', 'design_id', 'quantity', 'sales_price'], inserts)
+
+    # --- B2B取引・価格 ---
+    def _pending_orders(self, group):
+        """受注・拒否のうち、まだ保留中の自社宛て注文に対するものだけを返す"""
+        valid = []
+        for a in group:
+            order = self.order_book.get(a.order_id)
+            if order is None or order['seller_id'] != a.company_id or order['status'] != 'pending':
+                self._reject(a, f"order {a.order_id} is not pending for the company")
+                continue
+            valid.append(a)
+        return valid
+
+    def _apply_accept_order(self, cursor, group, current_week, batch):
+        for a in self._pending_orders(group):
+            self.order_book.accept(a.order_id, a.quantity, a.amount)
+
+    def _apply_reject_order(self, cursor, group, current_week, batch):
+        for a in self._pending_orders(group):
+            self.order_book.reject(a.order_id)
+
+    def _apply_place_order(self, cursor, group, current_week, batch):
+        companies = batch['world'].companies
+        for a in group:
+            seller = companies.get(a.seller_id)
+            if seller is None or not seller['is_active']:
+                self._reject(a, f"seller {a.seller_id} is not active")
+                continue
+            self.order_book.place(a.week, a.company_id, a.seller_id, a.design_id, a.quantity, a.amount)
+            # 売り手（プレイヤー等）にも通知を出す
+            self._add_news(batch, a.week, a.seller_id,
+                           f"{companies[a.company_id]['name']} から {a.quantity}台 の注文が入りました (営業画面で確認してください)")
+
+    def _apply_set_price(self, cursor, group, current_week, batch):
+        valid = []
+        for a in group:
+            if not self._owned(batch, 'product_designs', a.design_id, a.company_id):
+                self._reject(a, f"design {a.design_id} is not owned by the company")
+                continue
+            valid.append(a)
+        batch['world'].update_many('product_designs', [a.design_id for a in valid], sales_price=[a.price for a in valid])
+
+    def _apply_retail_price(self, cursor, group, current_week, batch):
+        valid = []
+        for a in group:
+            if not self._owned(batch, 'inventory', a.inventory_id, a.company_id):
+                self._reject(a, f"inventory {a.inventory_id} is not owned by the company")
+                continue
+            valid.append(a)
+        batch['world'].update_many('inventory', [a.inventory_id for a in valid], sales_price=[a.price for a in valid])
+
     def proceed_week(self):
-      with db.transaction():
-        current_week = self.get_current_week()
+        """1週間進める (全フェーズを1トランザクションで実行し、新しい週を返す)"""
+        # フェーズ別の計測・SQLのトレース (perf.enable() / tracer.enable() した場合のみ。週末に集計する)
+        perf.begin_week()
+        tracer.begin_week()
+        perf.start('week')
+        with db.transaction():
+            # 世界状態を一括ロード (以降のフェーズはメモリ上で読み書きし、週末にまとめて書き戻す)
+            with perf.phase('load'):
+                world = WorldState.load()
+                self.order_book = OrderBook.load()
+            return self._run_week(world)
+
+    def _run_week(self, world):
+        """proceed_week のトランザクション内で各フェーズを順に実行する"""
+        orders = self.order_book
+        self.requisitions = []
+        current_week = world.week
+        rng.begin_week(current_week)
         print(f"[Week {current_week}] Simulation Start")
 
         # 0. B2B注文の自動取り下げ (前週以前の未承認注文を期限切れにする)
         # 発注から受注まで1週間の猶予を持たせるため、2週以上前のものを期限切れにする
-        db.execute_query("UPDATE b2b_orders SET status = 'expired' WHERE status = 'pending' AND week < ?", (current_week - 1,))
+        orders.expire(current_week - 1)
 
         # 1. NPC意思決定
+        perf.start('npc_decisions')
         # --- パフォーマンス改善: 意思決定に必要なデータを一括で事前取得 ---
 
-        # 全アクティブ企業とNPCを取得
-        all_companies = db.fetch_all("SELECT * FROM companies WHERE is_active = 1")
-        all_npcs = db.fetch_all("SELECT * FROM npcs WHERE company_id IS NOT NULL")
-
-        # 企業IDをキーにした辞書を作成
-        companies_map = {c['id']: c for c in all_companies}
-        npcs_by_company = {c['id']: [] for c in all_companies}
-        for npc in all_npcs:
-            if npc['company_id'] in npcs_by_company:
-                npcs_by_company[npc['company_id']].append(npc)
+        # 全アクティブ企業とNPC (意思決定前のスナップショット)
+        all_companies = [dict(c) for c in world.active_companies()]
+        npcs_by_company = {c['id']: world.employees(c['id']) for c in all_companies}
 
         # 全企業の能力値を一括計算
-        all_caps = {}
-        for comp in all_companies:
-            all_caps[comp['id']] = self.calculate_capabilities(comp['id'], employees=npcs_by_company.get(comp['id'], []))
+        all_caps = self.calculate_all_capabilities(world)
 
         # 意思決定で共通して利用する市場データを取得
-        economic_index = db.fetch_one("SELECT economic_index FROM game_state")['economic_index']
+        economic_index = world.economic_index
 
         # 直近4週間のB2B販売実績 (全社) - 最高売上週を参照
-        market_b2b_sales_history = db.fetch_all("""
+        market_b2b_sales_history = [dict(r) for r in db.fetch_all("""
             SELECT seller_id, design_id, MAX(weekly_total) as max_weekly
             FROM (
                 SELECT seller_id, design_id, week, SUM(quantity) as weekly_total
@@ -412,50 +1001,28 @@ class Simulation:
                 GROUP BY seller_id, design_id, week
             )
             GROUP BY seller_id, design_id
-        """, (current_week - 4,))
+        """, (current_week - 4,))]
 
         # 市場全体のB2B販売規模（直近4週）
         market_stats_res = db.fetch_one("SELECT SUM(b2b_sales) as total FROM weekly_stats WHERE week >= ?", (current_week - 4,))
         market_total_sales_4w = market_stats_res['total'] if market_stats_res and market_stats_res['total'] else 0
 
-        # 全在庫情報
-        all_inventory_res = db.fetch_all("SELECT * FROM inventory")
-        inventory_by_company = {c['id']: [] for c in all_companies}
-        for inv in all_inventory_res:
-            if inv['company_id'] in inventory_by_company:
-                inventory_by_company[inv['company_id']].append(dict(inv))
+        # 全在庫情報 (意思決定側で引当数を書き換えるためコピーを渡す)
+        inventory_by_company = {c['id']: [dict(inv) for inv in world.inventory(c['id'])] for c in all_companies}
 
         # 全商品設計書
-        all_designs_res = db.fetch_all("SELECT * FROM product_designs")
-        designs_by_company = {c['id']: [] for c in all_companies}
-        for design in all_designs_res:
-            if design['company_id'] in designs_by_company:
-                designs_by_company[design['company_id']].append(design)
-
-        # 採用候補者プール
-        candidates_pool = db.fetch_all("SELECT * FROM npcs WHERE company_id IS NULL LIMIT 500")
+        all_designs_res = list(world.designs.values())
+        designs_by_company = {c['id']: world.company_designs(c['id']) for c in all_companies}
 
-        # B2B注文 (保留中・承認済み未納品)
-        # メーカー(Seller)は 'pending' のみを処理対象とする
+        # B2B注文 (保留中・承認済み未納品。意思決定側へはコピーを渡す)
+        # メーカー(Seller)は 'pending' のみを処理対象とする (注文板の優先順位順)
         # 小売(Buyer)は 'pending' と 'accepted' を発注残としてカウントする
-        active_orders_res = db.fetch_all("SELECT * FROM b2b_orders WHERE status IN ('pending', 'accepted')")
-        orders_for_seller = {c['id']: [] for c in all_companies}
-        orders_for_buyer = {c['id']: [] for c in all_companies}
-        for order in active_orders_res:
-            if order['status'] == 'pending' and order['seller_id'] in orders_for_seller:
-                orders_for_seller[order['seller_id']].append(order)
-            if order['buyer_id'] in orders_for_buyer:
-                orders_for_buyer[order['buyer_id']].append(order)
+        orders_for_seller = {c['id']: [dict(o) for o in orders.for_seller(c['id'], 'pending')] for c in all_companies}
+        orders_for_buyer = {c['id']: [dict(o) for o in orders.for_buyer(c['id'])] for c in all_companies}
 
         # 市場のメーカー在庫 (小売の仕入れ判断用)
-        # 修正: 在庫の所有者(i.company_id)がメーカーまたはプレイヤーであるものを対象とする
-        maker_stocks = db.fetch_all("""
-            SELECT i.quantity, i.design_id, d.sales_price, d.base_price, d.concept_score, d.industry_key, i.company_id as maker_id, c.brand_power
-            FROM inventory i
-            JOIN product_designs d ON i.design_id = d.id
-            JOIN companies c ON i.company_id = c.id
-            WHERE c.type IN ('player', 'npc_maker') AND c.is_active = 1 AND i.quantity > 0
-        """)
+        # 在庫の所有者がメーカーまたはプレイヤーであるものを対象とする (販売可能在庫の索引から取得)
+        maker_stocks = world.stocks.maker_offers()
 
         # --- NPC意思決定ループ ---
         npc_companies = [c for c in all_companies if c['type'].startswith('npc_')]
@@ -463,185 +1030,155 @@ class Simulation:
         # ボトルネック分析用の一時キャッシュ
         bottleneck_cache = {}
 
-        for comp in npc_companies:
-            company_employees = npcs_by_company.get(comp['id'], [])
-            company_designs = designs_by_company.get(comp['id'], [])
-            company_inventory = inventory_by_company.get(comp['id'], [])
-
-            logic = NPCLogic(comp['id'], company_data=comp, employees=company_employees)
-
-            # フェーズ更新とリストラ判断 (最初に行う) - 経営状態の確認
-            logic.update_phase(current_week)
-            logic.decide_restructuring(current_week)
-            logic.decide_financing(current_week)
-            logic.decide_stock_action(current_week) # 資本政策
-
-            # --- 計画フェーズ ---
-            logic.decide_weekly_targets(
-                current_week,
-                designs=company_designs,
-                inventory=company_inventory,
-                b2b_sales_history=market_b2b_sales_history,
-                market_total_sales_4w=market_total_sales_4w,
-                economic_index=economic_index,
-                maker_stocks=maker_stocks
-            )
+        # 意思決定の入力 (週初のスナップショット。並列実行時はワーカーへ渡す)
+        ctx = {
+            'week': current_week,
+            'companies': {c['id']: c for c in npc_companies},
+            'npcs_by_company': npcs_by_company,
+            'designs_by_company': designs_by_company,
+            'inventory_by_company': inventory_by_company,
+            'all_designs': all_designs_res,
+            'all_caps': all_caps,
+            'economic_index': economic_index,
+            'market_b2b_sales_history': market_b2b_sales_history,
+            'market_total_sales_4w': market_total_sales_4w,
+            'maker_stocks': maker_stocks,
+            'orders_for_seller': orders_for_seller,
+            'orders_for_buyer': orders_for_buyer,
+        }
 
-            # --- 準備フェーズ (リソース確保) ---
-            logic.decide_facilities(current_week)
-            logic.decide_development(current_week, designs=company_designs)
-            logic.decide_advertising(current_week)
-            
-            # 人事 (目標キャパシティに基づいて採用)
-            logic.decide_hiring(current_week, candidates_pool=candidates_pool, all_caps=all_caps)
-            logic.decide_salary(current_week)
-            logic.decide_promotion(current_week)
-            
-            # --- 実行フェーズ ---
-            # 受注処理を先に実行 (在庫を引き当てるため)
-            logic.decide_order_fulfillment(
-                current_week,
-                orders=orders_for_seller.get(comp['id'], []),
-                inventory=company_inventory
-            )
-            
-            logic.decide_production(
-                current_week,
-                designs=company_designs,
-                inventory=company_inventory,
-                b2b_sales_history=market_b2b_sales_history,
-                market_total_sales_4w=market_total_sales_4w,
-                economic_index=economic_index
-            )
-            logic.decide_procurement(
-                current_week,
-                maker_stocks=maker_stocks,
-                my_capabilities=all_caps.get(comp['id']),
-                all_capabilities=all_caps,
-                my_inventory=company_inventory,
-                on_order=orders_for_buyer.get(comp['id'], [])
-            )
-            logic.decide_pricing(
-                current_week,
-                designs=all_designs_res,
-                inventory=company_inventory,
-                b2b_sales_history=market_b2b_sales_history
-            )
-            
-            # 分析用データをキャッシュ
-            bottleneck_cache[comp['id']] = {
-                'phase': logic.phase,
-                'plan': logic.plan
-            }
+        # 各社の決定はアクションとして集め、全社分をまとめて検証・適用する
+        if self.decision_workers > 1 and len(npc_companies) > 1:
+            week_actions = self._decide_parallel(ctx, bottleneck_cache)
+        else:
+            week_actions = []
+            for comp in sorted(npc_companies, key=lambda c: c['id']):
+                logic = self._decide_company(comp, ctx)
+                week_actions.extend(logic.actions)
+                # 分析用データをキャッシュ
+                bottleneck_cache[comp['id']] = {
+                    'phase': logic.phase,
+                    'plan': logic.plan
+                }
+        with perf.phase('apply_actions'):
+            rejected = self.apply_actions(week_actions, current_week, world)
+        perf.stop()
 
-        print(f"[Week {current_week}] Phase 1: NPC Decisions Finished")
+        print(f"[Week {current_week}] Phase 1: NPC Decisions Finished ({len(week_actions)} actions, {rejected} rejected)")
 
         # 2. 能力確定 (各フェーズで calculate_capabilities を呼び出して使用)
 
         # 3. B2B取引 (受注分の納品処理)
-        self.process_b2b(current_week)
+        with perf.phase('b2b'):
+            self.process_b2b(current_week, world)
         print(f"[Week {current_week}] Phase 3: B2B Processing Finished")
 
         # 4. B2C取引 (需要と供給のマッチング)
-        self.process_b2c(current_week)
+        with perf.phase('b2c'):
+            self.process_b2c(current_week, world)
         print(f"[Week {current_week}] Phase 4: B2C Processing Finished")
 
         # 5. 人事処理 (成長、給与支払い)
-        self.process_hr(current_week)
+        with perf.phase('hr'):
+            self.process_hr(current_week, world)
         print(f"[Week {current_week}] Phase 5: HR Processing Finished")
 
         # 6. 開発進捗処理
-        self.process_development(current_week)
+        with perf.phase('development'):
+            self.process_development(current_week, world)
         print(f"[Week {current_week}] Phase 6: Development Processing Finished")
 
         # 6. 製品陳腐化処理
-        self.process_product_obsolescence(current_week)
+        with perf.phase('obsolescence'):
+            self.process_product_obsolescence(current_week, world)
         print(f"[Week {current_week}] Phase 6: Product Obsolescence Finished")
 
         # 6. 加齢・引退処理
-        self.process_aging(current_week)
+        with perf.phase('aging'):
+            self.process_aging(current_week, world)
 
         # 6.5 労働市場補充 (失業率調整)
-        self.process_labor_market_replenishment(current_week)
+        with perf.phase('labor_market'):
+            self.process_labor_market_replenishment(current_week, world)
 
         # 6. 広告効果減衰
-        self.process_advertising(current_week, all_caps)
+        with perf.phase('advertising'):
+            self.process_advertising(current_week, world, all_caps)
 
         # 6. その他 (固定費支払い)
-        self.process_financials(current_week, all_caps)
+        with perf.phase('financials'):
+            self.process_financials(current_week, world, all_caps)
         print(f"[Week {current_week}] Phase 6+: Misc Processing Finished")
 
         # 7. 銀行処理 (金利、格付け更新)
-        self.process_banking(current_week)
+        with perf.phase('banking'):
+            self.process_banking(current_week, world)
         print(f"[Week {current_week}] Phase 7: Banking Processing Finished")
 
         # 8. 倒産判定
-        self.check_bankruptcy(current_week)
+        with perf.phase('bankruptcy'):
+            self.check_bankruptcy(current_week, world)
         print(f"[Week {current_week}] Phase 8: Bankruptcy Check Finished")
         
         # 8.5 新規参入判定
-        self.process_new_entries(current_week)
+        with perf.phase('new_entries'):
+            self.process_new_entries(current_week, world)
         print(f"[Week {current_week}] Phase 8.5: New Entries Check Finished")
         
         # 9. 株式市場・決算処理
-        self.process_stock_market(current_week, all_caps)
+        with perf.phase('stock_market'):
+            self.process_stock_market(current_week, world, all_caps)
         print(f"[Week {current_week}] Phase 9: Stock Market Processing Finished")
 
+        # メモリ上の変更をまとめて書き戻す
+        with perf.phase('flush'):
+            orders.flush()
+            self.order_book = None
+            world.flush()
+
         # 7. 週更新
         new_week = current_week + 1
-        economic_index = 1.0 + random.uniform(-0.05, 0.05) # ランダム変動
+        economic_index = 1.0 + rng.stream('economy').uniform(-0.05, 0.05) # ランダム変動
         db.execute_query("UPDATE game_state SET week = ?, economic_index = ?", (new_week, economic_index))
         
         # 週次統計のスナップショット保存 (在庫数、施設サイズ)
-        active_companies = db.fetch_all("SELECT id, funds FROM companies WHERE is_active = 1")
-        for comp in active_companies:
+        perf.start('stats_snapshot')
+        for comp in world.active_companies():
             cid = comp['id']
             # 在庫数
-            inv = db.fetch_one("SELECT SUM(quantity) as qty FROM inventory WHERE company_id = ?", (cid,))
-            qty = inv['qty'] if inv and inv['qty'] else 0
+            qty = sum(i['quantity'] for i in world.inventory(cid))
             db.set_weekly_stat(current_week, cid, 'inventory_count', qty)
             
             # 施設サイズ
-            fac = db.fetch_one("SELECT SUM(size) as sz FROM facilities WHERE company_id = ?", (cid,))
-            sz = fac['sz'] if fac and fac['sz'] else 0
+            sz = sum(f['size'] for f in world.facilities(cid))
             db.set_weekly_stat(current_week, cid, 'facility_size', sz)
             
             # 借入残高
-            loan = db.fetch_one("SELECT SUM(amount) as total FROM loans WHERE company_id = ?", (cid,))
-            balance = loan['total'] if loan and loan['total'] else 0
+            balance = world.total_debt(cid)
             db.set_weekly_stat(current_week, cid, 'loan_balance', balance)
             
             # 現金残高
             db.set_weekly_stat(current_week, cid, 'funds', comp['funds'])
 
         # 財務フロー集計 (Revenue, Expenses, Labor, Facility)
-        # account_entriesから集計
-        financials = db.fetch_all("""
-            SELECT company_id, category, SUM(amount) as total 
-            FROM account_entries 
-            WHERE week = ? 
-            GROUP BY company_id, category
-        """, (current_week,))
+        # 会計ロールアップ (ledger_weekly) から集計
+        financials = ledger.totals_by_company(current_week, current_week)
         
         comp_fin = {}
-        for f in financials:
-            cid = f['company_id']
-            if cid not in comp_fin: comp_fin[cid] = {'revenue': 0, 'expenses': 0, 'labor': 0, 'facility': 0}
-            
-            cat = f['category']
-            amt = f['total']
-            
-            if cat == 'revenue':
-                comp_fin[cid]['revenue'] += amt
-            # 修正: equity_finance (株式調達/自社株買い) は営業費用ではないので除外
-            # facility_sell (資産売却) も除外
-            elif cat not in ['cogs', 'equity_finance', 'facility_sell']: 
-                comp_fin[cid]['expenses'] += amt
-                
-            if 'labor' in cat:
-                comp_fin[cid]['labor'] += amt
-            if 'rent' in cat or cat == 'facility_purchase':
-                comp_fin[cid]['facility'] += amt
+        for cid, pl in financials.items():
+            comp_fin[cid] = {'revenue': 0, 'expenses': 0, 'labor': 0, 'facility': 0}
+            for cat, amt in pl.items():
+                if cat == 'revenue':
+                    comp_fin[cid]['revenue'] += amt
+                # 修正: equity_finance (株式調達/自社株買い) は営業費用ではないので除外
+                # facility_sell (資産売却) も除外
+                elif cat not in ['cogs', 'equity_finance', 'facility_sell']: 
+                    comp_fin[cid]['expenses'] += amt
+                    
+                if 'labor' in cat:
+                    comp_fin[cid]['labor'] += amt
+                if 'rent' in cat or cat == 'facility_purchase':
+                    comp_fin[cid]['facility'] += amt
 
         for cid, data in comp_fin.items():
             db.set_weekly_stat(current_week, cid, 'total_revenue', data['revenue'])
@@ -732,115 +1269,107 @@ class Simulation:
             placeholders = ','.join(['?'] * 31)
             conn, _ = db.get_connection()
             conn.executemany(f"INSERT INTO bottleneck_logs VALUES ({placeholders})", bottleneck_logs)
+        perf.stop()
+
+        # 計測結果の保存 (週全体の 'week' も含めて閉じる)
+        perf.end_week(current_week)
+        tracer.end_week(current_week)
 
         print(f"[Week {current_week}] Simulation End")
         return new_week
 
-    def process_b2b(self, week):
+    def process_b2b(self, week, world):
         """
-        B2B取引処理: ステータスが 'accepted' の注文を処理し、在庫と資金を移動させる
+        B2B取引処理: 受注済み ('accepted') の注文を注文板の優先順位順に一括で決済し、在庫と資金を移動させる
+        在庫が注文数に満たない場合はある分だけ約定させ、残りは受注済みのまま翌週以降に回す (部分約定)。
+        在庫移動・資金増減・会計行はメモリ上で計算し、executemany でまとめて書き込む。
         """
-        accepted_orders = db.fetch_all("SELECT * FROM b2b_orders WHERE status = 'accepted'")
-        
+        accepted_orders = self.order_book.with_status('accepted')
+
         if not accepted_orders:
             return
 
+        fund_deltas = {}      # {company_id: 資金増減}
+        new_stocks = {}       # {(buyer_id, design_id): [数量, 初期販売価格]} 小売側に在庫行がない場合
+        unit_costs = {}       # {design_id: 材料費}
+        entries = []
+        transactions = []
+        news = []
+        logs = []
         b2b_sales_counts = {} # {seller_id: count}
+
+        for order in accepted_orders:
+            # 在庫確認 (同じメーカーへの注文は優先順位順に在庫を引き当てる)
+            stock = world.find_inventory(order['seller_id'], order['design_id'])
+            if not stock or stock['quantity'] <= 0:
+                continue
+            ordered_qty = order['quantity']
+            remainder = self.order_book.fill(order['id'], min(ordered_qty, stock['quantity']))
+            qty, amount = order['quantity'], order['amount']
+            design_info = world.designs.get(order['design_id'])
+
+            # 1. メーカー在庫減
+            world.adjust('inventory', stock['id'], 'quantity', -qty)
+
+            # 2. 小売在庫増 (なければ最後にまとめて作成)
+            # 小売在庫の販売価格は、メーカーのMSRP (product_designs.sales_price) を初期値とする
+            buyer_stock = world.find_inventory(order['buyer_id'], order['design_id'])
+            if buyer_stock:
+                world.adjust('inventory', buyer_stock['id'], 'quantity', qty)
+            else:
+                msrp = design_info['sales_price'] if design_info else 0
+                new_stock = new_stocks.setdefault((order['buyer_id'], order['design_id']), [0, msrp])
+                new_stock[0] += qty
+
+            # 3. 資金移動
+            fund_deltas[order['seller_id']] = fund_deltas.get(order['seller_id'], 0) + amount
+            fund_deltas[order['buyer_id']] = fund_deltas.get(order['buyer_id'], 0) - amount
+
+            # 4. 会計ログ (メーカー原価は材料費ベース)
+            if order['design_id'] not in unit_costs:
+                p_conf = json.loads(design_info['parts_config']) if design_info and design_info['parts_config'] else {}
+                unit_costs[order['design_id']] = sum(p['cost'] for p in p_conf.values())
+            entries.append((week, order['buyer_id'], 'stock_purchase', amount))
+            entries.append((week, order['seller_id'], 'revenue', amount))
+            entries.append((week, order['seller_id'], 'cogs', unit_costs[order['design_id']] * qty))
+
+            # 5. 取引履歴・ニュース
+            transactions.append((week, order['buyer_id'], order['seller_id'], order['design_id'], qty, amount))
+            if remainder:
+                news.append((week, order['buyer_id'], f"発注ID {order['id']} のうち {qty}/{ordered_qty}台 が納品されました (残りは発注ID {remainder['id']})。", 'info'))
+            else:
+                news.append((week, order['buyer_id'], f"発注ID {order['id']} が納品されました。", 'info'))
+            logs.append((order['buyer_id'], "B2B Delivery", f"Received {qty} units (Order ID: {order['id']})"))
+            logs.append((order['seller_id'], "B2B Shipment", f"Shipped {qty} units (Order ID: {order['id']})"))
+
+            b2b_sales_counts[order['seller_id']] = b2b_sales_counts.get(order['seller_id'], 0) + qty
+
+        for cid, delta in fund_deltas.items():
+            world.adjust('companies', cid, 'funds', delta)
+        world.insert_many('inventory', ['company_id', 'design_id', 'quantity', 'sales_price'],
+                          [(buyer_id, design_id, qty, msrp) for (buyer_id, design_id), (qty, msrp) in new_stocks.items()])
+
         with db.transaction() as conn:
             cursor = conn.cursor()
-            for order in accepted_orders:
-                # 在庫確認 (念のため) - トランザクション内での読み取りはcursorを使用
-                cursor.execute("SELECT quantity FROM inventory WHERE company_id = ? AND design_id = ?", 
-                               (order['seller_id'], order['design_id']))
-                stock = cursor.fetchone()
-                
-                if stock and stock['quantity'] >= order['quantity']:
-                    # 1. メーカー在庫減
-                    cursor.execute("UPDATE inventory SET quantity = quantity - ? WHERE company_id = ? AND design_id = ?", 
-                                   (order['quantity'], order['seller_id'], order['design_id']))
-                    
-                    # 2. 小売在庫増 (なければ作成)
-                    cursor.execute("SELECT id FROM inventory WHERE company_id = ? AND design_id = ?", 
-                                   (order['buyer_id'], order['design_id']))
-                    buyer_stock = cursor.fetchone()
-                    
-                    # 小売在庫の販売価格は、メーカーのMSRP (product_designs.sales_price) を初期値とする
-                    # order['design_id'] から MSRP を取得する必要があるが、ここでは簡易的に
-                    # メーカー在庫の sales_price (もしあれば) か、別途取得が必要。
-                    # 効率のため、b2b_orders作成時にMSRPをスナップショットするか、ここでJOINして取得する。
-                    # ここでは、inventoryテーブル更新時にMSRPを取得してセットする。
-                    cursor.execute("SELECT sales_price, parts_config FROM product_designs WHERE id = ?", (order['design_id'],))
-                    design_info = cursor.fetchone()
-                    msrp = design_info['sales_price'] if design_info else 0
-
-                    if buyer_stock:
-                        cursor.execute("UPDATE inventory SET quantity = quantity + ? WHERE id = ?", 
-                                       (order['quantity'], buyer_stock['id']))
-                    else:
-                        cursor.execute("INSERT INTO inventory (company_id, design_id, quantity, sales_price) VALUES (?, ?, ?, ?)", 
-                                       (order['buyer_id'], order['design_id'], order['quantity'], msrp))
-                    
-                    # 3. 資金移動
-                    cursor.execute("UPDATE companies SET funds = funds + ? WHERE id = ?", (order['amount'], order['seller_id']))
-                    cursor.execute("UPDATE companies SET funds = funds - ? WHERE id = ?", (order['amount'], order['buyer_id']))
-
-                    # 4. 会計ログ
-                    cursor.execute("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, 'stock_purchase', ?)",
-                                   (week, order['buyer_id'], order['amount']))
-                    cursor.execute("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, 'revenue', ?)",
-                                   (week, order['seller_id'], order['amount']))
-                    
-                    # メーカー原価計算 (材料費ベース)
-                    unit_material_cost = 0
-                    if design_info and design_info['parts_config']:
-                        p_conf = json.loads(design_info['parts_config'])
-                        unit_material_cost = sum(p['cost'] for p in p_conf.values())
-                    
-                    maker_cogs = unit_material_cost * order['quantity']
-                    cursor.execute("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, 'cogs', ?)",
-                                   (week, order['seller_id'], maker_cogs))
-                    
-                    # 5. 取引履歴 (Transactions)
-                    cursor.execute("INSERT INTO transactions (week, type, buyer_id, seller_id, design_id, quantity, amount) VALUES (?, 'b2b', ?, ?, ?, ?, ?)",
-                                   (week, order['buyer_id'], order['seller_id'], order['design_id'], order['quantity'], order['amount']))
+            cursor.executemany("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, ?, ?)", entries)
+            cursor.executemany("INSERT INTO transactions (week, type, buyer_id, seller_id, design_id, quantity, amount) VALUES (?, 'b2b', ?, ?, ?, ?, ?)", transactions)
+            cursor.executemany("INSERT INTO news_logs (week, company_id, message, type) VALUES (?, ?, ?, ?)", news)
+
+        db.log_file_events(week, logs)
 
-                    # 6. ステータス更新
-                    cursor.execute("UPDATE b2b_orders SET status = 'completed' WHERE id = ?", (order['id'],))
-                    
-                    # ログは別途書き込むか、ここでもcursorを使う（log_newsはdb.execute_queryを使うので注意）
-                    # ここでは簡易的に直接INSERT
-                    cursor.execute("INSERT INTO news_logs (week, company_id, message, type) VALUES (?, ?, ?, ?)",
-                                   (week, order['buyer_id'], f"発注ID {order['id']} が納品されました。", 'info'))
-                    
-                    b2b_sales_counts[order['seller_id']] = b2b_sales_counts.get(order['seller_id'], 0) + order['quantity']
-                    
-                    # ファイルログ (トランザクション外で実行するか、ここで実行するか。ファイル書き込みはDBトランザクションと無関係なのでここでOK)
-                    # ただしdb.log_file_eventは内部でSELECTを行うため、トランザクション中のconnを使わないとロックする可能性があるが、
-                    # SQLiteのデフォルト設定では読み取りはブロックされないことが多い。
-                    # 安全のため、必要な情報はここで取得して後でログ出力するか、単純な文字列構築にする。
-                    # ここでは簡易的に、db.log_file_eventを使わず直接ファイルに書くか、db.log_file_eventが別コネクションを使うことを許容する。
-                    # db.log_file_eventは get_connection() で新しい接続を作るので、WALモードでないとロックするかも。
-                    # 今回はシンプルに、ループ後にまとめてログ出力する形はとらず、都度出力するが、
-                    # ロック回避のため、必要な情報を集めておいてトランザクション後にログ出力する。
-            
-            # トランザクション終了後にログ出力
-            for order in accepted_orders:
-                db.log_file_event(week, order['buyer_id'], "B2B Delivery", f"Received {order['quantity']} units (Order ID: {order['id']})")
-                db.log_file_event(week, order['seller_id'], "B2B Shipment", f"Shipped {order['quantity']} units (Order ID: {order['id']})")
-        
         # 統計更新
-        for seller_id, count in b2b_sales_counts.items():
-            db.increment_weekly_stat(week, seller_id, 'b2b_sales', count)
+        db.bulk_upsert_weekly_stats([{'week': week, 'company_id': cid, 'b2b_sales': count} for cid, count in b2b_sales_counts.items()], increment=True)
 
-    def process_b2c(self, week):
+    def process_b2c(self, week, world):
         # カテゴリごとの需要計算とマッチング
-        economic_index = db.fetch_one("SELECT economic_index FROM game_state")['economic_index']
+        economic_index = world.economic_index
+        self.clearing_reports = []
         
         # 全カテゴリの需要を計算
         categories = []
         for ind_key, ind_val in gb.INDUSTRIES.items():
             base = ind_val['base_demand']
-            demand = int(base * economic_index * random.uniform(0.95, 1.05))
+            demand = int(base * economic_index * rng.stream('b2c').uniform(0.95, 1.05))
             categories.append({'key': ind_key, 'demand': demand})
             db.execute_query("INSERT INTO market_trends (week, industry_key, b2c_demand) VALUES (?, ?, ?)", (week, ind_key, demand))
         
@@ -848,281 +1377,142 @@ class Simulation:
         prev_b2c_sales = db.fetch_all("SELECT design_id, SUM(quantity) as total FROM transactions WHERE week = ? AND type = 'b2c' GROUP BY design_id", (week - 1,))
         prev_sales_map = {r['design_id']: r['total'] for r in prev_b2c_sales}
 
-        # 小売在庫の取得
-        retail_stocks = db.fetch_all("""
-            SELECT i.id, i.company_id, i.division_id, i.quantity, i.sales_price as retail_price, i.design_id, d.name as product_name,
-                   d.concept_score, d.base_price, d.sales_price as msrp, d.awareness, d.material_score, d.parts_config, d.industry_key,
-                   c.brand_power as retail_brand, c.type as company_type, m.orientation as maker_orientation,
-                   m.brand_power as maker_brand, m.id as creator_id
-            FROM inventory i
-            JOIN product_designs d ON i.design_id = d.id
-            JOIN companies c ON i.company_id = c.id
-            JOIN companies m ON d.company_id = m.id
-            WHERE c.type IN ('player', 'npc_retail') AND c.is_active = 1 AND i.quantity > 0
-        """)
+        # 小売在庫の取得 (販売可能在庫の索引に店舗スコアと前週販売数を付加)
+        retail_stocks = []
+        store_scores = {}
+        for stock in world.stocks.retail():
+            cid = stock['company_id']
+            if cid not in store_scores:
+                # 事業部ごとの店舗運営力を使用すべきだが、小売は通常1事業部または全社共通で売る
+                # ここでは全社合計の store_ops を使用
+                caps = self.get_capabilities(cid, world=world)
+                store_scores[cid] = ((1 + stock['holder_brand'] / 100.0) * (1 + caps['store_ops'] / 100.0), caps['store_throughput'])
+            retail_stocks.append({**stock, 'store_score': store_scores[cid][0], 'prev_sold': prev_sales_map.get(stock['design_id'], 0)})
 
         if not retail_stocks:
             return
 
-        # 企業ごとの能力キャッシュ
-        comp_caps = {}
-        
-        # カテゴリごとに処理
-        for cat in categories:
-            ind_key = cat['key']
-            market_demand = cat['demand']
-            
-            # 需要をセグメントに分割
-            demand_wealthy = int(market_demand * gb.MARKET_SEGMENT_WEALTHY_RATIO)
-            demand_mass = int(market_demand * gb.MARKET_SEGMENT_MASS_RATIO)
-            
-            # このカテゴリの在庫のみ抽出
-            cat_stocks = [s for s in retail_stocks if s['industry_key'] == ind_key]
-            if not cat_stocks: continue
-
-            # スコアリング
-            scored_stocks_wealthy = []
-            scored_stocks_mass = []
-            
-            total_score = 0
-            for stock in cat_stocks:
-                cid = stock['company_id']
-                if cid not in comp_caps:
-                    comp_caps[cid] = self.calculate_capabilities(cid)
-
-                # 事業部ごとの店舗運営力を使用すべきだが、小売は通常1事業部または全社共通で売る
-                # ここでは全社合計の store_ops を使用
-                store_ops = comp_caps[cid]['store_ops']
-                store_score = (1 + stock['retail_brand'] / 100.0) * (1 + store_ops / 100.0)
-
-                base_price = stock['base_price']
-                retail_price = stock['retail_price']
-                
-                # 価格比率 (高いか安いか)
-                price_ratio = retail_price / base_price if base_price > 0 else 1.0
-                
-                trend_factor = random.uniform(0.8, 1.2)
-                prev_sold = prev_sales_map.get(stock['design_id'], 0)
-                bandwagon_bonus = 1.0 + (math.log1p(prev_sold) * 0.15)
-                
-                # --- 富裕層向けスコア ---
-                # 価格感度低め、品質・ブランド重視
-                price_factor_w = price_ratio ** 0.5 # 価格が高くてもスコアがあまり落ちない
-                quality_score = stock['concept_score'] * stock['material_score']
-                brand_score = (1 + stock['maker_brand'] / 50.0) # ブランド影響大
-                
-                score_w = (quality_score * brand_score * (1 + stock['awareness'] / 100.0)) / price_factor_w
-                final_score_w = store_score * score_w * trend_factor * bandwagon_bonus * random.gauss(1.0, 0.1)
-                scored_stocks_wealthy.append({**stock, 'score': final_score_w})
-
-                # --- 一般層向けスコア ---
-                # 価格感度高め、コスパ重視
-                price_factor_m = price_ratio ** 3.0 # 価格が高いとスコア激減
-                # ブランド影響小
-                score_m = (quality_score * (1 + stock['maker_brand'] / 200.0) * (1 + stock['awareness'] / 100.0)) / price_factor_m
-                final_score_m = store_score * score_m * trend_factor * bandwagon_bonus * random.gauss(1.0, 0.1)
-                scored_stocks_mass.append({**stock, 'score': final_score_m})
-
-            # 需要分配処理 (共通関数化)
-            sales_record = {s['id']: 0 for s in cat_stocks}
-            
-            def distribute_demand(demand_pool, stock_list):
-                remaining = demand_pool
-                for _ in range(3): # 3 pass distribution
-                    if remaining <= 0: break
-                    
-                    # 販売可能在庫の抽出 (在庫あり & 店舗キャパあり)
-                    active = [s for s in stock_list if (s['quantity'] - sales_record[s['id']]) > 0 and comp_caps[s['company_id']]['store_throughput'] > 0]
-                    if not active: break
-                    
-                    total_s = sum(s['score'] for s in active)
-                    if total_s == 0: break
-                    
-                    round_d = remaining
-                    remaining = 0
-                    
-                    for stock in active:
-                        share = stock['score'] / total_s
-                        float_d = round_d * share
-                        d_int = int(float_d)
-                        if random.random() < (float_d - d_int): d_int += 1
-                        
-                        current_qty = stock['quantity'] - sales_record[stock['id']]
-                        
-                        # 店舗キャパシティチェック
-                        cap_float = comp_caps[stock['company_id']]['store_throughput']
-                        capacity = int(cap_float)
-                        if random.random() < (cap_float - capacity): capacity += 1
-                        
-                        sold = min(d_int, current_qty, capacity)
-                        sold = int(sold)
-                        
-                        if sold > 0:
-                            sales_record[stock['id']] += sold
-                            comp_caps[stock['company_id']]['store_throughput'] -= sold
-                        
-                        if d_int > sold:
-                            remaining += (d_int - sold)
+        # スコアリングと需要配分は業界ごとに配列で一括処理する
+        book = RetailBook(retail_stocks)
+        rand = rng.numpy('b2c')
+        # 企業ごとの残り店舗キャパシティ (販売で減っていく。業界をまたいで共有)
+        throughput = np.array([store_scores[cid][1] for cid in book.company_ids], dtype=np.float64)
+        sold = np.zeros(len(book), dtype=np.int64)
 
-            # 富裕層需要の分配
-            distribute_demand(demand_wealthy, scored_stocks_wealthy)
-            # 一般層需要の分配
-            distribute_demand(demand_mass, scored_stocks_mass)
-            
-            # DB更新用リストに追加 (カテゴリごとの結果を統合)
-            # (ループ外で定義したリストに追加していく処理は元のコードと同じ構造にするため省略し、
-            #  元のコードの update_inventory 等のリスト構築部分をこのループ内で行うか、
-            #  sales_record を全カテゴリ分統合してから一括処理する)
-            # ここでは sales_record を全カテゴリ分マージする形をとる
-            if 'all_sales_record' not in locals(): all_sales_record = {}
-            all_sales_record.update(sales_record)
-            if 'all_scored_stocks' not in locals(): all_scored_stocks = []
-            # ログ出力用にリストを保持 (重複除去が必要だが、sales_recordがIDベースなので更新処理は問題ない)
-            # ここでは単純に全在庫リストを対象にする
-            all_scored_stocks.extend(cat_stocks)
-
-        # DB更新とログ記録
-        # executemany用にデータを準備
-        update_inventory = []
-        update_funds = []
+        for cat in categories:
+            members = book.members(cat['key'])
+            if len(members) == 0: continue
+
+            # 配分方式は業界ごとに選択する
+            clearing = get_clearing(gb.INDUSTRIES[cat['key']].get('market_clearing', gb.DEFAULT_MARKET_CLEARING))
+            scores = score_stocks(book, members, rand)
+            # 需要をセグメントに分割し、富裕層 → 一般層の順に分配
+            for segment, ratio in (('wealthy', gb.MARKET_SEGMENT_WEALTHY_RATIO), ('mass', gb.MARKET_SEGMENT_MASS_RATIO)):
+                segment_sold, report = clearing.clear(cat['key'], segment, int(cat['demand'] * ratio), book, members, scores[segment], throughput, rand)
+                sold[members] += segment_sold
+                self.clearing_reports.append(report)
+
+        # 在庫・資金はメモリ上で更新し、履歴系はexecutemanyで一括記録
         insert_transactions = []
         insert_revenue = []
         insert_cogs = []
         b2c_sales_counts = {} # {company_id: count}
+        sales_logs = []
+
+        for idx in np.nonzero(sold)[0]:
+            stock = book.rows[idx]
+            sold_qty = int(sold[idx])
+            # 収益: 販売数 * 小売価格
+            revenue = sold_qty * stock['retail_price']
+
+            # 売上原価(COGS)の計算
+            if stock['company_id'] == stock['creator_id']:
+                # 自社製造 (Maker/Player as Maker) の場合: 原価は材料費
+                p_conf = json.loads(stock['parts_config']) if stock['parts_config'] else {}
+                unit_cost = sum(p['cost'] for p in p_conf.values()) if p_conf else 0
+                cogs = sold_qty * unit_cost
+            else:
+                # 小売販売の場合: 原価は仕入れ値 (MSRPの90%と仮定)
+                cogs = int(sold_qty * stock['msrp'] * 0.9)
 
-        # 重複を除去して処理
-        processed_ids = set()
-        for stock in all_scored_stocks:
-            if stock['id'] in processed_ids: continue
-            processed_ids.add(stock['id'])
-            
-            sold = all_sales_record.get(stock['id'], 0)
-            if sold > 0:
-                # ★バグ修正: 収益と原価を正しく計上する
-                # 収益: 販売数 * 小売価格
-                revenue = sold * stock['retail_price']
-                
-                # 売上原価(COGS)の計算
-                if stock['company_id'] == stock['creator_id']:
-                    # 自社製造 (Maker/Player as Maker) の場合: 原価は材料費
-                    p_conf = json.loads(stock['parts_config']) if stock['parts_config'] else {}
-                    unit_cost = sum(p['cost'] for p in p_conf.values()) if p_conf else 0
-                    cogs = sold * unit_cost
-                else:
-                    # 小売販売の場合: 原価は仕入れ値 (MSRPの90%と仮定)
-                    cogs = int(sold * stock['msrp'] * 0.9)
-
-                update_inventory.append((sold, stock['id']))
-                update_funds.append((revenue, stock['company_id']))
-                insert_transactions.append((week, 'b2c', stock['company_id'], stock['design_id'], sold, revenue))
-                insert_revenue.append((week, stock['company_id'], 'revenue', revenue))
-                insert_cogs.append((week, stock['company_id'], 'cogs', cogs))
-                b2c_sales_counts[stock['company_id']] = b2c_sales_counts.get(stock['company_id'], 0) + sold
+            world.adjust('inventory', stock['id'], 'quantity', -sold_qty)
+            world.adjust('companies', stock['company_id'], 'funds', revenue)
+            insert_transactions.append((week, 'b2c', stock['company_id'], stock['design_id'], sold_qty, revenue))
+            insert_revenue.append((week, stock['company_id'], 'revenue', revenue))
+            insert_cogs.append((week, stock['company_id'], 'cogs', cogs))
+            b2c_sales_counts[stock['company_id']] = b2c_sales_counts.get(stock['company_id'], 0) + sold_qty
+            sales_logs.append((stock['company_id'], f"Sold {sold_qty} units of {stock['product_name']}"))
 
         with db.transaction() as conn:
             cursor = conn.cursor()
-            if update_inventory:
-                cursor.executemany("UPDATE inventory SET quantity = quantity - ? WHERE id = ?", update_inventory)
-                cursor.executemany("UPDATE companies SET funds = funds + ? WHERE id = ?", update_funds)
+            if insert_transactions:
                 cursor.executemany("INSERT INTO transactions (week, type, seller_id, design_id, quantity, amount) VALUES (?, ?, ?, ?, ?, ?)", insert_transactions)
                 cursor.executemany("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, ?, ?)", insert_revenue)
                 cursor.executemany("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, ?, ?)", insert_cogs)
         
         # ログ出力
-        for stock in all_scored_stocks:
-            sold = all_sales_record.get(stock['id'], 0)
-            if sold > 0:
-                db.log_file_event(week, stock['company_id'], "Retail Sales", f"Sold {sold} units of {stock['product_name']}")
+        db.log_file_events(week, [(cid, "Retail Sales", details) for cid, details in sales_logs])
         
         # 統計更新
         for cid, count in b2c_sales_counts.items():
             db.increment_weekly_stat(week, cid, 'b2c_sales', count)
 
-    def process_hr(self, week):
-        # 0. 採用オファーの処理 (受諾判定)
-        offers = db.fetch_all("SELECT * FROM job_offers WHERE week = ?", (week,))
-        
-        # NPCごとにオファーをまとめる
-        npc_offers = {}
+    def process_hr(self, week, world):
+        # 0. 採用 (労働市場マッチング)
+        # NPC企業の求人と個別オファー (job_offers: プレイヤーなど) を、求職者とまとめてマッチングする
+        offers = [dict(o) for o in db.fetch_all("SELECT * FROM job_offers WHERE week = ?", (week,))]
+        candidates = world.labor_pool.candidates(self.requisitions, week)
+        pool_ids = {n['id'] for n in candidates}
         for offer in offers:
-            nid = offer['npc_id']
-            if nid not in npc_offers: npc_offers[nid] = []
-            npc_offers[nid].append(offer)
-        
-        hired_counts = {} # {company_id: count}
-        with db.transaction() as conn:
-            cursor = conn.cursor()
-            for nid, offer_list in npc_offers.items():
-                cursor.execute("SELECT * FROM npcs WHERE id = ?", (nid,))
-                npc = cursor.fetchone()
-                if not npc or npc['company_id'] is not None:
-                    # 既に就職済みならオファー無効
-                    continue
-                
-                # 最も条件の良いオファーを選ぶ
-                # 基準: 給与 + 企業ブランド力ボーナス
-                best_offer = None
-                best_val = -1
-                
-                for offer in offer_list:
-                    cursor.execute("SELECT brand_power FROM companies WHERE id = ?", (offer['company_id'],))
-                    comp = cursor.fetchone()
-                    brand = comp['brand_power'] if comp else 0
-                    
-                    # 評価値 = 提示給与 * (1 + ブランド/200)
-                    val = offer['offer_salary'] * (1 + brand / 200.0)
-                    if val > best_val:
-                        best_val = val
-                        best_offer = offer
-                
-                # 受諾判定
-                # 希望給与を満たしていればほぼ受諾
-                threshold = npc['desired_salary'] if npc['desired_salary'] > 0 else gb.BASE_SALARY_YEARLY
-                if best_offer['offer_salary'] >= threshold * 0.9: # 9割以上なら妥協して受諾
-                    # 採用成立
-                    # オファー時のターゲット部署に配属する
-                    target_dept = best_offer['target_dept']
-                    if not target_dept: target_dept = gb.DEPT_PRODUCTION # フォールバック
-
-                    # 事業部IDの決定 (直接部門の場合は最初の事業部に割り当てる)
-                    division_id = None
-                    if target_dept in [gb.DEPT_PRODUCTION, gb.DEPT_SALES, gb.DEPT_DEV, gb.DEPT_STORE]:
-                        # 簡易的に最初の事業部を取得
-                        div = db.fetch_one("SELECT id FROM divisions WHERE company_id = ? LIMIT 1", (best_offer['company_id'],))
-                        if div:
-                            division_id = div['id']
-
-                    cursor.execute("UPDATE npcs SET company_id = ?, division_id = ?, department = ?, role = ?, salary = ?, desired_salary = ?, loyalty = 50 WHERE id = ?",
-                                   (best_offer['company_id'], division_id, target_dept, gb.ROLE_MEMBER, best_offer['offer_salary'], best_offer['offer_salary'], nid))
-                    
-                    cursor.execute("INSERT INTO news_logs (week, company_id, message, type) VALUES (?, ?, ?, ?)",
-                                   (week, best_offer['company_id'], f"{npc['name']} を採用しました (年収: ¥{best_offer['offer_salary']:,})", 'info'))
-                    
-                    cid = best_offer['company_id']
-                    hired_counts[cid] = hired_counts.get(cid, 0) + 1
+            npc = world.npcs.get(offer['npc_id'])
+            # 既に就職済みならオファー無効
+            if npc and npc['company_id'] is None and npc['id'] not in pool_ids:
+                candidates.append(npc)
+                pool_ids.add(npc['id'])
+        brand_power = {cid: c['brand_power'] or 0 for cid, c in world.companies.items()}
+        hires = labor_market.match(candidates, self.requisitions, offers, brand_power, week)
+        self.requisitions = []
 
-        for cid, count in hired_counts.items():
-            db.increment_weekly_stat(week, cid, 'hired_count', count)
+        hired_counts = {} # {company_id: count}
+        news = []
+        for hire in hires:
+            npc = world.npcs[hire['npc_id']]
+            cid = hire['company_id']
+            # 求人・オファー時のターゲット部署に配属する
+            target_dept = hire['target_dept'] or gb.DEPT_PRODUCTION # フォールバック
+
+            # 事業部IDの決定 (直接部門の場合は最初の事業部に割り当てる)
+            division_id = None
+            if target_dept in [gb.DEPT_PRODUCTION, gb.DEPT_SALES, gb.DEPT_DEV, gb.DEPT_STORE]:
+                divs = world.divisions(cid)
+                if divs:
+                    division_id = divs[0]['id']
+
+            world.update('npcs', npc['id'], company_id=cid, division_id=division_id, department=target_dept,
+                         role=gb.ROLE_MEMBER, salary=hire['salary'], desired_salary=hire['salary'], loyalty=50)
+            news.append({'week': week, 'company_id': cid, 'type': 'info',
+                         'message': f"{npc['name']} を採用しました (年収: ¥{hire['salary']:,})"})
+            hired_counts[cid] = hired_counts.get(cid, 0) + 1
+
+        db.bulk_insert('news_logs', news)
+        db.bulk_upsert_weekly_stats([{'week': week, 'company_id': cid, 'hired_count': count} for cid, count in hired_counts.items()], increment=True)
 
         # オファーテーブルのクリーンアップ (今週分は処理済み)
         db.execute_query("DELETE FROM job_offers WHERE week <= ?", (week,))
 
-        # 企業ごとの処理 (忠誠度、成長、給与)
-        companies = db.fetch_all("SELECT id, type FROM companies WHERE is_active = 1")
-        
+        # 企業ごとの処理 (忠誠度、成長、給与) - 全従業員を列指向ストアでまとめて処理する
         # 事業部情報のキャッシュ (ID -> Industry)
-        all_divisions = db.fetch_all("SELECT id, industry_key FROM divisions")
-        div_industry_map = {d['id']: d['industry_key'] for d in all_divisions}
+        div_industry_map = {d['id']: d['industry_key'] for d in world.rows['divisions'].values()}
 
-        for comp in companies:
-            if comp['type'] == 'system_supplier': continue
+        store = world.npc_store
+        all_caps = self.calculate_all_capabilities(world)
 
-            # 従業員取得
-            employees = db.fetch_all("SELECT * FROM npcs WHERE company_id = ?", (comp['id'],))
-            if not employees: continue
-            
-            # HR能力計算
-            caps = self.calculate_capabilities(comp['id'], employees=employees)
+        # 企業ごとの忠誠度変化 (人事キャパシティの充足度)
+        comp_delta = {}
+        for comp in world.active_companies(include_suppliers=False):
+            caps = all_caps.get(comp['id'])
+            employee_count = len(world.employees(comp['id']))
+            if not employee_count or not caps: continue
             
             # 供給キャパシティ: 人事部員の能力合計(スケール済み) + 経営者分の基礎キャパシティ
             # 経営者分として、能力50のNPC1人分(スケール済み)を常に加算する（小規模組織の救済）
@@ -1131,7 +1521,7 @@ class Simulation:
 
             # 必要HRキャパシティ: 50 * (全従業員数(実数) / 7)
             # つまり、人事能力50の担当者1人で7人(実数)を見れる計算
-            required_capacity = 50 * ((len(employees) * gb.NPC_SCALE_FACTOR) / gb.HR_CAPACITY_PER_PERSON)
+            required_capacity = 50 * ((employee_count * gb.NPC_SCALE_FACTOR) / gb.HR_CAPACITY_PER_PERSON)
             
             # 忠誠度変化
             loyalty_delta = 0
@@ -1142,158 +1532,128 @@ class Simulation:
                 if required_capacity > 0:
                     ratio = hr_power_sum / required_capacity
                     loyalty_delta = -5 * (1.0 - ratio)
-            
-            updates_to_run = []
-            labor_costs = {}
-
-            # 部署と給与カテゴリのマッピング
-            dept_labor_map = {
-                gb.DEPT_PRODUCTION: 'labor_production',
-                gb.DEPT_STORE: 'labor_store',
-                gb.DEPT_SALES: 'labor_sales',
-                gb.DEPT_DEV: 'labor_dev',
-                gb.DEPT_HR: 'labor_hr',
-                gb.DEPT_PR: 'labor_pr',
-                gb.DEPT_ACCOUNTING: 'labor_accounting'
-            }
-
-            for npc in employees:
-                # 個別の忠誠度変動要因
-                individual_loyalty_delta = loyalty_delta
-                
-                # 給与不満による忠誠度低下
-                if npc['desired_salary'] > npc['salary']:
-                    gap = (npc['desired_salary'] - npc['salary']) / npc['desired_salary']
-                    if gap > 0.05: # 5%以上の乖離で不満発生
-                        individual_loyalty_delta -= int(gap * 10) # 乖離が大きいほど下がる
-
-                # 1. 忠誠度更新
-                new_loyalty = max(0, min(100, npc['loyalty'] + individual_loyalty_delta))
-                
-                # 2. 能力成長
-                # 基本成長率: 0.025 * 2^(Adaptability/50)
-                base_growth = 0.025 * (2 ** (npc['adaptability'] / 50.0))
-                
-                changes = {}
-
-                # 部署ボーナス
-                dept = npc['department']
-                stat_map = {
-                    gb.DEPT_PRODUCTION: 'production', gb.DEPT_SALES: 'sales', gb.DEPT_DEV: 'development',
-                    gb.DEPT_HR: 'hr', gb.DEPT_PR: 'pr', gb.DEPT_ACCOUNTING: 'accounting', gb.DEPT_STORE: 'store_ops'
-                }
-                target_stat = stat_map.get(dept)
-                
-                if target_stat:
-                    changes[target_stat] = min(gb.ABILITY_MAX, npc[target_stat] + base_growth)
-                
-                # マネジメント (部長補佐以上)
-                if npc['role'] in [gb.ROLE_ASSISTANT_MANAGER, gb.ROLE_MANAGER, gb.ROLE_CXO, gb.ROLE_CEO]:
-                     changes['management'] = min(gb.ABILITY_MAX, npc['management'] + base_growth)
-                     
-                # 役員適正 (部長以上)
-                if npc['role'] in [gb.ROLE_MANAGER, gb.ROLE_CXO, gb.ROLE_CEO]:
-                    # 適応力50なら0.1 -> base_growth * 2
-                    changes['executive'] = min(gb.ABILITY_MAX, npc['executive'] + (base_growth * 2))
-                
-                # 業界適性 (所属している事業部の業界のみ成長)
-                if npc['division_id'] and npc['division_id'] in div_industry_map:
-                    ind_key = div_industry_map[npc['division_id']]
-                    apts = json.loads(npc['aptitudes']) if npc['aptitudes'] else {}
-                    current_apt = apts.get(ind_key, 0.1)
-                    
-                    if current_apt < 2.0:
-                        speed_factor = npc['adaptability'] / 50.0
-                        apt_growth = (0.9 / 13.0) * speed_factor if current_apt < 1.0 else (1.0 / 260.0) * speed_factor
-                        apts[ind_key] = min(2.0, current_apt + apt_growth)
-                        changes['aptitudes'] = json.dumps(apts)
-
-                # 3. 希望給与の更新 (年に1回)
-                if week % 52 == 0:
-                    # 能力に基づく適正給与を計算
-                    max_stat = max(
-                        npc['production'], npc['sales'], npc['development'], 
-                        npc['hr'], npc['pr'], npc['accounting'], npc['store_ops']
-                    )
-                    base_req = int(gb.BASE_SALARY_YEARLY * (max_stat / 50.0))
-                    
-                    # 多少の揺らぎを持たせて希望給与を設定 (0.95 ~ 1.1倍)
-                    new_desired = int(base_req * random.uniform(0.95, 1.1))
-                    changes['desired_salary'] = new_desired
-                    
-                    if new_desired > npc['salary'] * 1.1:
-                        self.log_news(week, comp['id'], f"{npc['name']} が昇給を希望しています (希望: ¥{new_desired:,})", 'info')
-
-                # 4. 離職判定 (Turnover)
-                # 忠誠度が40を下回ると離職リスク発生
-                if new_loyalty < 40:
-                    # 忠誠度 0 で 20%、40 で 0% の確率
-                    resign_prob = (40 - new_loyalty) * 0.005
-                    if random.random() < resign_prob:
-                        # 離職実行 (会社ID等をNULLにして労働市場へ戻す)
-                        changes.update({
-                            "company_id": None, "department": None, "role": None, "loyalty": 50,
-                            "last_resigned_week": week, "last_company_id": comp['id']
-                        })
-                        self.log_news(week, comp['id'], f"従業員 {npc['name']} が退職しました。", 'warning')
-                        db.log_file_event(week, comp['id'], "HR Resignation", f"{npc['name']} resigned")
-
-                changes['loyalty'] = new_loyalty
-                
-                if changes:
-                    set_clause = ", ".join(f"{k} = ?" for k in changes.keys())
-                    params = list(changes.values()) + [npc['id']]
-                    updates_to_run.append((f"UPDATE npcs SET {set_clause} WHERE id = ?", tuple(params)))
-
-                # 3. 給与支払い
-                weekly_salary = int((npc['salary'] * gb.NPC_SCALE_FACTOR) / gb.WEEKS_PER_YEAR_REAL)
-                
-                cat = dept_labor_map.get(npc['department'], 'labor')
-                
-                labor_costs[cat] = labor_costs.get(cat, 0) + weekly_salary
+            comp_delta[comp['id']] = loyalty_delta
 
-            total_salary_deduction = sum(labor_costs.values())
+        rows = np.nonzero(np.isin(store.company, list(comp_delta.keys())))[0]
+        if len(rows) == 0:
+            return
+        row_company = store.company[rows]
+
+        # 希望給与の再評価は成長前の能力で行う
+        dept_stats = ['production', 'sales', 'development', 'hr', 'pr', 'accounting', 'store_ops']
+        max_stat = np.max(np.stack([store.stats[k][rows] for k in dept_stats]), axis=0)
+
+        # 1. 忠誠度更新 (企業単位の変化 + 給与不満)
+        delta_keys = np.array(sorted(comp_delta), dtype=np.int64)
+        delta_values = np.array([comp_delta[c] for c in delta_keys.tolist()], dtype=np.float64)
+        delta = delta_values[np.searchsorted(delta_keys, row_company)]
+        old_loyalty = store.stats['loyalty'][rows].copy()
+        new_loyalty = np.clip(old_loyalty + store.loyalty_deltas(rows, delta), 0, 100)
+        store.stats['loyalty'][rows] = new_loyalty
+
+        # 2. 能力成長 (担当能力、マネジメント、役員適性、業界適性)
+        before = {k: store.stats[k][rows].copy() for k in dept_stats + ['management', 'executive']}
+        apt_changes = store.apply_weekly_growth(rows, div_industry_map)
+        before['loyalty'] = old_loyalty
+        store.write_back(world, rows, before, apt_changes=apt_changes)
+
+        # 3. 給与支払い (部署別の人件費を企業ごとに集計)
+        dept_labor_map = {
+            gb.DEPT_PRODUCTION: 'labor_production',
+            gb.DEPT_STORE: 'labor_store',
+            gb.DEPT_SALES: 'labor_sales',
+            gb.DEPT_DEV: 'labor_dev',
+            gb.DEPT_HR: 'labor_hr',
+            gb.DEPT_PR: 'labor_pr',
+            gb.DEPT_ACCOUNTING: 'labor_accounting'
+        }
+        labor_cats = [dept_labor_map[d] for d in gb.DEPARTMENTS] + ['labor']
+        weekly_salary = np.floor((store.stats['salary'][rows] * gb.NPC_SCALE_FACTOR) / gb.WEEKS_PER_YEAR_REAL)
+        cat_idx = np.where(store.dept[rows] >= 0, store.dept[rows], len(gb.DEPARTMENTS))
+        comp_ids, comp_inv = np.unique(row_company, return_inverse=True)
+        labor = np.bincount(comp_inv * len(labor_cats) + cat_idx, weights=weekly_salary,
+                            minlength=len(comp_ids) * len(labor_cats)).reshape(len(comp_ids), len(labor_cats))
+
+        entries_to_insert = []
+        for k, cid in enumerate(comp_ids.tolist()):
+            total_salary_deduction = int(labor[k].sum())
             if total_salary_deduction > 0:
-                updates_to_run.append(("UPDATE companies SET funds = funds - ? WHERE id = ?", (total_salary_deduction, comp['id'])))
-                for cat, amount in labor_costs.items():
-                    if amount > 0:
-                        updates_to_run.append(("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, ?, ?)", (week, comp['id'], cat, amount)))
-
-            if updates_to_run:
-                with db.transaction() as conn:
-                    cursor = conn.cursor()
-                    for sql, p in updates_to_run:
-                        cursor.execute(sql, p)
-
-    def process_aging(self, week):
+                world.adjust('companies', cid, 'funds', -total_salary_deduction)
+                for j, cat in enumerate(labor_cats):
+                    if labor[k, j] > 0:
+                        entries_to_insert.append((week, cid, cat, int(labor[k, j])))
+
+        if entries_to_insert:
+            with db.transaction() as conn:
+                conn.executemany("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, ?, ?)", entries_to_insert)
+
+        # 4. 希望給与の更新 (年に1回) と離職判定
+        # 乱数は企業ごとのストリームから、その企業の従業員分 (NPC ID順) をまとめて引く
+        annual = week % 52 == 0
+        salary_factor = np.ones(len(rows))
+        resign_draw = np.ones(len(rows))
+        order = np.argsort(comp_inv, kind='stable')
+        bounds = np.r_[0, np.cumsum(np.bincount(comp_inv, minlength=len(comp_ids)))]
+        for k, cid in enumerate(comp_ids.tolist()):
+            sel = order[bounds[k]:bounds[k + 1]]
+            gen = rng.numpy('hr', cid)
+            if annual:
+                salary_factor[sel] = gen.uniform(0.95, 1.1, len(sel))
+            resign_draw[sel] = gen.random(len(sel))
+
+        npc_ids = store.ids[rows]
+        news = []
+        if annual:
+            # 能力に基づく適正給与に、多少の揺らぎ (0.95 ~ 1.1倍) を持たせて希望給与を設定
+            base_req = np.floor(gb.BASE_SALARY_YEARLY * (max_stat / 50.0))
+            new_desired = np.floor(base_req * salary_factor).astype(np.int64)
+            world.update_many('npcs', npc_ids.tolist(), desired_salary=new_desired.tolist())
+            for k in np.nonzero(new_desired > store.stats['salary'][rows] * 1.1)[0].tolist():
+                npc = world.npcs[int(npc_ids[k])]
+                news.append({'week': week, 'company_id': int(row_company[k]), 'type': 'info',
+                             'message': f"{npc['name']} が昇給を希望しています (希望: ¥{int(new_desired[k]):,})"})
+
+        # 忠誠度が40を下回ると離職リスク発生 (忠誠度 0 で 20%、40 で 0% の確率)
+        resign_prob = np.where(new_loyalty < 40, (40 - new_loyalty) * 0.005, 0.0)
+        resign_logs = []
+        for k in np.nonzero(resign_draw < resign_prob)[0].tolist():
+            # 離職実行 (会社ID等をNULLにして労働市場へ戻す)
+            npc = world.npcs[int(npc_ids[k])]
+            cid = int(row_company[k])
+            world.update('npcs', npc['id'], company_id=None, department=None, role=None, loyalty=50,
+                         last_resigned_week=week, last_company_id=cid)
+            news.append({'week': week, 'company_id': cid, 'type': 'warning', 'message': f"従業員 {npc['name']} が退職しました。"})
+            resign_logs.append((cid, "HR Resignation", f"{npc['name']} resigned"))
+
+        db.bulk_insert('news_logs', news)
+        db.log_file_events(week, resign_logs)
+
+    def process_aging(self, week, world):
         # 13週で1歳
         if week % gb.WEEKS_PER_AGE == 0:
-            db.execute_query("UPDATE npcs SET age = age + 1")
+            for npc in list(world.npcs.values()):
+                world.update('npcs', npc['id'], age=npc['age'] + 1)
             
             # 定年 (66歳) -> 引退処理
-            retirees = db.fetch_all("SELECT id FROM npcs WHERE age >= ?", (gb.RETIREMENT_AGE,))
+            retirees = [n['id'] for n in world.npcs.values() if n['age'] >= gb.RETIREMENT_AGE]
             if retirees:
-                for r in retirees:
-                    db.execute_query("DELETE FROM npcs WHERE id = ?", (r['id'],))
+                new_npcs = []
+                for nid in retirees:
+                    world.delete('npcs', nid)
                     
                     # 補充
-                    new_npc = generate_random_npc(age=22)
-                    keys = new_npc.keys()
-                    placeholders = ','.join(['?'] * len(keys))
-                    columns = ','.join(keys)
-                    values = tuple(new_npc.values())
-                    db.execute_query(f"INSERT INTO npcs ({columns}) VALUES ({placeholders})", values)
-
-    def process_labor_market_replenishment(self, week):
+                    new_npcs.append(generate_random_npc(age=22))
+
+                keys = list(new_npcs[0].keys())
+                world.insert_many('npcs', keys, [tuple(n[k] for k in keys) for n in new_npcs])
+
+    def process_labor_market_replenishment(self, week, world):
         """
         労働市場の調整: 失業率が5%を切ったら、10%になるまで補充する
         """
         # 現在の人口統計
-        total_res = db.fetch_one("SELECT COUNT(*) as cnt FROM npcs")
-        total_npcs = total_res['cnt'] if total_res else 0
-        
-        unemployed_res = db.fetch_one("SELECT COUNT(*) as cnt FROM npcs WHERE company_id IS NULL")
-        unemployed_npcs = unemployed_res['cnt'] if unemployed_res else 0
+        total_npcs = len(world.npcs)
+        unemployed_npcs = len(world.unemployed())
         
         if total_npcs == 0: return
 
@@ -1308,83 +1668,77 @@ class Simulation:
                 new_npcs = []
                 for _ in range(needed):
                     # 若手中心 (22-30歳)
-                    age = random.randint(22, 30)
+                    age = rng.stream('labor_market').randint(22, 30)
                     new_npcs.append(generate_random_npc(age=age))
                 
                 if new_npcs:
                     keys = list(new_npcs[0].keys())
-                    columns = ', '.join(keys)
-                    placeholders = ', '.join(['?'] * len(keys))
                     values_list = [tuple(npc[k] for k in keys) for npc in new_npcs]
-                    
-                    with db.transaction() as conn:
-                        conn.executemany(f"INSERT INTO npcs ({columns}) VALUES ({placeholders})", values_list)
+                    world.insert_many('npcs', keys, values_list)
                 
                 self.log_news(week, 0, f"労働市場に {needed} 人の新規求職者が流入しました (失業率調整)", 'market')
 
-    def process_financials(self, week, all_caps=None):
+    def process_financials(self, week, world, all_caps=None):
         # 施設賃料支払い
-        facilities = db.fetch_all("SELECT * FROM facilities WHERE is_owned = 0")
+        facilities = [f for f in world.rows['facilities'].values() if not f['is_owned']]
         if facilities:
+            entries = []
+            for fac in facilities:
+                cat = 'rent'
+                if fac['type'] == 'factory': cat = 'rent_factory'
+                elif fac['type'] == 'store': cat = 'rent_store'
+                elif fac['type'] == 'office': cat = 'rent_office'
+
+                if fac['company_id'] in world.companies:
+                    world.adjust('companies', fac['company_id'], 'funds', -fac['rent'])
+                entries.append((week, fac['company_id'], cat, fac['rent']))
+
             with db.transaction() as conn:
-                cursor = conn.cursor()
-                for fac in facilities:
-                    cat = 'rent'
-                    if fac['type'] == 'factory': cat = 'rent_factory'
-                    elif fac['type'] == 'store': cat = 'rent_store'
-                    elif fac['type'] == 'office': cat = 'rent_office'
-
-                    cursor.execute("UPDATE companies SET funds = funds - ? WHERE id = ?", (fac['rent'], fac['company_id']))
-                    cursor.execute("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, ?, ?)",
-                                   (week, fac['company_id'], cat, fac['rent']))
-
-    def process_advertising(self, week, all_caps=None):
+                conn.executemany("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, ?, ?)", entries)
+
+    def process_advertising(self, week, world, all_caps=None):
         """
         ブランド力と商品認知度の自然減衰 (広報能力依存)
         """
-        companies = db.fetch_all("SELECT id, type FROM companies WHERE is_active = 1")
-        
-        with db.transaction() as conn:
-            cursor = conn.cursor()
-            for comp in companies:
-                if comp['type'] == 'system_supplier': continue
-                
-                cid = comp['id']
-                pr_power = 0
-                if all_caps and cid in all_caps:
-                    pr_power = all_caps[cid].get('pr', 0)
-                
-                # キャパシティ不足チェック
-                # calculate_capabilities で計算済みの値を使いたいが、all_capsには能力値しか入っていない場合があるため再計算はコストが高い。
-                # 簡易的にここで再取得するか、all_capsの構造に依存する。
-                # all_caps は calculate_capabilities の戻り値そのものなので、requirements も入っているはず。
-                caps_data = all_caps.get(cid, {})
-                pr_cap = caps_data.get('pr_capacity', 0)
-                req_pr = caps_data.get('requirements', {}).get('pr', 0)
-                
-                sufficiency = 1.0
-                if req_pr > 0:
-                    sufficiency = min(1.0, pr_cap / req_pr)
+        for comp in world.active_companies(include_suppliers=False):
+            cid = comp['id']
+            pr_power = 0
+            if all_caps and cid in all_caps:
+                pr_power = all_caps[cid].get('pr', 0)
+            
+            # キャパシティ不足チェック
+            # calculate_capabilities で計算済みの値を使いたいが、all_capsには能力値しか入っていない場合があるため再計算はコストが高い。
+            # 簡易的にここで再取得するか、all_capsの構造に依存する。
+            # all_caps は calculate_capabilities の戻り値そのものなので、requirements も入っているはず。
+            caps_data = all_caps.get(cid, {})
+            pr_cap = caps_data.get('pr_capacity', 0)
+            req_pr = caps_data.get('requirements', {}).get('pr', 0)
+            
+            sufficiency = 1.0
+            if req_pr > 0:
+                sufficiency = min(1.0, pr_cap / req_pr)
 
-                # 減衰率の計算: 基本値 + (能力による緩和)
-                # キャパシティ不足の場合、緩和効果が消えるだけでなく、基本減衰率自体が悪化するペナルティ
-                penalty_decay = 0.05 * (1.0 - sufficiency) # 最大5%追加減衰
-                
-                brand_decay = min(1.0, gb.BRAND_DECAY_BASE + (pr_power * gb.PR_MITIGATION_FACTOR))
-                awareness_decay = min(1.0, gb.AWARENESS_DECAY_BASE + (pr_power * gb.PR_MITIGATION_FACTOR))
-                
-                # ペナルティ適用
-                brand_decay -= penalty_decay
-                awareness_decay -= penalty_decay
-                
-                cursor.execute("UPDATE companies SET brand_power = brand_power * ? WHERE id = ?", (brand_decay, cid))
-                cursor.execute("UPDATE product_designs SET awareness = awareness * ? WHERE company_id = ?", (awareness_decay, cid))
+            # 減衰率の計算: 基本値 + (能力による緩和)
+            # キャパシティ不足の場合、緩和効果が消えるだけでなく、基本減衰率自体が悪化するペナルティ
+            penalty_decay = 0.05 * (1.0 - sufficiency) # 最大5%追加減衰
+            
+            brand_decay = min(1.0, gb.BRAND_DECAY_BASE + (pr_power * gb.PR_MITIGATION_FACTOR))
+            awareness_decay = min(1.0, gb.AWARENESS_DECAY_BASE + (pr_power * gb.PR_MITIGATION_FACTOR))
+            
+            # ペナルティ適用
+            brand_decay -= penalty_decay
+            awareness_decay -= penalty_decay
+            
+            world.update('companies', cid, brand_power=comp['brand_power'] * brand_decay)
+            for d in world.company_designs(cid):
+                if d['awareness'] is not None:
+                    world.update('product_designs', d['id'], awareness=d['awareness'] * awareness_decay)
 
-    def process_development(self, week):
+    def process_development(self, week, world):
         """
         開発中のプロジェクトを進捗させ、完了時にステータスを確定する
         """
-        developing_projects = db.fetch_all("SELECT * FROM product_designs WHERE status = 'developing'")
+        developing_projects = [d for d in world.designs.values() if d['status'] == 'developing']
         
         for proj in developing_projects:
             start_week = proj['developed_week']
@@ -1392,7 +1746,7 @@ class Simulation:
             
             # 開発キャパシティチェック
             # 毎回計算するのは重いが、週次処理なので許容
-            caps = self.calculate_capabilities(company_id)
+            caps = self.get_capabilities(company_id, world=world)
             dev_cap = caps['development_capacity']
             req_dev = caps['requirements']['development'] # calculate_capabilities内で計算済み
             
@@ -1405,25 +1759,21 @@ class Simulation:
             # 充足率 0.5 なら、1週間進むところを 0.5週間しか進まない -> start_week を 0.5 増やす
             # 整数管理のため、確率的に +1 する
             delay_prob = 1.0 - sufficiency
-            if random.random() < delay_prob:
+            if rng.for_company(company_id, 'dev_progress').random() < delay_prob:
                 # 遅延発生
-                db.execute_query("UPDATE product_designs SET developed_week = developed_week + 1 WHERE id = ?", (proj['id'],))
+                world.adjust('product_designs', proj['id'], 'developed_week', 1)
                 # ログは出しすぎるとうるさいので、著しい遅延の場合のみ出すなどの調整が必要だが今回は割愛
             
             # 完了判定 (現在週 - 開始週 >= 期間)
             # 遅延により start_week が増えているため、完了が遅れる
-            current_start_week = start_week # DB更新前または更新後の値を取得すべきだが、ここでは簡易的に判定
-            # 正確には再取得が必要
-            updated_proj = db.fetch_one("SELECT developed_week FROM product_designs WHERE id = ?", (proj['id'],))
-            if updated_proj:
-                current_start_week = updated_proj['developed_week']
+            current_start_week = proj['developed_week']
 
             # 開発期間の取得 (カテゴリ依存)
             duration = 26 # Default fallback
             markup_modifier = 1.0 # Default
             cat_base_efficiency = gb.BASE_PRODUCTION_EFFICIENCY # Default
             if proj['division_id'] and proj['industry_key']:
-                div = db.fetch_one("SELECT industry_key FROM divisions WHERE id = ?", (proj['division_id'],))
+                div = world.rows['divisions'].get(proj['division_id'])
                 if div:
                     ind_key = div['industry_key']
                     if ind_key in gb.INDUSTRIES:
@@ -1436,7 +1786,7 @@ class Simulation:
                 
                 # 企業の開発力を計算
                 # caps は上で計算済み
-                company_data = db.fetch_one("SELECT dev_knowhow FROM companies WHERE id = ?", (company_id,))
+                company_data = world.company(company_id)
                 total_dev_power = caps['development']
                 if total_dev_power == 0: total_dev_power = 20 # 最低保証
 
@@ -1454,8 +1804,8 @@ class Simulation:
                 
                 # 開発の揺らぎ (Innovation/Bug): 予期せぬ成功や失敗
                 # 正規分布で自然なバラつきを持たせる
-                innovation_luck = random.gauss(0, 0.3)
-                efficiency_luck = random.gauss(0, 0.15)
+                innovation_luck = rng.for_company(company_id, 'dev_progress').gauss(0, 0.3)
+                efficiency_luck = rng.for_company(company_id, 'dev_progress').gauss(0, 0.15)
                 
                 base_concept = 3.0 * strat_mods['c_mod']
                 base_efficiency = cat_base_efficiency * strat_mods['e_mod']
@@ -1479,88 +1829,86 @@ class Simulation:
                 # 原価の約2倍程度を定価とする
                 sales_price = max(1, base_price) # 0円防止
 
-                with db.transaction() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                        UPDATE product_designs 
-                        SET status = 'completed', concept_score = ?, production_efficiency = ?, base_price = ?, sales_price = ?
-                        WHERE id = ?
-                    """, (final_concept, final_efficiency, base_price, sales_price, proj['id']))
+                world.update('product_designs', proj['id'], status='completed', concept_score=final_concept,
+                             production_efficiency=final_efficiency, base_price=base_price, sales_price=sales_price)
 
-                    # 開発ノウハウの蓄積
-                    cursor.execute("UPDATE companies SET dev_knowhow = dev_knowhow + ? WHERE id = ?", (gb.DEV_KNOWHOW_GAIN, company_id))
-                    
-                    cursor.execute("INSERT INTO news_logs (week, company_id, message, type) VALUES (?, ?, ?, ?)",
-                                   (week, company_id, f"新製品 '{proj['name']}' の開発が完了しました。", 'info'))
+                # 開発ノウハウの蓄積
+                if company_data:
+                    world.adjust('companies', company_id, 'dev_knowhow', gb.DEV_KNOWHOW_GAIN)
+                
+                self.log_news(week, company_id, f"新製品 '{proj['name']}' の開発が完了しました。", 'info')
             
                 db.log_file_event(week, company_id, "Development Complete", f"Completed {proj['name']}")
                 db.increment_weekly_stat(week, company_id, 'development_completed', 1)
 
-    def process_product_obsolescence(self, week):
+    def process_product_obsolescence(self, week, world):
         """
         既存製品の陳腐化: 毎週少しずつコンセプトスコアを減衰させる
         """
+        completed = [d for d in world.designs.values() if d['status'] == 'completed']
+
         # 通常減衰
-        db.execute_query(f"UPDATE product_designs SET concept_score = concept_score * {gb.CONCEPT_DECAY_RATE} WHERE status = 'completed' AND concept_score > 1.0")
+        for d in completed:
+            if d['concept_score'] > 1.0:
+                world.update('product_designs', d['id'], concept_score=d['concept_score'] * gb.CONCEPT_DECAY_RATE)
         
         # 技術革新イベント (イノベーション)
         for ind_key, ind_val in gb.INDUSTRIES.items():
-            if random.random() < gb.INNOVATION_EVENT_RATE:
+            if rng.stream('innovation').random() < gb.INNOVATION_EVENT_RATE:
                 # 該当業界の全製品のスコアを大幅に下げる
-                db.execute_query(f"UPDATE product_designs SET concept_score = concept_score * {gb.INNOVATION_DECAY_MULTIPLIER} WHERE status = 'completed' AND industry_key = ?", (ind_key,))
+                for d in completed:
+                    if d['industry_key'] == ind_key:
+                        world.update('product_designs', d['id'], concept_score=d['concept_score'] * gb.INNOVATION_DECAY_MULTIPLIER)
                 self.log_news(week, 0, f"【技術革新】{ind_val['name']}でブレイクスルー発生！既存製品の陳腐化が進みます。", 'market')
 
-    def process_banking(self, week):
+    def process_banking(self, week, world):
         """
         金利支払いと信用格付けの更新
         """
-        companies = db.fetch_all("SELECT * FROM companies WHERE is_active = 1")
-        if companies:
+        interest_entries = []
+        for comp in world.active_companies():
+            # 格付けは利払い前の資金で判定する
+            funds_before = comp['funds']
+
+            # 1. 金利支払い
+            total_debt = 0
+            for loan in world.loans(comp['id']):
+                # 週次利払い (年利 / 52)
+                interest = int(loan['amount'] * loan['interest_rate'] / 52)
+                world.adjust('companies', comp['id'], 'funds', -interest)
+                interest_entries.append((week, comp['id'], interest))
+                total_debt += loan['amount']
+            
+            # 2. 格付け更新
+            base_score = 50
+            fund_score = min(20, funds_before // 100000000)
+            debt_penalty = 0
+            if funds_before > 0 and total_debt > funds_before * 2:
+                debt_penalty = 20
+            
+            new_rating = max(1, min(100, base_score + fund_score - debt_penalty))
+            new_limit = new_rating * gb.CREDIT_LIMIT_MULTIPLIER
+            
+            world.update('companies', comp['id'], credit_rating=new_rating, borrowing_limit=new_limit)
+
+        if interest_entries:
             with db.transaction() as conn:
-                cursor = conn.cursor()
-                for comp in companies:
-                    # 1. 金利支払い
-                    # トランザクション内で読み取るためcursorを使用
-                    cursor.execute("SELECT * FROM loans WHERE company_id = ?", (comp['id'],))
-                    loans = cursor.fetchall()
-                    total_debt = 0
-                    for loan in loans:
-                        # 週次利払い (年利 / 52)
-                        interest = int(loan['amount'] * loan['interest_rate'] / 52)
-                        cursor.execute("UPDATE companies SET funds = funds - ? WHERE id = ?", (interest, comp['id']))
-                        cursor.execute("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, 'interest', ?)",
-                                       (week, comp['id'], interest))
-                        total_debt += loan['amount']
-                    
-                    # 2. 格付け更新
-                    base_score = 50
-                    fund_score = min(20, comp['funds'] // 100000000)
-                    debt_penalty = 0
-                    if comp['funds'] > 0 and total_debt > comp['funds'] * 2:
-                        debt_penalty = 20
-                    
-                    new_rating = max(1, min(100, base_score + fund_score - debt_penalty))
-                    new_limit = new_rating * gb.CREDIT_LIMIT_MULTIPLIER
-                    
-                    cursor.execute("UPDATE companies SET credit_rating = ?, borrowing_limit = ? WHERE id = ?", 
-                                   (new_rating, new_limit, comp['id']))
+                conn.executemany("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, 'interest', ?)", interest_entries)
 
-    def check_bankruptcy(self, week):
+    def check_bankruptcy(self, week, world):
         """
         倒産判定: 資金がマイナス かつ 追加借入不可
         """
-        companies = db.fetch_all("SELECT * FROM companies WHERE type != 'system_supplier' AND is_active = 1")
-        for comp in companies:
+        for comp in world.active_companies(include_suppliers=False):
             if comp['funds'] < 0:
                 # 借入余力を確認
-                loans = db.fetch_one("SELECT SUM(amount) as total FROM loans WHERE company_id = ?", (comp['id'],))
-                current_debt = loans['total'] if loans['total'] else 0
+                current_debt = world.total_debt(comp['id'])
                 
                 if current_debt >= comp['borrowing_limit']:
                     # 倒産処理 (今回はログ出力と社名変更のみ)
                     if comp['type'] == 'player':
                         print(f"GAME OVER: Player went bankrupt in week {week}.")
-                        db.execute_query("UPDATE companies SET name = name || ' (倒産)', is_active = 0 WHERE id = ?", (comp['id'],))
+                        world.update('companies', comp['id'], name=comp['name'] + ' (倒産)', is_active=0)
                         self.log_news(week, comp['id'], "資金繰りが悪化し、倒産しました。", 'error')
                     else:
                         # NPC企業の新陳代謝
@@ -1568,22 +1916,23 @@ class Simulation:
                         self.log_news(week, comp['id'], f"{comp['name']} が倒産しました。", 'market')
                         
                         # 1. 従業員の解雇
-                        db.execute_query("UPDATE npcs SET company_id = NULL, department = NULL, role = NULL, loyalty = 50 WHERE company_id = ?", (comp['id'],))
+                        for npc in world.employees(comp['id']):
+                            world.update('npcs', npc['id'], company_id=None, department=None, role=None, loyalty=50)
                         
                         # 2. 資産・負債の消滅 (簡易処理)
-                        db.execute_query("DELETE FROM inventory WHERE company_id = ?", (comp['id'],))
-                        db.execute_query("DELETE FROM product_designs WHERE company_id = ?", (comp['id'],))
+                        for table in ['inventory', 'product_designs', 'loans']:
+                            for row in world.owned_by(table, comp['id']):
+                                world.delete(table, row['id'])
                         # 施設は市場へ解放 (所有者なしの状態にする)
-                        db.execute_query("UPDATE facilities SET company_id = NULL WHERE company_id = ?", (comp['id'],))
-                        db.execute_query("DELETE FROM loans WHERE company_id = ?", (comp['id'],))
+                        for fac in world.facilities(comp['id']):
+                            world.update('facilities', fac['id'], company_id=None)
                         
                         # 3. 企業データの論理削除
-                        old_type = comp['type']
-                        db.execute_query("UPDATE companies SET is_active = 0 WHERE id = ?", (comp['id'],))
+                        world.update('companies', comp['id'], is_active=0)
                         
                         # 即座の復活(ゾンビ企業)は廃止し、process_new_entriesに委ねる
 
-    def process_new_entries(self, week):
+    def process_new_entries(self, week, world):
         """
         新規参入処理: 利益が出ている市場、または過疎市場に新企業が参入する
         """
@@ -1592,7 +1941,7 @@ class Simulation:
         for ind_key in gb.INDUSTRIES.keys():
             for c_type in target_types:
                 # アクティブ企業数確認
-                count = db.fetch_one("SELECT COUNT(*) as cnt FROM companies WHERE type = ? AND industry = ? AND is_active = 1", (c_type, ind_key))['cnt']
+                count = sum(1 for c in world.active_companies() if c['type'] == c_type and c['industry'] == ind_key)
                 
                 # 参入確率決定
                 prob = 0.0
@@ -1613,30 +1962,32 @@ class Simulation:
                     if stats and stats['avg_profit'] and stats['avg_profit'] > 0:
                         prob = gb.NEW_ENTRY_BASE_PROB
                 
-                if random.random() < prob:
+                if rng.stream('new_entry').random() < prob:
                     # 新規設立
                     new_name = name_generator.generate_company_name(c_type)
                     base_funds = gb.INITIAL_FUNDS_MAKER if c_type == 'npc_maker' else gb.INITIAL_FUNDS_RETAIL
                     initial_funds = int(base_funds * gb.NEW_ENTRY_FUNDS_RATIO) # 小規模スタート
                     
-                    new_id = db.execute_query("INSERT INTO companies (name, type, funds, industry, is_active) VALUES (?, ?, ?, ?, 1)", 
-                                              (new_name, c_type, initial_funds, ind_key))
+                    new_company = world.insert('companies', name=new_name, type=c_type, funds=initial_funds, industry=ind_key, is_active=1)
+                    new_id = new_company['id']
                     
                     # CEO就任
-                    candidate = db.fetch_one("SELECT id FROM npcs WHERE company_id IS NULL ORDER BY executive DESC LIMIT 1")
+                    candidate = world.labor_pool.best('executive')
                     if candidate:
-                        db.execute_query("UPDATE npcs SET company_id = ?, role = ?, department = ? WHERE id = ?", 
-                                         (new_id, gb.ROLE_CEO, gb.DEPT_HR, candidate['id']))
+                        world.update('npcs', candidate['id'], company_id=new_id, role=gb.ROLE_CEO, department=gb.DEPT_HR)
                     
                     # 事業部作成
                     div_name = "製造事業部" if c_type == 'npc_maker' else "販売事業部"
-                    db.execute_query("INSERT INTO divisions (company_id, name, industry_key) VALUES (?, ?, ?)", (new_id, div_name, ind_key))
+                    world.insert('divisions', company_id=new_id, name=div_name, industry_key=ind_key)
                     
                     self.log_news(week, new_id, f"新興企業 {new_name} が{gb.INDUSTRIES[ind_key]['name']}業界に参入しました！", 'market')
 
-    def check_ipo_eligibility(self, company_id):
+    def check_ipo_eligibility(self, company_id, world=None):
         """IPO条件を満たしているかチェック"""
-        company = db.fetch_one("SELECT * FROM companies WHERE id = ?", (company_id,))
+        if world:
+            company = world.company(company_id)
+        else:
+            company = db.fetch_one("SELECT * FROM companies WHERE id = ?", (company_id,))
         if not company: return False, ["企業が存在しません"]
         
         reasons = []
@@ -1644,23 +1995,25 @@ class Simulation:
         
         # 1. 純資産チェック (簡易: 資金 + 在庫評価 + 施設評価 - 負債)
         funds = company['funds']
-        # 在庫評価 (原価ベースが望ましいが、簡易的にsales_price * 0.5程度で評価)
-        inv_val = db.fetch_one("""
-            SELECT SUM(i.quantity * d.sales_price * 0.5) as val 
-            FROM inventory i JOIN product_designs d ON i.design_id = d.id 
-            WHERE i.company_id = ?
-        """, (company_id,))['val'] or 0
-        # 施設 (購入価格ベース)
-        fac_val = db.fetch_one("""
-            SELECT SUM(rent * 100) as val FROM facilities 
-            WHERE company_id = ? AND is_owned = 1
-        """, (company_id,))['val'] or 0
+        if world:
+            inv_val, fac_val = self._asset_values(company_id, world)
+            debt = world.total_debt(company_id)
+        else:
+            # 在庫評価 (原価ベースが望ましいが、簡易的にsales_price * 0.5程度で評価)
+            inv_val = db.fetch_one("""
+                SELECT SUM(i.quantity * d.sales_price * 0.5) as val 
+                FROM inventory i JOIN product_designs d ON i.design_id = d.id 
+                WHERE i.company_id = ?
+            """, (company_id,))['val'] or 0
+            # 施設 (購入価格ベース)
+            fac_val = db.fetch_one("""
+                SELECT SUM(rent * 100) as val FROM facilities 
+                WHERE company_id = ? AND is_owned = 1
+            """, (company_id,))['val'] or 0
+            # 負債
+            debt = db.fetch_one("SELECT SUM(amount) as val FROM loans WHERE company_id = ?", (company_id,))['val'] or 0
         
         total_assets = funds + inv_val + fac_val
-        
-        # 負債
-        debt = db.fetch_one("SELECT SUM(amount) as val FROM loans WHERE company_id = ?", (company_id,))['val'] or 0
-        
         net_assets = total_assets - debt
         
         if net_assets < gb.IPO_MIN_NET_ASSETS:
@@ -1668,13 +2021,9 @@ class Simulation:
             reasons.append(f"純資産不足 (現在: {net_assets/100000000:.1f}億円 / 必要: {gb.IPO_MIN_NET_ASSETS/100000000:.1f}億円)")
             
         # 2. 黒字要件 (直近4週間の純利益合計 > 0)
-        current_week = self.get_current_week()
-        profit_res = db.fetch_one("""
-            SELECT SUM(CASE WHEN category = 'revenue' THEN amount ELSE 0 END) - 
-                   SUM(CASE WHEN category NOT IN ('revenue', 'material', 'stock_purchase', 'facility_purchase', 'facility_sell', 'equity_finance') THEN amount ELSE 0 END) as profit
-            FROM account_entries WHERE company_id = ? AND week >= ?
-        """, (company_id, current_week - gb.IPO_MIN_PROFIT_WEEKS))
-        recent_profit = profit_res['profit'] or 0
+        current_week = world.week if world else self.get_current_week()
+        recent_profit = ledger.profit(ledger.totals(company_id, current_week - gb.IPO_MIN_PROFIT_WEEKS, current_week),
+                                      stock_logic.IPO_EXCLUDED_CATEGORIES)
         
         if recent_profit <= 0:
             is_eligible = False
@@ -1692,266 +2041,156 @@ class Simulation:
 
         return is_eligible, reasons
 
-    def process_stock_market(self, week, all_caps):
+    def _asset_values(self, company_id, world):
+        """在庫評価額 (販売価格の50%) と所有施設評価額 (賃料100週分) をメモリ上で計算する"""
+        inv_val = 0
+        for i in world.inventory(company_id):
+            d = world.designs.get(i['design_id'])
+            if d and d['sales_price'] is not None:
+                inv_val += i['quantity'] * d['sales_price'] * 0.5
+        fac_val = sum(f['rent'] * 100 for f in world.facilities(company_id) if f['is_owned'])
+        return inv_val, fac_val
+
+    def process_stock_market(self, week, world, all_caps):
         """
         株式市場の処理: 株価更新、決算発表、経理キャパシティ判定
+        企業別の集計と株価の計算は stock_logic で全社分をまとめて行う
         """
-        companies = db.fetch_all("SELECT * FROM companies WHERE type != 'system_supplier' AND is_active = 1")
+        companies = [dict(c) for c in world.active_companies(include_suppliers=False)]
+        if not companies: return
+        ids = [c['id'] for c in companies]
         
         with db.transaction() as conn:
             cursor = conn.cursor()
             
-            for comp in companies:
+            # --- 1. 決算処理 (Accounting) ---
+            # 四半期ごとの締め処理: 決算書作成 (Status: draft)
+            if week % gb.QUARTER_WEEKS == 0:
+                pl = stock_logic.period_pl(week - gb.QUARTER_WEEKS + 1, week)
+                year = 2025 + (week - 1) // 52
+                q = ((week - 1) // 13) % 4 + 1
+                period_str = f"{year} Q{q}"
+                
+                reports = []
+                for comp in companies:
+                    revenue, expenses = pl.get(comp['id'], (0, 0))
+                    # BS集計 (簡易: 資金 - 負債。在庫・施設は含めない)
+                    total_assets = comp['funds']
+                    net_assets = total_assets - world.total_debt(comp['id'])
+                    reports.append((comp['id'], week, period_str, revenue, revenue - expenses, total_assets, net_assets))
+                cursor.executemany("""
+                    INSERT INTO financial_reports (company_id, week, period_str, revenue, net_profit, total_assets, net_assets, status)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 'draft')
+                """, reports)
+            
+            # --- 2. 経理キャパシティと発表判定 ---
+            drafts = stock_logic.draft_reports()
+            tx_counts = stock_logic.transaction_counts(week) if drafts else {}
+            accounting_penalty = np.ones(len(companies)) # 株価への影響係数
+            published = []
+            
+            for k, cid in enumerate(ids):
+                draft_report = drafts.get(cid)
+                if not draft_report: continue
+                
+                # 経理負荷の計算 (取引数 + 従業員数)
+                emp_count = len(world.employees(cid))
+                load = (tx_counts.get(cid, 0) * gb.ACCOUNTING_LOAD_PER_TRANSACTION) + (emp_count * gb.ACCOUNTING_LOAD_PER_EMPLOYEE)
+                
+                # 経理キャパシティ
+                acc_cap = all_caps[cid]['accounting_capacity'] if cid in all_caps else 0
+                
+                # 判定: キャパが負荷を上回っていれば発表
+                # 不足している場合、確率で遅延
+                publish_prob = 1.0
+                if load > 0 and acc_cap < load:
+                    publish_prob = max(0.1, acc_cap / load)
+                
+                # 締め後、翌週から発表可能。最大4週遅れると強制発表（ただし信頼失墜）
+                weeks_since_close = week - draft_report['week']
+                
+                if weeks_since_close > 0:
+                    if rng.for_company(cid, 'ir').random() < publish_prob or weeks_since_close >= 4:
+                        status = 'published'
+                        if weeks_since_close >= 2:
+                            status = 'delayed'
+                            accounting_penalty[k] = 1.0 - (weeks_since_close * gb.REPORT_PUBLISH_DELAY_PENALTY)
+                            self.log_news(week, cid, f"決算発表を行いました (遅延: {weeks_since_close}週)", 'warning')
+                        else:
+                            self.log_news(week, cid, f"決算発表を行いました ({draft_report['period_str']})", 'info')
+                        published.append((status, week, draft_report['id']))
+            
+            cursor.executemany("UPDATE financial_reports SET status = ?, published_week = ? WHERE id = ?", published)
+            
+            # --- 3. 株価計算 (Valuation) ---
+            # 理論株価は IPO の公募価格計算でも使うため、ここで全社分を計算しておく
+            valuation = stock_logic.valuate(companies, stock_logic.recent_profits(week - 4, week),
+                                            stock_logic.asset_values(world), world.economic_index)
+            current_prices = [c['stock_price'] for c in companies]
+            shares = [c['outstanding_shares'] for c in companies]
+            
+            # --- IPO処理 (審査・上場) ---
+            for k, comp in enumerate(companies):
+                if comp['listing_status'] != 'applying': continue
                 cid = comp['id']
-                
-                # Rowオブジェクトをdictに変換して変更可能にする
-                comp_dict = dict(comp)
-                
-                # --- 1. 決算処理 (Accounting) ---
-                # 四半期ごとの締め処理
-                is_quarter_end = (week % gb.QUARTER_WEEKS == 0)
-                
-                if is_quarter_end:
-                    # 四半期データの集計
-                    start_week = week - gb.QUARTER_WEEKS + 1
-                    
-                    # PL集計
-                    cursor.execute("""
-                        SELECT category, SUM(amount) as total 
-                        FROM account_entries 
-                        WHERE company_id = ? AND week BETWEEN ? AND ?
-                        GROUP BY category
-                    """, (cid, start_week, week))
-                    entries = cursor.fetchall()
-                    
-                    revenue = 0
-                    expenses = 0
-                    for e in entries:
-                        if e['category'] == 'revenue': revenue += e['total']
-                        elif e['category'] not in ['material', 'stock_purchase', 'facility_purchase', 'facility_sell']:
-                            expenses += e['total']
-                    
-                    net_profit = revenue - expenses
-                    
-                    # BS集計 (簡易)
-                    total_assets = comp['funds'] # + 在庫 + 施設 (今回は簡易化)
-                    # 負債
-                    cursor.execute("SELECT SUM(amount) as total FROM loans WHERE company_id = ?", (cid,))
-                    debt_res = cursor.fetchone()
-                    debt = debt_res['total'] if debt_res and debt_res['total'] else 0
-                    net_assets = total_assets - debt
-                    
-                    # 決算書作成 (Status: draft)
-                    year = 2025 + (week - 1) // 52
-                    q = ((week - 1) // 13) % 4 + 1
-                    period_str = f"{year} Q{q}"
-                    
-                    cursor.execute("""
-                        INSERT INTO financial_reports (company_id, week, period_str, revenue, net_profit, total_assets, net_assets, status)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, 'draft')
-                    """, (cid, week, period_str, revenue, net_profit, total_assets, net_assets))
-                
-                # --- 2. 経理キャパシティと発表判定 ---
-                # 未発表の決算があるか確認
-                cursor.execute("SELECT * FROM financial_reports WHERE company_id = ? AND status = 'draft'", (cid,))
-                draft_report = cursor.fetchone()
-                
-                accounting_penalty = 1.0 # 株価への影響係数
-                
-                if draft_report:
-                    # 経理負荷の計算
-                    # 取引数
-                    cursor.execute("SELECT COUNT(*) as cnt FROM transactions WHERE (seller_id = ? OR buyer_id = ?) AND week = ?", (cid, cid, week))
-                    tx_count = cursor.fetchone()['cnt']
+                is_ok, reasons = self.check_ipo_eligibility(cid, world=world)
+                if is_ok:
+                    # 上場承認 & 公募増資
+                    offering_price = int(valuation['theoretical'][k] * gb.IPO_DISCOUNT_RATE)
+                    new_shares = int(shares[k] * gb.IPO_NEW_SHARE_RATIO)
+                    raised_funds = offering_price * new_shares
+                    fees = int(raised_funds * gb.IPO_FEE_RATE)
+                    net_proceeds = raised_funds - fees
                     
-                    # 従業員数
-                    cursor.execute("SELECT COUNT(*) as cnt FROM npcs WHERE company_id = ?", (cid,))
-                    emp_count = cursor.fetchone()['cnt']
+                    # 世界状態の更新
+                    world_comp = world.company(cid)
+                    world.update('companies', cid, listing_status='public', funds=world_comp['funds'] + net_proceeds,
+                                 outstanding_shares=world_comp['outstanding_shares'] + new_shares, stock_price=offering_price)
                     
-                    load = (tx_count * gb.ACCOUNTING_LOAD_PER_TRANSACTION) + (emp_count * gb.ACCOUNTING_LOAD_PER_EMPLOYEE)
+                    # 資金調達ログ (PL外)
+                    cursor.execute("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, 'equity_finance', ?)",
+                                   (week, cid, net_proceeds))
                     
-                    # 経理キャパシティ
-                    acc_cap = all_caps[cid]['accounting_capacity'] if cid in all_caps else 0
+                    self.log_news(week, cid, f"祝！新規上場(IPO)を果たしました！ 公募価格: {offering_price:,}円, 調達額: {net_proceeds:,}円", 'info')
                     
-                    # 判定: キャパが負荷を上回っていれば発表
-                    # 不足している場合、確率で遅延
-                    publish_prob = 1.0
-                    if load > 0 and acc_cap < load:
-                        publish_prob = max(0.1, acc_cap / load)
+                    # ブランド力ボーナス
+                    world.adjust('companies', cid, 'brand_power', 20)
                     
-                    # 締め後、翌週から発表可能。最大4週遅れると強制発表（ただし信頼失墜）
-                    weeks_since_close = week - draft_report['week']
-                    
-                    if weeks_since_close > 0:
-                        if random.random() < publish_prob or weeks_since_close >= 4:
-                            status = 'published'
-                            if weeks_since_close >= 2:
-                                status = 'delayed'
-                                accounting_penalty = 1.0 - (weeks_since_close * gb.REPORT_PUBLISH_DELAY_PENALTY)
-                                self.log_news(week, cid, f"決算発表を行いました (遅延: {weeks_since_close}週)", 'warning')
-                            else:
-                                self.log_news(week, cid, f"決算発表を行いました ({draft_report['period_str']})", 'info')
-                                
-                            cursor.execute("UPDATE financial_reports SET status = ?, published_week = ? WHERE id = ?", 
-                                           (status, week, draft_report['id']))
-                
-                # --- 2.5 株価計算用パラメータの準備 ---
-                # IPO時の公募価格計算でも使うため、ここで計算しておく
-                
-                shares = comp_dict['outstanding_shares']
-                
-                # --- 3. 株価計算 (Valuation) ---
-                # 理論株価 = (EPS * PER + BPS * PBR) / 2
-                
-                # 予想EPS: 直近4週の利益 * 13 / 株式数
-                cursor.execute("""
-                    SELECT SUM(CASE WHEN category = 'revenue' THEN amount ELSE 0 END) - 
-                           SUM(CASE WHEN category NOT IN ('revenue', 'material', 'stock_purchase', 'facility_purchase', 'facility_sell') THEN amount ELSE 0 END) as profit
-                    FROM account_entries WHERE company_id = ? AND week >= ?
-                """, (cid, week - 4))
-                recent_profit = cursor.fetchone()['profit'] or 0
-                annual_profit_forecast = recent_profit * 13
-                
-                eps = annual_profit_forecast / shares
-                
-                # BPS: 純資産 / 株式数 (より正確な資産評価)
-                funds = comp_dict['funds']
-                
-                # 在庫評価 (販売価格の50%で評価)
-                cursor.execute("""
-                    SELECT SUM(i.quantity * d.sales_price * 0.5) as val 
-                    FROM inventory i JOIN product_designs d ON i.design_id = d.id 
-                    WHERE i.company_id = ?
-                """, (cid,))
-                inv_res = cursor.fetchone()
-                inv_val = inv_res['val'] if inv_res and inv_res['val'] else 0
-                
-                # 施設評価 (所有物件の購入価格相当)
-                cursor.execute("""
-                    SELECT SUM(rent * 100) as val FROM facilities 
-                    WHERE company_id = ? AND is_owned = 1
-                """, (cid,))
-                fac_res = cursor.fetchone()
-                fac_val = fac_res['val'] if fac_res and fac_res['val'] else 0
-                
-                # 負債
-                cursor.execute("SELECT SUM(amount) as total FROM loans WHERE company_id = ?", (cid,))
-                debt_res = cursor.fetchone()
-                debt = debt_res['total'] if debt_res and debt_res['total'] else 0
-                
-                net_assets = funds + inv_val + fac_val - debt
-                bps = max(1, net_assets / shares)
-                
-                # PER, PBR基準
-                # 要件反映: 景気動向と信用格付けを反映
-                economic_index = db.fetch_one("SELECT economic_index FROM game_state")['economic_index']
-                
-                # 景気動向によるPER補正 (好況時は許容度が上がり、不況時は下がる)
-                # index 1.0 -> 1.0, 1.2 -> 1.4 (+40%), 0.8 -> 0.6 (-40%)
-                sentiment_multiplier = 1.0 + (economic_index - 1.0) * 2.0
-                
-                # 信用格付けによるディスカウント率補正 (格付けが高いほど株価は高くなる＝PER/PBRが高くなる)
-                # 50 -> 1.0, 100 -> 1.25, 0 -> 0.75
-                rating_multiplier = 0.75 + (comp_dict['credit_rating'] / 200.0)
-
-                target_per = gb.PER_BASE * sentiment_multiplier * rating_multiplier
-                target_pbr = (gb.PBR_BASE + (comp_dict['brand_power'] / 100.0)) * rating_multiplier
-                
-                # 理論株価
-                if eps > 0:
-                    # 黒字: 収益価値と資産価値の併用
-                    theoretical_price = ((eps * target_per) + (bps * target_pbr)) / 2.0
+                    # 公募価格を起点に、この週の株価遷移と履歴保存へ進む
+                    shares[k] += new_shares
+                    current_prices[k] = offering_price
                 else:
-                    # 赤字: 資産価値(PBR)のみで評価 (赤字で株価がマイナスになるのを防ぐ)
-                    theoretical_price = bps * target_pbr
-                
-                theoretical_price = max(1, theoretical_price) # 1円以上
-                
-                # --- IPO処理 (審査・上場) ---
-                if comp_dict['listing_status'] == 'applying':
-                    is_ok, reasons = self.check_ipo_eligibility(cid)
-                    if is_ok:
-                        # 上場承認 & 公募増資
-                        offering_price = int(theoretical_price * gb.IPO_DISCOUNT_RATE)
-                        new_shares = int(shares * gb.IPO_NEW_SHARE_RATIO)
-                        raised_funds = offering_price * new_shares
-                        fees = int(raised_funds * gb.IPO_FEE_RATE)
-                        net_proceeds = raised_funds - fees
-                        
-                        # DB更新
-                        cursor.execute("""
-                            UPDATE companies 
-                            SET listing_status = 'public', funds = funds + ?, outstanding_shares = outstanding_shares + ?, stock_price = ? 
-                            WHERE id = ?
-                        """, (net_proceeds, new_shares, offering_price, cid))
-                        
-                        # 資金調達ログ (PL外)
-                        cursor.execute("INSERT INTO account_entries (week, company_id, category, amount) VALUES (?, ?, 'equity_finance', ?)",
-                                       (week, cid, net_proceeds))
-                        
-                        self.log_news(week, cid, f"祝！新規上場(IPO)を果たしました！ 公募価格: {offering_price:,}円, 調達額: {net_proceeds:,}円", 'info')
-                        
-                        # ブランド力ボーナス
-                        cursor.execute("UPDATE companies SET brand_power = brand_power + 20 WHERE id = ?", (cid,))
-                        
-                        # メモリ上の値を更新して、後続の履歴保存に反映させる
-                        comp_dict['listing_status'] = 'public'
-                        comp_dict['outstanding_shares'] += new_shares
-                        comp_dict['stock_price'] = offering_price
-                        # fundsは株価計算に使わないので更新省略
-                        
-                        # 初値がついたので、この週の株価計算はスキップ（公募価格＝終値とする）
-                        # ただし履歴には残したいので後続へ進む
-                    else:
-                        # 審査落ち
-                        cursor.execute("UPDATE companies SET listing_status = 'private' WHERE id = ?", (cid,))
-                        self.log_news(week, cid, f"IPO審査に落ちました。理由: {', '.join(reasons)}", 'error')
-
-                # 現在株価からの遷移
-                current_price = comp_dict['stock_price']
-                alpha = 0.1 # 織り込み係数 (急激な変動を抑えるため0.2->0.1へ変更)
-                
-                # 変動
-                volatility = random.uniform(1.0 - gb.STOCK_VOLATILITY, 1.0 + gb.STOCK_VOLATILITY)
-                
-                proposed_price = int(((theoretical_price * alpha) + (current_price * (1 - alpha))) * volatility * accounting_penalty)
-                
-                # ストップ高・ストップ安 (週次変動制限 ±20%)
-                max_price = int(current_price * 1.2)
-                min_price = int(current_price * 0.8)
-                
-                new_price = max(min_price, min(max_price, proposed_price))
-                new_price = max(1, new_price)
-                
-                # --- 株式分割 (Stock Split) ---
-                # 株価が10万円を超えた場合、5000円を目安に分割する
-                # IPO等で株式数が変動している可能性があるため、最新の値を参照
-                shares = comp_dict['outstanding_shares']
-                
-                if new_price > 100000:
-                    split_ratio = int(new_price / 5000)
-                    if split_ratio >= 2:
-                        new_shares = shares * split_ratio
-                        new_price = int(new_price / split_ratio)
-                        
-                        cursor.execute("UPDATE companies SET outstanding_shares = ? WHERE id = ?", (new_shares, cid))
-                        self.log_news(week, cid, f"株式分割を実施しました (1:{split_ratio})。株価は {new_price:,}円 に調整されました。", 'market')
-                        
-                        shares = new_shares
-                        comp_dict['outstanding_shares'] = shares
-
-                market_cap = new_price * shares
-                
-                # 更新
-                cursor.execute("UPDATE companies SET stock_price = ?, market_cap = ? WHERE id = ?", (new_price, market_cap, cid))
-                
-                # 履歴保存
-                real_per = new_price / eps if eps > 0 else 0
-                real_pbr = new_price / bps
-                cursor.execute("""
-                    INSERT INTO stock_history (week, company_id, stock_price, market_cap, eps, bps, per, pbr)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (week, cid, new_price, market_cap, eps, bps, real_per, real_pbr))
+                    # 審査落ち
+                    world.update('companies', cid, listing_status='private')
+                    self.log_news(week, cid, f"IPO審査に落ちました。理由: {', '.join(reasons)}", 'error')
+            
+            # 現在株価からの遷移 (変動は企業ごとの乱数ストリームから引く)
+            volatility = np.array([rng.for_company(cid, 'stock').uniform(1.0 - gb.STOCK_VOLATILITY, 1.0 + gb.STOCK_VOLATILITY) for cid in ids])
+            prices = stock_logic.next_prices(current_prices, valuation['theoretical'], volatility, accounting_penalty)
+            
+            # --- 株式分割 (Stock Split) ---
+            shares = np.array(shares, dtype=np.int64)
+            ratios = stock_logic.split_ratios(prices)
+            prices = prices // ratios
+            shares = shares * ratios
+            for k in np.flatnonzero(ratios > 1):
+                world.update('companies', ids[k], outstanding_shares=int(shares[k]))
+                self.log_news(week, ids[k], f"株式分割を実施しました (1:{ratios[k]})。株価は {prices[k]:,}円 に調整されました。", 'market')
+            
+            market_caps = prices * shares
+            
+            # 更新
+            world.update_many('companies', ids, stock_price=prices.tolist(), market_cap=market_caps.tolist())
+            
+            # 履歴保存
+            eps, bps = valuation['eps'], valuation['bps']
+            real_per = np.divide(prices, eps, out=np.zeros(len(ids)), where=eps > 0)
+            real_pbr = prices / bps
+            cursor.executemany("""
+                INSERT INTO stock_history (week, company_id, stock_price, market_cap, eps, bps, per, pbr)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, list(zip([week] * len(ids), ids, prices.tolist(), market_caps.tolist(),
+                          eps.tolist(), bps.tolist(), real_per.tolist(), real_pbr.tolist())))
 
     def get_financial_report(self, company_id, current_week, period='weekly', target=0):
         """指定された期間の財務諸表(PL/BS)データを生成して返す"""
@@ -1989,17 +2228,12 @@ class Simulation:
             y = 2025 + (target - 1)
             label = f"{y}年 (第{target}期)"
 
-        # PL集計
-        entries = db.fetch_all("""
-            SELECT category, SUM(amount) as total 
-            FROM account_entries 
-            WHERE company_id = ? AND week BETWEEN ? AND ?
-            GROUP BY category
-        """, (company_id, start_week, end_week))
+        # PL集計 (会計ロールアップから期間分をまとめて引く)
+        entries = ledger.totals(company_id, start_week, end_week)
         
         pl = {k: 0 for k in ['revenue', 'cogs', 'gross_profit', 'labor', 'rent', 'ad', 'other_sga', 'operating_profit', 'interest', 'net_profit']}
-        for e in entries:
-            cat, amt = e['category'], int(e['total'])
+        for cat, total in entries.items():
+            amt = int(total)
             if cat in pl: pl[cat] += amt
             elif 'labor' in cat: pl['labor'] += amt
             elif 'rent' in cat: pl['rent'] += amt
@@ -0,0 +1,180 @@
+# c:\0124newSIm\src\sql_trace.py
+# SQLのトレース (正規化したSQL・呼び出し元ごとの実行回数・時間・行数の週次集計と、N+1 パターンの検出)
+# tracer.enable() したときだけ記録する。fetch_one / fetch_all も db.transaction() の生カーソルも
+# Database のコネクションを通るため、ここで全て拾える。
+
+import json
+import os
+import re
+import sys
+from database import db
+
+# 週次レポートに載せる件数
+TOP_N = 10
+# 同じ呼び出し元から同じ SELECT を1件ずつ、週にこの回数以上実行していたら N+1 とみなす
+N_PLUS_ONE_MIN_CALLS = 20
+
+# 呼び出し元として扱わないファイル (DBアクセスの下回り)
+_SKIP_FILES = {'database.py', 'sql_trace.py', 'perf.py', 'contextlib.py'}
+
+_COMMENT = re.compile(r"--[^\n]*")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\bIN \(\?(?:, ?\?)*\)", re.IGNORECASE)
+
+def normalize(sql):
+    """リテラルを ? に、IN (?, ?, ...) を IN (...) にまとめ、空白を詰めたSQL"""
+    sql = _STRING.sub('?', sql)
+    sql = _COMMENT.sub(' ', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _SPACE.sub(' ', sql).strip()
+    sql = sql.replace('( ', '(').replace(' )', ')')
+    return _IN_LIST.sub('IN (...)', sql)
+
+def _call_site():
+    """DBアクセスの下回りを除いた最初の呼び出し元 "ファイル:行 関数" """
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.basename(frame.f_code.co_filename)
+        if filename not in _SKIP_FILES:
+            return f"{filename}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+class _Call:
+    """1回の実行のトレース (結果の取得時間・行数を後から加算する)"""
+    __slots__ = ('stats', 'ms')
+
+    def __init__(self, stats, ms):
+        self.stats = stats
+        self.ms = ms
+
+    def fetched(self, ms, rows):
+        self.ms += ms
+        self.stats['total_ms'] += ms
+        self.stats['rows'] += rows
+        if self.ms > self.stats['max_ms']:
+            self.stats['max_ms'] = self.ms
+
+class SQLTracer:
+    """
+    実行された文を (正規化したSQL, 呼び出し元) ごとに週内で集計する。
+    週末の end_week() で、時間のかかった文・実行回数の多い文の上位と N+1 の候補をまとめる。
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.weeks = {}        # {week: summarize() の結果}
+        self._stats = {}       # {(正規化SQL, 呼び出し元): 集計}
+        self._normalized = {}  # {SQL: 正規化SQL} (同じ文字列のSQLは毎回正規化しない)
+
+    def enable(self):
+        self.enabled = True
+        self.begin_week()
+        db.start_tracing(self)
+
+    def disable(self):
+        db.stop_tracing()
+        self.enabled = False
+
+    def begin_week(self):
+        self._stats = {}
+
+    def record(self, conn, sql, ms, many):
+        """Database のカーソルから文の実行ごとに呼ばれる"""
+        normalized = self._normalized.get(sql)
+        if normalized is None:
+            normalized = self._normalized[sql] = normalize(sql)
+        key = (normalized, _call_site())
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = {'sql': normalized, 'site': key[1], 'calls': 0, 'many': 0,
+                                        'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0, 'new_connections': 0}
+        stats['calls'] += 1
+        stats['total_ms'] += ms
+        if ms > stats['max_ms']:
+            stats['max_ms'] = ms
+        if many:
+            stats['many'] += 1
+        if conn.fresh:
+            # このコネクションを開いてから最初の文 (= この呼び出しで接続を開いた)
+            conn.fresh = False
+            stats['new_connections'] += 1
+        return _Call(stats, ms)
+
+    # ---------------------------------------------------------
+    # 集計・レポート
+    # ---------------------------------------------------------
+    def summarize(self, top_n=TOP_N):
+        """
+        週内の集計をまとめる。
+        slowest / frequent: 正規化SQLごと (呼び出し元をまたいで合算) の合計時間・実行回数の上位
+        n_plus_one: 同じ呼び出し元から同じ SELECT を1件ずつ N_PLUS_ONE_MIN_CALLS 回以上実行したもの
+        """
+        by_sql = {}
+        for stats in self._stats.values():
+            agg = by_sql.get(stats['sql'])
+            if agg is None:
+                agg = by_sql[stats['sql']] = {'sql': stats['sql'], 'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                                              'rows': 0, 'new_connections': 0, 'sites': []}
+            for k in ('calls', 'total_ms', 'rows', 'new_connections'):
+                agg[k] += stats[k]
+            agg['max_ms'] = max(agg['max_ms'], stats['max_ms'])
+            agg['sites'].append(stats['site'])
+        statements = list(by_sql.values())
+        for agg in statements:
+            agg['total_ms'] = round(agg['total_ms'], 3)
+            agg['max_ms'] = round(agg['max_ms'], 3)
+            agg['sites'].sort()
+
+        n_plus_one = []
+        for stats in self._stats.values():
+            single = stats['calls'] - stats['many']
+            if single >= N_PLUS_ONE_MIN_CALLS and stats['sql'].upper().startswith('SELECT'):
+                n_plus_one.append({'sql': stats['sql'], 'site': stats['site'], 'calls': single,
+                                   'total_ms': round(stats['total_ms'], 3), 'rows_per_call': round(stats['rows'] / stats['calls'], 2)})
+
+        return {
+            'statements': sum(s['calls'] for s in statements),
+            'distinct': len(statements),
+            'total_ms': round(sum(s['total_ms'] for s in statements), 3),
+            'new_connections': sum(s['new_connections'] for s in statements),
+            'slowest': sorted(statements, key=lambda s: (-s['total_ms'], s['sql']))[:top_n],
+            'frequent': sorted(statements, key=lambda s: (-s['calls'], s['sql']))[:top_n],
+            'n_plus_one': sorted(n_plus_one, key=lambda s: (-s['calls'], s['site'])),
+        }
+
+    def end_week(self, week):
+        """週の集計を weeks に保存してレポートを表示する"""
+        if not self.enabled: return None
+        summary = self.weeks[week] = self.summarize()
+        print(format_report(week, summary))
+        self.begin_week()
+        return summary
+
+    def export(self, path):
+        """週ごとの集計を JSON で書き出す"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'weeks': {str(w): s for w, s in sorted(self.weeks.items())}}, f, ensure_ascii=False, indent=1)
+        return len(self.weeks)
+
+def _shorten(sql, width=100):
+    return sql if len(sql) <= width else sql[:width - 3] + "..."
+
+def format_report(week, summary, top_n=5):
+    lines = [f"[Week {week}] SQL trace: {summary['statements']} statements ({summary['distinct']} distinct), "
+             f"{summary['total_ms']:.1f}ms, {summary['new_connections']} new connections"]
+    lines.append("  slowest:")
+    for s in summary['slowest'][:top_n]:
+        lines.append(f"    {s['total_ms']:9.2f}ms {s['calls']:6d}x  {_shorten(s['sql'])}")
+    lines.append("  most frequent:")
+    for s in summary['frequent'][:top_n]:
+        lines.append(f"    {s['calls']:6d}x {s['total_ms']:9.2f}ms  {_shorten(s['sql'])}")
+    if summary['n_plus_one']:
+        lines.append("  N+1 candidates:")
+        for s in summary['n_plus_one'][:top_n]:
+            lines.append(f"    {s['calls']:6d}x at {s['site']}  {_shorten(s['sql'], 80)}")
+    return "\n".join(lines)
+
+tracer = SQLTracer()
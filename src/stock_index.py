@@ -0,0 +1,119 @@
+# c:\0124newSIm\src\stock_index.py
+# 販売可能在庫のインデックス (在庫・設計書・保有企業・製造企業を結合済みの状態で保持)
+
+# 結合結果に影響するカラム (これ以外の変更、例えば資金の増減では索引を更新しない)
+RELEVANT_COLUMNS = {
+    'inventory': {'company_id', 'design_id', 'quantity', 'sales_price'},
+    'product_designs': {'company_id', 'industry_key', 'name', 'sales_price', 'base_price', 'concept_score',
+                        'material_score', 'awareness', 'parts_config'},
+    'companies': {'type', 'is_active', 'brand_power', 'orientation'},
+}
+
+RETAIL_TYPES = ('player', 'npc_retail')   # B2C販売を行う企業
+MAKER_TYPES = ('player', 'npc_maker')     # B2B販売を行う企業
+
+class SellableStockIndex:
+    """
+    在庫ID をキーに、販売可能な在庫 (数量 > 0、保有企業が稼働中、設計書と製造企業が存在) の結合済み属性を業界別に保持する。
+    WorldState の更新 (update / adjust / insert / delete) から on_change() で通知を受け、該当する在庫だけを作り直す。
+    エントリは変更のたびに新しい dict へ置き換えるため、取得済みのリストは取得時点のスナップショットとして使える。
+    """
+
+    def __init__(self, world):
+        self.world = world
+        self._by_industry = {}   # {industry_key: {inventory_id: entry}}
+        self._industry_of = {}   # {inventory_id: industry_key}
+        self._by_design = {}     # {design_id: set(inventory_id)} (数量0の在庫も含む)
+        self._design_of = {}     # {inventory_id: design_id}
+
+    def rebuild(self):
+        """世界状態の全在庫から作り直す (WorldState.refresh の後)"""
+        self._by_industry = {}
+        self._industry_of = {}
+        self._by_design = {}
+        self._design_of = {}
+        for inv in self.world.rows['inventory'].values():
+            self._index_design(inv)
+            self._refresh_entry(inv['id'])
+
+    # ---------------------------------------------------------
+    # 参照
+    # ---------------------------------------------------------
+    def entries(self, industry_key=None):
+        """販売可能在庫 (在庫ID昇順)。industry_key を指定するとその業界のみ"""
+        if industry_key is not None:
+            part = self._by_industry.get(industry_key, {})
+            return [part[i] for i in sorted(part)]
+        return sorted((e for part in self._by_industry.values() for e in part.values()), key=lambda e: e['id'])
+
+    def retail(self, industry_key=None):
+        """小売店頭の在庫 (B2C需要マッチング用)"""
+        return [e for e in self.entries(industry_key) if e['holder_type'] in RETAIL_TYPES]
+
+    def maker_offers(self, industry_key=None):
+        """メーカーが保有する在庫 (小売の仕入れ判断用)。maker_id / brand_power は保有企業のもの"""
+        return [{
+            'quantity': e['quantity'], 'design_id': e['design_id'], 'sales_price': e['msrp'],
+            'base_price': e['base_price'], 'concept_score': e['concept_score'], 'industry_key': e['industry_key'],
+            'maker_id': e['company_id'], 'brand_power': e['holder_brand'],
+        } for e in self.entries(industry_key) if e['holder_type'] in MAKER_TYPES]
+
+    # ---------------------------------------------------------
+    # 更新通知
+    # ---------------------------------------------------------
+    def on_change(self, table, row, columns=None):
+        """行の変更通知 (columns=None は行の追加・削除)"""
+        relevant = RELEVANT_COLUMNS.get(table)
+        if relevant is None: return
+        if columns is not None and not relevant.intersection(columns): return
+
+        if table == 'inventory':
+            self._index_design(row)
+            self._refresh_entry(row['id'])
+        elif table == 'product_designs':
+            for inv_id in self._by_design.get(row['id'], ()):
+                self._refresh_entry(inv_id)
+        elif table == 'companies':
+            # 保有在庫と、その企業が製造した設計書の在庫 (他社の店頭を含む)
+            inv_ids = {inv['id'] for inv in self.world.inventory(row['id'])}
+            for d in self.world.company_designs(row['id']):
+                inv_ids.update(self._by_design.get(d['id'], ()))
+            for inv_id in inv_ids:
+                self._refresh_entry(inv_id)
+
+    def _index_design(self, inv):
+        """在庫行の追加・削除・design_id 変更に合わせて逆引きを更新する"""
+        old_design = self._design_of.pop(inv['id'], None)
+        if old_design is not None:
+            self._by_design[old_design].discard(inv['id'])
+        if inv['id'] in self.world.rows['inventory']:
+            self._design_of[inv['id']] = inv['design_id']
+            self._by_design.setdefault(inv['design_id'], set()).add(inv['id'])
+
+    def _refresh_entry(self, inv_id):
+        old_industry = self._industry_of.pop(inv_id, None)
+        if old_industry is not None:
+            self._by_industry[old_industry].pop(inv_id, None)
+
+        entry = self._build_entry(inv_id)
+        if entry is None: return
+        self._by_industry.setdefault(entry['industry_key'], {})[inv_id] = entry
+        self._industry_of[inv_id] = entry['industry_key']
+
+    def _build_entry(self, inv_id):
+        inv = self.world.rows['inventory'].get(inv_id)
+        if not inv or inv['quantity'] <= 0: return None
+        holder = self.world.company(inv['company_id'])
+        if not holder or not holder['is_active']: return None
+        d = self.world.designs.get(inv['design_id'])
+        maker = self.world.company(d['company_id']) if d else None
+        if not maker: return None
+        return {
+            'id': inv_id, 'company_id': holder['id'], 'holder_type': holder['type'],
+            'holder_brand': holder['brand_power'], 'orientation': holder.get('orientation') or 'standard',
+            'quantity': inv['quantity'], 'retail_price': inv['sales_price'],
+            'design_id': d['id'], 'product_name': d['name'], 'industry_key': d['industry_key'],
+            'concept_score': d['concept_score'], 'material_score': d['material_score'], 'awareness': d['awareness'],
+            'base_price': d['base_price'], 'msrp': d['sales_price'], 'parts_config': d['parts_config'],
+            'creator_id': maker['id'], 'maker_brand': maker['brand_power'],
+        }
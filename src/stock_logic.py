@@ -0,0 +1,116 @@
+# c:\0124newSIm\src\stock_logic.py
+# 株式市場の評価エンジン (企業別の集計を GROUP BY でまとめて取得し、株価を全社分の配列で計算する)
+
+import numpy as np
+from database import db
+import gamebalance as gb
+import ledger
+
+# 損益に含めない勘定 (資産の増減・資本取引)
+NON_PL_CATEGORIES = ('material', 'stock_purchase', 'facility_purchase', 'facility_sell')
+# IPO審査・配当判断の利益では資本取引 (株式調達/自社株買い) も除く
+IPO_EXCLUDED_CATEGORIES = NON_PL_CATEGORIES + ('equity_finance',)
+
+# 株価の織り込み係数 (理論株価への週次の追随率。急激な変動を抑えるため0.2->0.1へ変更)
+PRICE_ALPHA = 0.1
+# ストップ高・ストップ安 (週次変動制限 ±20%)
+LIMIT_UP = 1.2
+LIMIT_DOWN = 0.8
+# 株価が10万円を超えた場合、5000円を目安に分割する
+SPLIT_THRESHOLD = 100000
+SPLIT_TARGET_PRICE = 5000
+
+# ---------------------------------------------------------
+# 集計 (全社分を1クエリずつ。損益は会計ロールアップから引く)
+# ---------------------------------------------------------
+def period_pl(start_week, end_week):
+    """期間中の売上と費用 {company_id: (revenue, expenses)}"""
+    result = {}
+    for cid, pl in ledger.totals_by_company(start_week, end_week).items():
+        revenue = pl.get('revenue', 0) or 0
+        result[cid] = (revenue, revenue - ledger.profit(pl, NON_PL_CATEGORIES))
+    return result
+
+def recent_profits(since_week, until_week):
+    """期間中の利益 {company_id: profit}"""
+    return {cid: ledger.profit(pl, NON_PL_CATEGORIES) for cid, pl in ledger.totals_by_company(since_week, until_week).items()}
+
+def draft_reports():
+    """未発表の決算 {company_id: report} (企業ごとに最も古いもの)"""
+    drafts = {}
+    for r in db.fetch_all("SELECT * FROM financial_reports WHERE status = 'draft' ORDER BY id"):
+        drafts.setdefault(r['company_id'], dict(r))
+    return drafts
+
+def transaction_counts(week):
+    """週の取引件数 {company_id: count} (売り手・買い手のどちらかとして関わった取引)"""
+    rows = db.fetch_all("""
+        SELECT company_id, COUNT(*) as cnt FROM (
+            SELECT seller_id as company_id FROM transactions WHERE week = ?
+            UNION ALL
+            SELECT buyer_id FROM transactions WHERE week = ? AND buyer_id IS NOT seller_id
+        )
+        WHERE company_id IS NOT NULL
+        GROUP BY company_id
+    """, (week, week))
+    return {r['company_id']: r['cnt'] for r in rows}
+
+def asset_values(world):
+    """在庫評価額 (販売価格の50%)・所有施設評価額 (賃料100週分)・負債 {company_id: (inv_val, fac_val, debt)}"""
+    inv, fac, debt = {}, {}, {}
+    for i in world.rows['inventory'].values():
+        d = world.designs.get(i['design_id'])
+        if d and d['sales_price'] is not None:
+            inv[i['company_id']] = inv.get(i['company_id'], 0) + i['quantity'] * d['sales_price'] * 0.5
+    for f in world.rows['facilities'].values():
+        if f['is_owned']:
+            fac[f['company_id']] = fac.get(f['company_id'], 0) + f['rent'] * 100
+    for l in world.rows['loans'].values():
+        debt[l['company_id']] = debt.get(l['company_id'], 0) + l['amount']
+    return {cid: (inv.get(cid, 0), fac.get(cid, 0), debt.get(cid, 0)) for cid in set(inv) | set(fac) | set(debt)}
+
+# ---------------------------------------------------------
+# 評価 (配列)
+# ---------------------------------------------------------
+def valuate(companies, profits, assets, economic_index):
+    """
+    理論株価 = (EPS * PER + BPS * PBR) / 2 (赤字企業は BPS * PBR のみ)。
+    companies: 企業行のリスト (並びは戻り値の配列と同じ)
+    戻り値: {'eps', 'bps', 'theoretical'} の配列
+    """
+    n = len(companies)
+    shares = np.array([c['outstanding_shares'] for c in companies], dtype=np.float64)
+    funds = np.array([c['funds'] for c in companies], dtype=np.float64)
+    rating = np.array([c['credit_rating'] for c in companies], dtype=np.float64)
+    brand = np.array([c['brand_power'] for c in companies], dtype=np.float64)
+    profit = np.array([profits.get(c['id'], 0) for c in companies], dtype=np.float64)
+    inv_val, fac_val, debt = np.array([assets.get(c['id'], (0, 0, 0)) for c in companies], dtype=np.float64).reshape(n, 3).T
+
+    # 予想EPS: 直近4週の利益 * 13 / 株式数
+    eps = (profit * 13) / shares
+    # BPS: 純資産 (資金 + 在庫 + 施設 - 負債) / 株式数
+    bps = np.maximum(1, (funds + inv_val + fac_val - debt) / shares)
+
+    # 景気動向によるPER補正 (index 1.0 -> 1.0, 1.2 -> 1.4, 0.8 -> 0.6)
+    sentiment_multiplier = 1.0 + (economic_index - 1.0) * 2.0
+    # 信用格付けによる補正 (50 -> 1.0, 100 -> 1.25, 0 -> 0.75)
+    rating_multiplier = 0.75 + (rating / 200.0)
+    target_per = gb.PER_BASE * sentiment_multiplier * rating_multiplier
+    target_pbr = (gb.PBR_BASE + (brand / 100.0)) * rating_multiplier
+
+    # 黒字: 収益価値と資産価値の併用 / 赤字: 資産価値のみ (株価がマイナスになるのを防ぐ)
+    theoretical = np.where(eps > 0, ((eps * target_per) + (bps * target_pbr)) / 2.0, bps * target_pbr)
+    return {'eps': eps, 'bps': bps, 'theoretical': np.maximum(1, theoretical)}
+
+def next_prices(current, theoretical, volatility, penalty):
+    """理論株価へ織り込み係数分だけ寄せ、変動と決算遅延ペナルティを掛けてから値幅制限で抑える"""
+    current = np.asarray(current, dtype=np.float64)
+    proposed = np.trunc(((theoretical * PRICE_ALPHA) + (current * (1 - PRICE_ALPHA))) * volatility * penalty)
+    upper = np.trunc(current * LIMIT_UP)
+    lower = np.trunc(current * LIMIT_DOWN)
+    return np.maximum(1, np.maximum(lower, np.minimum(upper, proposed))).astype(np.int64)
+
+def split_ratios(prices):
+    """株式分割の比率 (分割しない企業は1)"""
+    ratios = np.trunc(prices / SPLIT_TARGET_PRICE).astype(np.int64)
+    return np.where((prices > SPLIT_THRESHOLD) & (ratios >= 2), ratios, 1)
@@ -0,0 +1,238 @@
+# c:\0124newSIm\src\world_state.py
+# 週次シミュレーション用のインメモリ世界状態
+
+from database import db
+from capability_cache import capability_cache
+from stock_index import SellableStockIndex
+from labor_pool import LaborPoolIndex
+from npc_store import NPCStore
+
+class WorldState:
+    """
+    週の開始時に企業・NPC・事業部・施設・在庫・設計書・借入をDBから一括ロードし、
+    各フェーズはメモリ上のdictを読み書きする。
+    変更は dirty として記録し、flush() でまとめてDBへ書き戻す。
+    販売可能在庫 (stocks) と求職者 (labor_pool) は索引として保持し、行の変更に合わせて差分更新する。
+    NPCの列指向ストア (npc_store) も最初の参照時に作り、以降は行の変更に合わせて同期する。
+    """
+
+    # ロード対象テーブル (companies 以外は company_id で索引を持つ)
+    TABLES = ['companies', 'divisions', 'npcs', 'facilities', 'inventory', 'product_designs', 'loans']
+
+    def __init__(self):
+        self.week = 0
+        self.economic_index = 1.0
+        self.rows = {t: {} for t in self.TABLES}
+        self._by_company = {t: {} for t in self.TABLES if t != 'companies'}
+        self._dirty = {t: {} for t in self.TABLES}   # {table: {row_id: set(columns)}}
+        self._deleted = {t: set() for t in self.TABLES}
+        self.stocks = SellableStockIndex(self)
+        self.labor_pool = LaborPoolIndex(self)
+        self._indexes = [self.stocks, self.labor_pool]
+        self._npc_store = None
+
+    @classmethod
+    def load(cls):
+        world = cls()
+        world.refresh()
+        return world
+
+    def refresh(self):
+        """DBから全テーブルを読み直す (未flushの変更は破棄される)"""
+        state = db.fetch_one("SELECT week, economic_index FROM game_state")
+        self.week = state['week'] if state else 0
+        self.economic_index = state['economic_index'] if state else 1.0
+
+        for table in self.TABLES:
+            self.rows[table] = {r['id']: dict(r) for r in db.fetch_all(f"SELECT * FROM {table}")}
+            self._dirty[table] = {}
+            self._deleted[table] = set()
+            if table in self._by_company:
+                index = {}
+                for row_id, row in self.rows[table].items():
+                    index.setdefault(row['company_id'], {})[row_id] = row
+                self._by_company[table] = index
+        for index in self._indexes:
+            index.rebuild()
+        self._npc_store = None
+
+    # ---------------------------------------------------------
+    # 参照
+    # ---------------------------------------------------------
+    @property
+    def companies(self):
+        return self.rows['companies']
+
+    @property
+    def npcs(self):
+        return self.rows['npcs']
+
+    @property
+    def npc_store(self):
+        """全NPCの NPCStore (週の最初の参照時に作り、同じインスタンスを各フェーズで共有する)"""
+        if self._npc_store is None:
+            self._npc_store = NPCStore.from_world(self)
+        return self._npc_store
+
+    @property
+    def designs(self):
+        return self.rows['product_designs']
+
+    def company(self, company_id):
+        return self.rows['companies'].get(company_id)
+
+    def active_companies(self, include_suppliers=True):
+        return [c for c in self.rows['companies'].values()
+                if c['is_active'] and (include_suppliers or c['type'] != 'system_supplier')]
+
+    def owned_by(self, table, company_id):
+        """指定テーブルのうち company_id が一致する行のリスト (company_id=None で無所属)"""
+        return list(self._by_company[table].get(company_id, {}).values())
+
+    def employees(self, company_id):
+        return self.owned_by('npcs', company_id)
+
+    def unemployed(self):
+        return self.owned_by('npcs', None)
+
+    def divisions(self, company_id):
+        return self.owned_by('divisions', company_id)
+
+    def facilities(self, company_id):
+        return self.owned_by('facilities', company_id)
+
+    def inventory(self, company_id):
+        return self.owned_by('inventory', company_id)
+
+    def company_designs(self, company_id):
+        return self.owned_by('product_designs', company_id)
+
+    def loans(self, company_id):
+        return self.owned_by('loans', company_id)
+
+    def find_inventory(self, company_id, design_id):
+        for item in self._by_company['inventory'].get(company_id, {}).values():
+            if item['design_id'] == design_id:
+                return item
+        return None
+
+    def total_debt(self, company_id):
+        return sum(l['amount'] for l in self.loans(company_id))
+
+    # ---------------------------------------------------------
+    # 更新
+    # ---------------------------------------------------------
+    def update(self, table, row_id, **changes):
+        row = self.rows[table][row_id]
+        if table in self._by_company:
+            capability_cache.notify(table, {row['company_id'], changes.get('company_id', row['company_id'])}, changes.keys())
+        elif table == 'companies':
+            capability_cache.notify(table, [row_id], changes.keys())
+        if 'company_id' in changes and table in self._by_company and changes['company_id'] != row['company_id']:
+            self._by_company[table].get(row['company_id'], {}).pop(row_id, None)
+            self._by_company[table].setdefault(changes['company_id'], {})[row_id] = row
+        row.update(changes)
+        self._dirty[table].setdefault(row_id, set()).update(changes.keys())
+        self._notify(table, row, changes.keys())
+        return row
+
+    def update_many(self, table, row_ids, **columns):
+        """
+        複数行の同じカラムをまとめて更新する (columns: {カラム: row_ids と同じ並びの値のリスト})
+        1行ずつ update() するより通知と dirty 記録のコストが小さい。company_id の変更には使えない。
+        """
+        if 'company_id' in columns:
+            raise ValueError("update_many cannot change company_id")
+        names = list(columns.keys())
+        values = [columns[c] for c in names]
+        rows = self.rows[table]
+        dirty = self._dirty[table]
+        company_ids = set()
+        for k, row_id in enumerate(row_ids):
+            row = rows[row_id]
+            for name, vals in zip(names, values):
+                row[name] = vals[k]
+            dirty.setdefault(row_id, set()).update(names)
+            if table in self._by_company:
+                company_ids.add(row['company_id'])
+            elif table == 'companies':
+                company_ids.add(row_id)
+            self._notify(table, row, names)
+        if company_ids:
+            capability_cache.notify(table, company_ids, names)
+
+    def adjust(self, table, row_id, column, delta):
+        """数値カラムへの加算 (funds, quantity など)"""
+        row = self.rows[table][row_id]
+        return self.update(table, row_id, **{column: (row[column] or 0) + delta})
+
+    def insert(self, table, **values):
+        """1行追加して採番済みの行を返す (新規在庫・新規企業など稀な操作用)"""
+        columns = ', '.join(values.keys())
+        placeholders = ', '.join(['?'] * len(values))
+        row_id = db.execute_query(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", tuple(values.values()))
+        row = dict(db.fetch_one(f"SELECT * FROM {table} WHERE id = ?", (row_id,)))
+        self._add_row(table, row)
+        return row
+
+    def insert_many(self, table, columns, values_list):
+        """executemany で一括追加し、採番された行をまとめて読み込む"""
+        if not values_list: return []
+        res = db.fetch_one(f"SELECT MAX(id) as max_id FROM {table}")
+        last_id = res['max_id'] or 0
+        placeholders = ', '.join(['?'] * len(columns))
+        with db.transaction() as conn:
+            conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", values_list)
+        new_rows = [dict(r) for r in db.fetch_all(f"SELECT * FROM {table} WHERE id > ? ORDER BY id", (last_id,))]
+        for row in new_rows:
+            self._add_row(table, row)
+        return new_rows
+
+    def delete(self, table, row_id):
+        row = self.rows[table].pop(row_id, None)
+        if row is None: return
+        if table in self._by_company:
+            self._by_company[table].get(row['company_id'], {}).pop(row_id, None)
+            capability_cache.notify(table, [row['company_id']])
+        self._dirty[table].pop(row_id, None)
+        self._deleted[table].add(row_id)
+        self._notify(table, row)
+
+    def _add_row(self, table, row):
+        self.rows[table][row['id']] = row
+        if table in self._by_company:
+            self._by_company[table].setdefault(row['company_id'], {})[row['id']] = row
+            capability_cache.notify(table, [row['company_id']])
+        self._notify(table, row)
+
+    def _notify(self, table, row, columns=None):
+        """索引へ行の変更を通知する (columns=None は行の追加・削除)"""
+        for index in self._indexes:
+            index.on_change(table, row, columns)
+        if table == 'npcs' and self._npc_store is not None:
+            if columns is None:
+                self._npc_store = None  # 行の追加・削除は次の参照時に作り直す
+            else:
+                self._npc_store.sync(row, columns)
+
+    # ---------------------------------------------------------
+    # 書き戻し
+    # ---------------------------------------------------------
+    def flush(self):
+        """dirty な行をカラムセットごとに executemany でまとめて書き戻す"""
+        with db.transaction() as conn:
+            cursor = conn.cursor()
+            for table in self.TABLES:
+                if self._deleted[table]:
+                    cursor.executemany(f"DELETE FROM {table} WHERE id = ?", [(i,) for i in self._deleted[table]])
+                    self._deleted[table] = set()
+
+                groups = {}
+                for row_id, cols in self._dirty[table].items():
+                    groups.setdefault(tuple(sorted(cols)), []).append(row_id)
+
+                for cols, row_ids in groups.items():
+                    set_clause = ", ".join(f"{c} = ?" for c in cols)
+                    params = [tuple(self.rows[table][i][c] for c in cols) + (i,) for i in row_ids]
+                    cursor.executemany(f"UPDATE {table} SET {set_clause} WHERE id = ?", params)
+                self._dirty[table] = {}
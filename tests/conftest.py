@@ -0,0 +1,36 @@
+# c:\0124newSIm\tests\conftest.py
+# テスト共通の設定 (src を import パスに追加し、DB・イベントログは一時ディレクトリに作る)
+import os
+import sys
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from database import db
+from rng import rng
+from capability_cache import capability_cache
+
+# テストで使う乱数のマスターシード
+SEED = 7
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """一時ディレクトリのファイルDB (simulation_events.log もカレントディレクトリの一時ディレクトリに書かれる)"""
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / "newsim.db")
+    db.use_file(path)
+    capability_cache.clear()
+    yield path
+    db.reset_pool()
+    db._close_memory()
+
+@pytest.fixture
+def seeded(db_path):
+    """シード固定で初期データを作ったDB"""
+    import seed
+    rng.seed(SEED)
+    seed.run_seed()
+    capability_cache.clear()
+    return db_path
@@ -0,0 +1,291 @@
+-- c:\0124newSIm\tests\data\baseline_schema.sql
+-- スキーマのバージョン管理 (schema_version) 導入前のセーブデータのスキーマと、移行対象のデータの一部
+
+CREATE TABLE game_state (
+            week INTEGER PRIMARY KEY,
+            economic_index REAL
+        );
+
+CREATE TABLE companies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            type TEXT, -- 'player', 'npc_maker', 'npc_retail', 'system_supplier'
+            funds INTEGER,
+            brand_power REAL DEFAULT 0,
+            industry TEXT DEFAULT 'automotive',
+            orientation TEXT DEFAULT 'standard', -- 'luxury', 'value', 'standard'
+            credit_rating INTEGER DEFAULT 50,
+            dev_knowhow REAL DEFAULT 0,
+            borrowing_limit INTEGER DEFAULT 0,
+            is_active BOOLEAN DEFAULT 1,
+            -- Supplier Traits
+            trait_material_score REAL DEFAULT 3.0,
+            trait_cost_multiplier REAL DEFAULT 1.0,
+            part_category TEXT, -- 'engine', 'body', etc. for system_supplier
+            
+            -- Stock info
+            listing_status TEXT DEFAULT 'private', -- 'private', 'public'
+            stock_price INTEGER DEFAULT 50000,
+            outstanding_shares INTEGER DEFAULT 20000,
+            market_cap INTEGER DEFAULT 1000000000
+        );
+
+CREATE TABLE divisions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_id INTEGER,
+            name TEXT,
+            industry_key TEXT, -- 'automotive', 'pc'
+            FOREIGN KEY(company_id) REFERENCES companies(id)
+        );
+
+CREATE TABLE npcs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            age INTEGER,
+            gender TEXT,
+            company_id INTEGER,
+            division_id INTEGER, -- NULLなら共通部門(本社)
+            department TEXT,
+            role TEXT,
+            salary INTEGER,
+            desired_salary INTEGER,
+            loyalty REAL,
+            is_genius BOOLEAN,
+            last_resigned_week INTEGER DEFAULT 0,
+            last_company_id INTEGER,
+            
+            -- 能力値 (真値)
+            diligence REAL,
+            management REAL,
+            adaptability REAL,
+            store_ops REAL,
+            production REAL,
+            development REAL,
+            sales REAL,
+            hr REAL,
+            pr REAL,
+            accounting REAL,
+            executive REAL,
+            aptitudes TEXT, -- JSON: {"automotive": 0.5, ...}
+            
+            FOREIGN KEY(company_id) REFERENCES companies(id),
+            FOREIGN KEY(division_id) REFERENCES divisions(id)
+        );
+
+CREATE TABLE product_designs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_id INTEGER,
+            division_id INTEGER,
+            industry_key TEXT, -- 'automotive', 'pc'
+            name TEXT,
+            material_score REAL,
+            concept_score REAL,
+            production_efficiency REAL,
+            base_price INTEGER,
+            sales_price INTEGER,
+            status TEXT, -- 'developing', 'completed', 'obsolete'
+            strategy TEXT, -- 開発方針
+            developed_week INTEGER,
+            parts_config TEXT, -- JSON: {part_key: {supplier_id, score, cost}}
+            awareness REAL DEFAULT 0,
+            FOREIGN KEY(company_id) REFERENCES companies(id),
+            FOREIGN KEY(division_id) REFERENCES divisions(id)
+        );
+
+CREATE TABLE inventory (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_id INTEGER,
+            division_id INTEGER,
+            design_id INTEGER,
+            quantity INTEGER,
+            sales_price INTEGER DEFAULT 0, -- 小売での販売価格 (メーカー在庫の場合はMSRPまたは0)
+            FOREIGN KEY(company_id) REFERENCES companies(id),
+            FOREIGN KEY(division_id) REFERENCES divisions(id),
+            FOREIGN KEY(design_id) REFERENCES product_designs(id)
+        );
+
+CREATE TABLE facilities (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_id INTEGER,
+            division_id INTEGER, -- NULLなら共通施設(本社オフィス等)
+            name TEXT,
+            type TEXT, -- 'office', 'factory', 'store'
+            size INTEGER, -- 収容人数
+            rent INTEGER,
+            access_score TEXT, -- 店舗用 S-D
+            is_owned BOOLEAN DEFAULT 0,
+            FOREIGN KEY(company_id) REFERENCES companies(id),
+            FOREIGN KEY(division_id) REFERENCES divisions(id)
+        );
+
+CREATE TABLE loans (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_id INTEGER,
+            amount INTEGER,
+            interest_rate REAL, -- 年利 (0.05 = 5%)
+            remaining_weeks INTEGER,
+            FOREIGN KEY(company_id) REFERENCES companies(id)
+        );
+
+CREATE TABLE transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            week INTEGER,
+            type TEXT, -- 'b2b', 'b2c'
+            buyer_id INTEGER,
+            seller_id INTEGER,
+            design_id INTEGER,
+            quantity INTEGER,
+            amount INTEGER
+        );
+
+CREATE TABLE account_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            week INTEGER,
+            company_id INTEGER,
+            category TEXT, -- 'revenue', 'cogs', 'labor', 'rent', 'ad', 'interest', 'material', 'stock_purchase'
+            amount INTEGER
+        );
+
+CREATE TABLE news_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            week INTEGER,
+            company_id INTEGER,
+            message TEXT,
+            type TEXT -- 'info', 'warning', 'error', 'market'
+        );
+
+CREATE TABLE job_offers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            week INTEGER,
+            company_id INTEGER,
+            npc_id INTEGER,
+            offer_salary INTEGER,
+            target_dept TEXT,
+            FOREIGN KEY(company_id) REFERENCES companies(id),
+            FOREIGN KEY(npc_id) REFERENCES npcs(id)
+        );
+
+CREATE TABLE b2b_orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            week INTEGER,
+            buyer_id INTEGER,
+            seller_id INTEGER,
+            design_id INTEGER,
+            quantity INTEGER,
+            amount INTEGER,
+            status TEXT, -- 'pending', 'accepted', 'rejected', 'completed'
+            FOREIGN KEY(buyer_id) REFERENCES companies(id),
+            FOREIGN KEY(seller_id) REFERENCES companies(id),
+            FOREIGN KEY(design_id) REFERENCES product_designs(id)
+        );
+
+CREATE TABLE weekly_stats (
+            week INTEGER,
+            company_id INTEGER,
+            production_ordered INTEGER DEFAULT 0,
+            production_completed INTEGER DEFAULT 0,
+            development_ordered INTEGER DEFAULT 0,
+            development_completed INTEGER DEFAULT 0,
+            inventory_count INTEGER DEFAULT 0,
+            b2b_sales INTEGER DEFAULT 0,
+            b2c_sales INTEGER DEFAULT 0,
+            hired_count INTEGER DEFAULT 0,
+            facility_size INTEGER DEFAULT 0,
+            total_revenue INTEGER DEFAULT 0,
+            total_expenses INTEGER DEFAULT 0,
+            labor_costs INTEGER DEFAULT 0,
+            facility_costs INTEGER DEFAULT 0,
+            loan_balance INTEGER DEFAULT 0,
+            funds INTEGER DEFAULT 0,
+            phase TEXT,
+            PRIMARY KEY (week, company_id)
+        );
+
+CREATE TABLE stock_history (
+            week INTEGER,
+            company_id INTEGER,
+            stock_price INTEGER,
+            market_cap INTEGER,
+            eps REAL,
+            bps REAL,
+            per REAL,
+            pbr REAL,
+            PRIMARY KEY (week, company_id)
+        );
+
+CREATE TABLE financial_reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_id INTEGER,
+            week INTEGER, -- 決算締め日
+            period_str TEXT, -- '2025 Q1' etc
+            revenue INTEGER,
+            net_profit INTEGER,
+            total_assets INTEGER,
+            net_assets INTEGER,
+            published_week INTEGER, -- 実際に発表された週
+            status TEXT, -- 'draft', 'published', 'delayed', 'corrected'
+            correction_flag BOOLEAN DEFAULT 0
+        );
+
+CREATE TABLE market_trends (
+            week INTEGER,
+            industry_key TEXT,
+            b2c_demand INTEGER DEFAULT 0,
+            PRIMARY KEY (week, industry_key)
+        );
+
+CREATE TABLE bottleneck_logs (
+            week INTEGER,
+            company_id INTEGER,
+            industry TEXT,
+            type TEXT,
+            phase TEXT,
+            funds INTEGER,
+            market_cap INTEGER,
+            revenue INTEGER,
+            expenses INTEGER,
+            profit INTEGER,
+            current_share REAL,
+            target_share REAL,
+            target_production INTEGER,
+            production_count INTEGER,
+            production_capacity REAL,
+            target_sales INTEGER,
+            sales_count INTEGER,
+            sales_capacity REAL,
+            req_facility_div INTEGER,
+            cap_facility_div INTEGER,
+            req_hr INTEGER,
+            cap_hr REAL,
+            req_facility_common INTEGER,
+            cap_facility_common INTEGER,
+            emp_production INTEGER,
+            emp_sales INTEGER,
+            emp_development INTEGER,
+            emp_hr INTEGER,
+            emp_pr INTEGER,
+            emp_accounting INTEGER,
+            emp_store INTEGER,
+            PRIMARY KEY (week, company_id)
+        );
+
+CREATE INDEX idx_npcs_company_id ON npcs(company_id);
+
+CREATE INDEX idx_inventory_company_design ON inventory(company_id, design_id);
+
+CREATE INDEX idx_product_designs_company ON product_designs(company_id);
+
+CREATE INDEX idx_facilities_company ON facilities(company_id);
+
+CREATE INDEX idx_transactions_week_type ON transactions(week, type);
+
+CREATE INDEX idx_b2b_orders_status ON b2b_orders(status);
+
+CREATE INDEX idx_job_offers_week ON job_offers(week);
+
+INSERT INTO game_state (week, economic_index) VALUES (17, 1.0041909387619088);
+INSERT INTO npcs (id, name, company_id, aptitudes) VALUES (1, '吉川 清', 44, '{"automotive": 1.0615384615384613, "pc": 1.0}');
+INSERT INTO npcs (id, name, company_id, aptitudes) VALUES (2, '吉村 健', 44, '{"automotive": 1.0615384615384613, "pc": 1.0}');
+INSERT INTO account_entries (id, week, company_id, category, amount) VALUES (1, 1, 44, 'equity_finance', -150000000);
+INSERT INTO account_entries (id, week, company_id, category, amount) VALUES (2, 1, 44, 'facility_purchase', 50000000);
+INSERT INTO account_entries (id, week, company_id, category, amount) VALUES (3, 1, 44, 'ad', 5000000);
@@ -0,0 +1,32 @@
+# c:\0124newSIm\tests\test_apply_actions.py
+# アクションの検証・適用
+from database import db
+import gamebalance as gb
+from simulation import Simulation
+from actions import StartDevelopment
+
+def _development(company_id, division_id):
+    return StartDevelopment(company_id, 1, division_id=division_id, industry_key='automotive', name='Test Model',
+                            material_score=1.0, strategy=gb.DEV_STRATEGY_BALANCED, parts_config='{}')
+
+def test_start_development_is_validated(seeded):
+    makers = [dict(r) for r in db.fetch_all("""
+        SELECT c.id, MIN(d.id) AS division_id FROM companies c JOIN divisions d ON d.company_id = c.id
+        WHERE c.type = 'npc_maker' AND c.is_active = 1 GROUP BY c.id ORDER BY c.id
+    """)]
+    own, other, broke, closed = makers[:4]
+    db.execute_query("UPDATE companies SET funds = 0 WHERE id = ?", (broke['id'],))
+    db.execute_query("UPDATE companies SET is_active = 0 WHERE id = ?", (closed['id'],))
+    designs = db.fetch_one("SELECT COUNT(*) AS n FROM product_designs")['n']
+
+    actions = [
+        _development(own['id'], own['division_id']),
+        _development(own['id'], other['division_id']),   # 他社の事業部
+        _development(broke['id'], broke['division_id']), # 資金なし
+        _development(closed['id'], closed['division_id']), # 倒産済み
+    ]
+    assert Simulation().apply_actions(actions, 1) == 3
+    assert [a.status for a in actions] == ['applied', 'rejected', 'rejected', 'rejected']
+    # 却下分の設計書は作られない
+    assert db.fetch_one("SELECT COUNT(*) AS n FROM product_designs")['n'] == designs + 1
+    assert db.fetch_one("SELECT company_id FROM product_designs ORDER BY id DESC LIMIT 1")['company_id'] == own['id']
@@ -0,0 +1,45 @@
+# c:\0124newSIm\tests\test_checkpoint.py
+# チェックポイントの保存・再開
+import sqlite3
+from database import db
+from simulation import Simulation
+from checkpoint import save_checkpoint, load_checkpoint
+
+def _week_on_disk(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT week FROM game_state").fetchone()[0]
+    finally:
+        conn.close()
+
+def test_resume_file_mode_writes_to_restored_file(seeded, tmp_path):
+    sim = Simulation()
+    sim.proceed_week()
+    path = save_checkpoint(directory=str(tmp_path / "checkpoints"))
+    sim.proceed_week()
+    sim.proceed_week()
+
+    meta = load_checkpoint(path, in_memory=False, db_path=seeded)
+    assert sim.get_current_week() == meta['week']
+    sim.proceed_week()
+    assert sim.get_current_week() == meta['week'] + 1
+    db.reset_pool()
+    # 再開後の週は削除前のファイルではなく、復元したファイルに書かれている
+    assert _week_on_disk(seeded) == meta['week'] + 1
+
+def test_resume_memory_mode_leaves_file_untouched(seeded, tmp_path):
+    sim = Simulation()
+    sim.proceed_week()
+    path = save_checkpoint(directory=str(tmp_path / "checkpoints"))
+    sim.proceed_week()
+    sim.proceed_week()
+    db.reset_pool()
+    week_on_disk = _week_on_disk(seeded)
+
+    meta = load_checkpoint(path, in_memory=True)
+    assert db.is_memory
+    assert sim.get_current_week() == meta['week']
+    sim.proceed_week()
+    assert sim.get_current_week() == meta['week'] + 1
+    # インメモリで再開した実行はファイルへ書き込まない
+    assert _week_on_disk(seeded) == week_on_disk
@@ -0,0 +1,59 @@
+# c:\0124newSIm\tests\test_determinism.py
+# 再現性 (並列意思決定・チェックポイントからの再実行が同じ結果になること)
+import sqlite3
+import seed
+from database import db
+from rng import rng
+from capability_cache import capability_cache
+from simulation import Simulation
+from checkpoint import save_checkpoint, load_checkpoint
+from conftest import SEED
+
+# 実行時間・適用日時を含むため比較しないテーブル
+EXCLUDED_TABLES = {'perf_stats', 'schema_version', 'sqlite_sequence'}
+
+WEEKS = 2
+
+def _dump(path):
+    """全テーブルの全行 (rowid順)"""
+    db.reset_pool()
+    conn = sqlite3.connect(path)
+    try:
+        tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+        return {t: conn.execute(f"SELECT * FROM {t} ORDER BY rowid").fetchall() for t in tables if t not in EXCLUDED_TABLES}
+    finally:
+        conn.close()
+
+def _run(path, weeks, decision_workers=0):
+    db.use_file(path)
+    rng.seed(SEED)
+    seed.run_seed()
+    capability_cache.clear()
+    sim = Simulation(decision_workers=decision_workers)
+    try:
+        for _ in range(weeks):
+            sim.proceed_week()
+    finally:
+        sim.shutdown()
+    return _dump(path)
+
+def test_parallel_decisions_match_serial(db_path, tmp_path):
+    serial = _run(str(tmp_path / "serial.db"), WEEKS)
+    parallel = _run(str(tmp_path / "parallel.db"), WEEKS, decision_workers=2)
+    assert serial.keys() == parallel.keys()
+    for table in serial:
+        assert serial[table] == parallel[table], table
+
+def test_week_replayed_from_checkpoint_is_identical(seeded, tmp_path):
+    sim = Simulation()
+    sim.proceed_week()
+    path = save_checkpoint(directory=str(tmp_path / "checkpoints"))
+    sim.proceed_week()
+    first = _dump(seeded)
+
+    load_checkpoint(path, in_memory=False, db_path=seeded)
+    sim.proceed_week()
+    replayed = _dump(seeded)
+    assert first.keys() == replayed.keys()
+    for table in first:
+        assert first[table] == replayed[table], table
@@ -0,0 +1,70 @@
+# c:\0124newSIm\tests\test_migrations.py
+# スキーマのマイグレーション
+import os
+import json
+import sqlite3
+import aptitudes
+from database import db, SCHEMA_VERSION
+
+# schema_version 導入前のセーブデータ (スキーマと移行対象の行)
+BASELINE_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "baseline_schema.sql")
+
+def _columns(path, table):
+    conn = sqlite3.connect(path)
+    try:
+        return {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+    finally:
+        conn.close()
+
+def _schema(path):
+    """テーブルのカラム定義・インデックスのカラム・トリガーの一覧"""
+    conn = sqlite3.connect(path)
+    try:
+        result = {}
+        for obj_type, name, table in conn.execute("SELECT type, name, tbl_name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"):
+            if obj_type == 'table':
+                result[(obj_type, name)] = [(r[1], r[2].upper(), r[4], r[5]) for r in conn.execute(f"PRAGMA table_info({name})")]
+            elif obj_type == 'index':
+                result[(obj_type, name)] = (table, [r[2] for r in conn.execute(f"PRAGMA index_info({name})")])
+            else:
+                result[(obj_type, name)] = table
+        return result
+    finally:
+        conn.close()
+
+def test_migrate_baseline_save_matches_fresh_schema(db_path, tmp_path):
+    db.init_db()
+    db.reset_pool()
+    fresh = _schema(db_path)
+
+    old = str(tmp_path / "baseline.db")
+    conn = sqlite3.connect(old)
+    with open(BASELINE_SQL, encoding='utf-8') as f:
+        conn.executescript(f.read())
+    blob = conn.execute("SELECT aptitudes FROM npcs WHERE id = 1").fetchone()[0]
+    entries = conn.execute("SELECT SUM(amount) FROM account_entries").fetchone()[0]
+    conn.close()
+
+    # 既存のファイルは開くときにマイグレーションされる
+    db.use_file(old)
+    assert db.schema_version() == SCHEMA_VERSION
+    db.reset_pool()
+    assert _schema(old) == fresh
+
+    conn = sqlite3.connect(old)
+    try:
+        columns = list(aptitudes.COLUMNS.values())
+        row = conn.execute(f"SELECT {', '.join(columns)} FROM npcs WHERE id = 1").fetchone()
+        assert dict(zip(columns, row)) == aptitudes.to_columns(json.loads(blob))
+        assert conn.execute("SELECT SUM(amount) FROM ledger_weekly").fetchone()[0] == entries
+    finally:
+        conn.close()
+
+def test_migrate_adds_columns_for_new_industries(db_path, monkeypatch):
+    db.init_db()
+    monkeypatch.setitem(aptitudes.COLUMNS, 'robotics', 'apt_robotics')
+    db.migrate()
+    db.reset_pool()
+    assert 'apt_robotics' in _columns(db_path, 'npcs')
+    # 2回目以降は何もしない
+    db.migrate()
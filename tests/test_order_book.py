@@ -0,0 +1,48 @@
+# c:\0124newSIm\tests\test_order_book.py
+# B2B注文板の部分受注・部分約定
+from database import db
+from order_book import OrderBook
+
+def _rows():
+    return {r['id']: dict(r) for r in db.fetch_all("SELECT id, quantity, amount, status FROM b2b_orders ORDER BY id")}
+
+def test_partial_fill_splits_order(db_path):
+    db.init_db()
+    book = OrderBook.load(priority='fifo')
+    order = book.place(1, buyer_id=10, seller_id=20, design_id=30, quantity=10, amount=1000)
+    book.accept(order['id'])
+
+    remainder = book.fill(order['id'], 4)
+    # 約定分は完了して注文板から外れ、残りは新しいIDの受注済み注文になる
+    assert book.get(order['id']) is None
+    assert (order['quantity'], order['amount'], order['status']) == (4, 400, 'completed')
+    assert remainder['id'] != order['id']
+    assert (remainder['quantity'], remainder['amount'], remainder['status']) == (6, 600, 'accepted')
+    assert [o['id'] for o in book.for_seller(20, 'accepted')] == [remainder['id']]
+
+    assert book.fill(remainder['id'], 6) is None
+    assert book.for_buyer(10) == []
+    book.flush()
+    rows = _rows()
+    assert rows[order['id']] == {'id': order['id'], 'quantity': 4, 'amount': 400, 'status': 'completed'}
+    assert rows[remainder['id']] == {'id': remainder['id'], 'quantity': 6, 'amount': 600, 'status': 'completed'}
+
+def test_partial_accept_and_reload(db_path):
+    db.init_db()
+    book = OrderBook.load(priority='fifo')
+    first = book.place(1, buyer_id=10, seller_id=20, design_id=30, quantity=10, amount=1000)
+    second = book.place(1, buyer_id=11, seller_id=20, design_id=30, quantity=5, amount=500)
+    book.accept(first['id'], quantity=3, amount=300)
+    book.flush()
+
+    # 一部約定の残りは保存後の読み直しでも未約定として残り、IDは既存の最大IDの次から採番される
+    book = OrderBook.load(priority='fifo')
+    remainder = book.fill(first['id'], 1)
+    assert remainder['id'] == second['id'] + 1
+    assert (remainder['quantity'], remainder['amount']) == (2, 200)
+    assert [o['id'] for o in book.for_seller(20)] == [second['id'], remainder['id']]
+    book.flush()
+
+    book = OrderBook.load(priority='fifo')
+    assert {o['id']: o['status'] for o in book.for_seller(20)} == {second['id']: 'pending', remainder['id']: 'accepted'}
+    assert _rows()[first['id']]['status'] == 'completed'